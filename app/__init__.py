@@ -1,6 +1,7 @@
 from flask import Flask, request, abort
 from config import Config
 import os
+import atexit
 import logging
 from datetime import datetime
 
@@ -18,6 +19,12 @@ def create_app(config_class=Config):
     from app.db.models import db
     db.init_app(app)
     
+    # Configure shared database connection pools
+    from app.utils import mysql_pool, postgres_pool, schema_cache
+    mysql_pool.init_app(app)
+    postgres_pool.init_app(app)
+    schema_cache.init_app(app)
+    
     # Ensure instance path exists
     os.makedirs(app.instance_path, exist_ok=True)
     
@@ -61,16 +68,25 @@ def create_app(config_class=Config):
             from app.db.init_db import init_db
             app.logger.info("No database found. Initializing database...")
             init_db(app)
+        else:
+            from app.db.init_db import upgrade_db
+            upgrade_db(app)
+    
+    # Run scheduled backups and keep the backup catalog in sync with the
+    # backup directory and S3, in one worker process only
+    from app.features.backup.services.backup_service import get_backup_service
+    get_backup_service().start_scheduler(app)
     
-    # Cleanup on shutdown
-    @app.teardown_appcontext
-    def shutdown_services(exception=None):
+    # Cleanup on shutdown; teardown_appcontext runs after every request,
+    # which would stop the scheduler long before the process exits
+    def shutdown_services():
         """Clean up resources when the application shuts down"""
-        from app.features.backup.services.backup_service import get_backup_service
         try:
             backup_service = get_backup_service()
             backup_service.shutdown()
         except Exception as e:
             app.logger.error(f"Error shutting down backup service: {str(e)}")
     
+    atexit.register(shutdown_services)
+    
     return app 
\ No newline at end of file
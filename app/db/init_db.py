@@ -9,6 +9,8 @@ import logging
 from datetime import datetime
 from pathlib import Path
 
+import sqlalchemy as sa
+
 from app.db.models import db, User, Config
 
 logger = logging.getLogger(__name__)
@@ -38,6 +40,63 @@ def save_credentials_to_file(username, password, filepath):
         logger.error(f"Failed to save credentials: {str(e)}")
         return False
 
+def add_missing_columns():
+    """
+    Add model columns that are missing from existing tables.
+    
+    db.create_all() only creates missing tables, so columns added to a model
+    after the database was first created are added here. New columns must be
+    nullable or have a scalar default.
+    """
+    inspector = sa.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(db.engine.dialect)}"
+            if column.default is not None and column.default.is_scalar:
+                default = sa.literal(column.default.arg, column.type).compile(
+                    dialect=db.engine.dialect,
+                    compile_kwargs={'literal_binds': True}
+                )
+                ddl += f" DEFAULT {default}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+            
+            db.session.execute(sa.text(ddl))
+            logger.info(f"Added column {table.name}.{column.name}")
+    db.session.commit()
+
+def add_missing_indexes():
+    """Create model indexes that are missing from existing tables."""
+    inspector = sa.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                logger.info(f"Created index {index.name}")
+
+def upgrade_db(app):
+    """
+    Bring an existing database up to date with the models.
+    
+    Args:
+        app: Flask application instance
+    """
+    with app.app_context():
+        db.create_all()
+        add_missing_columns()
+        add_missing_indexes()
+
 def init_db(app, force=False):
     """
     Initialize the database and create initial data.
@@ -53,6 +112,8 @@ def init_db(app, force=False):
         
         # Create tables if they don't exist
         db.create_all()
+        add_missing_columns()
+        add_missing_indexes()
         logger.info("Created database tables")
         
         # Check if admin user exists
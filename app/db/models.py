@@ -1,6 +1,6 @@
 """
 SQLite database models for NEXDB.
-Contains models for user authentication and configuration.
+Contains models for user authentication, configuration and the backup catalog.
 """
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -52,11 +52,14 @@ class BackupSchedule(db.Model):
     name = db.Column(db.String(80), nullable=False)
     db_type = db.Column(db.String(20), nullable=False)  # mysql or postgres
     db_name = db.Column(db.String(80), nullable=False)
-    frequency = db.Column(db.String(20), nullable=False)  # daily, weekly, monthly
+    frequency = db.Column(db.String(20), nullable=False)  # hourly, daily, weekly, monthly
     time = db.Column(db.Time, nullable=False)
     day_of_week = db.Column(db.Integer, nullable=True)  # 0-6 (Monday-Sunday)
     day_of_month = db.Column(db.Integer, nullable=True)  # 1-31
     backup_type = db.Column(db.String(20), nullable=False)  # local or s3
+    backup_mode = db.Column(db.String(20), nullable=False, default='single')  # single, parallel, incremental or dedup
+    retention_policy = db.Column(db.Text, nullable=True)  # JSON counts of hourly/daily/weekly/monthly backups to keep
+    resource_limits = db.Column(db.Text, nullable=True)  # JSON overrides of the BACKUP_NICE/IO/BANDWIDTH/CPU limits
     enabled = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_run = db.Column(db.DateTime, nullable=True)
@@ -71,12 +74,48 @@ class BackupLog(db.Model):
     db_type = db.Column(db.String(20), nullable=False)
     db_name = db.Column(db.String(80), nullable=False)
     backup_type = db.Column(db.String(20), nullable=False)  # local or s3
-    status = db.Column(db.String(20), nullable=False)  # success, failed
+    status = db.Column(db.String(20), nullable=False)  # success, failed, skipped, deleted
     message = db.Column(db.Text, nullable=True)
     file_path = db.Column(db.String(255), nullable=True)
-    file_size = db.Column(db.Integer, nullable=True)  # in bytes
+    file_size = db.Column(db.BigInteger, nullable=True)  # in bytes
+    checksum = db.Column(db.String(64), nullable=True)  # sha256 of the backup file
+    compression = db.Column(db.String(10), nullable=True)  # gzip, zstd, lz4 or None
+    backup_mode = db.Column(db.String(20), nullable=True)  # single, parallel or incremental
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     schedule_id = db.Column(db.Integer, db.ForeignKey('backup_schedule.id'), nullable=True)
+    parent_id = db.Column(db.Integer, db.ForeignKey('backup_log.id'), nullable=True)  # backup this one was copied from
+    
+    # The backup catalog is queried by location and by database, newest first
+    __table_args__ = (
+        db.Index('ix_backup_log_catalog', 'backup_type', 'status', 'created_at'),
+        db.Index('ix_backup_log_database', 'db_type', 'db_name', 'created_at'),
+        db.Index('ix_backup_log_name', 'backup_type', 'backup_name'),
+    )
+    
+    def __repr__(self):
+        return f'<BackupLog {self.backup_name}>' 
+
+class BackupJob(db.Model):
+    """Backup job model for tracking backups and restores run in the background."""
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # backup or restore
+    name = db.Column(db.String(200), nullable=False)
+    db_type = db.Column(db.String(20), nullable=True)
+    db_name = db.Column(db.String(80), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed, cancelled
+    bytes_done = db.Column(db.BigInteger, nullable=False, default=0)
+    bytes_total = db.Column(db.BigInteger, nullable=True)  # unknown for dumps and directory backups
+    message = db.Column(db.Text, nullable=True)
+    result = db.Column(db.Text, nullable=True)  # JSON result of a successful job
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    pid = db.Column(db.Integer, nullable=True)  # worker process the job runs in
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_backup_job_status', 'status', 'created_at'),
+    )
     
     def __repr__(self):
-        return f'<BackupLog {self.backup_name}>' 
\ No newline at end of file
+        return f'<BackupJob {self.id}>'
\ No newline at end of file
@@ -1,14 +1,18 @@
-from flask import Blueprint, jsonify, request, current_app, send_file
+from flask import Blueprint, Response, jsonify, request, current_app, send_file, stream_with_context
 from typing import Dict, Any, List, Optional, Tuple, Union
 import os
+from datetime import datetime
 from werkzeug.utils import secure_filename
 from flask_jwt_extended import jwt_required
 from http import HTTPStatus
 
+from app.features.backup.services.backup_jobs import stream_job_events
 from app.features.backup.services.backup_service import get_backup_service
+from app.features.backup.services.retention import PERIODS, set_policy
 from app.features.backup.types import BackupFrequency, BackupResponse, S3BackupError, BackupError, BackupType
 from app.features.database.services.mysql_service import MySQLService
 from app.features.database.services.postgres_service import PostgresService
+from app.utils.throttle import ThrottleError, validate_limits
 
 
 backup_api = Blueprint('backup_api', __name__, url_prefix='/api/backups')
@@ -122,6 +126,7 @@ def create_backup() -> Tuple[Dict[str, Any], int]:
         db_type = data.get('db_type')
         db_name = data.get('db_name')
         upload_to_s3 = data.get('upload_to_s3', False)
+        stream_to_s3 = data.get('stream_to_s3', False)
         
         # Validate inputs
         if not db_type or not db_name:
@@ -139,29 +144,50 @@ def create_backup() -> Tuple[Dict[str, Any], int]:
                 'data': None
             }), HTTPStatus.BAD_REQUEST
         
-        # Create backup
-        service = get_backup_service()
-        backup_file = service.create_backup(db_type, db_name)
+        # Streamed backups are a single dump piped into one S3 object
+        if stream_to_s3 and data.get('mode') not in (None, 'single'):
+            return jsonify({
+                'success': False,
+                'message': f"Backups in {data.get('mode')} mode can't be streamed to S3",
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
         
-        # Upload to S3 if requested
-        s3_key = None
-        if upload_to_s3:
-            try:
-                s3_key = service.upload_to_s3(backup_file)
-            except S3BackupError as e:
-                # Just log the error but continue as the local backup succeeded
-                current_app.logger.warning(f"S3 upload failed: {str(e)}")
+        # Optional resource limits overriding the defaults for this job
+        try:
+            limits = validate_limits(data['limits']) if data.get('limits') else None
+        except ThrottleError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e),
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        # The backup runs as a background job on the backup queue, manual
+        # backups ahead of scheduled ones; poll /jobs/<id> for its outcome
+        service = get_backup_service()
+        job = service.submit_job(
+            'backup',
+            db_type,
+            db_name,
+            service.run_backup,
+            db_type,
+            db_name,
+            compression=data.get('compression'),
+            mode=data.get('mode'),
+            upload_to_s3=upload_to_s3,
+            stream_to_s3=stream_to_s3,
+            keep_local=data.get('keep_local'),
+            name=f"backup {db_name}",
+            limits=limits
+        )
         
         response: BackupResponse = {
             'success': True,
-            'message': 'Backup created successfully',
-            'data': {
-                'backup_file': os.path.basename(backup_file),
-                's3_key': s3_key
-            }
+            'message': f'Backup of {db_name} started',
+            'data': job
         }
         
-        return jsonify(response), HTTPStatus.CREATED
+        return jsonify(response), HTTPStatus.ACCEPTED
     
     except Exception as e:
         response = {
@@ -302,6 +328,433 @@ def upload_to_s3() -> Tuple[Dict[str, Any], int]:
         return jsonify(response), HTTPStatus.INTERNAL_SERVER_ERROR
 
 
+@backup_api.route('/restore/local', methods=['POST'])
+@jwt_required()
+def restore_local_backup() -> Tuple[Dict[str, Any], int]:
+    """Restore a database from a local backup or dedup snapshot"""
+    try:
+        # Get request data
+        data = request.get_json()
+        if not data:
+            return jsonify({
+                'success': False,
+                'message': 'No data provided',
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        db_type = data.get('db_type')
+        db_name = data.get('db_name')
+        backup_file = data.get('backup_file')
+        
+        # Validate inputs
+        if not db_type or not db_name or not backup_file:
+            return jsonify({
+                'success': False,
+                'message': 'Database type, name and backup file are required',
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        if db_type not in [BackupType.MYSQL, BackupType.POSTGRES]:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid database type: {db_type}',
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        # Optional resource limits overriding the defaults for this job
+        try:
+            limits = validate_limits(data['limits']) if data.get('limits') else None
+        except ThrottleError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e),
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        backup_file = secure_filename(backup_file)
+        if not os.path.exists(os.path.join(current_app.config['BACKUP_DIR'], backup_file)):
+            return jsonify({
+                'success': False,
+                'message': f'Backup file not found: {backup_file}',
+                'data': None
+            }), HTTPStatus.NOT_FOUND
+        
+        service = get_backup_service()
+        job = service.submit_job(
+            'restore',
+            db_type,
+            db_name,
+            service.restore_local_backup,
+            db_type,
+            backup_file,
+            db_name,
+            name=f"restore {db_name}",
+            limits=limits
+        )
+        
+        response: BackupResponse = {
+            'success': True,
+            'message': f'Restore of {db_name} from {backup_file} started',
+            'data': job
+        }
+        
+        return jsonify(response), HTTPStatus.ACCEPTED
+    
+    except Exception as e:
+        response = {
+            'success': False,
+            'message': f'Failed to restore backup: {str(e)}',
+            'data': None
+        }
+        return jsonify(response), HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+@backup_api.route('/restore/s3', methods=['POST'])
+@jwt_required()
+def restore_from_s3() -> Tuple[Dict[str, Any], int]:
+    """Restore a database by streaming a backup from S3"""
+    try:
+        # Get request data
+        data = request.get_json()
+        if not data:
+            return jsonify({
+                'success': False,
+                'message': 'No data provided',
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        db_type = data.get('db_type')
+        db_name = data.get('db_name')
+        object_name = data.get('object_name')
+        
+        # Validate inputs
+        if not db_type or not db_name or not object_name:
+            return jsonify({
+                'success': False,
+                'message': 'Database type, name and S3 object name are required',
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        if db_type not in [BackupType.MYSQL, BackupType.POSTGRES]:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid database type: {db_type}',
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        # Optional resource limits overriding the defaults for this job
+        try:
+            limits = validate_limits(data['limits']) if data.get('limits') else None
+        except ThrottleError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e),
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        service = get_backup_service()
+        if not service.is_s3_configured():
+            return jsonify({
+                'success': False,
+                'message': 'AWS S3 credentials not configured',
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        job = service.submit_job(
+            'restore',
+            db_type,
+            db_name,
+            service.restore_from_s3,
+            db_type,
+            object_name,
+            db_name,
+            name=f"restore {db_name}",
+            limits=limits
+        )
+        
+        response: BackupResponse = {
+            'success': True,
+            'message': f'Restore of {db_name} from {object_name} started',
+            'data': job
+        }
+        
+        return jsonify(response), HTTPStatus.ACCEPTED
+    
+    except Exception as e:
+        response = {
+            'success': False,
+            'message': f'Failed to restore from S3: {str(e)}',
+            'data': None
+        }
+        return jsonify(response), HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+@backup_api.route('/restore/point-in-time', methods=['POST'])
+@jwt_required()
+def restore_point_in_time() -> Tuple[Dict[str, Any], int]:
+    """Restore a database to a point in time from a base backup and archived logs"""
+    try:
+        # Get request data
+        data = request.get_json()
+        if not data:
+            return jsonify({
+                'success': False,
+                'message': 'No data provided',
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        db_type = data.get('db_type')
+        db_name = data.get('db_name')
+        target_time = data.get('target_time')
+        
+        # Validate inputs
+        if not db_type or not db_name or not target_time:
+            return jsonify({
+                'success': False,
+                'message': 'Database type, name and target time are required',
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        if db_type not in [BackupType.MYSQL, BackupType.POSTGRES]:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid database type: {db_type}',
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        try:
+            target = datetime.fromisoformat(target_time)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid target time: {target_time}',
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        # Recovery targets are handled in server local time
+        if target.tzinfo is not None:
+            target = target.astimezone().replace(tzinfo=None)
+        
+        # Optional resource limits overriding the defaults for this job
+        try:
+            limits = validate_limits(data['limits']) if data.get('limits') else None
+        except ThrottleError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e),
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        # The job's result is the restored database name for MySQL, and
+        # for PostgreSQL the data directory to start a server on
+        service = get_backup_service()
+        job = service.submit_job(
+            'restore',
+            db_type,
+            db_name,
+            service.restore_point_in_time,
+            db_type,
+            db_name,
+            target,
+            name=f"restore {db_name} to {target.isoformat()}",
+            limits=limits
+        )
+        
+        response: BackupResponse = {
+            'success': True,
+            'message': f'Restore of {db_name} to {target.isoformat()} started',
+            'data': job
+        }
+        
+        return jsonify(response), HTTPStatus.ACCEPTED
+    
+    except Exception as e:
+        response = {
+            'success': False,
+            'message': f'Failed to restore to point in time: {str(e)}',
+            'data': None
+        }
+        return jsonify(response), HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+@backup_api.route('/retention', methods=['GET'])
+@jwt_required()
+def preview_retention() -> Tuple[Dict[str, Any], int]:
+    """Preview which backups the retention policies would delete"""
+    try:
+        service = get_backup_service()
+        result = service.apply_retention(
+            dry_run=True,
+            location=request.args.get('location'),
+            db_type=request.args.get('db_type'),
+            db_name=request.args.get('db_name')
+        )
+        
+        response: BackupResponse = {
+            'success': True,
+            'message': f"{len(result['local'])} local and {len(result['s3'])} S3 backups would be deleted",
+            'data': result
+        }
+        
+        return jsonify(response), HTTPStatus.OK
+    
+    except Exception as e:
+        response = {
+            'success': False,
+            'message': f'Failed to preview retention: {str(e)}',
+            'data': None
+        }
+        return jsonify(response), HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+@backup_api.route('/retention', methods=['POST'])
+@jwt_required()
+def apply_retention() -> Tuple[Dict[str, Any], int]:
+    """Delete the backups expired by the retention policies"""
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        service = get_backup_service()
+        result = service.apply_retention(
+            dry_run=bool(data.get('dry_run', False)),
+            location=data.get('location'),
+            db_type=data.get('db_type'),
+            db_name=data.get('db_name')
+        )
+        
+        verb = 'would be' if result['dry_run'] else 'were'
+        response: BackupResponse = {
+            'success': True,
+            'message': f"{len(result['local'])} local and {len(result['s3'])} S3 backups {verb} deleted",
+            'data': result
+        }
+        
+        return jsonify(response), HTTPStatus.OK
+    
+    except Exception as e:
+        response = {
+            'success': False,
+            'message': f'Failed to apply retention: {str(e)}',
+            'data': None
+        }
+        return jsonify(response), HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+@backup_api.route('/repository/gc', methods=['POST'])
+@jwt_required()
+def collect_repository_garbage() -> Tuple[Dict[str, Any], int]:
+    """Remove unreferenced chunks from the deduplicating repository"""
+    try:
+        result = get_backup_service().collect_garbage()
+        
+        response: BackupResponse = {
+            'success': True,
+            'message': 'Repository garbage collected',
+            'data': result
+        }
+        
+        return jsonify(response), HTTPStatus.OK
+    
+    except Exception as e:
+        response = {
+            'success': False,
+            'message': f'Failed to collect repository garbage: {str(e)}',
+            'data': None
+        }
+        return jsonify(response), HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+@backup_api.route('/retention/policy', methods=['PUT'])
+@jwt_required()
+def set_retention_policy() -> Tuple[Dict[str, Any], int]:
+    """Set the retention policy of a database"""
+    try:
+        # Get request data
+        data = request.get_json()
+        if not data:
+            return jsonify({
+                'success': False,
+                'message': 'No data provided',
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        db_type = data.get('db_type')
+        db_name = data.get('db_name')
+        
+        # Validate inputs
+        if not db_type or not db_name:
+            return jsonify({
+                'success': False,
+                'message': 'Database type and name are required',
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        if db_type not in [BackupType.MYSQL, BackupType.POSTGRES]:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid database type: {db_type}',
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        try:
+            policy = {period: int(data.get(period, 0)) for period in PERIODS}
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': 'Retention counts must be integers',
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        if any(count < 0 for count in policy.values()):
+            return jsonify({
+                'success': False,
+                'message': 'Retention counts cannot be negative',
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        set_policy(db_type, db_name, policy)
+        
+        response: BackupResponse = {
+            'success': True,
+            'message': f'Retention policy for {db_name} updated',
+            'data': {'db_type': db_type, 'db_name': db_name, 'policy': policy}
+        }
+        
+        return jsonify(response), HTTPStatus.OK
+    
+    except Exception as e:
+        response = {
+            'success': False,
+            'message': f'Failed to update retention policy: {str(e)}',
+            'data': None
+        }
+        return jsonify(response), HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+@backup_api.route('/queue', methods=['GET'])
+@jwt_required()
+def get_backup_queue() -> Tuple[Dict[str, Any], int]:
+    """Get the depth and wait times of the backup queue"""
+    try:
+        service = get_backup_service()
+        
+        response: BackupResponse = {
+            'success': True,
+            'message': 'Backup queue retrieved successfully',
+            'data': service.queue_stats()
+        }
+        
+        return jsonify(response), HTTPStatus.OK
+    
+    except Exception as e:
+        response = {
+            'success': False,
+            'message': f'Failed to retrieve backup queue: {str(e)}',
+            'data': None
+        }
+        return jsonify(response), HTTPStatus.INTERNAL_SERVER_ERROR
+
+
 @backup_api.route('/scheduled', methods=['POST'])
 @jwt_required()
 def schedule_backup() -> Tuple[Dict[str, Any], int]:
@@ -347,9 +800,54 @@ def schedule_backup() -> Tuple[Dict[str, Any], int]:
                 'data': None
             }), HTTPStatus.BAD_REQUEST
         
+        # Optional run time (HH:MM) and day of the week (0 is Monday) or month
+        try:
+            at = datetime.strptime(data['time'], '%H:%M').time() if data.get('time') else None
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': f"Invalid time: {data.get('time')}",
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        day_of_week = data.get('day_of_week')
+        day_of_month = data.get('day_of_month')
+        if day_of_week is not None and (str(day_of_week) not in [str(day) for day in range(7)]):
+            return jsonify({
+                'success': False,
+                'message': f"Invalid day of the week: {day_of_week} (0-6, 0 is Monday)",
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        if day_of_month is not None and (str(day_of_month) not in [str(day) for day in range(1, 32)]):
+            return jsonify({
+                'success': False,
+                'message': f"Invalid day of the month: {day_of_month} (1-31)",
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        # Optional resource limits overriding the defaults for this job
+        try:
+            limits = validate_limits(data['limits']) if data.get('limits') else None
+        except ThrottleError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e),
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
         # Schedule backup
         service = get_backup_service()
-        job_id, job_info = service.schedule_backup(db_type, db_name, frequency_enum, upload_to_s3)
+        job_id, job_info = service.schedule_backup(
+            db_type,
+            db_name,
+            frequency_enum,
+            upload_to_s3,
+            mode=data.get('mode'),
+            at=at,
+            day_of_week=int(day_of_week) if day_of_week is not None else None,
+            day_of_month=int(day_of_month) if day_of_month is not None else None,
+            limits=limits
+        )
         
         response: BackupResponse = {
             'success': True,
@@ -401,4 +899,202 @@ def cancel_scheduled_backup(job_id: str) -> Tuple[Dict[str, Any], int]:
             'message': f'Failed to cancel scheduled backup: {str(e)}',
             'data': None
         }
-        return jsonify(response), HTTPStatus.INTERNAL_SERVER_ERROR 
\ No newline at end of file
+        return jsonify(response), HTTPStatus.INTERNAL_SERVER_ERROR 
+
+
+@backup_api.route('/scheduled/<job_id>/limits', methods=['PUT'])
+@jwt_required()
+def set_schedule_limits(job_id: str) -> Tuple[Dict[str, Any], int]:
+    """Set the resource limits of a scheduled backup's future runs"""
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        service = get_backup_service()
+        job_info = service.set_schedule_limits(job_id, data.get('limits'))
+        
+        response: BackupResponse = {
+            'success': True,
+            'message': f"Resource limits of {job_info['name']} updated",
+            'data': job_info
+        }
+        
+        return jsonify(response), HTTPStatus.OK
+    
+    except ThrottleError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'data': None
+        }), HTTPStatus.BAD_REQUEST
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'data': None
+        }), HTTPStatus.NOT_FOUND
+    
+    except Exception as e:
+        response = {
+            'success': False,
+            'message': f'Failed to update resource limits: {str(e)}',
+            'data': None
+        }
+        return jsonify(response), HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+@backup_api.route('/jobs', methods=['GET'])
+@jwt_required()
+def get_jobs() -> Tuple[Dict[str, Any], int]:
+    """Get recent backup and restore jobs, optionally filtered by ?status="""
+    try:
+        service = get_backup_service()
+        jobs = service.get_jobs(request.args.get('status'), request.args.get('limit', 50, type=int))
+        
+        response: BackupResponse = {
+            'success': True,
+            'message': 'Jobs retrieved successfully',
+            'data': jobs
+        }
+        
+        return jsonify(response), HTTPStatus.OK
+    
+    except Exception as e:
+        response = {
+            'success': False,
+            'message': f'Failed to retrieve jobs: {str(e)}',
+            'data': None
+        }
+        return jsonify(response), HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+@backup_api.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id: str) -> Tuple[Dict[str, Any], int]:
+    """Get the status and progress of a backup or restore job"""
+    try:
+        job = get_backup_service().get_job(job_id)
+        if job is None:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid job ID: {job_id}',
+                'data': None
+            }), HTTPStatus.NOT_FOUND
+        
+        response: BackupResponse = {
+            'success': True,
+            'message': 'Job retrieved successfully',
+            'data': job
+        }
+        
+        return jsonify(response), HTTPStatus.OK
+    
+    except Exception as e:
+        response = {
+            'success': False,
+            'message': f'Failed to retrieve job: {str(e)}',
+            'data': None
+        }
+        return jsonify(response), HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+@backup_api.route('/jobs/<job_id>/events', methods=['GET'])
+@jwt_required()
+def job_events(job_id: str) -> Union[Tuple[Dict[str, Any], int], Response]:
+    """
+    Stream a job's status and progress as Server-Sent Events.
+    
+    A 'progress' event carrying the job is sent whenever it changes, and
+    the stream ends after the job has finished.
+    """
+    service = get_backup_service()
+    if service.get_job(job_id) is None:
+        return jsonify({
+            'success': False,
+            'message': f'Invalid job ID: {job_id}',
+            'data': None
+        }), HTTPStatus.NOT_FOUND
+    
+    return Response(
+        stream_with_context(stream_job_events(service.get_job, job_id, current_app.json.dumps)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@backup_api.route('/jobs/<job_id>/cancel', methods=['POST'])
+@jwt_required()
+def cancel_job(job_id: str) -> Tuple[Dict[str, Any], int]:
+    """Cancel a queued or running backup or restore job"""
+    try:
+        job = get_backup_service().cancel_job(job_id)
+        
+        response: BackupResponse = {
+            'success': True,
+            'message': f"Cancellation of {job['name'] or job_id} requested",
+            'data': job
+        }
+        
+        return jsonify(response), HTTPStatus.ACCEPTED
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'data': None
+        }), HTTPStatus.NOT_FOUND
+    
+    except Exception as e:
+        response = {
+            'success': False,
+            'message': f'Failed to cancel job: {str(e)}',
+            'data': None
+        }
+        return jsonify(response), HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+@backup_api.route('/jobs/<job_id>/limits', methods=['PATCH'])
+@jwt_required()
+def update_job_limits(job_id: str) -> Tuple[Dict[str, Any], int]:
+    """Change the resource limits of a running backup or restore job"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({
+                'success': False,
+                'message': 'No data provided',
+                'data': None
+            }), HTTPStatus.BAD_REQUEST
+        
+        service = get_backup_service()
+        job = service.update_job_limits(job_id, data)
+        
+        response: BackupResponse = {
+            'success': True,
+            'message': f"Resource limits of {job['name'] or job_id} updated",
+            'data': job
+        }
+        
+        return jsonify(response), HTTPStatus.OK
+    
+    except ThrottleError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'data': None
+        }), HTTPStatus.BAD_REQUEST
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'data': None
+        }), HTTPStatus.NOT_FOUND
+    
+    except Exception as e:
+        response = {
+            'success': False,
+            'message': f'Failed to update resource limits: {str(e)}',
+            'data': None
+        }
+        return jsonify(response), HTTPStatus.INTERNAL_SERVER_ERROR
@@ -77,21 +77,24 @@ def backup_and_upload():
             flash(f'Invalid database type: {db_type}', 'danger')
             return redirect(url_for('backup.index'))
         
-        # Create backup
         backup_service = get_backup_service()
-        backup_file = backup_service.create_backup(db_type, db_name)
-        flash(f'Successfully created backup: {os.path.basename(backup_file)}', 'success')
-        
-        # Upload to S3 if requested
-        if upload_to_s3:
-            try:
-                if not backup_service.is_s3_configured():
-                    flash('AWS credentials not configured for S3 upload', 'warning')
-                else:
-                    s3_key = backup_service.upload_to_s3(backup_file)
-                    flash(f'Successfully uploaded backup to S3: {s3_key}', 'success')
-            except S3BackupError as e:
-                flash(f'Error uploading to S3: {str(e)}', 'danger')
+        if upload_to_s3 and not backup_service.is_s3_configured():
+            flash('AWS credentials not configured for S3 upload', 'warning')
+            upload_to_s3 = False
+        
+        # Create the backup in the background
+        job = backup_service.submit_job(
+            'backup',
+            db_type,
+            db_name,
+            backup_service.run_backup,
+            db_type,
+            db_name,
+            mode=request.form.get('mode') or None,
+            upload_to_s3=upload_to_s3,
+            name=f"backup {db_name}"
+        )
+        flash(f"Backup of {db_name} started (job {job['id']})", 'success')
     
     except Exception as e:
         current_app.logger.error(f"Error creating backup: {str(e)}")
@@ -270,7 +273,13 @@ def schedule_backup():
         
         # Schedule the backup
         backup_service = get_backup_service()
-        job_id, job_info = backup_service.schedule_backup(db_type, db_name, frequency_enum, upload_to_s3)
+        job_id, job_info = backup_service.schedule_backup(
+            db_type,
+            db_name,
+            frequency_enum,
+            upload_to_s3,
+            mode=request.form.get('mode') or None
+        )
         flash(f'Successfully scheduled {frequency} backup for {db_name}', 'success')
     
     except Exception as e:
@@ -2,7 +2,12 @@
 Backup controller for NEXDB.
 Provides endpoints for database backups and restoration.
 """
-from flask import Blueprint, render_template, request, current_app, flash, redirect, url_for, jsonify
+import os
+from flask import Blueprint, Response, render_template, request, current_app, flash, redirect, url_for, jsonify, stream_with_context
+from werkzeug.utils import secure_filename
+from app.routes.auth import login_required
+from app.features.backup.services.backup_jobs import ACTIVE_STATUSES, stream_job_events
+from app.features.backup.services.backup_service import get_backup_service
 from app.utils.backup_manager import BackupManager
 from app.features.database.utils import get_mysql_manager, get_postgres_manager
 from app.db.models import db, Config
@@ -92,57 +97,29 @@ def create_backup():
         flash("Database type and name are required", "danger")
         return redirect(url_for('backup.backup_controller.index'))
     
-    # Get S3 config from database
-    s3_config = {
-        'aws_access_key': get_config('AWS_ACCESS_KEY', ''),
-        'aws_secret_key': get_config('AWS_SECRET_KEY', ''),
-        'aws_bucket': get_config('AWS_BUCKET_NAME', ''),
-        'aws_region': get_config('AWS_REGION', 'us-east-1')
-    }
-    
-    backup_manager = BackupManager(
-        backup_dir=current_app.config['BACKUP_DIR'],
-        aws_access_key=s3_config['aws_access_key'],
-        aws_secret_key=s3_config['aws_secret_key'],
-        aws_bucket=s3_config['aws_bucket'],
-        aws_region=s3_config['aws_region']
-    )
+    if db_type not in ('mysql', 'postgres'):
+        flash("Invalid database type", "danger")
+        return redirect(url_for('backup.backup_controller.index'))
     
     try:
-        if db_type == 'mysql':
-            mysql_manager = get_mysql_manager()
-            backup_file = backup_manager.backup_mysql_database(
-                db_name,
-                mysql_manager.host,
-                mysql_manager.port,
-                mysql_manager.user,
-                mysql_manager.password
-            )
-        elif db_type == 'postgres':
-            postgres_manager = get_postgres_manager()
-            backup_file = backup_manager.backup_postgres_database(
-                db_name,
-                postgres_manager.host,
-                postgres_manager.port,
-                postgres_manager.user,
-                postgres_manager.password
-            )
-        else:
-            flash("Invalid database type", "danger")
+        backup_service = get_backup_service()
+        if backup_type == 's3' and not backup_service.is_s3_configured():
+            flash("S3 credentials not configured", "danger")
             return redirect(url_for('backup.backup_controller.index'))
         
-        # Upload to S3 if requested
-        if backup_type == 's3':
-            if (s3_config['aws_access_key'] and 
-                s3_config['aws_secret_key'] and 
-                s3_config['aws_bucket']):
-                backup_manager.upload_to_s3(backup_file)
-                flash(f"Database {db_name} backed up to S3 successfully", "success")
-            else:
-                flash("S3 credentials not configured", "danger")
-                return redirect(url_for('backup.backup_controller.index'))
-        else:
-            flash(f"Database {db_name} backed up locally successfully", "success")
+        # The backup runs in the background; its page shows the progress
+        job = backup_service.submit_job(
+            'backup',
+            db_type,
+            db_name,
+            backup_service.run_backup,
+            db_type,
+            db_name,
+            upload_to_s3=backup_type == 's3',
+            name=f"backup {db_name}"
+        )
+        flash(f"Backup of {db_name} started (job {job['id']})", "success")
+        return redirect(url_for('backup.backup_controller.job_status', job_id=job['id']))
             
     except Exception as e:
         flash(f"Error creating backup: {str(e)}", "danger")
@@ -160,54 +137,80 @@ def restore_backup():
         flash("Backup file, database type, and name are required", "danger")
         return redirect(url_for('backup.backup_controller.index'))
     
-    # Get S3 config from database
-    s3_config = {
-        'aws_access_key': get_config('AWS_ACCESS_KEY', ''),
-        'aws_secret_key': get_config('AWS_SECRET_KEY', ''),
-        'aws_bucket': get_config('AWS_BUCKET_NAME', ''),
-        'aws_region': get_config('AWS_REGION', 'us-east-1')
-    }
+    if db_type not in ('mysql', 'postgres'):
+        flash("Invalid database type", "danger")
+        return redirect(url_for('backup.backup_controller.index'))
     
-    backup_manager = BackupManager(
-        backup_dir=current_app.config['BACKUP_DIR'],
-        aws_access_key=s3_config['aws_access_key'],
-        aws_secret_key=s3_config['aws_secret_key'],
-        aws_bucket=s3_config['aws_bucket'],
-        aws_region=s3_config['aws_region']
-    )
+    backup_file = secure_filename(backup_file)
+    if not os.path.exists(os.path.join(current_app.config['BACKUP_DIR'], backup_file)):
+        flash(f"Backup file not found: {backup_file}", "danger")
+        return redirect(url_for('backup.backup_controller.index'))
     
     try:
-        if db_type == 'mysql':
-            mysql_manager = get_mysql_manager()
-            backup_manager.restore_mysql_database(
-                backup_file,
-                db_name,
-                mysql_manager.host,
-                mysql_manager.port,
-                mysql_manager.user,
-                mysql_manager.password
-            )
-        elif db_type == 'postgres':
-            postgres_manager = get_postgres_manager()
-            backup_manager.restore_postgres_database(
-                backup_file,
-                db_name,
-                postgres_manager.host,
-                postgres_manager.port,
-                postgres_manager.user,
-                postgres_manager.password
-            )
-        else:
-            flash("Invalid database type", "danger")
-            return redirect(url_for('backup.backup_controller.index'))
-            
-        flash(f"Database {db_name} restored successfully", "success")
+        # Restores can take hours, so they run in the background rather
+        # than in the request; the job's page shows the progress
+        backup_service = get_backup_service()
+        job = backup_service.submit_job(
+            'restore',
+            db_type,
+            db_name,
+            backup_service.restore_local_backup,
+            db_type,
+            backup_file,
+            db_name,
+            name=f"restore {db_name}"
+        )
+        flash(f"Restore of {db_name} started (job {job['id']})", "success")
+        return redirect(url_for('backup.backup_controller.job_status', job_id=job['id']))
             
     except Exception as e:
         flash(f"Error restoring backup: {str(e)}", "danger")
     
     return redirect(url_for('backup.backup_controller.index'))
 
+@blueprint.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    """Show the status and progress of a backup or restore job"""
+    job = get_backup_service().get_job(job_id)
+    if job is None:
+        flash(f"Job not found: {job_id}", "danger")
+        return redirect(url_for('backup.backup_controller.index'))
+    
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(job)
+    
+    return render_template('backup/job.html', job=job, active=job['status'] in ACTIVE_STATUSES)
+
+@blueprint.route('/jobs/<job_id>/events')
+@login_required
+def job_events(job_id):
+    """Stream a job's status and progress as Server-Sent Events"""
+    service = get_backup_service()
+    if service.get_job(job_id) is None:
+        return jsonify({'error': f"Job not found: {job_id}"}), 404
+    
+    return Response(
+        stream_with_context(stream_job_events(service.get_job, job_id, current_app.json.dumps)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@blueprint.route('/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(job_id):
+    """Cancel a queued or running backup or restore job"""
+    try:
+        job = get_backup_service().cancel_job(job_id)
+        flash(f"Cancellation of {job['name'] or job_id} requested", "warning")
+    except ValueError as e:
+        flash(str(e), "danger")
+        return redirect(url_for('backup.backup_controller.index'))
+    except Exception as e:
+        flash(f"Error cancelling job: {str(e)}", "danger")
+    
+    return redirect(url_for('backup.backup_controller.job_status', job_id=job_id))
+
 @blueprint.route('/config/s3', methods=['POST'])
 def update_s3_config():
     """Update S3 configuration"""
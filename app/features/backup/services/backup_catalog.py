@@ -0,0 +1,266 @@
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.db.models import db, BackupLog
+from app.features.backup.types import BackupError
+from app.utils.compression import DEDUP_EXTENSION, get_compression, strip_compression_extension
+
+# Backup names are <database>_<YYYYmmdd_HHMMSS><extensions>
+BACKUP_NAME = re.compile(r'^(?P<db_name>.+)_(?P<timestamp>\d{8}_\d{6})\.')
+
+# Catalog fields that a sync refreshes when they changed
+SYNCED_FIELDS = ('file_path', 'file_size', 'checksum')
+
+
+def to_utc(value: datetime) -> datetime:
+    """Convert a local (naive) or timezone-aware time to naive UTC, as the catalog stores it"""
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def describe_backup(name: str, manifest: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Derive catalog fields from a backup's name and, for directory backups, its manifest.
+
+    Returns:
+        dict: db_type, db_name, compression, backup_mode and created_at (or None)
+    """
+    base = strip_compression_extension(name.rstrip('/').rsplit('/', 1)[-1])
+    match = BACKUP_NAME.match(base)
+    manifest = manifest or {}
+    compression = get_compression(name) or manifest.get('compression')
+
+    if base.endswith(DEDUP_EXTENSION):
+        # Snapshots keep the dump format in their name: <db>_<time>.sql.dedup
+        db_type = 'mysql' if base[:-len(DEDUP_EXTENSION)].endswith('.sql') else 'postgres'
+        mode, compression = 'dedup', 'zlib'
+    elif base.endswith('.sql'):
+        db_type, mode = 'mysql', 'single'
+    elif base.endswith('.dump'):
+        db_type, mode = 'postgres', 'single'
+    elif base.endswith('.basebackup'):
+        db_type, mode = 'postgres', 'incremental'
+    else:
+        engine = manifest.get('engine', '')
+        db_type = 'mysql' if engine.startswith('mysql') else 'postgres' if engine.startswith('pg') else 'unknown'
+        mode = 'parallel'
+
+    # Names and manifests carry the local time the backup was taken
+    created_at = None
+    if manifest.get('created'):
+        created_at = to_utc(datetime.fromisoformat(manifest['created']))
+    elif match:
+        created_at = to_utc(datetime.strptime(match.group('timestamp'), '%Y%m%d_%H%M%S'))
+
+    return {
+        'db_type': db_type,
+        'db_name': manifest.get('database') or (match.group('db_name') if match else base),
+        'compression': compression,
+        'backup_mode': mode,
+        'created_at': created_at
+    }
+
+
+class BackupCatalog:
+    """
+    Catalog of local and S3 backups, stored as BackupLog rows.
+
+    Listings are served from indexed queries instead of scanning BACKUP_DIR
+    or listing the bucket. Rows are written when backups are created,
+    uploaded or deleted, and sync() reconciles them with what actually
+    exists. Deleted backups keep their row with status 'deleted'.
+    """
+
+    def record(self,
+               location: str,
+               name: str,
+               db_type: str,
+               db_name: str,
+               file_path: Optional[str] = None,
+               file_size: Optional[int] = None,
+               checksum: Optional[str] = None,
+               compression: Optional[str] = None,
+               backup_mode: Optional[str] = None,
+               created_at: Optional[datetime] = None,
+               parent: Optional[BackupLog] = None,
+               schedule_id: Optional[int] = None) -> BackupLog:
+        """Add a backup to the catalog, or update it if it is already listed; created_at is naive UTC"""
+        try:
+            entry = self.find(location, name)
+            if entry is None:
+                entry = BackupLog(backup_name=name, backup_type=location, status='success')
+                db.session.add(entry)
+
+            entry.db_type = db_type
+            entry.db_name = db_name
+            entry.file_path = file_path
+            entry.file_size = file_size
+            entry.checksum = checksum
+            entry.compression = compression
+            entry.backup_mode = backup_mode
+            entry.created_at = created_at or datetime.utcnow()
+            entry.parent_id = parent.id if parent is not None else entry.parent_id
+            entry.schedule_id = schedule_id if schedule_id is not None else entry.schedule_id
+
+            db.session.commit()
+            return entry
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error recording backup in catalog: {str(e)}")
+            raise BackupError(f"Failed to record backup in catalog: {str(e)}")
+
+    def record_failure(self,
+                       location: str,
+                       name: str,
+                       db_type: str,
+                       db_name: str,
+                       message: str,
+                       status: str = 'failed',
+                       schedule_id: Optional[int] = None) -> None:
+        """Log a backup that failed or was skipped; it is never listed as a backup"""
+        try:
+            db.session.add(BackupLog(
+                backup_name=name,
+                backup_type=location,
+                db_type=db_type,
+                db_name=db_name,
+                status=status,
+                message=message,
+                schedule_id=schedule_id,
+                created_at=datetime.utcnow()
+            ))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error logging backup failure: {str(e)}")
+            raise BackupError(f"Failed to log backup failure: {str(e)}")
+
+    def assign_schedule(self, location: str, name: str, schedule_id: int) -> Optional[BackupLog]:
+        """Attribute a catalogued backup to the schedule that made it"""
+        try:
+            entry = self.find(location, name)
+            if entry is not None:
+                entry.schedule_id = schedule_id
+                db.session.commit()
+            return entry
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error assigning backup schedule: {str(e)}")
+            raise BackupError(f"Failed to assign backup schedule: {str(e)}")
+
+    def remove(self, location: str, name: str) -> None:
+        """Mark a backup as deleted"""
+        try:
+            entry = self.find(location, name)
+            if entry is not None:
+                entry.status = 'deleted'
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error removing backup from catalog: {str(e)}")
+            raise BackupError(f"Failed to remove backup from catalog: {str(e)}")
+
+    def remove_many(self, location: str, names: List[str]) -> None:
+        """Mark several backups as deleted in one transaction"""
+        try:
+            for start in range(0, len(names), 500):
+                BackupLog.query.filter(
+                    BackupLog.backup_type == location,
+                    BackupLog.backup_name.in_(names[start:start + 500]),
+                    BackupLog.status == 'success'
+                ).update({'status': 'deleted'}, synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error removing backups from catalog: {str(e)}")
+            raise BackupError(f"Failed to remove backups from catalog: {str(e)}")
+
+    def find(self, location: str, name: str) -> Optional[BackupLog]:
+        """Find the live catalog entry of a backup"""
+        return BackupLog.query.filter_by(
+            backup_type=location,
+            backup_name=name,
+            status='success'
+        ).order_by(BackupLog.id.desc()).first()
+
+    def list_backups(self,
+                     location: str,
+                     db_type: Optional[str] = None,
+                     db_name: Optional[str] = None,
+                     limit: Optional[int] = None,
+                     offset: int = 0) -> List[BackupLog]:
+        """List live backups in a location, newest first"""
+        query = BackupLog.query.filter_by(backup_type=location, status='success')
+        if db_type:
+            query = query.filter_by(db_type=db_type)
+        if db_name:
+            query = query.filter_by(db_name=db_name)
+
+        query = query.order_by(BackupLog.created_at.desc()).offset(offset)
+        if limit:
+            query = query.limit(limit)
+        return query.all()
+
+    def sync(self, location: str, found: Dict[str, Dict[str, Any]], partial: bool = False) -> Tuple[int, int, int]:
+        """
+        Reconcile the catalog of a location with the backups that exist.
+
+        Args:
+            location: local or s3
+            found: Backup name mapped to its BackupLog column values
+            partial: found only holds new or changed backups, so nothing
+                is marked deleted for being absent
+
+        Returns:
+            tuple: Number of (added, updated, removed) entries
+        """
+        try:
+            entries = {
+                entry.backup_name: entry
+                for entry in BackupLog.query.filter_by(backup_type=location, status='success')
+            }
+
+            added = updated = removed = 0
+            for name, fields in found.items():
+                entry = entries.get(name)
+                if entry is None:
+                    entry = BackupLog(backup_name=name, backup_type=location, status='success')
+                    for field, value in fields.items():
+                        setattr(entry, field, value)
+                    if entry.created_at is None:
+                        entry.created_at = datetime.utcnow()
+                    db.session.add(entry)
+                    added += 1
+                    continue
+
+                changed = False
+                for field in SYNCED_FIELDS:
+                    if field in fields and fields[field] is not None and getattr(entry, field) != fields[field]:
+                        setattr(entry, field, fields[field])
+                        changed = True
+                updated += changed
+
+            if not partial:
+                for name, entry in entries.items():
+                    if name not in found:
+                        entry.status = 'deleted'
+                        removed += 1
+
+            db.session.commit()
+            return added, updated, removed
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error syncing backup catalog: {str(e)}")
+            raise BackupError(f"Failed to sync backup catalog: {str(e)}")
+
+
+# Singleton instance
+_backup_catalog = None
+
+def get_backup_catalog() -> BackupCatalog:
+    """Get the backup catalog singleton"""
+    global _backup_catalog
+    if _backup_catalog is None:
+        _backup_catalog = BackupCatalog()
+    return _backup_catalog
@@ -0,0 +1,340 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.db.models import db, BackupJob
+from app.features.backup.types import BackupJobInfo, BackupQueueStats
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+# Seconds between progress writes and cancellation checks of a running job
+PROGRESS_SECONDS = 1.0
+
+# Number of started jobs the wait time statistics cover
+WAIT_SAMPLES = 100
+
+# Seconds between job polls of an event stream, and between keep-alive
+# comments while nothing changes, so proxies don't drop idle streams
+SSE_POLL_SECONDS = 1.0
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+def job_info(job: BackupJob) -> BackupJobInfo:
+    """Convert a job to the API format"""
+    percent = None
+    if job.bytes_total:
+        percent = round(min(100.0, 100.0 * job.bytes_done / job.bytes_total), 1)
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'name': job.name,
+        'db_type': job.db_type,
+        'db_name': job.db_name,
+        'status': job.status,
+        'bytes_done': job.bytes_done or 0,
+        'bytes_total': job.bytes_total,
+        'percent': percent,
+        'message': job.message,
+        'result': json.loads(job.result) if job.result else None,
+        'cancel_requested': bool(job.cancel_requested),
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'limits': None
+    }
+
+
+def stream_job_events(get_job: Callable[[str], Optional[BackupJobInfo]], job_id: str,
+                      dumps: Callable[[Any], str]) -> Iterator[str]:
+    """
+    Yield a job's status and progress as Server-Sent Events.
+    
+    A 'progress' event carrying the job is sent whenever it changes, and
+    the stream ends after the job has finished.
+    """
+    sent = None
+    idle = 0.0
+    while True:
+        job = get_job(job_id)
+        # Don't hold a connection or stale rows between polls
+        db.session.remove()
+        if job is None:
+            return
+        
+        payload = dumps(job)
+        if payload != sent:
+            sent = payload
+            idle = 0.0
+            yield f"event: progress\ndata: {payload}\n\n"
+        elif idle >= SSE_KEEPALIVE_SECONDS:
+            idle = 0.0
+            yield ": keep-alive\n\n"
+        
+        if job['status'] not in ACTIVE_STATUSES:
+            return
+        time.sleep(SSE_POLL_SECONDS)
+        idle += SSE_POLL_SECONDS
+
+
+class JobContext:
+    """State of a running job in the process that runs it"""
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.bytes_done = 0
+        self.bytes_total: Optional[int] = None
+        self.cancelled = threading.Event()
+        # Stops the job's processes; set once they are known
+        self.on_cancel: Optional[Callable[[], None]] = None
+
+    def progress(self, done: int, total: Optional[int] = None) -> None:
+        """Progress callback taking (bytes_done, total_bytes)"""
+        self.bytes_done = done
+        if total is not None:
+            self.bytes_total = total
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+        if self.on_cancel is not None:
+            self.on_cancel()
+
+
+class BackupJobs:
+    """
+    Tracks background backup and restore jobs in the BackupJob table.
+
+    Jobs run on the backup queue of the worker process that submitted them,
+    but the table is shared, so any process can report on a job or cancel
+    it. While a job runs, a monitor thread writes its progress every
+    PROGRESS_SECONDS and picks up cancellation requests. Jobs whose process
+    died are marked failed when they are next looked at.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures: Dict[str, Future] = {}
+        self._contexts: Dict[str, JobContext] = {}
+
+    def create(self, kind: str, name: str, db_type: Optional[str], db_name: Optional[str],
+               keep_days: int = 7) -> str:
+        """Record a new queued job, dropping finished jobs older than keep_days"""
+        job = BackupJob(
+            id=uuid.uuid4().hex[:12],
+            kind=kind,
+            name=name,
+            db_type=db_type,
+            db_name=db_name,
+            status=QUEUED,
+            bytes_done=0,
+            cancel_requested=False,
+            pid=os.getpid()
+        )
+        db.session.add(job)
+
+        cutoff = datetime.utcnow() - timedelta(days=keep_days)
+        BackupJob.query.filter(
+            BackupJob.status.notin_(ACTIVE_STATUSES),
+            BackupJob.created_at < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return job.id
+
+    def track(self, job_id: str, future: Future) -> None:
+        """Remember the queue future of a job so it can be cancelled before it starts"""
+        with self._lock:
+            self._futures[job_id] = future
+        future.add_done_callback(lambda _: self._forget(job_id))
+
+    def run(self, app, job_id: str, func: Callable[[JobContext], Any]) -> Any:
+        """
+        Run a job on the current thread, recording its outcome.
+
+        func gets the job's JobContext and returns the job's result, which
+        is stored as JSON. Exceptions are recorded and re-raised.
+        """
+        context = JobContext(job_id)
+        with app.app_context():
+            job = db.session.get(BackupJob, job_id)
+            if job.cancel_requested:
+                self._finish(job, CANCELLED, 'Cancelled before it started')
+                return None
+            job.status = RUNNING
+            job.started_at = datetime.utcnow()
+            job.pid = os.getpid()
+            db.session.commit()
+
+        with self._lock:
+            self._contexts[job_id] = context
+        stop = threading.Event()
+        monitor = threading.Thread(target=self._monitor, args=(app, context, stop), name=f"job-{job_id}", daemon=True)
+        monitor.start()
+
+        result = None
+        error: Optional[BaseException] = None
+        try:
+            result = func(context)
+        except BaseException as e:
+            error = e
+        finally:
+            stop.set()
+            monitor.join()
+            with self._lock:
+                self._contexts.pop(job_id, None)
+
+        with app.app_context():
+            job = db.session.get(BackupJob, job_id)
+            job.bytes_done = context.bytes_done
+            job.bytes_total = context.bytes_total
+            if error is None:
+                job.result = json.dumps(result, default=str)
+                self._finish(job, SUCCEEDED, None)
+            elif context.cancelled.is_set():
+                self._finish(job, CANCELLED, 'Cancelled')
+            else:
+                self._finish(job, FAILED, str(error))
+
+        if error is not None:
+            raise error
+        return result
+
+    def get(self, job_id: str) -> Optional[BackupJobInfo]:
+        """Look up a job; reads through to the database so other processes' updates are seen"""
+        job = db.session.get(BackupJob, job_id, populate_existing=True)
+        if job is None:
+            return None
+        self._check_alive(job)
+        return job_info(job)
+
+    def recent(self, status: Optional[str] = None, limit: int = 50) -> List[BackupJobInfo]:
+        """Newest jobs first, optionally only those with a status"""
+        query = BackupJob.query.execution_options(populate_existing=True)
+        if status:
+            query = query.filter_by(status=status)
+        jobs = query.order_by(BackupJob.created_at.desc()).limit(limit).all()
+        for job in jobs:
+            self._check_alive(job)
+        return [job_info(job) for job in jobs]
+
+    def queue_stats(self, workers: int, per_host: int, host: Callable[[str], str]) -> BackupQueueStats:
+        """
+        Queue depth, running jobs and wait times across all worker processes.
+
+        Args:
+            workers: Jobs each process runs at once
+            per_host: Jobs allowed at once against one database server
+            host: Maps a job's db_type to its database server
+        """
+        counts = dict(
+            db.session.query(BackupJob.status, db.func.count(BackupJob.id)).group_by(BackupJob.status).all()
+        )
+        running_by_host: Dict[str, int] = {}
+        rows = (db.session.query(BackupJob.db_type, db.func.count(BackupJob.id))
+                .filter(BackupJob.status == RUNNING)
+                .group_by(BackupJob.db_type))
+        for db_type, count in rows:
+            if db_type:
+                running_by_host[host(db_type)] = running_by_host.get(host(db_type), 0) + count
+
+        now = datetime.utcnow()
+        oldest = db.session.query(db.func.min(BackupJob.created_at)).filter(BackupJob.status == QUEUED).scalar()
+        started = (BackupJob.query
+                   .filter(BackupJob.started_at.isnot(None))
+                   .order_by(BackupJob.started_at.desc())
+                   .limit(WAIT_SAMPLES)
+                   .with_entities(BackupJob.created_at, BackupJob.started_at)
+                   .all())
+        waits = [max(0.0, (started_at - created_at).total_seconds()) for created_at, started_at in started]
+
+        return {
+            'workers': workers,
+            'per_host': per_host,
+            'depth': counts.get(QUEUED, 0),
+            'running': counts.get(RUNNING, 0),
+            'running_by_host': running_by_host,
+            'oldest_wait_seconds': round(max(0.0, (now - oldest).total_seconds()), 3) if oldest else 0.0,
+            'avg_wait_seconds': round(sum(waits) / len(waits), 3) if waits else 0.0,
+            'max_wait_seconds': round(max(waits, default=0.0), 3),
+            'completed': counts.get(SUCCEEDED, 0) + counts.get(FAILED, 0) + counts.get(CANCELLED, 0),
+            'failed': counts.get(FAILED, 0)
+        }
+
+    def cancel(self, job_id: str) -> BackupJobInfo:
+        """
+        Cancel a job.
+
+        A queued job is dropped; a running job has its processes terminated.
+        Jobs running in another process are cancelled by that process within
+        PROGRESS_SECONDS. Finished jobs are left as they are.
+        """
+        job = db.session.get(BackupJob, job_id, populate_existing=True)
+        if job is None:
+            raise ValueError(f"Invalid job ID: {job_id}")
+        if job.status not in ACTIVE_STATUSES:
+            return job_info(job)
+
+        job.cancel_requested = True
+        db.session.commit()
+
+        with self._lock:
+            context = self._contexts.get(job_id)
+            future = self._futures.get(job_id)
+        if context is not None:
+            context.cancel()
+        elif future is not None and future.cancel():
+            self._finish(job, CANCELLED, 'Cancelled before it started')
+        return job_info(job)
+
+    def _monitor(self, app, context: JobContext, stop: threading.Event) -> None:
+        """Write a running job's progress and pick up cancellation requests"""
+        while not stop.wait(PROGRESS_SECONDS):
+            try:
+                with app.app_context():
+                    job = db.session.get(BackupJob, context.id)
+                    job.bytes_done = context.bytes_done
+                    job.bytes_total = context.bytes_total
+                    requested = job.cancel_requested
+                    db.session.commit()
+                if requested and not context.cancelled.is_set():
+                    logging.info(f"Cancelling job {context.id}")
+                    context.cancel()
+            except Exception as e:
+                logging.error(f"Error updating job {context.id}: {str(e)}")
+
+    def _check_alive(self, job: BackupJob) -> None:
+        """Mark an unfinished job failed if the process running it is gone"""
+        if job.status not in ACTIVE_STATUSES or not job.pid or _process_alive(job.pid):
+            return
+        self._finish(job, FAILED, 'The worker process running the job exited')
+
+    def _forget(self, job_id: str) -> None:
+        with self._lock:
+            self._futures.pop(job_id, None)
+
+    @staticmethod
+    def _finish(job: BackupJob, status: str, message: Optional[str]) -> None:
+        job.status = status
+        job.message = message
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -0,0 +1,160 @@
+import fcntl
+import itertools
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from typing import IO, Any, Callable, Dict, List, Optional
+
+from werkzeug.utils import secure_filename
+
+# Lower runs first; manual backups go ahead of scheduled ones
+PRIORITY_MANUAL = 0
+PRIORITY_SCHEDULED = 10
+
+# Seconds between retries while every slot of a host is held by other processes
+SLOT_RETRY_SECONDS = 1.0
+
+
+class QueuedBackup:
+    """A backup job waiting for, or holding, a worker"""
+
+    def __init__(self, func: Callable[[], Any], host: str, priority: int, name: str, sequence: int):
+        self.func = func
+        self.host = host
+        self.priority = priority
+        self.name = name
+        self.sequence = sequence
+        self.future: Future = Future()
+        # Lock file of the host slot the job holds while it runs
+        self.slot: Optional[IO] = None
+
+    @property
+    def order(self):
+        return self.priority, self.sequence
+
+
+class BackupQueue:
+    """
+    Priority queue of backup jobs run by a bounded pool of worker threads.
+
+    At most `workers` jobs run at once in this process, and at most
+    `per_host` against the same database server. A worker takes the
+    highest-priority job (oldest first within a priority) whose server has
+    a free slot, so a busy server doesn't hold up jobs for other servers.
+
+    With a lock_dir, a host slot is an exclusive file lock on one of
+    `per_host` lock files, so the per-host limit holds across all worker
+    processes sharing the directory. Without one it holds within this
+    process only.
+    """
+
+    def __init__(self, workers: int = 2, per_host: int = 1, lock_dir: Optional[str] = None):
+        self.workers = max(1, int(workers))
+        self.per_host = max(1, int(per_host))
+        self.lock_dir = lock_dir
+
+        self._condition = threading.Condition()
+        self._pending: List[QueuedBackup] = []
+        self._running: Dict[str, int] = {}
+        self._threads: List[threading.Thread] = []
+        self._sequence = itertools.count()
+
+    def submit(self, func: Callable[[], Any], host: str, priority: int = PRIORITY_SCHEDULED, name: str = '') -> Future:
+        """
+        Queue a backup job.
+
+        Args:
+            func: Runs the backup; it gets no arguments and no app context
+            host: Database server the job dumps from, e.g. mysql://db1:3306
+            priority: PRIORITY_MANUAL or PRIORITY_SCHEDULED
+
+        Returns:
+            Future: Resolves to func's result once the job has run
+        """
+        job = QueuedBackup(func, host, priority, name, next(self._sequence))
+        with self._condition:
+            self._pending.append(job)
+            self._start_workers()
+            self._condition.notify()
+        logging.info(f"Queued backup {name} for {host} ({len(self._pending)} waiting)")
+        return job.future
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"backup-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _take(self) -> QueuedBackup:
+        """Wait for the next job whose host has a free slot and claim the slot"""
+        with self._condition:
+            while True:
+                runnable = [job for job in self._pending if self._running.get(job.host, 0) < self.per_host]
+                busy_hosts = set()
+                for job in sorted(runnable, key=lambda queued: queued.order):
+                    if job.host in busy_hosts:
+                        continue
+                    if self.lock_dir is not None:
+                        job.slot = self._claim_slot(job.host)
+                        if job.slot is None:
+                            busy_hosts.add(job.host)
+                            continue
+                    self._pending.remove(job)
+                    self._running[job.host] = self._running.get(job.host, 0) + 1
+                    return job
+                # Other processes don't notify us when they free a slot
+                self._condition.wait(SLOT_RETRY_SECONDS if busy_hosts else None)
+
+    def _claim_slot(self, host: str) -> Optional[IO]:
+        """Lock a free slot file of host without waiting, or return None if all are held"""
+        os.makedirs(self.lock_dir, exist_ok=True)
+        prefix = secure_filename(host) or 'host'
+        for number in range(self.per_host):
+            f = open(os.path.join(self.lock_dir, f"queue-{prefix}-{number}.lock"), 'a')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return f
+            except BlockingIOError:
+                f.close()
+        return None
+
+    def _release(self, job: QueuedBackup) -> None:
+        with self._condition:
+            if job.slot is not None:
+                # Closing the file drops the lock
+                job.slot.close()
+                job.slot = None
+            self._running[job.host] -= 1
+            if not self._running[job.host]:
+                del self._running[job.host]
+            # A freed host slot may make a job runnable for any idle worker
+            self._condition.notify_all()
+
+    def _work(self) -> None:
+        while True:
+            job = self._take()
+            if not job.future.set_running_or_notify_cancel():
+                self._release(job)
+                continue
+
+            try:
+                job.future.set_result(job.func())
+            except BaseException as e:
+                logging.error(f"Backup job {job.name} failed: {str(e)}")
+                job.future.set_exception(e)
+            finally:
+                self._release(job)
+
+
+# Singleton instance
+_backup_queue: Optional[BackupQueue] = None
+_backup_queue_lock = threading.Lock()
+
+def get_backup_queue(workers: int = 2, per_host: int = 1, lock_dir: Optional[str] = None) -> BackupQueue:
+    """Get the backup queue singleton; the settings apply when it is first created"""
+    global _backup_queue
+    with _backup_queue_lock:
+        if _backup_queue is None:
+            _backup_queue = BackupQueue(workers, per_host, lock_dir)
+        return _backup_queue
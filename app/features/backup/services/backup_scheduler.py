@@ -0,0 +1,273 @@
+import fcntl
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from apscheduler.job import Job
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
+from werkzeug.utils import secure_filename
+
+from app.db.models import db, BackupSchedule
+from app.features.backup.types import BackupError
+
+# Job store of the backup schedules, kept in the app database so next run
+# times survive restarts and missed runs are caught up
+PERSISTENT_STORE = 'default'
+
+# Job store of the maintenance jobs the leader adds when it starts
+MEMORY_STORE = 'memory'
+
+JOB_TABLE = 'apscheduler_jobs'
+
+# Application the persistent jobs run in; jobs are stored by reference,
+# so they can't carry it themselves
+_app = None
+
+
+def schedule_job_id(schedule_id: int) -> str:
+    """Scheduler job ID of a backup schedule"""
+    return f"backup_schedule_{schedule_id}"
+
+
+def schedule_trigger(schedule: BackupSchedule, jitter: Optional[int] = None) -> CronTrigger:
+    """Build the cron trigger of a backup schedule, delaying each run by up to jitter seconds"""
+    at = schedule.time
+    jitter = jitter or None
+    if schedule.frequency == 'hourly':
+        return CronTrigger(minute=at.minute, jitter=jitter)
+    if schedule.frequency == 'daily':
+        return CronTrigger(hour=at.hour, minute=at.minute, jitter=jitter)
+    if schedule.frequency == 'weekly':
+        return CronTrigger(day_of_week=schedule.day_of_week or 0, hour=at.hour, minute=at.minute, jitter=jitter)
+    if schedule.frequency == 'monthly':
+        return CronTrigger(day=schedule.day_of_month or 1, hour=at.hour, minute=at.minute, jitter=jitter)
+    raise BackupError(f"Invalid backup frequency: {schedule.frequency}")
+
+
+def run_scheduled_backup(schedule_id: int) -> None:
+    """Job function of every backup schedule; queues the backup and returns"""
+    from app.features.backup.services.backup_service import get_backup_service
+
+    with _app.app_context():
+        get_backup_service().enqueue_schedule(schedule_id)
+
+
+@contextmanager
+def database_lock(lock_dir: str, db_type: str, db_name: str) -> Iterator[bool]:
+    """
+    Try to take the backup lock of a database without waiting.
+
+    Yields:
+        bool: Whether the lock was taken; if not, another process or
+            thread is backing up the same database
+    """
+    os.makedirs(lock_dir, exist_ok=True)
+    path = os.path.join(lock_dir, f"{db_type}-{secure_filename(db_name)}.lock")
+    with open(path, 'a') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class BackupScheduler:
+    """
+    Backup scheduler that runs in a single process.
+
+    Every worker process creates one, but only the process holding an
+    exclusive lock on SCHEDULER_LOCK_FILE starts an APScheduler. The others
+    retry every SCHEDULER_LEADER_RETRY_SECONDS and take over when the
+    leader exits. The lock is a file lock, so leadership is per host.
+
+    Backup schedules are rows of the BackupSchedule table. The leader turns
+    them into jobs in a SQLAlchemy job store with coalescing, so runs
+    missed while no process was up are caught up once, if they are less
+    than SCHEDULER_MISFIRE_GRACE_SECONDS late. Each run is delayed by up
+    to BACKUP_SCHEDULE_JITTER_SECONDS and only queues its backup.
+    """
+
+    def __init__(self):
+        self._scheduler: Optional[BackgroundScheduler] = None
+        self._lock_file = None
+        self._on_leader: Optional[Callable[[], None]] = None
+        self._app = None
+        self._stop = threading.Event()
+        self._mutex = threading.RLock()
+
+    @property
+    def is_leader(self) -> bool:
+        """Whether this process runs the scheduler"""
+        return self._scheduler is not None
+
+    @property
+    def running(self) -> bool:
+        """Whether a scheduler is running, in this process or another one"""
+        if self._scheduler is not None:
+            return self._scheduler.running
+        if self._app is None:
+            return False
+
+        # A shared lock is refused while the leader holds its exclusive lock
+        with open(self._lock_path(), 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(f, fcntl.LOCK_UN)
+            return False
+
+    def start(self, app, on_leader: Callable[[], None]) -> None:
+        """
+        Start leader election.
+
+        Args:
+            app: Flask application the jobs run in
+            on_leader: Called in an app context once this process becomes
+                the leader, to add the jobs kept in MEMORY_STORE
+        """
+        global _app
+        _app = app
+        self._app = app
+        self._on_leader = on_leader
+        self._stop.clear()
+
+        try:
+            leading = self._try_lead()
+        except Exception as e:
+            logging.error(f"Error starting backup scheduler: {str(e)}")
+            leading = False
+        if not leading:
+            threading.Thread(target=self._elect, name='scheduler-election', daemon=True).start()
+
+    def shutdown(self) -> None:
+        """Stop the scheduler and hand leadership over"""
+        self._stop.set()
+        self._resign()
+
+    def add_job(self, func, trigger, **kwargs) -> Optional[Job]:
+        """Add a maintenance job on the leader; other processes ignore it"""
+        if self._scheduler is None:
+            return None
+        kwargs.setdefault('jobstore', MEMORY_STORE)
+        return self._scheduler.add_job(func, trigger, **kwargs)
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        """Look up a job on the leader"""
+        if self._scheduler is None:
+            return None
+        return self._scheduler.get_job(job_id)
+
+    def sync_schedules(self) -> int:
+        """
+        Bring the persistent jobs in line with the enabled BackupSchedule rows.
+
+        Jobs whose trigger is unchanged are left alone, so their pending
+        next run time is kept. Rows with an invalid trigger are logged and
+        skipped. Does nothing outside the leader.
+
+        Returns:
+            int: Number of jobs added, replaced or removed
+        """
+        if self._scheduler is None:
+            return 0
+
+        wanted = {schedule_job_id(schedule.id): schedule for schedule in BackupSchedule.query.filter_by(enabled=True)}
+        jitter = self._app.config.get('BACKUP_SCHEDULE_JITTER_SECONDS', 0)
+        changed = 0
+
+        for job in self._scheduler.get_jobs(jobstore=PERSISTENT_STORE):
+            if job.id not in wanted:
+                job.remove()
+                changed += 1
+
+        for job_id, schedule in wanted.items():
+            try:
+                trigger = schedule_trigger(schedule, jitter)
+            except (BackupError, ValueError) as e:
+                # One bad row must not keep the other schedules from running
+                logging.error(f"Skipping backup schedule {schedule.id}: {str(e)}")
+                continue
+            job = self._scheduler.get_job(job_id, jobstore=PERSISTENT_STORE)
+            if job is not None and repr(job.trigger) == repr(trigger):
+                continue
+            self._scheduler.add_job(
+                run_scheduled_backup,
+                trigger,
+                id=job_id,
+                name=schedule.name,
+                args=[schedule.id],
+                jobstore=PERSISTENT_STORE,
+                replace_existing=True
+            )
+            changed += 1
+        return changed
+
+    def _try_lead(self) -> bool:
+        """Become the leader if no other process is"""
+        with self._mutex:
+            if self._stop.is_set():
+                return False
+
+            f = open(self._lock_path(), 'a')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                return False
+            self._lock_file = f
+
+            app = self._app
+            try:
+                with app.app_context():
+                    self._scheduler = BackgroundScheduler(
+                        jobstores={
+                            PERSISTENT_STORE: SQLAlchemyJobStore(engine=db.engine, tablename=JOB_TABLE),
+                            MEMORY_STORE: MemoryJobStore()
+                        },
+                        job_defaults={
+                            'coalesce': True,
+                            'max_instances': 1,
+                            'misfire_grace_time': app.config.get('SCHEDULER_MISFIRE_GRACE_SECONDS', 24 * 3600)
+                        }
+                    )
+                    self._scheduler.start()
+                    self._on_leader()
+            except Exception:
+                self._resign()
+                raise
+
+        logging.info(f"Process {os.getpid()} is now the backup scheduler leader")
+        return True
+
+    def _elect(self) -> None:
+        """Retry becoming the leader until this process is, or shuts down"""
+        interval = self._app.config.get('SCHEDULER_LEADER_RETRY_SECONDS', 30)
+        while not self._stop.wait(interval):
+            try:
+                if self._try_lead():
+                    return
+            except Exception as e:
+                logging.error(f"Error starting backup scheduler: {str(e)}")
+
+    def _resign(self) -> None:
+        """Stop the scheduler and release the leader lock"""
+        with self._mutex:
+            if self._scheduler is not None and self._scheduler.running:
+                self._scheduler.shutdown(wait=False)
+            self._scheduler = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    def _lock_path(self) -> str:
+        return self._app.config.get('SCHEDULER_LOCK_FILE') or os.path.join(self._app.instance_path, 'scheduler.lock')
@@ -1,40 +1,70 @@
 import boto3
+import json
 import logging
+import tempfile
 import os
 import shutil
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, time, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
+from botocore.exceptions import ClientError
 from flask import current_app
 from werkzeug.utils import secure_filename
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.job import Job
-
+from app.db.models import db, BackupLog, BackupSchedule, Config
 from app.features.backup.types import (
     BackupFile, ScheduledBackup, BackupError, 
-    S3BackupError, BackupFrequency
+    S3BackupError, BackupFrequency, RetentionResult, BackupQueueStats, JobLimits, BackupJobInfo
+)
+from app.features.backup.services.backup_catalog import get_backup_catalog, describe_backup, to_utc
+from app.features.backup.services.retention import plan_retention
+from app.features.backup.services.backup_scheduler import (
+    BackupScheduler, database_lock, schedule_job_id, schedule_trigger
+)
+from app.features.backup.services.backup_queue import PRIORITY_MANUAL, PRIORITY_SCHEDULED, get_backup_queue
+from app.features.backup.services.backup_jobs import BackupJobs, JobContext
+from app.features.backup.services.dedup_repository import (
+    Chunker, DedupRepository, REMOTE_PREFIX, parse_snapshot, read_snapshot
 )
+from app.features.database.utils import get_parallel_jobs
 from app.features.database.services.mysql_service import MySQLService
 from app.features.database.services.postgres_service import PostgresService
+from app.utils.compression import (
+    compression_options, get_extension, is_backup_file,
+    dump_pipeline, copy_stream, write_checksum_file, read_checksum_file, DIRECTORY_EXTENSIONS, DEDUP_EXTENSION
+)
+from app.features.database.services.backup_manifest import MANIFEST_NAME, is_parallel_backup, read_manifest
+from app.features.database.services.log_archive import MySQLBinlogArchive, PostgresWalArchive
+from app.utils.progress import ProgressReader, current_progress, use_progress
+from app.utils.s3_stream import S3MultipartUploader, open_s3_backup
+from app.utils.s3_download import S3ParallelDownloader
+from app.utils.s3_listing import backup_key, list_partitioned
+from app.utils.throttle import (
+    ResourceLimits, current_limits, limits_from_config, list_jobs, update_job, use_limits, validate_limits
+)
+
+
+# Config keys holding the state of the S3 catalog sync
+S3_WATERMARK_KEY = 's3_catalog_watermark'
+S3_FULL_SYNC_KEY = 's3_catalog_full_sync'
 
 
 class BackupService:
     """Service for managing database backups and scheduled jobs"""
     
     def __init__(self):
-        self._scheduler = BackgroundScheduler()
-        self._scheduled_backups: Dict[str, Dict] = {}
-        self._scheduler.start()
+        self._scheduler = BackupScheduler()
+        self._jobs = BackupJobs()
         
     @property
     def scheduler_running(self) -> bool:
-        """Check if scheduler is running"""
+        """Check if the scheduler is running, in this or another worker process"""
         return self._scheduler.running
     
     def shutdown(self) -> None:
         """Shutdown the scheduler"""
-        if self._scheduler.running:
-            self._scheduler.shutdown()
+        self._scheduler.shutdown()
     
     def get_s3_client(self) -> boto3.client:
         """Get an S3 client with configuration from app config"""
@@ -43,81 +73,337 @@ class BackupService:
                 's3',
                 aws_access_key_id=current_app.config['AWS_ACCESS_KEY'],
                 aws_secret_access_key=current_app.config['AWS_SECRET_KEY'],
-                region_name=current_app.config['AWS_REGION']
+                region_name=current_app.config['AWS_REGION'],
+                endpoint_url=current_app.config.get('AWS_S3_ENDPOINT_URL')
             )
             return s3_client
         except Exception as e:
             logging.error(f"Error creating S3 client: {str(e)}")
             raise S3BackupError(f"Failed to create S3 client: {str(e)}")
     
-    def list_local_backups(self) -> List[BackupFile]:
-        """List all local backup files"""
-        backup_dir = current_app.config['BACKUP_DIR']
-        backups: List[BackupFile] = []
-        
-        if os.path.exists(backup_dir):
-            for filename in os.listdir(backup_dir):
-                if filename.endswith('.sql') or filename.endswith('.dump'):
-                    file_path = os.path.join(backup_dir, filename)
-                    file_size = round(os.path.getsize(file_path) / (1024 * 1024), 2)  # MB
-                    file_date = datetime.fromtimestamp(os.path.getmtime(file_path))
-                    
-                    backups.append({
-                        'name': filename,
-                        'size': file_size,
-                        'date': file_date
-                    })
-        
-        # Sort by date, newest first
-        return sorted(backups, key=lambda x: x['date'], reverse=True)
-    
-    def list_s3_backups(self) -> List[BackupFile]:
-        """List all backups in the S3 bucket"""
+    def list_local_backups(self,
+                           db_type: Optional[str] = None,
+                           db_name: Optional[str] = None,
+                           limit: Optional[int] = None) -> List[BackupFile]:
+        """List local backups from the backup catalog, newest first"""
+        return [self._backup_file(entry) for entry in get_backup_catalog().list_backups('local', db_type, db_name, limit)]
+    
+    def list_s3_backups(self,
+                        db_type: Optional[str] = None,
+                        db_name: Optional[str] = None,
+                        limit: Optional[int] = None) -> List[BackupFile]:
+        """List S3 backups from the backup catalog, newest first"""
         if not self._is_s3_configured():
             return []
-            
-        try:
-            s3_client = self.get_s3_client()
-            response = s3_client.list_objects_v2(Bucket=current_app.config['AWS_BUCKET_NAME'])
-            
-            if 'Contents' not in response:
-                return []
-            
-            backups: List[BackupFile] = []
-            for obj in response['Contents']:
-                backups.append({
-                    'name': obj['Key'],
-                    'size': round(obj['Size'] / (1024**2), 2),  # MB
-                    'date': obj['LastModified']
-                })
-            
-            # Sort by date, newest first
-            return sorted(backups, key=lambda x: x['date'], reverse=True)
-        except Exception as e:
-            logging.error(f"Error listing S3 backups: {str(e)}")
-            raise S3BackupError(f"Failed to list S3 backups: {str(e)}")
+        return [self._backup_file(entry) for entry in get_backup_catalog().list_backups('s3', db_type, db_name, limit)]
     
-    def create_backup(self, db_type: str, db_name: str) -> str:
-        """Create a database backup"""
+    def sync_catalog(self, full: Optional[bool] = None) -> Dict[str, Tuple[int, int, int]]:
+        """
+        Reconcile the backup catalog with BACKUP_DIR and the S3 bucket.
+        
+        S3 is synced incrementally from the last-seen watermark: only date
+        prefixes from the watermark's day on are listed, and nothing is
+        marked deleted. A full listing, which also detects deleted objects,
+        runs every BACKUP_CATALOG_FULL_SYNC_HOURS or when full is set.
+        
+        Returns:
+            dict: Location mapped to the number of (added, updated, removed) entries
+        """
+        catalog = get_backup_catalog()
+        results = {'local': catalog.sync('local', self._scan_local())}
+        if not self._is_s3_configured():
+            return results
+        
+        watermark = self._get_setting(S3_WATERMARK_KEY)
+        last_full = self._get_setting(S3_FULL_SYNC_KEY)
+        if full is None:
+            interval = timedelta(hours=current_app.config.get('BACKUP_CATALOG_FULL_SYNC_HOURS', 24))
+            full = watermark is None or last_full is None or last_full < datetime.now(timezone.utc) - interval
+        
+        started = datetime.now(timezone.utc)
+        found, newest = self._scan_s3(since=None if full else watermark)
+        results['s3'] = catalog.sync('s3', found, partial=not full)
+        
+        if newest is not None and (watermark is None or newest > watermark):
+            self._set_setting(S3_WATERMARK_KEY, newest)
+        if full:
+            self._set_setting(S3_FULL_SYNC_KEY, started)
+        return results
+    
+    def start_scheduler(self, app) -> None:
+        """
+        Start the backup scheduler.
+        
+        Only one worker process runs it (see BackupScheduler). That process
+        runs the backup schedules, sync_catalog every
+        BACKUP_CATALOG_SYNC_MINUTES, and picks up schedule changes made by
+        other processes every SCHEDULER_SYNC_SECONDS.
+        """
+        self._scheduler.start(app, lambda: self._start_leader_jobs(app))
+    
+    def create_backup(self,
+                      db_type: str,
+                      db_name: str,
+                      compression: Optional[str] = None,
+                      mode: Optional[str] = None) -> str:
+        """
+        Create a database backup, compressed with BACKUP_COMPRESSION unless overridden.
+        
+        mode selects a single dump file ('single'), a parallel per-table
+        backup directory ('parallel'), a base backup plus log archiving
+        ('incremental') or a snapshot in the deduplicating repository
+        ('dedup'); BACKUP_MODE by default.
+        """
         # Get appropriate service based on db_type
         service = self._get_db_service(db_type)
+        compression, _, _ = compression_options(current_app.config, compression)
+        mode = self._backup_mode(db_type, mode)
         
-        # Generate backup filename with timestamp and secure name
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        secure_db_name = secure_filename(db_name)
-        extension = '.sql' if db_type == 'mysql' else '.dump'
-        filename = f"{secure_db_name}_{timestamp}{extension}"
+        if mode == 'incremental':
+            return self._incremental_backup(db_type, db_name, compression)
+        if mode == 'dedup':
+            return self._dedup_backup(db_type, db_name)
         
         # Get full backup path
+        filename = self._backup_filename(db_type, db_name, compression, mode)
         backup_path = os.path.join(current_app.config['BACKUP_DIR'], filename)
         
         # Perform backup
-        success = service.backup_database(db_name, backup_path)
+        success = service.backup_database(db_name, backup_path, compression=compression or 'none', mode=mode)
         if not success:
             raise BackupError(f"Failed to create {db_type} backup for {db_name}")
         
+        self._record_local(backup_path)
         return backup_path
     
+    def stream_backup_to_s3(self,
+                            db_type: str,
+                            db_name: str,
+                            compression: Optional[str] = None,
+                            keep_local: Optional[bool] = None,
+                            object_name: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        """
+        Back up a database straight into S3 with a multipart upload.
+        
+        The dump is compressed and uploaded while it is produced, so no local
+        staging copy is needed. If keep_local is set (BACKUP_KEEP_LOCAL_COPY by
+        default, off) the same bytes are also written to BACKUP_DIR in the same
+        pass.
+        A failed dump or upload aborts the multipart upload.
+        
+        Returns:
+            tuple: (S3 object name, local backup path or None)
+        """
+        if not self._is_s3_configured():
+            raise S3BackupError("AWS S3 credentials not configured")
+        
+        service = self._get_db_service(db_type)
+        compression, level, threads = compression_options(current_app.config, compression)
+        if keep_local is None:
+            keep_local = current_app.config.get('BACKUP_KEEP_LOCAL_COPY', False)
+        
+        filename = self._backup_filename(db_type, db_name, compression)
+        if object_name is None:
+            object_name = self._s3_object_name(filename, db_type, db_name)
+        
+        local_path = os.path.join(current_app.config['BACKUP_DIR'], filename) if keep_local else None
+        partial_path = f"{local_path}.partial" if local_path else None
+        bucket = current_app.config['AWS_BUCKET_NAME']
+        
+        try:
+            cmd, env = service.dump_command(db_name, compressed=bool(compression))
+            s3_client = self.get_s3_client()
+            
+            # Exit order matters: the dump pipeline is checked before the
+            # upload is completed, so a failed dump aborts the upload
+            with ExitStack() as stack:
+                uploader = stack.enter_context(S3MultipartUploader(
+                    s3_client,
+                    bucket,
+                    object_name,
+                    part_size=current_app.config.get('S3_MULTIPART_PART_SIZE', 64 * 1024 * 1024),
+                    concurrency=current_app.config.get('S3_MULTIPART_CONCURRENCY', 4)
+                ))
+                source = stack.enter_context(
+                    dump_pipeline(cmd, env=env, compression=compression, level=level, threads=threads,
+                                  limits=current_limits())
+                )
+                if current_progress() is not None:
+                    source = ProgressReader(source, None, current_progress())
+                targets = [uploader]
+                if partial_path:
+                    targets.append(stack.enter_context(open(partial_path, 'wb')))
+                
+                checksum = copy_stream(source, *targets)
+            
+            s3_client.put_object(
+                Bucket=bucket,
+                Key=f"{object_name}.sha256",
+                Body=f"{checksum}  {os.path.basename(object_name)}\n".encode()
+            )
+            
+            parent = None
+            if local_path:
+                os.replace(partial_path, local_path)
+                write_checksum_file(local_path, checksum)
+                parent = self._record_local(local_path)
+            
+            self._record_s3(object_name, uploader.bytes_written, checksum, parent)
+            return object_name, local_path
+        except Exception as e:
+            if partial_path and os.path.exists(partial_path):
+                os.remove(partial_path)
+            logging.error(f"Error streaming backup to S3: {str(e)}")
+            raise S3BackupError(f"Failed to stream backup to S3: {str(e)}")
+    
+    def restore_from_s3(self,
+                        db_type: str,
+                        object_name: str,
+                        db_name: str,
+                        progress: Optional[Callable[[int, int], None]] = None,
+                        limits: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Restore a database straight from an S3 backup.
+        
+        The object is read with parallel ranged GETs and piped through the
+        decompressor into the restore client, so nothing is written to disk.
+        Progress is passed to progress as (bytes_read, total_bytes), or to
+        the running job's progress callback, or logged.
+        The object's .sha256 is checked once the stream has been consumed.
+        
+        Directory backups span many objects and are downloaded to a
+        temporary directory, restored and removed instead. Dedup snapshots
+        are reassembled from the local repository, with chunks it lacks
+        read from the S3 mirror.
+        
+        limits overrides the default resource limits of the restore.
+        """
+        if not self._is_s3_configured():
+            raise S3BackupError("AWS S3 credentials not configured")
+        
+        service = self._get_db_service(db_type)
+        bucket = current_app.config['AWS_BUCKET_NAME']
+        
+        try:
+            with self._job_limits(f"restore {db_name}", limits):
+                if object_name.endswith(DIRECTORY_EXTENSIONS):
+                    with tempfile.TemporaryDirectory(dir=current_app.config['BACKUP_DIR'], prefix='.restore-') as workdir:
+                        local_path = self.download_from_s3(object_name, os.path.join(workdir, os.path.basename(object_name)))
+                        return service.restore_database(local_path, db_name)
+            
+                s3_client = self.get_s3_client()
+                if object_name.endswith(DEDUP_EXTENSION):
+                    snapshot = parse_snapshot(s3_client.get_object(Bucket=bucket, Key=object_name)['Body'].read())
+                    with self._dedup_repository().open_snapshot(snapshot, s3_client, bucket) as source:
+                        return service.restore_stream(source, db_name)
+            
+                with open_s3_backup(
+                    s3_client,
+                    bucket,
+                    object_name,
+                    part_size=current_app.config.get('S3_DOWNLOAD_PART_SIZE', 16 * 1024 * 1024),
+                    concurrency=current_app.config.get('S3_DOWNLOAD_CONCURRENCY', 4),
+                    progress=progress or current_progress() or self._progress_logger(object_name),
+                    expected_checksum=self._s3_checksum(s3_client, object_name)
+                ) as source:
+                    return service.restore_stream(source, db_name)
+        except Exception as e:
+            logging.error(f"Error restoring from S3: {str(e)}")
+            raise S3BackupError(f"Failed to restore from S3: {str(e)}")
+    
+    def restore_local_backup(self, db_type: str, backup_file: str, db_name: str,
+                             limits: Optional[Dict[str, Any]] = None) -> bool:
+        """Restore a database from a backup in BACKUP_DIR, reassembling dedup snapshots on the fly"""
+        service = self._get_db_service(db_type)
+        backup_path = os.path.join(current_app.config['BACKUP_DIR'], secure_filename(backup_file))
+        if not os.path.exists(backup_path):
+            raise FileNotFoundError(f"Backup file not found: {backup_file}")
+        
+        try:
+            with self._job_limits(f"restore {db_name}", limits):
+                if backup_path.endswith(DEDUP_EXTENSION):
+                    with self._dedup_repository().open_snapshot(read_snapshot(backup_path)) as source:
+                        return service.restore_stream(source, db_name)
+                return service.restore_database(backup_path, db_name)
+        except Exception as e:
+            logging.error(f"Error restoring backup: {str(e)}")
+            raise BackupError(f"Failed to restore backup: {str(e)}")
+    
+    def restore_point_in_time(self,
+                              db_type: str,
+                              db_name: str,
+                              target_time: datetime,
+                              target_dir: Optional[str] = None,
+                              limits: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Restore to a point in time from a base backup and the log archive.
+        
+        MySQL: the newest parallel base backup taken before target_time is
+        restored into db_name and archived binlogs are replayed up to
+        target_time.
+        
+        PostgreSQL: WAL covers the whole cluster, so a data directory is
+        prepared in target_dir (a new directory in BACKUP_DIR by default)
+        that recovers to target_time once a server is started on it.
+        
+        Returns:
+            str: The restored database name, or the prepared data directory
+        """
+        service = self._get_db_service(db_type)
+        base = self._latest_base(db_type, db_name, before=target_time)
+        if base is None:
+            raise BackupError(f"No base backup taken before {target_time.isoformat()}")
+        base_path, manifest = base
+        archive = self._log_archive(db_type, service)
+        
+        try:
+            with self._job_limits(f"restore {db_name} to {target_time.isoformat()}", limits):
+                if db_type == 'mysql':
+                    service.restore_database(base_path, db_name)
+                    archive.replay(
+                        db_name,
+                        manifest['database'],
+                        manifest['binlog']['file'],
+                        manifest['binlog']['position'],
+                        target_time
+                    )
+                    return db_name
+            
+                if target_dir is None:
+                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                    target_dir = os.path.join(current_app.config['BACKUP_DIR'], f"pitr_{timestamp}")
+                return archive.prepare_restore(base_path, target_time, target_dir)
+        except Exception as e:
+            logging.error(f"Error restoring to point in time: {str(e)}")
+            raise BackupError(f"Point-in-time restore failed: {str(e)}")
+    
+    def upload_archive_to_s3(self, db_type: str) -> List[str]:
+        """Upload archived binlogs/WAL segments that are not in S3 yet"""
+        if not self._is_s3_configured():
+            raise S3BackupError("AWS S3 credentials not configured")
+        
+        archive_dir = self._archive_dir(db_type)
+        if not os.path.isdir(archive_dir):
+            return []
+        
+        try:
+            s3_client = self.get_s3_client()
+            prefix = f"archive/{db_type}/"
+            existing = set(self._list_prefix(s3_client, prefix))
+            
+            uploaded: List[str] = []
+            for filename in sorted(os.listdir(archive_dir)):
+                path = os.path.join(archive_dir, filename)
+                key = f"{prefix}{filename}"
+                if filename.startswith('.') or filename.endswith('.partial') or not os.path.isfile(path) or key in existing:
+                    continue
+                s3_client.upload_file(path, current_app.config['AWS_BUCKET_NAME'], key)
+                uploaded.append(key)
+            return uploaded
+        except Exception as e:
+            logging.error(f"Error uploading log archive to S3: {str(e)}")
+            raise S3BackupError(f"Failed to upload log archive to S3: {str(e)}")
+    
     def upload_to_s3(self, file_path: str, object_name: Optional[str] = None) -> str:
         """Upload a file to S3 bucket"""
         if not self._is_s3_configured():
@@ -127,36 +413,84 @@ class BackupService:
             raise FileNotFoundError(f"Backup file not found: {file_path}")
             
         if object_name is None:
-            object_name = os.path.basename(file_path)
+            object_name = self._s3_object_name(file_path)
         
         try:
             s3_client = self.get_s3_client()
-            s3_client.upload_file(
-                file_path, 
-                current_app.config['AWS_BUCKET_NAME'], 
-                object_name
-            )
+            
+            # Directory backups are uploaded as a prefix
+            if os.path.isdir(file_path):
+                for filename in os.listdir(file_path):
+                    s3_client.upload_file(
+                        os.path.join(file_path, filename),
+                        current_app.config['AWS_BUCKET_NAME'],
+                        f"{object_name}/{filename}"
+                    )
+            elif file_path.endswith(DEDUP_EXTENSION):
+                # Snapshots only reference chunks; upload the packs S3 lacks first
+                uploaded = self._dedup_repository().push(
+                    s3_client,
+                    current_app.config['AWS_BUCKET_NAME'],
+                    read_snapshot(file_path),
+                    lambda: s3_client.upload_file(file_path, current_app.config['AWS_BUCKET_NAME'], object_name)
+                )
+                logging.info(f"Uploaded {uploaded} repository packs for {object_name}")
+            else:
+                s3_client.upload_file(
+                    file_path, 
+                    current_app.config['AWS_BUCKET_NAME'], 
+                    object_name
+                )
+            
+            parent = get_backup_catalog().find('local', os.path.basename(file_path))
+            self._record_s3(object_name, self._backup_size(file_path), read_checksum_file(file_path), parent)
             return object_name
         except Exception as e:
             logging.error(f"Error uploading to S3: {str(e)}")
             raise S3BackupError(f"Failed to upload to S3: {str(e)}")
     
-    def download_from_s3(self, object_name: str) -> str:
-        """Download a file from S3 bucket"""
+    def download_from_s3(self, object_name: str, local_path: Optional[str] = None) -> str:
+        """Download a file from S3 bucket, into BACKUP_DIR unless local_path is given"""
         if not self._is_s3_configured():
             raise S3BackupError("AWS S3 credentials not configured")
             
+        # Downloads to a caller's location are not part of the catalog
+        catalogued = local_path is None
+        
         try:
-            # Ensure object name doesn't contain path traversal
-            secure_object_name = secure_filename(object_name)
-            local_path = os.path.join(current_app.config['BACKUP_DIR'], secure_object_name)
+            if local_path is None:
+                # Ensure object name doesn't contain path traversal
+                secure_object_name = secure_filename(object_name.rsplit('/', 1)[-1])
+                local_path = os.path.join(current_app.config['BACKUP_DIR'], secure_object_name)
             
             s3_client = self.get_s3_client()
-            s3_client.download_file(
-                current_app.config['AWS_BUCKET_NAME'], 
-                object_name, 
-                local_path
-            )
+            
+            # Directory backups are stored as a prefix of their files,
+            # which are checked against the manifest on restore
+            if object_name.endswith(DIRECTORY_EXTENSIONS):
+                os.makedirs(local_path, exist_ok=True)
+                for key in self._list_prefix(s3_client, f"{object_name}/"):
+                    self._downloader(s3_client, key).download(
+                        os.path.join(local_path, secure_filename(key.rsplit('/', 1)[-1]))
+                    )
+            else:
+                checksum = self._downloader(s3_client, object_name, self._progress_logger(object_name)).download(
+                    local_path,
+                    expected_checksum=self._s3_checksum(s3_client, object_name)
+                )
+                write_checksum_file(local_path, checksum)
+            
+            if object_name.endswith(DEDUP_EXTENSION):
+                pulled = self._dedup_repository().pull(
+                    s3_client,
+                    current_app.config['AWS_BUCKET_NAME'],
+                    read_snapshot(local_path),
+                    lambda key, path: self._downloader(s3_client, key).download(path)
+                )
+                logging.info(f"Downloaded {pulled} repository packs for {object_name}")
+            
+            if catalogued:
+                self._record_local(local_path, get_backup_catalog().find('s3', object_name))
             return local_path
         except Exception as e:
             logging.error(f"Error downloading from S3: {str(e)}")
@@ -179,7 +513,8 @@ class BackupService:
             if not os.path.exists(backup_path):
                 raise FileNotFoundError(f"Backup file not found: {backup_file}")
             
-            os.remove(backup_path)
+            self._remove_local(backup_path)
+            get_backup_catalog().remove('local', secure_name)
             return True
         except Exception as e:
             logging.error(f"Error deleting local backup: {str(e)}")
@@ -192,136 +527,953 @@ class BackupService:
             
         try:
             s3_client = self.get_s3_client()
-            s3_client.delete_object(
-                Bucket=current_app.config['AWS_BUCKET_NAME'],
-                Key=object_name
-            )
+            self._delete_keys(s3_client, self._backup_keys(s3_client, object_name))
+            get_backup_catalog().remove('s3', object_name)
             return True
         except Exception as e:
             logging.error(f"Error deleting from S3: {str(e)}")
             raise S3BackupError(f"Failed to delete from S3: {str(e)}")
     
+    def apply_retention(self,
+                        dry_run: bool = True,
+                        location: Optional[str] = None,
+                        db_type: Optional[str] = None,
+                        db_name: Optional[str] = None) -> RetentionResult:
+        """
+        Delete the backups expired by the grandfather-father-son retention policies.
+        
+        With dry_run (the default) nothing is deleted and the result only
+        previews what would be. S3 keys are removed with batched
+        DeleteObjects calls and local backups are removed in parallel.
+        """
+        expired = plan_retention(location, db_type, db_name)
+        result: RetentionResult = {
+            'dry_run': dry_run,
+            'local': [entry.backup_name for entry in expired.get('local', [])],
+            's3': [entry.backup_name for entry in expired.get('s3', [])],
+            'freed_bytes': sum(entry.file_size or 0 for entries in expired.values() for entry in entries)
+        }
+        if dry_run:
+            return result
+        
+        catalog = get_backup_catalog()
+        
+        if result['local']:
+            backup_dir = current_app.config['BACKUP_DIR']
+            paths = [os.path.join(backup_dir, secure_filename(name)) for name in result['local']]
+            with ThreadPoolExecutor(max_workers=get_parallel_jobs(), thread_name_prefix='retention') as executor:
+                list(executor.map(self._remove_local, paths))
+            catalog.remove_many('local', result['local'])
+        
+        if result['s3']:
+            if not self._is_s3_configured():
+                raise S3BackupError("AWS S3 credentials not configured")
+            try:
+                s3_client = self.get_s3_client()
+                keys: List[str] = []
+                for name in result['s3']:
+                    keys.extend(self._backup_keys(s3_client, name))
+                self._delete_keys(s3_client, keys)
+            except Exception as e:
+                logging.error(f"Error applying S3 retention: {str(e)}")
+                raise S3BackupError(f"Failed to delete expired S3 backups: {str(e)}")
+            catalog.remove_many('s3', result['s3'])
+        
+        logging.info(f"Retention deleted {len(result['local'])} local and {len(result['s3'])} S3 backups")
+        
+        if any(name.endswith(DEDUP_EXTENSION) for name in result['local'] + result['s3']):
+            try:
+                logging.info(f"Repository garbage collected: {self.collect_garbage()}")
+            except BackupError as e:
+                # The snapshots are gone either way; the next run collects their chunks
+                logging.warning(str(e))
+        return result
+    
+    def collect_garbage(self) -> Dict[str, Dict[str, int]]:
+        """
+        Remove the chunks of the deduplicating repository that no snapshot uses.
+        
+        The local repository is checked against the snapshots in BACKUP_DIR
+        and the S3 mirror against the snapshots in the bucket, which is
+        listed in full. Both are listed under the repository's exclusive
+        lock, so snapshots written by backups running meanwhile are seen.
+        
+        Returns:
+            dict: Location mapped to the packs deleted (and repacked) and bytes freed
+        """
+        repository = self._dedup_repository()
+        backup_dir = current_app.config['BACKUP_DIR']
+        
+        def local_snapshots() -> List[Dict]:
+            return [
+                read_snapshot(os.path.join(backup_dir, filename))
+                for filename in os.listdir(backup_dir)
+                if filename.endswith(DEDUP_EXTENSION)
+            ]
+        
+        try:
+            results = {'local': repository.gc(local_snapshots, current_app.config.get('BACKUP_DEDUP_REPACK_PERCENT', 50))}
+            if not self._is_s3_configured():
+                return results
+            
+            s3_client = self.get_s3_client()
+            bucket = current_app.config['AWS_BUCKET_NAME']
+            concurrency = current_app.config.get('S3_LIST_CONCURRENCY', 8)
+            
+            def fetch(key: str) -> Dict:
+                return parse_snapshot(s3_client.get_object(Bucket=bucket, Key=key)['Body'].read())
+            
+            def remote_snapshots() -> List[Dict]:
+                keys = [
+                    obj['Key']
+                    for obj in list_partitioned(s3_client, bucket, concurrency=concurrency, exclude=('archive/', REMOTE_PREFIX))
+                    if obj['Key'].endswith(DEDUP_EXTENSION)
+                ]
+                with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='dedup-gc') as executor:
+                    return list(executor.map(fetch, keys))
+            
+            results['s3'] = repository.remote_gc(
+                s3_client,
+                bucket,
+                remote_snapshots,
+                lambda expired: self._delete_keys(s3_client, expired)
+            )
+            return results
+        except Exception as e:
+            logging.error(f"Error collecting repository garbage: {str(e)}")
+            raise BackupError(f"Failed to collect repository garbage: {str(e)}")
+    
     def schedule_backup(self, 
                        db_type: str, 
                        db_name: str, 
                        frequency: BackupFrequency, 
-                       upload_to_s3: bool) -> Tuple[str, ScheduledBackup]:
-        """Schedule a regular backup job"""
-        from uuid import uuid4
+                       upload_to_s3: bool,
+                       mode: Optional[str] = None,
+                       at: Optional[time] = None,
+                       day_of_week: Optional[int] = None,
+                       day_of_month: Optional[int] = None,
+                       limits: Optional[Dict[str, Any]] = None) -> Tuple[str, ScheduledBackup]:
+        """
+        Schedule a regular backup job.
         
+        The schedule is stored in the BackupSchedule table. Without at,
+        schedules of the same frequency are staggered
+        BACKUP_SCHEDULE_STAGGER_MINUTES apart from midnight (or the hour).
+        It is picked up by the scheduler's leader process immediately, or
+        within SCHEDULER_SYNC_SECONDS if that is another process. limits
+        overrides the default resource limits of its runs.
+        """
         # Validate database exists
         service = self._get_db_service(db_type)
         databases = service.list_databases()
         if db_name not in databases:
             raise BackupError(f"Database {db_name} not found")
+        mode = self._backup_mode(db_type, mode)
+        frequency = BackupFrequency(frequency)
         
-        # Generate a unique job ID
-        job_id = str(uuid4())
-        
-        # Add job based on frequency
-        if frequency == BackupFrequency.HOURLY:
-            job = self._scheduler.add_job(
-                self._perform_scheduled_backup,
-                'interval', 
-                hours=1,
-                args=[db_type, db_name, upload_to_s3, job_id]
-            )
-        elif frequency == BackupFrequency.DAILY:
-            job = self._scheduler.add_job(
-                self._perform_scheduled_backup,
-                'cron', 
-                hour=0, 
-                minute=0,
-                args=[db_type, db_name, upload_to_s3, job_id]
-            )
-        elif frequency == BackupFrequency.WEEKLY:
-            job = self._scheduler.add_job(
-                self._perform_scheduled_backup,
-                'cron', 
-                day_of_week='mon', 
-                hour=0, 
-                minute=0,
-                args=[db_type, db_name, upload_to_s3, job_id]
+        try:
+            if at is None:
+                at = self._staggered_time(frequency)
+            schedule = BackupSchedule(
+                name=f"{db_name} ({db_type})",
+                db_type=db_type,
+                db_name=db_name,
+                frequency=frequency.value,
+                time=at,
+                day_of_week=day_of_week if frequency == BackupFrequency.WEEKLY else None,
+                day_of_month=day_of_month if frequency == BackupFrequency.MONTHLY else None,
+                backup_type='s3' if upload_to_s3 else 'local',
+                backup_mode=mode,
+                resource_limits=json.dumps(validate_limits(limits)) if limits else None,
+                enabled=True
             )
-        else:
-            raise ValueError(f"Invalid backup frequency: {frequency}")
-        
-        # Store job in our dictionary
-        job_info: ScheduledBackup = {
-            'id': job_id,
-            'name': f"{db_name} ({db_type})",
-            'frequency': frequency,
-            'db_type': db_type,
-            'db_name': db_name,
-            'upload_to_s3': upload_to_s3,
-            'last_run': None
-        }
-        
-        self._scheduled_backups[job_id] = {
-            **job_info,
-            'job': job
-        }
+            # A schedule the scheduler can't run must not reach the table
+            schedule_trigger(schedule)
+            db.session.add(schedule)
+            db.session.commit()
+            
+            self._scheduler.sync_schedules()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error scheduling backup: {str(e)}")
+            raise BackupError(f"Failed to schedule backup: {str(e)}")
         
-        return job_id, job_info
+        return str(schedule.id), self._scheduled_backup(schedule)
     
     def cancel_scheduled_backup(self, job_id: str) -> str:
-        """Cancel a scheduled backup job"""
-        if job_id not in self._scheduled_backups:
+        """Cancel a scheduled backup job; the schedule is disabled, keeping its backup history"""
+        schedule = db.session.get(BackupSchedule, int(job_id)) if str(job_id).isdigit() else None
+        if schedule is None or not schedule.enabled:
             raise ValueError(f"Invalid job ID: {job_id}")
         
         try:
-            # Remove job from scheduler
-            job_info = self._scheduled_backups[job_id]
-            job_info['job'].remove()
+            schedule.enabled = False
+            db.session.commit()
             
-            # Get name before removing from dictionary
-            name = job_info['name']
-            
-            # Remove from our dictionary
-            del self._scheduled_backups[job_id]
-            
-            return name
+            self._scheduler.sync_schedules()
+            return schedule.name
         except Exception as e:
+            db.session.rollback()
             logging.error(f"Error cancelling scheduled backup: {str(e)}")
             raise BackupError(f"Failed to cancel scheduled backup: {str(e)}")
     
+    def set_schedule_limits(self, job_id: str, limits: Optional[Dict[str, Any]]) -> ScheduledBackup:
+        """Replace the resource limit overrides of a backup schedule; None restores the defaults"""
+        schedule = db.session.get(BackupSchedule, int(job_id)) if str(job_id).isdigit() else None
+        if schedule is None or not schedule.enabled:
+            raise ValueError(f"Invalid job ID: {job_id}")
+        
+        schedule.resource_limits = json.dumps(validate_limits(limits)) if limits else None
+        db.session.commit()
+        return self._scheduled_backup(schedule)
+    
+    def get_jobs(self, status: Optional[str] = None, limit: int = 50) -> List[BackupJobInfo]:
+        """Recent backup and restore jobs of all worker processes, newest first"""
+        jobs = self._jobs.recent(status, limit)
+        self._add_limits(jobs)
+        return jobs
+    
+    def get_job(self, job_id: str) -> Optional[BackupJobInfo]:
+        """Look up a backup or restore job by ID"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            self._add_limits([job])
+        return job
+    
+    def cancel_job(self, job_id: str) -> BackupJobInfo:
+        """
+        Cancel a queued or running job.
+        
+        The dump, restore and compression processes of a running job get
+        SIGTERM, and SIGKILL if they are still there after a grace period.
+        A restore cancelled halfway leaves the database partially restored.
+        """
+        return self._jobs.cancel(job_id)
+    
+    def update_job_limits(self, job_id: str, changes: Dict[str, Any]) -> JobLimits:
+        """
+        Change the resource limits of a running job.
+        
+        The process running the job applies them within a second.
+        """
+        return update_job(self._limits_dir(), job_id, changes)
+    
     def get_scheduled_backups(self) -> List[ScheduledBackup]:
-        """Get all scheduled backup jobs"""
-        # Convert to list of job info without the job object
-        result: List[ScheduledBackup] = []
-        for job_id, job_data in self._scheduled_backups.items():
-            # Create a copy without the job object
-            job_info = {k: v for k, v in job_data.items() if k != 'job'}
-            result.append(job_info)  # type: ignore
-        return result
+        """Get all enabled backup schedules"""
+        schedules = BackupSchedule.query.filter_by(enabled=True).order_by(BackupSchedule.id)
+        return [self._scheduled_backup(schedule) for schedule in schedules]
+    
+    def submit_job(self,
+                   kind: str,
+                   db_type: str,
+                   db_name: Optional[str],
+                   func: Callable,
+                   *args,
+                   priority: int = PRIORITY_MANUAL,
+                   name: str = '',
+                   limits: Optional[Dict[str, Any]] = None,
+                   **kwargs) -> BackupJobInfo:
+        """
+        Run a backup or restore function as a background job.
+        
+        The job goes on the backup queue, which runs at most
+        BACKUP_QUEUE_WORKERS jobs at once in this process and at most
+        BACKUP_QUEUE_PER_HOST against one database server across all
+        processes, manual jobs first. func is called with
+        args and kwargs in an app context, under the default resource limits
+        with limits applied on top. Its result is stored with the job, so it
+        must be JSON serializable.
+        
+        Returns:
+            BackupJobInfo: The queued job; poll get_job for its progress
+        """
+        app = current_app._get_current_object()
+        name = name or func.__name__
+        if limits:
+            validate_limits(limits)
+        
+        job_id = self._jobs.create(kind, name, db_type, db_name, current_app.config.get('BACKUP_JOB_RETENTION_DAYS', 7))
+        
+        def run(context: JobContext):
+            with app.app_context(), self._job_limits(name, limits, job_id) as job_limits:
+                context.on_cancel = job_limits.cancel
+                if context.cancelled.is_set():
+                    job_limits.cancel()
+                with use_progress(context.progress):
+                    return func(*args, **kwargs)
+        
+        future = self._backup_queue().submit(
+            lambda: self._jobs.run(app, job_id, run),
+            self._database_host(db_type),
+            priority,
+            name
+        )
+        self._jobs.track(job_id, future)
+        return self._jobs.get(job_id)
+    
+    def run_backup(self,
+                   db_type: str,
+                   db_name: str,
+                   compression: Optional[str] = None,
+                   mode: Optional[str] = None,
+                   upload_to_s3: bool = False,
+                   stream_to_s3: bool = False,
+                   keep_local: Optional[bool] = None) -> Dict[str, Optional[str]]:
+        """
+        Create a backup and optionally put it in S3; the body of a manual backup job.
+        
+        A failed upload is logged, as the local backup succeeded. Streamed
+        backups are single-file dumps, so stream_to_s3 only takes the
+        'single' mode.
+        
+        Returns:
+            dict: backup_file (name in BACKUP_DIR or None) and s3_key (or None)
+        """
+        if stream_to_s3:
+            if (mode or 'single') != 'single':
+                raise BackupError(f"Backups in {mode} mode can't be streamed to S3")
+            s3_key, backup_path = self.stream_backup_to_s3(db_type, db_name, compression=compression, keep_local=keep_local)
+            return {'backup_file': os.path.basename(backup_path) if backup_path else None, 's3_key': s3_key}
+        
+        backup_path = self.create_backup(db_type, db_name, compression=compression, mode=mode)
+        # Incremental runs without a new base backup only archive logs
+        base_backup = backup_path != self._archive_dir(db_type)
+        s3_key = None
+        if upload_to_s3:
+            try:
+                if base_backup:
+                    s3_key = self.upload_to_s3(backup_path)
+                if self._backup_mode(db_type, mode) == 'incremental':
+                    uploaded = self.upload_archive_to_s3(db_type)
+                    logging.info(f"Uploaded {len(uploaded)} archived logs to S3")
+            except S3BackupError as e:
+                logging.warning(f"S3 upload failed: {str(e)}")
+        return {'backup_file': os.path.basename(backup_path) if base_backup else None, 's3_key': s3_key}
+    
+    def queue_stats(self) -> BackupQueueStats:
+        """Depth, running jobs and wait times of the backup queues of all worker processes"""
+        return self._jobs.queue_stats(
+            current_app.config.get('BACKUP_QUEUE_WORKERS', 2),
+            current_app.config.get('BACKUP_QUEUE_PER_HOST', 1),
+            self._database_host
+        )
+    
+    def enqueue_schedule(self, schedule_id: int) -> Optional[BackupJobInfo]:
+        """Queue a run of a backup schedule; called by the scheduler"""
+        schedule = db.session.get(BackupSchedule, schedule_id)
+        if schedule is None or not schedule.enabled:
+            current_app.logger.warning(f"Backup schedule {schedule_id} no longer exists")
+            return None
+        return self.submit_job(
+            'backup',
+            schedule.db_type,
+            schedule.db_name,
+            self.run_schedule,
+            schedule_id,
+            priority=PRIORITY_SCHEDULED,
+            name=schedule.name,
+            limits=json.loads(schedule.resource_limits) if schedule.resource_limits else None
+        )
+    
+    def run_schedule(self, schedule_id: int) -> None:
+        """
+        Run a backup schedule; called by the scheduler.
+        
+        A run is skipped if a backup of the same database is already in
+        progress. The outcome is written to the schedule's last_run and to
+        BackupLog, where the backups are attributed to the schedule.
+        """
+        schedule = db.session.get(BackupSchedule, schedule_id)
+        if schedule is None or not schedule.enabled:
+            current_app.logger.warning(f"Backup schedule {schedule_id} no longer exists")
+            return
+        
+        catalog = get_backup_catalog()
+        lock_dir = os.path.join(current_app.instance_path, 'locks')
+        with database_lock(lock_dir, schedule.db_type, schedule.db_name) as acquired:
+            if not acquired:
+                message = f"Skipped: a backup of {schedule.db_name} is already running"
+                current_app.logger.warning(f"Scheduled backup {schedule.name}: {message}")
+                catalog.record_failure(schedule.backup_type, schedule.name, schedule.db_type, schedule.db_name,
+                                       message, status='skipped', schedule_id=schedule.id)
+                return
+            
+            try:
+                for location, name in self._perform_scheduled_backup(schedule):
+                    catalog.assign_schedule(location, name, schedule.id)
+            except Exception as e:
+                current_app.logger.error(f"Error in scheduled backup: {str(e)}")
+                catalog.record_failure(schedule.backup_type, schedule.name, schedule.db_type, schedule.db_name,
+                                       str(e), schedule_id=schedule.id)
+            finally:
+                schedule.last_run = datetime.now()
+                db.session.commit()
     
     def is_s3_configured(self) -> bool:
         """Check if AWS S3 is configured"""
         return self._is_s3_configured()
     
-    def _perform_scheduled_backup(self, db_type: str, db_name: str, upload_to_s3: bool, job_id: str) -> None:
+    def _perform_scheduled_backup(self, schedule: BackupSchedule) -> List[Tuple[str, str]]:
+        """
+        Perform the backup of a schedule
+        
+        Returns:
+            list: (location, name) of the backups that were made
+        """
+        db_type, db_name, mode = schedule.db_type, schedule.db_name, schedule.backup_mode
+        upload_to_s3 = schedule.backup_type == 's3'
+        made: List[Tuple[str, str]] = []
+        
+        # Stream straight into S3 when configured, skipping the local staging copy
+        # Parallel backups are directories and can't be streamed as one object
+        if (upload_to_s3 and mode == 'single' and self._is_s3_configured()
+                and current_app.config.get('BACKUP_STREAM_TO_S3')):
+            s3_key, backup_file = self.stream_backup_to_s3(db_type, db_name)
+            current_app.logger.info(f"Scheduled backup streamed to S3: {s3_key}")
+            made.append(('s3', s3_key))
+            if backup_file:
+                made.append(('local', os.path.basename(backup_file)))
+            return made
+        
+        # Create backup
+        backup_file = self.create_backup(db_type, db_name, mode=mode)
+        current_app.logger.info(f"Scheduled backup created: {backup_file}")
+        
+        # Incremental runs without a new base backup only archive logs
+        if backup_file != self._archive_dir(db_type):
+            made.append(('local', os.path.basename(backup_file)))
+        
+        # Upload to S3 if requested
+        if upload_to_s3 and self._is_s3_configured() and mode == 'incremental':
+            # Only new base backups are uploaded; logs are synced separately
+            if backup_file != self._archive_dir(db_type):
+                made.append(('s3', self.upload_to_s3(backup_file)))
+            uploaded = self.upload_archive_to_s3(db_type)
+            current_app.logger.info(f"Scheduled backup uploaded {len(uploaded)} archived logs to S3")
+        elif upload_to_s3 and self._is_s3_configured():
+            s3_key = self.upload_to_s3(backup_file)
+            made.append(('s3', s3_key))
+            current_app.logger.info(f"Scheduled backup uploaded to S3: {s3_key}")
+        elif upload_to_s3:
+            current_app.logger.warning("AWS credentials not configured for S3 upload")
+        return made
+    
+    def _scheduled_backup(self, schedule: BackupSchedule) -> ScheduledBackup:
+        """Convert a backup schedule to the listing format"""
+        job = self._scheduler.get_job(schedule_job_id(schedule.id))
+        return {
+            'id': str(schedule.id),
+            'name': schedule.name,
+            'frequency': schedule.frequency,
+            'db_type': schedule.db_type,
+            'db_name': schedule.db_name,
+            'upload_to_s3': schedule.backup_type == 's3',
+            'mode': schedule.backup_mode,
+            'last_run': schedule.last_run,
+            'next_run': job.next_run_time if job is not None else None,
+            'limits': json.loads(schedule.resource_limits) if schedule.resource_limits else None
+        }
+    
+    @staticmethod
+    def _staggered_time(frequency: BackupFrequency) -> time:
+        """Default run time of a new schedule, after the schedules of the same frequency"""
+        count = BackupSchedule.query.filter_by(frequency=frequency.value, enabled=True).count()
+        minutes = count * current_app.config.get('BACKUP_SCHEDULE_STAGGER_MINUTES', 5)
+        return time((minutes // 60) % 24, minutes % 60)
+    
+    @contextmanager
+    def _job_limits(self,
+                    name: str,
+                    overrides: Optional[Dict[str, Any]] = None,
+                    job_id: Optional[str] = None) -> Iterator[ResourceLimits]:
+        """
+        Run the block as a job under resource limits.
+        
+        The limits are the BACKUP_NICE, BACKUP_IO_*, BACKUP_BANDWIDTH_MBPS and
+        BACKUP_COMPRESSION_CPU_PERCENT defaults with overrides applied. A
+        block inside another job keeps that job's limits.
+        """
+        limits = current_limits()
+        if limits is not None:
+            yield limits
+            return
+        
+        limits = ResourceLimits(limits_from_config(current_app.config, overrides), self._limits_dir(), name, job_id)
+        with limits, use_limits(limits):
+            yield limits
+    
+    def _add_limits(self, jobs: List[BackupJobInfo]) -> None:
+        """Fill in the current resource limits of running jobs"""
+        running = {job['id']: job['limits'] for job in list_jobs(self._limits_dir())}
+        for job in jobs:
+            job['limits'] = running.get(job['id'])
+    
+    @staticmethod
+    def _limits_dir() -> str:
+        """Directory of the state files of running jobs, shared by the worker processes"""
+        return os.path.join(current_app.instance_path, 'jobs')
+    
+    def _backup_queue(self):
+        """The process's backup queue, sized from the config"""
+        return get_backup_queue(
+            current_app.config.get('BACKUP_QUEUE_WORKERS', 2),
+            current_app.config.get('BACKUP_QUEUE_PER_HOST', 1),
+            # Host slots are lock files shared by the worker processes
+            os.path.join(current_app.instance_path, 'locks')
+        )
+    
+    def _database_host(self, db_type: str) -> str:
+        """Identify the database server a backup of db_type runs against"""
+        service = self._get_db_service(db_type)
+        return f"{db_type}://{service.host}:{service.port}"
+    
+    def _start_leader_jobs(self, app) -> None:
+        """Add the scheduler's maintenance jobs and load the backup schedules; runs on the leader"""
+        self._scheduler.add_job(
+            self._sync_catalog_job,
+            'interval',
+            minutes=app.config.get('BACKUP_CATALOG_SYNC_MINUTES', 15),
+            id='backup_catalog_sync',
+            replace_existing=True,
+            next_run_time=datetime.now(),
+            args=[app]
+        )
+        self._scheduler.add_job(
+            self._sync_schedules_job,
+            'interval',
+            seconds=app.config.get('SCHEDULER_SYNC_SECONDS', 60),
+            id='backup_schedule_sync',
+            replace_existing=True,
+            args=[app]
+        )
+        self._scheduler.sync_schedules()
+    
+    def _sync_schedules_job(self, app) -> None:
+        """Scheduler entry point picking up schedules changed by other processes"""
+        with app.app_context():
+            try:
+                changed = self._scheduler.sync_schedules()
+                if changed:
+                    app.logger.info(f"Backup schedules updated: {changed} jobs changed")
+            except Exception as e:
+                app.logger.error(f"Error syncing backup schedules: {str(e)}")
+    
+    def _backup_filename(self, db_type: str, db_name: str, compression: Optional[str], mode: str = 'single') -> str:
+        """Generate backup filename with timestamp and secure name"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        secure_db_name = secure_filename(db_name)
+        if mode == 'parallel':
+            # A directory of individually compressed chunks
+            return f"{secure_db_name}_{timestamp}.parallel"
+        extension = '.sql' if db_type == 'mysql' else '.dump'
+        if mode == 'dedup':
+            # Chunks are compressed by the repository
+            return f"{secure_db_name}_{timestamp}{extension}{DEDUP_EXTENSION}"
+        return f"{secure_db_name}_{timestamp}{extension}{get_extension(compression)}"
+    
+    def _backup_mode(self, db_type: str, mode: Optional[str]) -> str:
+        """Resolve and validate the backup mode"""
+        mode = mode or current_app.config.get('BACKUP_MODE', 'single')
+        if mode not in ('single', 'parallel', 'incremental', 'dedup'):
+            raise BackupError(f"Invalid backup mode: {mode}")
+        return mode
+    
+    def _incremental_backup(self, db_type: str, db_name: str, compression: Optional[str]) -> str:
         """
-        Perform a backup operation with the given parameters
-        This function is called by the scheduler
+        Take a base backup when the last one is older than BACKUP_BASE_INTERVAL_HOURS,
+        then archive the binlogs/WAL written since the previous run.
+        
+        Returns:
+            str: The new base backup, or the log archive directory
         """
+        service = self._get_db_service(db_type)
+        archive = self._log_archive(db_type, service, compression or 'none')
+        
+        interval = timedelta(hours=current_app.config.get('BACKUP_BASE_INTERVAL_HOURS', 24))
+        base = self._latest_base(db_type, db_name)
+        backup_path = archive.archive_dir
+        
+        try:
+            if base is None or datetime.fromisoformat(base[1]['created']) < datetime.now() - interval:
+                if db_type == 'mysql':
+                    # Parallel backups record the binlog position of their snapshot
+                    backup_path = self.create_backup(db_type, db_name, compression or 'none', mode='parallel')
+                    if not read_manifest(backup_path).get('binlog'):
+                        raise BackupError("Binary logging is disabled on the MySQL server")
+                else:
+                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                    backup_path = os.path.join(current_app.config['BACKUP_DIR'], f"postgres_{timestamp}.basebackup")
+                    archive.base_backup(backup_path)
+                    self._record_local(backup_path)
+            
+            archive.archive()
+        except BackupError:
+            raise
+        except Exception as e:
+            logging.error(f"Error creating incremental backup: {str(e)}")
+            raise BackupError(f"Incremental backup failed: {str(e)}")
+        
+        return backup_path
+    
+    def _dedup_backup(self, db_type: str, db_name: str) -> str:
+        """
+        Dump a database into the deduplicating repository.
+        
+        Returns:
+            str: The snapshot path
+        """
+        service = self._get_db_service(db_type)
+        filename = self._backup_filename(db_type, db_name, None, mode='dedup')
+        snapshot_path = os.path.join(current_app.config['BACKUP_DIR'], filename)
+        
         try:
-            # Create backup
-            backup_file = self.create_backup(db_type, db_name)
-            current_app.logger.info(f"Scheduled backup created: {backup_file}")
+            if db_type == 'mysql':
+                cmd, env = service.dump_command(
+                    db_name,
+                    extended_insert=current_app.config.get('BACKUP_DEDUP_EXTENDED_INSERT', False)
+                )
+                engine = 'mysql-dedup'
+            else:
+                # pg_dump's own compression would defeat deduplication
+                cmd, env = service.dump_command(db_name, compressed=True)
+                engine = 'pg-dedup'
+            
+            with dump_pipeline(cmd, env=env, limits=current_limits()) as source:
+                self._dedup_repository().backup(source, snapshot_path, {'engine': engine, 'database': db_name})
+        except Exception as e:
+            # A failed dump is only detected once the snapshot was written
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+            logging.error(f"Error creating dedup backup: {str(e)}")
+            raise BackupError(f"Dedup backup failed: {str(e)}")
+        
+        self._record_local(snapshot_path)
+        return snapshot_path
+    
+    def _latest_base(self,
+                     db_type: str,
+                     db_name: str,
+                     before: Optional[datetime] = None) -> Optional[Tuple[str, Dict]]:
+        """Find the newest base backup usable for point-in-time recovery"""
+        backup_dir = current_app.config['BACKUP_DIR']
+        if not os.path.isdir(backup_dir):
+            return None
+        
+        latest = None
+        for filename in os.listdir(backup_dir):
+            path = os.path.join(backup_dir, filename)
+            if not is_parallel_backup(path):
+                continue
+            
+            manifest = read_manifest(path)
+            if db_type == 'mysql':
+                usable = (manifest.get('engine') == 'mysql-parallel' and manifest.get('database') == db_name
+                          and manifest.get('binlog'))
+            else:
+                # WAL and base backups cover every database in the cluster
+                usable = manifest.get('engine') == 'pg-basebackup'
             
-            # Upload to S3 if requested
-            if upload_to_s3 and self._is_s3_configured():
-                s3_key = self.upload_to_s3(backup_file)
-                current_app.logger.info(f"Scheduled backup uploaded to S3: {s3_key}")
-            elif upload_to_s3:
-                current_app.logger.warning("AWS credentials not configured for S3 upload")
+            created = datetime.fromisoformat(manifest['created'])
+            if not usable or (before is not None and created > before):
+                continue
+            if latest is None or created > datetime.fromisoformat(latest[1]['created']):
+                latest = (path, manifest)
+        
+        return latest
+    
+    def _log_archive(self,
+                     db_type: str,
+                     service: Union[MySQLService, PostgresService],
+                     compression: Optional[str] = None) -> Union[MySQLBinlogArchive, PostgresWalArchive]:
+        """Get the binlog or WAL archive for a database type"""
+        compression, level, _ = compression_options(current_app.config, compression)
+        archive_class = MySQLBinlogArchive if db_type == 'mysql' else PostgresWalArchive
+        return archive_class(service, self._archive_dir(db_type), compression, level)
+    
+    def _archive_dir(self, db_type: str) -> str:
+        """Directory holding archived binlogs or WAL segments"""
+        return os.path.join(current_app.config['BACKUP_DIR'], 'archive', db_type)
+    
+    def _sync_catalog_job(self, app) -> None:
+        """Scheduler entry point for sync_catalog, followed by retention if enabled"""
+        with app.app_context():
+            try:
+                results = self.sync_catalog()
+                app.logger.info(f"Backup catalog synced: {results}")
+                
+                if app.config.get('BACKUP_RETENTION_ENABLED'):
+                    self.apply_retention(dry_run=False)
+            except Exception as e:
+                app.logger.error(f"Error syncing backup catalog: {str(e)}")
+    
+    def _scan_local(self) -> Dict[str, Dict]:
+        """Describe every backup in BACKUP_DIR for the catalog"""
+        backup_dir = current_app.config['BACKUP_DIR']
+        found: Dict[str, Dict] = {}
+        if not os.path.isdir(backup_dir):
+            return found
+        
+        for filename in os.listdir(backup_dir):
+            if is_backup_file(filename):
+                found[filename] = self._local_fields(os.path.join(backup_dir, filename))
+        return found
+    
+    def _scan_s3(self, since: Optional[datetime] = None) -> Tuple[Dict[str, Dict], Optional[datetime]]:
+        """
+        Describe the backups in the S3 bucket for the catalog.
+        
+        Database prefixes are listed concurrently; with since, only from
+        that day on.
+        
+        Returns:
+            tuple: (backups by name, newest LastModified seen)
+        """
+        s3_client = self.get_s3_client()
+        bucket = current_app.config['AWS_BUCKET_NAME']
+        known = {entry.backup_name: entry for entry in get_backup_catalog().list_backups('s3')}
+        
+        objects = list_partitioned(
+            s3_client,
+            bucket,
+            since=since,
+            concurrency=current_app.config.get('S3_LIST_CONCURRENCY', 8),
+            exclude=('archive/', REMOTE_PREFIX)
+        )
+        
+        found: Dict[str, Dict] = {}
+        newest = None
+        for obj in objects:
+            # Directory backups are uploaded as a prefix; list them once
+            name = self._directory_backup_name(obj['Key']) or obj['Key']
+            if name == obj['Key'] and not is_backup_file(name):
+                continue
             
-            # Update the last run time in the job info
-            if job_id in self._scheduled_backups:
-                self._scheduled_backups[job_id]['last_run'] = datetime.now()
+            newest = max(newest, obj['LastModified']) if newest else obj['LastModified']
+            modified = to_utc(obj['LastModified'])
+            entry = found.get(name)
+            if entry is None:
+                entry = found[name] = describe_backup(name)
+                entry.update({'file_path': name, 'file_size': 0})
+                entry['created_at'] = entry['created_at'] or modified
+            entry['file_size'] += obj['Size']
         
+        for name, entry in found.items():
+            if entry['db_type'] != 'unknown':
+                continue
+            if name in known:
+                entry['db_type'] = known[name].db_type
+                continue
+            # Only the manifest tells which engine wrote a directory backup
+            try:
+                body = s3_client.get_object(Bucket=bucket, Key=f"{name}/{MANIFEST_NAME}")['Body'].read()
+                entry.update(describe_backup(name, json.loads(body)))
+            except (ClientError, ValueError) as e:
+                logging.warning(f"Could not read manifest of {name}: {str(e)}")
+        return found, newest
+    
+    def _s3_object_name(self, file_path: str, db_type: Optional[str] = None, db_name: Optional[str] = None) -> str:
+        """S3 key for a backup, per database and date unless S3_KEY_LAYOUT is flat"""
+        filename = os.path.basename(file_path)
+        if current_app.config.get('S3_KEY_LAYOUT', 'database') == 'flat':
+            return filename
+        
+        if db_type is None or db_name is None:
+            entry = get_backup_catalog().find('local', filename)
+            if entry is not None:
+                db_type, db_name = entry.db_type, entry.db_name
+            else:
+                fields = self._local_fields(file_path) if os.path.exists(file_path) else describe_backup(filename)
+                db_type, db_name = fields['db_type'], fields['db_name']
+        
+        if db_type == 'unknown':
+            return filename
+        return backup_key(filename, db_type, secure_filename(db_name))
+    
+    @staticmethod
+    def _get_setting(key: str) -> Optional[datetime]:
+        """Read a timestamp kept in the Config table"""
+        setting = Config.query.filter_by(key=key).first()
+        if setting is None or not setting.value:
+            return None
+        return datetime.fromisoformat(setting.value)
+    
+    @staticmethod
+    def _set_setting(key: str, value: datetime) -> None:
+        """Store a timestamp in the Config table"""
+        setting = Config.query.filter_by(key=key).first()
+        if setting is None:
+            setting = Config(key=key, description='Maintained by the backup catalog sync')
+            db.session.add(setting)
+        setting.value = value.isoformat()
+        db.session.commit()
+    
+    def _local_fields(self, path: str) -> Dict:
+        """Catalog fields of a local backup"""
+        manifest = read_manifest(path) if is_parallel_backup(path) else None
+        fields = describe_backup(os.path.basename(path), manifest)
+        fields.update({
+            'file_path': path,
+            'file_size': self._backup_size(path),
+            'checksum': None if os.path.isdir(path) else read_checksum_file(path)
+        })
+        fields['created_at'] = fields['created_at'] or datetime.utcfromtimestamp(os.path.getmtime(path))
+        return fields
+    
+    def _record_local(self, path: str, parent: Optional[BackupLog] = None) -> Optional[BackupLog]:
+        """Add a local backup to the catalog; failures are left to the next sync"""
+        try:
+            return get_backup_catalog().record('local', os.path.basename(path), parent=parent, **self._local_fields(path))
+        except Exception as e:
+            logging.warning(f"Backup {path} not added to the catalog: {str(e)}")
+            return None
+    
+    def _record_s3(self,
+                   object_name: str,
+                   size: int,
+                   checksum: Optional[str] = None,
+                   parent: Optional[BackupLog] = None) -> Optional[BackupLog]:
+        """Add an S3 backup to the catalog; failures are left to the next sync"""
+        fields = describe_backup(object_name)
+        if parent is not None:
+            # A copy of a local backup shares its description
+            fields.update(db_type=parent.db_type, db_name=parent.db_name, backup_mode=parent.backup_mode)
+        try:
+            return get_backup_catalog().record(
+                's3',
+                object_name,
+                file_path=object_name,
+                file_size=size,
+                checksum=checksum,
+                parent=parent,
+                **fields
+            )
         except Exception as e:
-            current_app.logger.error(f"Error in scheduled backup: {str(e)}")
+            logging.warning(f"Backup {object_name} not added to the catalog: {str(e)}")
+            return None
+    
+    @staticmethod
+    def _backup_file(entry: BackupLog) -> BackupFile:
+        """Convert a catalog entry to the listing format"""
+        return {
+            'name': entry.backup_name,
+            'size': round((entry.file_size or 0) / (1024 * 1024), 2),  # MB
+            'date': entry.created_at,
+            'compression': entry.compression
+        }
+    
+    @staticmethod
+    def _directory_backup_name(key: str) -> Optional[str]:
+        """Name of the directory backup an S3 key belongs to, if any"""
+        for extension in DIRECTORY_EXTENSIONS:
+            prefix, separator, _ = key.partition(f"{extension}/")
+            if separator:
+                return f"{prefix}{extension}"
+        return None
+    
+    @staticmethod
+    def _remove_local(path: str) -> None:
+        """Remove a local backup and its checksum sidecar"""
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+        
+        # Remove the checksum written alongside the backup
+        if os.path.exists(f"{path}.sha256"):
+            os.remove(f"{path}.sha256")
+    
+    def _backup_keys(self, s3_client: boto3.client, object_name: str) -> List[str]:
+        """Every S3 key belonging to a backup, including its checksum object"""
+        if object_name.endswith(DIRECTORY_EXTENSIONS):
+            return self._list_prefix(s3_client, f"{object_name}/")
+        return [object_name, f"{object_name}.sha256"]
+    
+    @staticmethod
+    def _delete_keys(s3_client: boto3.client, keys: List[str]) -> None:
+        """Delete S3 keys with DeleteObjects, S3_DELETE_BATCH_SIZE (at most 1000) at a time"""
+        batch_size = min(int(current_app.config.get('S3_DELETE_BATCH_SIZE', 1000)), 1000)
+        failed: List[str] = []
+        for start in range(0, len(keys), batch_size):
+            response = s3_client.delete_objects(
+                Bucket=current_app.config['AWS_BUCKET_NAME'],
+                Delete={
+                    'Objects': [{'Key': key} for key in keys[start:start + batch_size]],
+                    'Quiet': True
+                }
+            )
+            failed.extend(f"{error['Key']} ({error.get('Code')})" for error in response.get('Errors', []))
+        
+        if failed:
+            raise S3BackupError(f"Failed to delete {len(failed)} S3 objects: {', '.join(failed[:10])}")
+    
+    @staticmethod
+    def _backup_size(path: str) -> int:
+        """Size in bytes of a backup file or parallel backup directory"""
+        if os.path.isdir(path):
+            return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+        return os.path.getsize(path)
+    
+    def _list_prefix(self, s3_client: boto3.client, prefix: str) -> List[str]:
+        """List every object key under a prefix"""
+        keys: List[str] = []
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=current_app.config['AWS_BUCKET_NAME'], Prefix=prefix):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []))
+        return keys
+    
+    def _downloader(self,
+                    s3_client: boto3.client,
+                    object_name: str,
+                    progress: Optional[Callable[[int, int], None]] = None) -> S3ParallelDownloader:
+        """Create a resumable ranged downloader with the configured part size and concurrency"""
+        return S3ParallelDownloader(
+            s3_client,
+            current_app.config['AWS_BUCKET_NAME'],
+            object_name,
+            part_size=current_app.config.get('S3_DOWNLOAD_PART_SIZE', 16 * 1024 * 1024),
+            concurrency=current_app.config.get('S3_DOWNLOAD_CONCURRENCY', 4),
+            progress=progress
+        )
+    
+    @staticmethod
+    def _s3_checksum(s3_client: boto3.client, object_name: str) -> Optional[str]:
+        """Read the sha256 stored next to an S3 backup, or None if there is none"""
+        try:
+            response = s3_client.get_object(
+                Bucket=current_app.config['AWS_BUCKET_NAME'],
+                Key=f"{object_name}.sha256"
+            )
+            return response['Body'].read().decode().split()[0]
+        except (ClientError, IndexError):
+            return None
+    
+    @staticmethod
+    def _progress_logger(name: str, step: int = 10) -> Callable[[int, int], None]:
+        """Build a progress callback logging every step percent of a transfer"""
+        state = {'reported': -step}
+        
+        def report(done: int, total: int) -> None:
+            percent = 100 * done // total if total else 100
+            if percent >= state['reported'] + step:
+                state['reported'] = percent - percent % step
+                logging.info(f"{name}: {percent}% ({done} of {total} bytes)")
+        
+        return report
+    
+    def _dedup_repository(self) -> DedupRepository:
+        """The deduplicating repository in BACKUP_DIR, with the configured chunking"""
+        config = current_app.config
+        return DedupRepository(
+            os.path.join(config['BACKUP_DIR'], 'repository'),
+            Chunker(
+                config.get('BACKUP_DEDUP_CHUNK_MIN_SIZE', 128 * 1024),
+                config.get('BACKUP_DEDUP_CHUNK_AVG_SIZE', 512 * 1024),
+                config.get('BACKUP_DEDUP_CHUNK_MAX_SIZE', 2 * 1024 * 1024)
+            ),
+            pack_size=config.get('BACKUP_DEDUP_PACK_SIZE', 64 * 1024 * 1024),
+            level=config.get('BACKUP_DEDUP_COMPRESSION_LEVEL', 6),
+            concurrency=get_parallel_jobs()
+        )
     
     def _get_db_service(self, db_type: str) -> Union[MySQLService, PostgresService]:
         """Get the appropriate database service based on type"""
@@ -0,0 +1,686 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from app.features.backup.types import BackupError
+from app.utils.compression import CHUNK_SIZE, open_pipe
+from app.utils.s3_listing import list_objects
+
+SNAPSHOT_VERSION = 1
+INDEX_VERSION = 1
+
+# S3 prefix mirroring the local repository directory
+REMOTE_PREFIX = 'repository/'
+
+# Candidate cut points: line ends, and the row separators of the long
+# extended INSERT lines written by mysqldump
+BOUNDARY = re.compile(rb'\n|\),\(')
+
+# Bytes before a candidate whose hash decides if it becomes a cut point
+WINDOW_SIZE = 32
+
+# Where a chunk is stored: (pack id, offset, stored length, raw size, zlib compressed)
+ChunkLocation = Tuple[str, int, int, int, bool]
+
+
+def read_snapshot(path: str) -> Dict[str, Any]:
+    """Read a snapshot, checking its version"""
+    with open(path) as f:
+        return parse_snapshot(f.read())
+
+
+def parse_snapshot(data) -> Dict[str, Any]:
+    """Parse a snapshot's JSON, checking its version"""
+    snapshot = json.loads(data)
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        raise BackupError(f"Unsupported snapshot version: {snapshot.get('version')}")
+    return snapshot
+
+
+class Chunker:
+    """
+    Splits a stream into content-defined chunks.
+
+    Cut points depend only on the bytes just before them, so inserting or
+    removing rows in a dump only changes the chunks around the edit and
+    the rest deduplicate against the previous dump. Hashing a rolling
+    window at every byte is far too slow in Python, so only candidate
+    positions found by a regular expression (line ends and row separators)
+    are hashed, with crc32 over the preceding WINDOW_SIZE bytes.
+
+    As in FastCDC, a stricter mask is used below avg_size and a looser one
+    above it, which keeps chunk sizes close to the average. No chunk is
+    smaller than min_size (except the last) or larger than max_size.
+    """
+
+    def __init__(self, min_size: int, avg_size: int, max_size: int):
+        self.min_size = max(int(min_size), WINDOW_SIZE)
+        self.max_size = max(int(max_size), self.min_size)
+        self.avg_size = min(max(int(avg_size), self.min_size), self.max_size)
+
+        # Assumes a candidate about every 256 bytes
+        bits = max(1, (self.avg_size - self.min_size).bit_length() - 8)
+        self._strict = (1 << (bits + 2)) - 1
+        self._loose = (1 << max(bits - 2, 0)) - 1
+
+    def split(self, source: BinaryIO) -> Iterator[bytes]:
+        """Yield the chunks of a stream"""
+        buffer = bytearray()
+        eof = False
+        while True:
+            while not eof and len(buffer) < self.max_size:
+                data = source.read(CHUNK_SIZE)
+                if data:
+                    buffer += data
+                else:
+                    eof = True
+
+            if not buffer:
+                return
+
+            cut = self._cut_point(buffer)
+            yield bytes(buffer[:cut])
+            del buffer[:cut]
+
+    def _cut_point(self, buffer: bytearray) -> int:
+        """Find the end of the next chunk; buffer holds max_size bytes unless the stream ended"""
+        size = len(buffer)
+        if size <= self.min_size:
+            return size
+
+        end = min(size, self.max_size)
+        with memoryview(buffer) as view:
+            for match in BOUNDARY.finditer(buffer, self.min_size, end):
+                position = match.end()
+                mask = self._strict if position < self.avg_size else self._loose
+                if zlib.crc32(view[position - WINDOW_SIZE:position]) & mask == 0:
+                    return position
+        return end
+
+
+class PackWriter:
+    """
+    Appends chunks to a new pack file.
+
+    The pack is written as .partial and only becomes part of the
+    repository when commit() renames it and writes its index.
+    """
+
+    def __init__(self, root: str):
+        self.pack_id = uuid.uuid4().hex
+        self.root = root
+        self.entries: Dict[str, List] = {}
+        self.size = 0
+        self._path = os.path.join(root, 'packs', f"{self.pack_id}.pack")
+        self._file = open(f"{self._path}.partial", 'wb')
+
+    def add(self, digest: str, data: bytes, raw_size: int, compressed: bool) -> None:
+        """Append a stored chunk"""
+        self._file.write(data)
+        self.entries[digest] = [self.size, len(data), raw_size, compressed]
+        self.size += len(data)
+
+    def commit(self) -> Dict[str, ChunkLocation]:
+        """Make the pack durable and index it; returns the locations of its chunks"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(f"{self._path}.partial", self._path)
+
+        index_path = os.path.join(self.root, 'index', f"{self.pack_id}.json")
+        with open(f"{index_path}.tmp", 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'pack': self.pack_id, 'chunks': self.entries}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{index_path}.tmp", index_path)
+
+        return {digest: (self.pack_id, *entry) for digest, entry in self.entries.items()}
+
+    def abort(self) -> None:
+        """Discard the pack"""
+        self._file.close()
+        try:
+            os.remove(f"{self._path}.partial")
+        except OSError:
+            pass
+
+
+class SnapshotReader:
+    """
+    File-like reader reassembling the dump of a snapshot.
+
+    Chunks are fetched and decompressed ahead of the reader by a thread
+    pool, up to twice the concurrency. The size and sha256 of the whole
+    dump are checked when the last chunk has been read.
+    """
+
+    def __init__(self, snapshot: Dict[str, Any], fetch: Callable[[str], bytes], concurrency: int = 4):
+        self.snapshot = snapshot
+        self.bytes_read = 0
+        self._fetch = fetch
+        self._chunks = iter(snapshot['chunks'])
+        self._window = max(1, int(concurrency)) * 2
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(concurrency)), thread_name_prefix='dedup-read')
+        self._pending = deque()
+        self._buffer = b''
+        self._offset = 0
+        self._sha256 = hashlib.sha256()
+        self._done = False
+
+    def read(self, size: int = -1) -> bytes:
+        parts = []
+        remaining = size if size is not None and size >= 0 else None
+        while remaining is None or remaining > 0:
+            if self._offset >= len(self._buffer) and not self._next_chunk():
+                break
+            end = len(self._buffer) if remaining is None else self._offset + remaining
+            data = self._buffer[self._offset:end]
+            self._offset += len(data)
+            if remaining is not None:
+                remaining -= len(data)
+            parts.append(data)
+        return b''.join(parts)
+
+    def _next_chunk(self) -> bool:
+        if self._done:
+            return False
+
+        while len(self._pending) < self._window:
+            digest = next(self._chunks, None)
+            if digest is None:
+                break
+            self._pending.append(self._executor.submit(self._fetch, digest))
+
+        if not self._pending:
+            self._done = True
+            self._verify()
+            return False
+
+        self._buffer = self._pending.popleft().result()
+        self._offset = 0
+        self.bytes_read += len(self._buffer)
+        self._sha256.update(self._buffer)
+        return True
+
+    def _verify(self) -> None:
+        if self.bytes_read != self.snapshot.get('size', self.bytes_read):
+            raise BackupError(f"Snapshot size mismatch: expected {self.snapshot['size']}, got {self.bytes_read}")
+        if self.snapshot.get('sha256') and self._sha256.hexdigest() != self.snapshot['sha256']:
+            raise BackupError("Snapshot checksum mismatch")
+
+    def close(self) -> None:
+        for future in self._pending:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+class DedupRepository:
+    """
+    Content-addressed chunk store shared by deduplicated backups.
+
+    A dump is split into content-defined chunks that are addressed by their
+    sha256, so a chunk already stored by an earlier backup is not stored
+    again. New chunks are zlib compressed and appended to pack files of
+    about pack_size bytes:
+
+        <root>/packs/<pack id>.pack   concatenated stored chunks
+        <root>/index/<pack id>.json   chunk hash -> offset, length and size
+
+    The backup itself is a small snapshot file listing its chunks in order.
+    Snapshots live wherever the caller puts them (BACKUP_DIR), so they are
+    catalogued, uploaded and expired like any other backup. The same layout
+    is mirrored in S3 under REMOTE_PREFIX; only packs missing there are
+    uploaded.
+
+    Backups, uploads and restores hold a shared lock on the repository;
+    garbage collection takes it exclusively and only then lists the
+    snapshots, so it never removes a pack that is being written or read, or
+    one a snapshot written since depends on.
+    """
+
+    def __init__(self,
+                 root: str,
+                 chunker: Chunker,
+                 pack_size: int = 64 * 1024 * 1024,
+                 level: int = 6,
+                 concurrency: int = 4):
+        self.root = root
+        self.chunker = chunker
+        self.pack_size = int(pack_size)
+        self.level = int(level)
+        self.concurrency = max(1, int(concurrency))
+
+        for directory in ('packs', 'index'):
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+
+    @contextmanager
+    def lock(self, exclusive: bool = False) -> Iterator[None]:
+        """Hold the repository lock, shared unless exclusive"""
+        with open(os.path.join(self.root, 'lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def load_index(self) -> Dict[str, ChunkLocation]:
+        """Locations of every chunk in the repository"""
+        index: Dict[str, ChunkLocation] = {}
+        for pack_id, chunks in self._read_indexes().items():
+            for digest, entry in chunks.items():
+                index[digest] = (pack_id, *entry)
+        return index
+
+    def backup(self, source: BinaryIO, snapshot_path: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Store a dump stream and write its snapshot to snapshot_path.
+
+        Chunks are compressed by a thread pool while the stream is being
+        chunked. The snapshot is written last, so an interrupted backup
+        leaves at most unreferenced packs for garbage collection.
+
+        Returns:
+            dict: The snapshot, including how many bytes were newly stored
+        """
+        with self.lock():
+            index = self.load_index()
+            sha256 = hashlib.sha256()
+            chunks: List[str] = []
+            size = 0
+            stored = 0
+            in_flight: Set[str] = set()
+            pending = deque()
+            writer: Optional[PackWriter] = None
+
+            def write_next():
+                nonlocal writer, stored
+                digest, future = pending.popleft()
+                data, raw_size, compressed = future.result()
+                if writer is None:
+                    writer = PackWriter(self.root)
+                writer.add(digest, data, raw_size, compressed)
+                stored += len(data)
+                if writer.size >= self.pack_size:
+                    index.update(writer.commit())
+                    writer = None
+
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='dedup-write') as executor:
+                try:
+                    for chunk in self.chunker.split(source):
+                        digest = hashlib.sha256(chunk).hexdigest()
+                        sha256.update(chunk)
+                        size += len(chunk)
+                        chunks.append(digest)
+
+                        if digest in index or digest in in_flight:
+                            continue
+                        in_flight.add(digest)
+                        pending.append((digest, executor.submit(self._compress, chunk)))
+                        if len(pending) >= self.concurrency * 2:
+                            write_next()
+
+                    while pending:
+                        write_next()
+                    if writer is not None:
+                        index.update(writer.commit())
+                        writer = None
+                except BaseException:
+                    for _, future in pending:
+                        future.cancel()
+                    if writer is not None:
+                        writer.abort()
+                    raise
+
+            snapshot = {
+                **metadata,
+                'version': SNAPSHOT_VERSION,
+                'created': datetime.now().isoformat(),
+                'size': size,
+                'stored': stored,
+                'sha256': sha256.hexdigest(),
+                'compression': 'zlib',
+                'chunks': chunks
+            }
+            with open(f"{snapshot_path}.partial", 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(f"{snapshot_path}.partial", snapshot_path)
+
+            logging.info(f"Snapshot {os.path.basename(snapshot_path)}: {size} bytes in {len(chunks)} chunks, "
+                         f"{stored} bytes newly stored")
+            return snapshot
+
+    @contextmanager
+    def open_snapshot(self,
+                      snapshot: Dict[str, Any],
+                      s3_client=None,
+                      bucket: Optional[str] = None) -> Iterator[BinaryIO]:
+        """
+        Context manager yielding the reassembled dump of a snapshot as a pipe.
+
+        The yielded stream has a real file descriptor, so it can be passed
+        to a restore client as stdin. With an S3 client, chunks missing
+        from the local repository are read from the S3 mirror with ranged
+        GETs.
+        """
+        with self.lock():
+            local = self.load_index()
+            remote: Dict[str, ChunkLocation] = {}
+            if s3_client is not None and not set(snapshot['chunks']) <= local.keys():
+                remote = self.remote_index(s3_client, bucket)
+
+            files: Dict[str, int] = {}
+            files_lock = threading.Lock()
+
+            def read_local(location: ChunkLocation) -> bytes:
+                pack_id, offset, length = location[:3]
+                with files_lock:
+                    if pack_id not in files:
+                        files[pack_id] = os.open(self._pack_path(pack_id), os.O_RDONLY)
+                    fd = files[pack_id]
+                return os.pread(fd, length, offset)
+
+            def read_remote(location: ChunkLocation) -> bytes:
+                pack_id, offset, length = location[:3]
+                response = s3_client.get_object(
+                    Bucket=bucket,
+                    Key=self._remote_key('packs', f"{pack_id}.pack"),
+                    Range=f"bytes={offset}-{offset + length - 1}"
+                )
+                return response['Body'].read()
+
+            def fetch(digest: str) -> bytes:
+                if digest in local:
+                    location = local[digest]
+                    data = read_local(location)
+                elif digest in remote:
+                    location = remote[digest]
+                    data = read_remote(location)
+                else:
+                    raise BackupError(f"Chunk {digest} missing from the repository")
+
+                if location[4]:
+                    data = zlib.decompress(data)
+                if len(data) != location[3] or hashlib.sha256(data).hexdigest() != digest:
+                    raise BackupError(f"Chunk {digest} is corrupt")
+                return data
+
+            reader = SnapshotReader(snapshot, fetch, self.concurrency)
+            try:
+                with open_pipe(reader) as output:
+                    yield output
+            finally:
+                reader.close()
+                for fd in files.values():
+                    os.close(fd)
+
+    def gc(self, list_snapshots: Callable[[], Iterable[Dict[str, Any]]], repack_percent: int = 50) -> Dict[str, int]:
+        """
+        Remove chunks that no snapshot references.
+
+        Packs without any referenced chunk are deleted. Packs where less
+        than repack_percent of the stored bytes are still referenced are
+        rewritten with their live chunks only. Packs left without an index
+        by an interrupted backup are deleted too.
+
+        Args:
+            list_snapshots: Called under the exclusive lock for every
+                snapshot that uses the repository
+
+        Returns:
+            dict: Number of packs deleted and repacked, and bytes freed
+        """
+        result = {'packs_deleted': 0, 'packs_repacked': 0, 'freed_bytes': 0}
+
+        with self.lock(exclusive=True):
+            referenced = self._referenced(list_snapshots())
+            indexes = self._read_indexes()
+            writer: Optional[PackWriter] = None
+            # Repacked packs, removed once their live chunks are committed elsewhere
+            retired: List[str] = []
+
+            def commit():
+                nonlocal writer
+                writer.commit()
+                writer = None
+                for old_id in retired:
+                    self._remove_pack(old_id)
+                retired.clear()
+
+            for pack_id, chunks in indexes.items():
+                total = sum(entry[1] for entry in chunks.values())
+                live = {digest: entry for digest, entry in chunks.items() if digest in referenced}
+                live_bytes = sum(entry[1] for entry in live.values())
+
+                if live and live_bytes * 100 >= total * repack_percent:
+                    continue
+
+                result['freed_bytes'] += total - live_bytes
+                if not live:
+                    self._remove_pack(pack_id)
+                    result['packs_deleted'] += 1
+                    continue
+
+                with open(self._pack_path(pack_id), 'rb') as f:
+                    for digest, (offset, length, raw_size, compressed) in live.items():
+                        f.seek(offset)
+                        if writer is None:
+                            writer = PackWriter(self.root)
+                        writer.add(digest, f.read(length), raw_size, compressed)
+                retired.append(pack_id)
+                result['packs_repacked'] += 1
+                if writer.size >= self.pack_size:
+                    commit()
+
+            if writer is not None:
+                commit()
+
+            # Packs and temporary files left behind by interrupted backups
+            for directory in ('packs', 'index'):
+                for filename in os.listdir(os.path.join(self.root, directory)):
+                    temporary = filename.endswith(('.partial', '.tmp'))
+                    if temporary or not self._is_indexed(filename.split('.', 1)[0]):
+                        path = os.path.join(self.root, directory, filename)
+                        result['freed_bytes'] += os.path.getsize(path)
+                        os.remove(path)
+
+        return result
+
+    def push(self,
+             s3_client,
+             bucket: str,
+             snapshot: Dict[str, Any],
+             upload_snapshot: Optional[Callable[[], Any]] = None) -> int:
+        """
+        Upload the packs a snapshot needs that are not in S3 yet.
+
+        Each pack is uploaded before its index, so the S3 index never
+        points at a missing pack.
+
+        Args:
+            upload_snapshot: Called once the packs are in S3 to upload the
+                snapshot itself, still under the shared lock so garbage
+                collection can't remove the packs before S3 has a snapshot
+                referencing them
+
+        Returns:
+            int: Number of packs uploaded
+        """
+        with self.lock():
+            index = self.load_index()
+            missing = [digest for digest in set(snapshot['chunks']) if digest not in index]
+            if missing:
+                raise BackupError(f"{len(missing)} chunks of the snapshot are missing from the repository")
+
+            needed = {index[digest][0] for digest in snapshot['chunks']}
+            uploaded = needed - self._remote_pack_ids(s3_client, bucket)
+            for pack_id in sorted(uploaded):
+                s3_client.upload_file(self._pack_path(pack_id), bucket, self._remote_key('packs', f"{pack_id}.pack"))
+                s3_client.upload_file(self._index_path(pack_id), bucket, self._remote_key('index', f"{pack_id}.json"))
+            if upload_snapshot is not None:
+                upload_snapshot()
+            return len(uploaded)
+
+    def pull(self,
+             s3_client,
+             bucket: str,
+             snapshot: Dict[str, Any],
+             download: Callable[[str, str], Any]) -> int:
+        """
+        Download the packs holding chunks of a snapshot that are missing locally.
+
+        Args:
+            download: Called with (S3 key, local path) to fetch a pack
+
+        Returns:
+            int: Number of packs downloaded
+        """
+        with self.lock():
+            index = self.load_index()
+            missing = {digest for digest in snapshot['chunks'] if digest not in index}
+            if not missing:
+                return 0
+
+            remote = self.remote_index(s3_client, bucket)
+            absent = [digest for digest in missing if digest not in remote]
+            if absent:
+                raise BackupError(f"{len(absent)} chunks of the snapshot are missing from S3")
+
+            needed = sorted({remote[digest][0] for digest in missing})
+            for pack_id in needed:
+                download(self._remote_key('packs', f"{pack_id}.pack"), self._pack_path(pack_id))
+                body = s3_client.get_object(Bucket=bucket, Key=self._remote_key('index', f"{pack_id}.json"))['Body']
+                with open(f"{self._index_path(pack_id)}.tmp", 'wb') as f:
+                    f.write(body.read())
+                os.replace(f"{self._index_path(pack_id)}.tmp", self._index_path(pack_id))
+            return len(needed)
+
+    def remote_index(self, s3_client, bucket: str) -> Dict[str, ChunkLocation]:
+        """Locations of every chunk in the S3 mirror"""
+        index: Dict[str, ChunkLocation] = {}
+        for pack_id, chunks in self._read_remote_indexes(s3_client, bucket).items():
+            for digest, entry in chunks.items():
+                index[digest] = (pack_id, *entry)
+        return index
+
+    def remote_gc(self,
+                  s3_client,
+                  bucket: str,
+                  list_snapshots: Callable[[], Iterable[Dict[str, Any]]],
+                  delete: Callable[[List[str]], Any]) -> Dict[str, int]:
+        """
+        Delete the S3 packs that no S3 snapshot references.
+
+        Partly referenced packs are kept, since rewriting them would mean
+        downloading and uploading them again.
+
+        Args:
+            list_snapshots: Called under the exclusive lock for every
+                snapshot stored in S3
+            delete: Called with the keys to delete
+
+        Returns:
+            dict: Number of packs deleted and bytes freed
+        """
+        with self.lock(exclusive=True):
+            referenced = self._referenced(list_snapshots())
+            indexes = self._read_remote_indexes(s3_client, bucket)
+            keys: List[str] = []
+            packs = 0
+            freed = 0
+            for pack_id, chunks in indexes.items():
+                if not referenced.intersection(chunks):
+                    keys.extend([
+                        self._remote_key('packs', f"{pack_id}.pack"),
+                        self._remote_key('index', f"{pack_id}.json")
+                    ])
+                    packs += 1
+                    freed += sum(entry[1] for entry in chunks.values())
+
+            # Packs whose upload was interrupted before their index
+            objects, _ = list_objects(s3_client, bucket, self._remote_key('packs', ''))
+            for obj in objects:
+                if obj['Key'].rsplit('/', 1)[-1].split('.', 1)[0] not in indexes:
+                    keys.append(obj['Key'])
+                    packs += 1
+                    freed += obj['Size']
+
+            if keys:
+                delete(keys)
+            return {'packs_deleted': packs, 'freed_bytes': freed}
+
+    def _compress(self, chunk: bytes) -> Tuple[bytes, int, bool]:
+        """Compress a chunk, keeping it as is if that doesn't make it smaller"""
+        data = zlib.compress(chunk, self.level)
+        if len(data) < len(chunk):
+            return data, len(chunk), True
+        return chunk, len(chunk), False
+
+    def _read_indexes(self) -> Dict[str, Dict[str, List]]:
+        indexes: Dict[str, Dict[str, List]] = {}
+        directory = os.path.join(self.root, 'index')
+        for filename in os.listdir(directory):
+            if not filename.endswith('.json'):
+                continue
+            with open(os.path.join(directory, filename)) as f:
+                data = json.load(f)
+            indexes[data['pack']] = data['chunks']
+        return indexes
+
+    def _read_remote_indexes(self, s3_client, bucket: str) -> Dict[str, Dict[str, List]]:
+        objects, _ = list_objects(s3_client, bucket, self._remote_key('index', ''))
+
+        def fetch(key):
+            return json.loads(s3_client.get_object(Bucket=bucket, Key=key)['Body'].read())
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='dedup-index') as executor:
+            return {data['pack']: data['chunks'] for data in executor.map(fetch, [obj['Key'] for obj in objects])}
+
+    def _remote_pack_ids(self, s3_client, bucket: str) -> Set[str]:
+        objects, _ = list_objects(s3_client, bucket, self._remote_key('index', ''))
+        return {obj['Key'].rsplit('/', 1)[-1][:-len('.json')] for obj in objects}
+
+    def _remove_pack(self, pack_id: str) -> None:
+        # Index first: a pack without an index is cleaned up by the next run
+        for path in (self._index_path(pack_id), self._pack_path(pack_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _is_indexed(self, pack_id: str) -> bool:
+        return os.path.exists(self._index_path(pack_id))
+
+    def _pack_path(self, pack_id: str) -> str:
+        return os.path.join(self.root, 'packs', f"{pack_id}.pack")
+
+    def _index_path(self, pack_id: str) -> str:
+        return os.path.join(self.root, 'index', f"{pack_id}.json")
+
+    @staticmethod
+    def _remote_key(directory: str, filename: str) -> str:
+        return f"{REMOTE_PREFIX}{directory}/{filename}"
+
+    @staticmethod
+    def _referenced(snapshots: Iterable[Dict[str, Any]]) -> Set[str]:
+        referenced: Set[str] = set()
+        for snapshot in snapshots:
+            referenced.update(snapshot['chunks'])
+        return referenced
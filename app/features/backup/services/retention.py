@@ -0,0 +1,139 @@
+import json
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from flask import current_app
+
+from app.db.models import db, BackupLog, BackupSchedule, Config
+from app.features.backup.types import BackupError, RetentionPolicy
+
+# Grandfather-father-son periods, finest first, and the bucket a backup
+# time falls into for each of them
+PERIODS: Dict[str, Callable[[datetime], Tuple]] = {
+    'hourly': lambda when: (when.year, when.month, when.day, when.hour),
+    'daily': lambda when: (when.year, when.month, when.day),
+    'weekly': lambda when: tuple(when.isocalendar())[:2],
+    'monthly': lambda when: (when.year, when.month),
+}
+
+
+def policy_key(db_type: str, db_name: str) -> str:
+    """Config key holding the retention policy of a database"""
+    return f"retention_policy:{db_type}:{db_name}"
+
+
+def default_policy() -> RetentionPolicy:
+    """The BACKUP_KEEP_* settings as a retention policy"""
+    return {
+        period: int(current_app.config.get(f"BACKUP_KEEP_{period.upper()}", 0))
+        for period in PERIODS
+    }
+
+
+def parse_policy(value: Optional[str], fallback: RetentionPolicy) -> RetentionPolicy:
+    """Read a JSON retention policy, taking missing periods from fallback"""
+    if not value:
+        return fallback
+    try:
+        stored = json.loads(value)
+    except ValueError:
+        logging.warning(f"Ignoring invalid retention policy: {value}")
+        return fallback
+    return {period: int(stored.get(period, fallback[period])) for period in PERIODS}
+
+
+def get_policy(db_type: str, db_name: str, schedule_id: Optional[int] = None) -> RetentionPolicy:
+    """
+    Resolve the retention policy for a database's backups.
+
+    A schedule's policy applies to the backups it made, then the database's
+    own policy, then the BACKUP_KEEP_* defaults.
+    """
+    setting = Config.query.filter_by(key=policy_key(db_type, db_name)).first()
+    policy = parse_policy(setting.value if setting else None, default_policy())
+
+    if schedule_id is not None:
+        schedule = db.session.get(BackupSchedule, schedule_id)
+        if schedule is not None:
+            policy = parse_policy(schedule.retention_policy, policy)
+    return policy
+
+
+def set_policy(db_type: str, db_name: str, policy: RetentionPolicy) -> None:
+    """Store the retention policy of a database"""
+    key = policy_key(db_type, db_name)
+    setting = Config.query.filter_by(key=key).first()
+    if setting is None:
+        setting = Config(key=key, description=f"Backup retention for {db_type} database {db_name}")
+        db.session.add(setting)
+    setting.value = json.dumps({period: int(policy.get(period, 0)) for period in PERIODS})
+    db.session.commit()
+
+
+def select_kept(backups: Iterable[BackupLog], policy: RetentionPolicy) -> Set[int]:
+    """
+    Apply a grandfather-father-son policy to the backups of one database.
+
+    For each period the newest backup of each of the N most recent periods
+    that have a backup is kept. The newest backup overall is always kept.
+
+    Returns:
+        set: IDs of the catalog entries to keep
+    """
+    ordered = sorted(backups, key=lambda entry: entry.created_at, reverse=True)
+    if not ordered:
+        return set()
+
+    kept = {ordered[0].id}
+    for period, bucket in PERIODS.items():
+        count = policy.get(period, 0)
+        seen = set()
+        for entry in ordered:
+            if len(seen) >= count:
+                break
+            key = bucket(entry.created_at)
+            if key not in seen:
+                seen.add(key)
+                kept.add(entry.id)
+    return kept
+
+
+def plan_retention(location: Optional[str] = None,
+                   db_type: Optional[str] = None,
+                   db_name: Optional[str] = None) -> Dict[str, List[BackupLog]]:
+    """
+    Work out which catalogued backups the retention policies expire.
+
+    Backups are grouped per location, database and schedule. A policy of
+    all zeros disables retention for its group instead of expiring
+    everything but the newest backup.
+
+    Returns:
+        dict: Location (local or s3) mapped to the entries to delete
+    """
+    try:
+        query = BackupLog.query.filter_by(status='success')
+        if location:
+            query = query.filter_by(backup_type=location)
+        if db_type:
+            query = query.filter_by(db_type=db_type)
+        if db_name:
+            query = query.filter_by(db_name=db_name)
+
+        groups: Dict[Tuple, List[BackupLog]] = {}
+        for entry in query:
+            groups.setdefault((entry.backup_type, entry.db_type, entry.db_name, entry.schedule_id), []).append(entry)
+
+        expired: Dict[str, List[BackupLog]] = {'local': [], 's3': []}
+        for (group_location, group_type, group_name, schedule_id), entries in groups.items():
+            policy = get_policy(group_type, group_name, schedule_id)
+            if not any(policy.values()):
+                continue
+
+            kept = select_kept(entries, policy)
+            expired.setdefault(group_location, []).extend(entry for entry in entries if entry.id not in kept)
+        return expired
+    except Exception as e:
+        logging.error(f"Error planning backup retention: {str(e)}")
+        raise BackupError(f"Failed to plan backup retention: {str(e)}")
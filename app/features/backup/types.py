@@ -8,6 +8,7 @@ class BackupFrequency(str, Enum):
     HOURLY = "hourly"
     DAILY = "daily"
     WEEKLY = "weekly"
+    MONTHLY = "monthly"
 
 
 class BackupType(str, Enum):
@@ -21,6 +22,7 @@ class BackupFile(TypedDict):
     name: str
     size: float  # Size in MB
     date: datetime
+    compression: Optional[str]  # gzip, zstd, lz4 or None
 
 
 class ScheduledBackup(TypedDict):
@@ -31,7 +33,69 @@ class ScheduledBackup(TypedDict):
     db_type: str
     db_name: str
     upload_to_s3: bool
+    mode: str  # single, parallel, incremental or dedup
     last_run: Optional[datetime]
+    next_run: Optional[datetime]  # Only known in the scheduler's leader process
+    limits: Optional[Dict[str, Any]]  # Resource limit overrides of the schedule's runs
+
+
+class RetentionPolicy(TypedDict):
+    """Type definition for a grandfather-father-son retention policy"""
+    hourly: int  # Newest backup of each of the last N hours with a backup
+    daily: int
+    weekly: int
+    monthly: int
+
+
+class RetentionResult(TypedDict):
+    """Type definition for the outcome of a retention run"""
+    dry_run: bool
+    local: List[str]  # Names of expired local backups
+    s3: List[str]  # Keys of expired S3 backups
+    freed_bytes: int
+
+
+class BackupQueueStats(TypedDict):
+    """Type definition for the state of the backup job queue"""
+    workers: int  # Jobs each worker process runs at once
+    per_host: int  # Jobs allowed at once against one database server
+    depth: int  # Jobs waiting for a worker, in all processes
+    running: int
+    running_by_host: Dict[str, int]
+    oldest_wait_seconds: float  # Of the jobs still waiting
+    avg_wait_seconds: float  # Over the last jobs that started
+    max_wait_seconds: float
+    completed: int  # Finished jobs still kept in the job table
+    failed: int
+
+
+class BackupJobInfo(TypedDict):
+    """Type definition for a background backup or restore job"""
+    id: str
+    kind: str  # backup or restore
+    name: str
+    db_type: Optional[str]
+    db_name: Optional[str]
+    status: str  # queued, running, succeeded, failed or cancelled
+    bytes_done: int  # Of the backup being read, or of the dump written so far
+    bytes_total: Optional[int]  # None when the size isn't known up front
+    percent: Optional[float]
+    message: Optional[str]  # Error of a failed job
+    result: Any  # Return value of a successful job
+    cancel_requested: bool
+    created_at: Optional[datetime]
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    limits: Optional[Dict[str, Any]]  # Resource limits while the job runs
+
+
+class JobLimits(TypedDict):
+    """Type definition for the resource limits of a running backup or restore job"""
+    id: str
+    name: str
+    pid: int  # Worker process running the job
+    started: float  # Unix time
+    limits: Dict[str, Any]  # nice, io_class, io_priority, bandwidth_mbps, cpu_percent
 
 
 class BackupError(Exception):
@@ -2,10 +2,21 @@
 Database explorer controller for NEXDB.
 Provides a lightweight PHPMyAdmin-like interface for database management.
 """
-from flask import Blueprint, render_template, request, jsonify, current_app, flash, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, current_app, flash, redirect, url_for, Response, stream_with_context
 from app.auth.auth_manager import login_required, admin_required
-from app.features.database.utils import get_mysql_manager, get_postgres_manager, format_db_size
-import time
+from app.features.database.utils import (
+    get_mysql_manager, get_postgres_manager, format_db_size,
+    get_keyset_columns, encode_page_token, decode_page_token
+)
+from app.features.database.services.count_service import get_count_service
+from app.features.database.services.query_service import get_query_service
+from app.utils.query_stream import iter_ndjson, iter_csv, iter_parquet
+from app.utils.compression import compress_chunks, get_extension
+from app.utils.bulk_import import open_upload, import_csv
+from app.utils.search_plan import SearchTimeout
+from functools import partial
+from datetime import datetime
+import json
 
 blueprint = Blueprint('db_explorer', __name__)
 
@@ -23,19 +34,21 @@ def index():
     try:
         if db_type == 'mysql':
             db_manager = get_mysql_manager()
-            databases = db_manager.list_databases()
-            if not db_name and databases:
-                db_name = databases[0]['name']
         else:
             db_manager = get_postgres_manager()
-            databases = db_manager.list_databases()
-            if not db_name and databases:
-                db_name = databases[0]['name']
+        
+        # Database and table lists come from the schema cache
+        databases = [{'name': name, 'size': ''} for name in db_manager.list_databases()]
+        if not db_name and databases:
+            db_name = databases[0]['name']
         
         # Get tables for the selected database
         tables = []
         if db_name:
-            tables = db_manager.list_tables(db_name)
+            tables = [
+                dict(table, size=format_db_size(table['size'] or 0))
+                for table in db_manager.list_tables(db_name)
+            ]
     except Exception as e:
         flash(f"Error connecting to database: {str(e)}", "danger")
         databases = []
@@ -61,6 +74,9 @@ def view_table():
     search = request.args.get('search', '')
     sort_by = request.args.get('sort_by', '')
     sort_dir = request.args.get('sort_dir', 'asc')
+    pagination = request.args.get('pagination', 'keyset')
+    after = request.args.get('after')
+    before = request.args.get('before')
     
     if not db_type or not db_name or not table_name:
         flash('Missing required parameters', 'danger')
@@ -75,20 +91,67 @@ def view_table():
         # Get table structure
         structure = db_manager.get_table_structure(db_name, table_name)
         
+        # Work out which indexes the search can use; searches are stopped
+        # by the server after EXPLORER_SEARCH_TIMEOUT seconds
+        search_plan = db_manager.plan_search(db_name, table_name, search) if search else None
+        timeout = current_app.config.get('EXPLORER_SEARCH_TIMEOUT', 10) if search else None
+        
         # Get total records count
-        total_records = db_manager.count_records(db_name, table_name, search)
+        total_records, count_exact, count_status = get_record_count(db_type, db_manager, db_name, table_name, search)
+        count_capped = bool(search) and not count_exact
         
-        # Get table data
-        offset = (page - 1) * limit
-        data = db_manager.get_table_data(
-            db_name, 
-            table_name, 
-            offset=offset, 
-            limit=limit,
-            search=search,
-            sort_by=sort_by,
-            sort_dir=sort_dir
+        # Seek by a unique key when the sort order allows it, so deep pages
+        # cost the same as the first one
+        key_columns = get_keyset_columns(structure)
+        keyset = (
+            pagination == 'keyset' and bool(key_columns) and
+            (not sort_by or [sort_by] == key_columns)
         )
+        next_token = None
+        prev_token = None
+        
+        if keyset:
+            try:
+                after_values = decode_page_token(after, key_columns) if after else None
+                before_values = decode_page_token(before, key_columns) if before and not after else None
+            except ValueError as e:
+                flash(str(e), "warning")
+                after_values = before_values = None
+            
+            data, has_more = db_manager.get_table_data_keyset(
+                db_name,
+                table_name,
+                key_columns,
+                limit=limit,
+                after=after_values,
+                before=before_values,
+                search=search,
+                sort_dir=sort_dir,
+                timeout=timeout
+            )
+            
+            if before_values is not None:
+                has_prev, has_next = has_more, True
+            else:
+                has_prev, has_next = after_values is not None, has_more
+            
+            if data and has_next:
+                next_token = encode_page_token(data[-1], key_columns)
+            if data and has_prev:
+                prev_token = encode_page_token(data[0], key_columns)
+        else:
+            # Get table data
+            offset = (page - 1) * limit
+            data = db_manager.get_table_data(
+                db_name, 
+                table_name, 
+                offset=offset, 
+                limit=limit,
+                search=search,
+                sort_by=sort_by,
+                sort_dir=sort_dir,
+                timeout=timeout
+            )
         
         # Calculate pagination
         total_pages = (total_records + limit - 1) // limit
@@ -106,28 +169,115 @@ def view_table():
             total_pages=total_pages,
             search=search,
             sort_by=sort_by,
-            sort_dir=sort_dir
+            sort_dir=sort_dir,
+            pagination=pagination,
+            keyset=keyset,
+            next_token=next_token,
+            prev_token=prev_token,
+            count_exact=count_exact,
+            count_capped=count_capped,
+            count_status=count_status,
+            search_plan=search_plan
         )
+    except SearchTimeout as e:
+        flash(f"{str(e)}. Filter on an indexed column to narrow it down.", "warning")
+        return redirect(url_for('database.db_explorer.view_table', db_type=db_type, db_name=db_name, table_name=table_name,
+                                limit=limit, pagination=pagination))
     except Exception as e:
         flash(f"Error retrieving table data: {str(e)}", "danger")
         return redirect(url_for('database.db_explorer.index', db_type=db_type, db_name=db_name))
 
+def get_record_count(db_type, db_manager, db_name, table_name, search=''):
+    """
+    Get the row count to show for a table without scanning large tables.
+    
+    Small tables are counted exactly. Large ones use the estimate from table
+    statistics unless a background count for the same search has finished.
+    Searches of large tables count matches up to EXPLORER_SEARCH_COUNT_LIMIT.
+    
+    Returns:
+        tuple: (count, exact, status) where status is the background count state, if any
+    """
+    count_service = get_count_service(current_app.config.get('EXPLORER_COUNT_CACHE_TTL', 300))
+    status = count_service.get(db_type, db_name, table_name, search)
+    if status and status['status'] == 'done':
+        return status['count'], True, status
+    
+    timeout = current_app.config.get('EXPLORER_SEARCH_TIMEOUT', 10) if search else None
+    estimate = db_manager.estimate_records(db_name, table_name)
+    threshold = current_app.config.get('EXPLORER_EXACT_COUNT_THRESHOLD', 100000)
+    if estimate is None or estimate <= threshold:
+        return db_manager.count_records(db_name, table_name, search, timeout=timeout), True, status
+    
+    if search:
+        # Stop counting at the cap rather than scanning for every match
+        cap = current_app.config.get('EXPLORER_SEARCH_COUNT_LIMIT', 10000)
+        count = db_manager.count_records(db_name, table_name, search, limit=cap, timeout=timeout)
+        return count, count < cap, status
+    
+    return estimate, False, status
+
+@blueprint.route('/count', methods=['GET', 'POST'])
+@login_required
+def record_count():
+    """Start (POST) or poll (GET) an exact background row count"""
+    db_type = request.values.get('db_type')
+    db_name = request.values.get('db_name')
+    table_name = request.values.get('table_name')
+    search = request.values.get('search', '')
+    
+    if db_type not in ['mysql', 'postgres'] or not db_name or not table_name:
+        return jsonify({'success': False, 'message': 'Missing required parameters'}), 400
+    
+    count_service = get_count_service(current_app.config.get('EXPLORER_COUNT_CACHE_TTL', 300))
+    if request.method == 'POST':
+        db_manager = get_mysql_manager() if db_type == 'mysql' else get_postgres_manager()
+        status = count_service.start(db_manager, db_type, db_name, table_name, search)
+    else:
+        status = count_service.get(db_type, db_name, table_name, search)
+    
+    return jsonify({'success': True, 'data': status})
+
+@blueprint.route('/count/cancel', methods=['POST'])
+@login_required
+def cancel_record_count():
+    """Cancel a running background row count"""
+    db_type = request.form.get('db_type')
+    db_name = request.form.get('db_name')
+    table_name = request.form.get('table_name')
+    search = request.form.get('search', '')
+    
+    cancelled = get_count_service(current_app.config.get('EXPLORER_COUNT_CACHE_TTL', 300)).cancel(db_type, db_name, table_name, search)
+    return jsonify({'success': cancelled})
+
 @blueprint.route('/query', methods=['GET', 'POST'])
 @login_required
 def run_query():
-    """Run SQL query on database"""
+    """
+    Run SQL query on database.
+    
+    The query runs in the background under a time limit. The page waits up
+    to EXPLORER_QUERY_WAIT_SECONDS for it; a query still running then is
+    shown with a cancel button and picked up again with ?query_id=.
+    """
     db_type = request.args.get('db_type') or request.form.get('db_type', 'mysql')
     db_name = request.args.get('db_name') or request.form.get('db_name', '')
     query = request.form.get('query', '')
+    query_id = request.args.get('query_id')
     
     if not db_type or not db_name:
         flash('Database type and name are required', 'danger')
         return redirect(url_for('database.db_explorer.index'))
     
-    results = None
-    error = None
-    affected_rows = 0
-    execution_time = 0
+    max_timeout = current_app.config.get('EXPLORER_QUERY_MAX_TIMEOUT', 3600)
+    timeout = request.form.get('timeout', current_app.config.get('EXPLORER_QUERY_TIMEOUT', 60), type=int)
+    timeout = max(1, min(timeout, max_timeout))
+    
+    status = None
+    query_service = get_query_service(
+        current_app.config.get('EXPLORER_QUERY_WORKERS', 4),
+        current_app.config.get('EXPLORER_QUERY_RESULT_TTL', 300)
+    )
     
     if request.method == 'POST' and query:
         try:
@@ -136,22 +286,44 @@ def run_query():
             else:
                 db_manager = get_postgres_manager()
             
-            # Run query
-            query_type = query.strip().split(' ')[0].upper()
-            is_select = query_type == 'SELECT'
-            
-            start_time = time.time()
-            if is_select:
-                results = db_manager.run_query(db_name, query)
-                affected_rows = len(results)
-            else:
-                affected_rows = db_manager.execute_query(db_name, query)
-                results = []
-            execution_time = round((time.time() - start_time) * 1000, 2)  # ms
-            
-            flash(f"Query executed successfully. {affected_rows} rows affected. Execution time: {execution_time}ms", "success")
+            status = query_service.start(
+                db_manager,
+                db_type,
+                db_name,
+                query,
+                timeout,
+                current_app.config.get('EXPLORER_MAX_ROWS', 1000),
+                current_app.config.get('EXPLORER_MAX_BYTES', 5 * 1024 * 1024)
+            )
+            status = query_service.wait(status['id'], current_app.config.get('EXPLORER_QUERY_WAIT_SECONDS', 10))
         except Exception as e:
-            error = str(e)
+            flash(f"Error executing query: {str(e)}", "danger")
+    elif query_id:
+        status = query_service.get(query_id)
+        if status is None:
+            flash('The query result has expired, run the query again', 'warning')
+        else:
+            query = status['query']
+            timeout = status['timeout']
+    
+    results = None
+    error = None
+    affected_rows = 0
+    execution_time = 0
+    truncated = False
+    
+    if status is not None:
+        if status['status'] == 'done':
+            results = status['results']
+            affected_rows = status['affected_rows']
+            execution_time = status['execution_time']
+            truncated = status['truncated']
+            if truncated:
+                flash(f"Showing the first {affected_rows} rows. Download the result to get every row.", "warning")
+            else:
+                flash(f"Query executed successfully. {affected_rows} rows affected. Execution time: {execution_time}ms", "success")
+        elif status['status'] in ('failed', 'cancelled'):
+            error = status['error']
             flash(f"Error executing query: {error}", "danger")
     
     return render_template(
@@ -162,9 +334,211 @@ def run_query():
         results=results,
         error=error,
         affected_rows=affected_rows,
-        execution_time=execution_time
+        execution_time=execution_time,
+        truncated=truncated,
+        is_select=query.strip().split(' ')[0].upper() == 'SELECT',
+        timeout=timeout,
+        max_timeout=max_timeout,
+        running_query=status if status and status['status'] == 'running' else None
     )
 
+@blueprint.route('/query/status')
+@login_required
+def query_status():
+    """Poll the state of a background query, without its rows"""
+    status = get_query_service().get(request.args.get('query_id', ''))
+    if status is None:
+        return jsonify({'success': False, 'message': 'Unknown query'}), 404
+    
+    status = dict(status, results=None)
+    return jsonify({'success': True, 'data': status})
+
+@blueprint.route('/query/cancel', methods=['POST'])
+@login_required
+def cancel_query():
+    """Cancel a running query, stopping it on the server"""
+    cancelled = get_query_service().cancel(request.form.get('query_id', ''))
+    return jsonify({'success': cancelled})
+
+# Export formats: (mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', '.csv'),
+    'ndjson': ('application/x-ndjson', '.ndjson'),
+    'parquet': ('application/vnd.apache.parquet', '.parquet')
+}
+
+@blueprint.route('/export', methods=['GET', 'POST'])
+@blueprint.route('/query/stream', methods=['POST'])
+@login_required
+def export_data():
+    """
+    Stream a whole table (table_name) or the result of a SELECT (query) as
+    CSV, NDJSON or Parquet, optionally gzip or zstd compressed.
+    
+    Rows are read through COPY TO STDOUT (PostgreSQL CSV) or a server-side
+    cursor and sent in a chunked response as they are read, so an export
+    runs in constant memory however large the table is.
+    """
+    db_type = request.values.get('db_type', 'mysql')
+    db_name = request.values.get('db_name', '')
+    table_name = request.values.get('table_name', '')
+    query = request.values.get('query', '')
+    output_format = request.values.get('format', 'ndjson')
+    compression = request.values.get('compression', 'none')
+    
+    if not db_name or not (table_name or query):
+        flash('Database name and a table or query are required', 'danger')
+        return redirect(url_for('database.db_explorer.index'))
+    
+    if table_name:
+        back_url = url_for('database.db_explorer.view_table', db_type=db_type, db_name=db_name, table_name=table_name)
+    else:
+        back_url = url_for('database.db_explorer.run_query', db_type=db_type, db_name=db_name)
+    
+    if not table_name and query.strip().split(' ')[0].upper() != 'SELECT':
+        flash('Only SELECT queries can be exported', 'danger')
+        return redirect(back_url)
+    
+    if output_format not in EXPORT_FORMATS or compression not in ['none', 'gzip', 'zstd']:
+        flash('Invalid output format', 'danger')
+        return redirect(back_url)
+    
+    try:
+        if db_type == 'mysql':
+            db_manager = get_mysql_manager()
+        else:
+            db_manager = get_postgres_manager()
+        
+        if output_format == 'csv' and db_type == 'postgres':
+            body = db_manager.copy_out(db_name, table_name=table_name or None, query=query or None)
+        else:
+            if table_name:
+                stream = db_manager.stream_table(db_name, table_name)
+            else:
+                stream = db_manager.stream_query(db_name, query)
+            
+            if output_format == 'csv':
+                body = iter_csv(stream)
+            elif output_format == 'ndjson':
+                body = iter_ndjson(stream)
+            else:
+                # Parquet compresses its own pages
+                body = iter_parquet(
+                    stream,
+                    row_group_rows=current_app.config.get('EXPLORER_EXPORT_ROW_GROUP_ROWS', 65536),
+                    compression='snappy' if compression == 'none' else compression
+                )
+        
+        # Started before compression, whose output would otherwise begin
+        # with a gzip/zstd header before a bad query fails
+        body = start_body(body)
+        mimetype, extension = EXPORT_FORMATS[output_format]
+        if output_format != 'parquet' and compression != 'none':
+            body = start_body(compress_chunks(
+                body, compression, current_app.config.get('EXPLORER_EXPORT_COMPRESSION_LEVEL', 3)
+            ))
+            mimetype = f"application/{compression}"
+            extension += get_extension(compression)
+    except Exception as e:
+        flash(f"Error exporting data: {str(e)}", "danger")
+        return redirect(back_url)
+    
+    filename = f"{table_name or db_name + '_query'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def start_body(body):
+    """
+    Read the first chunk of a response body now, so errors raised before
+    any data is produced (bad SQL, missing tools) can still be reported.
+    """
+    first = next(body, None)
+    
+    def chunks():
+        try:
+            if first is not None:
+                yield first
+            yield from body
+        finally:
+            body.close()
+    
+    return chunks()
+
+@blueprint.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_table():
+    """
+    Bulk import a CSV or TSV file into a table.
+    
+    GET shows the import form. POST takes the file, optionally gzip
+    compressed, as the raw request body with the options in the query
+    string, so rows are loaded while the upload is still arriving, and
+    returns the import report.
+    """
+    db_type = request.args.get('db_type')
+    db_name = request.args.get('db_name')
+    table_name = request.args.get('table_name')
+    
+    if db_type not in ['mysql', 'postgres'] or not db_name or not table_name:
+        if request.method == 'POST':
+            return jsonify({'success': False, 'message': 'Missing required parameters'}), 400
+        flash('Missing required parameters', 'danger')
+        return redirect(url_for('database.db_explorer.index'))
+    
+    max_batch_size = current_app.config.get('EXPLORER_IMPORT_BATCH_ROWS', 50000)
+    
+    try:
+        if db_type == 'mysql':
+            db_manager = get_mysql_manager()
+        else:
+            db_manager = get_postgres_manager()
+        
+        structure = db_manager.get_table_structure(db_name, table_name)
+    except Exception as e:
+        if request.method == 'POST':
+            return jsonify({'success': False, 'message': str(e)}), 500
+        flash(f"Error retrieving table structure: {str(e)}", "danger")
+        return redirect(url_for('database.db_explorer.index', db_type=db_type, db_name=db_name))
+    
+    if request.method == 'GET':
+        return render_template(
+            'database/explorer/import.html',
+            db_type=db_type,
+            db_name=db_name,
+            table_name=table_name,
+            structure=structure,
+            batch_size=max_batch_size
+        )
+    
+    try:
+        mapping = json.loads(request.args['mapping']) if request.args.get('mapping') else None
+        if mapping is not None and not isinstance(mapping, list):
+            raise ValueError('mapping must be a list')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f"Invalid column mapping: {str(e)}"}), 400
+    
+    filename = request.args.get('filename', '')
+    compressed = request.args.get('compression') == 'gzip' or filename.endswith('.gz')
+    batch_size = max(1, min(request.args.get('batch_size', max_batch_size, type=int), max_batch_size))
+    
+    text, counter = open_upload(request.stream, compressed=compressed)
+    report = import_csv(
+        text,
+        [column['name'] for column in structure],
+        partial(db_manager.bulk_loader, db_name, table_name),
+        mapping=mapping,
+        header=request.args.get('header', '1') == '1',
+        delimiter='\t' if request.args.get('format') == 'tsv' else ',',
+        null_value=request.args.get('null', ''),
+        batch_size=batch_size,
+        max_errors=current_app.config.get('EXPLORER_IMPORT_MAX_ERRORS', 100),
+        counter=counter
+    )
+    
+    return jsonify({'success': not report['aborted'], 'data': report})
+
 @blueprint.route('/record', methods=['GET', 'POST'])
 @login_required
 def edit_record():
@@ -257,4 +631,54 @@ def delete_record():
     except Exception as e:
         flash(f"Error deleting record: {str(e)}", "danger")
     
-    return redirect(url_for('database.db_explorer.view_table', db_type=db_type, db_name=db_name, table_name=table_name)) 
\ No newline at end of file
+    return redirect(url_for('database.db_explorer.view_table', db_type=db_type, db_name=db_name, table_name=table_name))
+
+@blueprint.route('/truncate-table', methods=['POST'])
+@login_required
+def truncate_table():
+    """Delete every row of a table"""
+    db_type = request.form.get('db_type')
+    db_name = request.form.get('db_name')
+    table_name = request.form.get('table_name')
+    
+    if not db_type or not db_name or not table_name:
+        flash('Missing required parameters', 'danger')
+        return redirect(url_for('database.db_explorer.index'))
+    
+    try:
+        if db_type == 'mysql':
+            db_manager = get_mysql_manager()
+        else:
+            db_manager = get_postgres_manager()
+        
+        db_manager.truncate_table(db_name, table_name)
+        flash(f'Table {table_name} truncated successfully', 'success')
+    except Exception as e:
+        flash(f"Error truncating table: {str(e)}", "danger")
+    
+    return redirect(url_for('database.db_explorer.view_table', db_type=db_type, db_name=db_name, table_name=table_name))
+
+@blueprint.route('/drop-table', methods=['POST'])
+@login_required
+def drop_table():
+    """Drop a table"""
+    db_type = request.form.get('db_type')
+    db_name = request.form.get('db_name')
+    table_name = request.form.get('table_name')
+    
+    if not db_type or not db_name or not table_name:
+        flash('Missing required parameters', 'danger')
+        return redirect(url_for('database.db_explorer.index'))
+    
+    try:
+        if db_type == 'mysql':
+            db_manager = get_mysql_manager()
+        else:
+            db_manager = get_postgres_manager()
+        
+        db_manager.drop_table(db_name, table_name)
+        flash(f'Table {table_name} dropped successfully', 'success')
+    except Exception as e:
+        flash(f"Error dropping table: {str(e)}", "danger")
+    
+    return redirect(url_for('database.db_explorer.index', db_type=db_type, db_name=db_name))
\ No newline at end of file
@@ -0,0 +1,53 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from app.features.database.types import DatabaseError
+from app.utils.compression import file_checksum
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+def is_parallel_backup(path: str) -> bool:
+    """Check if a path is a parallel backup directory"""
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST_NAME))
+
+
+def read_manifest(backup_dir: str, engine: Optional[str] = None) -> Dict[str, Any]:
+    """Read the manifest of a parallel backup, checking its version and engine"""
+    with open(os.path.join(backup_dir, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise DatabaseError(f"Unsupported backup manifest version: {manifest.get('version')}")
+    if engine and manifest.get('engine') != engine:
+        raise DatabaseError(f"Backup was made by {manifest.get('engine')}, not {engine}")
+    return manifest
+
+
+def write_manifest(backup_dir: str, manifest: Dict[str, Any]) -> None:
+    """Write the manifest of a parallel backup"""
+    with open(os.path.join(backup_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def checksum_files(backup_dir: str, jobs: int = 1) -> Dict[str, str]:
+    """Compute the sha256 of every file in a backup directory except the manifest"""
+    names = sorted(name for name in os.listdir(backup_dir) if name != MANIFEST_NAME)
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        checksums = executor.map(file_checksum, [os.path.join(backup_dir, name) for name in names])
+        return dict(zip(names, checksums))
+
+
+def verify_files(backup_dir: str, expected: Dict[str, str], jobs: int = 1) -> None:
+    """Raise if any file listed in a manifest is missing or has a different checksum"""
+    missing: List[str] = [name for name in expected if not os.path.exists(os.path.join(backup_dir, name))]
+    if missing:
+        raise DatabaseError(f"Backup files missing: {', '.join(missing)}")
+
+    actual = checksum_files(backup_dir, jobs)
+    mismatched = [name for name, checksum in expected.items() if actual.get(name) != checksum]
+    if mismatched:
+        raise DatabaseError(f"Checksum mismatch for backup files: {', '.join(mismatched)}")
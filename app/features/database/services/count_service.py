@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from app.features.database.types import RowCountStatus
+
+
+class RowCountService:
+    """Runs exact COUNT(*) queries in the background and caches their results"""
+
+    def __init__(self, max_workers: int = 2, ttl: int = 300):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='row-count')
+        self._jobs: Dict[Tuple[str, str, str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.ttl = ttl
+
+    def get(self, db_type: str, db_name: str, table_name: str, search: str = '') -> Optional[RowCountStatus]:
+        """Get the state of the count for a table and search, if one is known"""
+        key = (db_type, db_name, table_name, search)
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(key)
+            return self._status(job) if job else None
+
+    def start(self, db_manager: Any, db_type: str, db_name: str, table_name: str, search: str = '') -> RowCountStatus:
+        """Start counting in the background unless a count is running or cached"""
+        key = (db_type, db_name, table_name, search)
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(key)
+            if job and job['status'] in ('running', 'done'):
+                return self._status(job)
+
+            job = {
+                'status': 'running',
+                'count': None,
+                'error': None,
+                'started': time.time(),
+                'finished': None,
+                'session_id': None,
+                # Held while the session is killed, so its connection isn't
+                # handed to another request in the meantime
+                'session_lock': threading.Lock(),
+                'manager': db_manager
+            }
+            self._jobs[key] = job
+
+        self._executor.submit(self._run, job, db_manager, db_name, table_name, search)
+        return self._status(job)
+
+    def cancel(self, db_type: str, db_name: str, table_name: str, search: str = '') -> bool:
+        """Cancel a running count by stopping its query on the server"""
+        key = (db_type, db_name, table_name, search)
+        with self._lock:
+            job = self._jobs.get(key)
+            if not job or job['status'] != 'running':
+                return False
+            job['status'] = 'cancelled'
+            job['finished'] = time.time()
+
+        # The session id is cleared before the connection goes back to the pool
+        with job['session_lock']:
+            if job['session_id'] is not None:
+                job['manager'].cancel_session(job['session_id'])
+        return True
+
+    def _run(self, job: Dict[str, Any], db_manager: Any, db_name: str, table_name: str, search: str) -> None:
+        def on_session(session_id):
+            with job['session_lock']:
+                if session_id is not None and job['status'] == 'cancelled':
+                    raise RuntimeError("Count cancelled")
+                job['session_id'] = session_id
+
+        try:
+            count = db_manager.count_records(db_name, table_name, search, on_session=on_session)
+        except Exception as e:
+            with self._lock:
+                if job['status'] == 'running':
+                    logging.error(f"Error counting rows of {db_name}.{table_name}: {str(e)}")
+                    job['status'] = 'failed'
+                    job['error'] = str(e)
+                    job['finished'] = time.time()
+            return
+
+        with self._lock:
+            if job['status'] == 'running':
+                job['status'] = 'done'
+                job['count'] = count
+                job['finished'] = time.time()
+
+    def _expire(self) -> None:
+        """Drop finished counts older than the TTL"""
+        cutoff = time.time() - self.ttl
+        for key, job in list(self._jobs.items()):
+            if job['finished'] is not None and job['finished'] < cutoff:
+                del self._jobs[key]
+
+    @staticmethod
+    def _status(job: Dict[str, Any]) -> RowCountStatus:
+        return {
+            'status': job['status'],
+            'count': job['count'],
+            'error': job['error'],
+            'started': job['started'],
+            'finished': job['finished']
+        }
+
+
+# Create a singleton instance
+_count_service = None
+
+def get_count_service(ttl: int = 300) -> RowCountService:
+    """Get the row count service singleton"""
+    global _count_service
+    if _count_service is None:
+        _count_service = RowCountService(ttl=ttl)
+    return _count_service
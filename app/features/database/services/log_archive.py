@@ -0,0 +1,341 @@
+import logging
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.features.database.types import DatabaseError
+from app.features.database.services.backup_manifest import (
+    MANIFEST_VERSION, read_manifest, write_manifest, checksum_files, verify_files
+)
+from app.utils.compression import (
+    COMPRESSORS, compress_file, decompress_command, dump_pipeline, open_backup,
+    strip_compression_extension, CompressionError
+)
+from app.utils.throttle import current_limits, run_limited
+
+# Replication slot that keeps WAL on the server between archive runs
+WAL_SLOT_NAME = 'nexdb_archive'
+
+WAL_SEGMENT = re.compile(r'^[0-9A-F]{24}$')
+WAL_HISTORY = re.compile(r'^[0-9A-F]{8}\.history$')
+
+
+def _archived_files(archive_dir: str) -> Dict[str, str]:
+    """Archived log names, without compression extension, mapped to their paths"""
+    files: Dict[str, str] = {}
+    if not os.path.isdir(archive_dir):
+        return files
+
+    for filename in os.listdir(archive_dir):
+        path = os.path.join(archive_dir, filename)
+        if filename.startswith('.') or filename.endswith(('.sha256', '.partial')) or not os.path.isfile(path):
+            continue
+        files[strip_compression_extension(filename)] = path
+    return files
+
+
+class MySQLBinlogArchive:
+    """
+    Copies closed MySQL binary logs into an archive directory and replays them.
+
+    Together with a parallel backup, which records the binlog position of its
+    snapshot, this allows restoring a database to any point in time covered
+    by the archive.
+    """
+
+    def __init__(self, service: Any, archive_dir: str, compression: Optional[str] = None, level: Optional[int] = None):
+        self.service = service
+        self.archive_dir = archive_dir
+        self.compression = compression
+        self.level = level
+
+    def archive(self) -> List[str]:
+        """
+        Rotate the binary log and archive every closed binlog not archived yet.
+
+        Returns:
+            list: Paths of the newly archived files
+        """
+        if not self.service.check_binary_exists('mysqlbinlog'):
+            raise DatabaseError("mysqlbinlog binary not found. Please install MySQL client tools.")
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+        with self.service.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("FLUSH BINARY LOGS")
+            cursor.execute("SHOW BINARY LOGS")
+            logs = [row[0] for row in cursor.fetchall()]
+            cursor.close()
+
+        # The newest binlog is still being written
+        closed = logs[:-1]
+        archived = _archived_files(self.archive_dir)
+        pending = [name for name in closed if name not in archived]
+
+        if archived and logs and self._number(min(logs)) > self._number(max(archived)) + 1:
+            logging.warning(f"Binary logs after {max(archived)} were purged before they were archived")
+
+        if not pending:
+            return []
+
+        cmd = [
+            'mysqlbinlog',
+            '--read-from-remote-server',
+            '--raw',
+            f'--host={self.service.host}',
+            f'--port={str(self.service.port)}',
+            f'--user={self.service.user}',
+            f'--result-file={self.archive_dir}{os.sep}',
+            *pending
+        ]
+        env = os.environ.copy()
+        env['MYSQL_PWD'] = self.service.password
+
+        subprocess.run(cmd, env=env, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        return [
+            compress_file(os.path.join(self.archive_dir, name), self.compression, self.level)
+            for name in pending
+        ]
+
+    def replay(self, db_name: str, source_db: str, start_file: str, start_position: int, stop_time: datetime) -> None:
+        """
+        Apply archived binlog events for source_db to db_name.
+
+        Events are replayed from start_position in start_file, the position
+        recorded by the base backup, up to stop_time (local time).
+        """
+        for binary in ('mysqlbinlog', 'mysql'):
+            if not self.service.check_binary_exists(binary):
+                raise DatabaseError(f"{binary} binary not found. Please install MySQL client tools.")
+
+        archived = _archived_files(self.archive_dir)
+        names = sorted(name for name in archived if name >= start_file)
+        if not names or names[0] != start_file:
+            raise DatabaseError(f"Binary log {start_file} is not in the archive")
+
+        numbers = [self._number(name) for name in names]
+        if numbers != list(range(numbers[0], numbers[0] + len(numbers))):
+            raise DatabaseError("The binary log archive has gaps; cannot replay to the requested time")
+
+        with tempfile.TemporaryDirectory(dir=self.archive_dir, prefix='.replay-') as workdir:
+            # mysqlbinlog needs plain files to carry positions across logs
+            files = []
+            for name in names:
+                path = os.path.join(workdir, name)
+                with open_backup(archived[name]) as source, open(path, 'wb') as out:
+                    shutil.copyfileobj(source, out)
+                files.append(path)
+
+            cmd = [
+                'mysqlbinlog',
+                f'--start-position={int(start_position)}',
+                f"--stop-datetime={stop_time.strftime('%Y-%m-%d %H:%M:%S')}",
+                f'--database={db_name}'
+            ]
+            # --database applies to the rewritten name
+            if db_name != source_db:
+                cmd.append(f'--rewrite-db={source_db}->{db_name}')
+            cmd.extend(files)
+
+            mysql_cmd = [
+                'mysql',
+                f'--host={self.service.host}',
+                f'--port={str(self.service.port)}',
+                f'--user={self.service.user}',
+                db_name
+            ]
+            env = os.environ.copy()
+            env['MYSQL_PWD'] = self.service.password
+
+            with dump_pipeline(cmd) as events:
+                subprocess.run(mysql_cmd, stdin=events, env=env, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    @staticmethod
+    def _number(name: str) -> int:
+        """Sequence number of a binlog file name such as binlog.000042"""
+        suffix = name.rsplit('.', 1)[-1]
+        return int(suffix) if suffix.isdigit() else -1
+
+
+class PostgresWalArchive:
+    """
+    Streams PostgreSQL WAL into an archive directory and prepares PITR restores.
+
+    WAL is received through a physical replication slot so the server keeps
+    every segment until it has been archived. WAL and base backups cover the
+    whole cluster, not a single database.
+    """
+
+    def __init__(self, service: Any, archive_dir: str, compression: Optional[str] = None, level: Optional[int] = None):
+        self.service = service
+        self.archive_dir = archive_dir
+        self.compression = compression
+        self.level = level
+        # pg_receivewal resumes from the newest segment it finds here
+        self.staging_dir = os.path.join(archive_dir, '.receive')
+
+    def archive(self) -> List[str]:
+        """
+        Switch to a new WAL segment and archive every completed segment.
+
+        Returns:
+            list: Paths of the newly archived files
+        """
+        if not self.service.check_binary_exists('pg_receivewal'):
+            raise DatabaseError("pg_receivewal binary not found. Please install PostgreSQL client tools.")
+
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+        with self.service.connection() as conn:
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM pg_replication_slots WHERE slot_name = %s", (WAL_SLOT_NAME,))
+            if cursor.fetchone() is None:
+                cursor.execute("SELECT pg_create_physical_replication_slot(%s, true)", (WAL_SLOT_NAME,))
+            cursor.execute("SELECT pg_switch_wal()")
+            cursor.execute("SELECT pg_current_wal_lsn()")
+            end_lsn = cursor.fetchone()[0]
+            cursor.close()
+
+        cmd = [
+            'pg_receivewal',
+            f'--host={self.service.host}',
+            f'--port={str(self.service.port)}',
+            f'--username={self.service.user}',
+            '--no-password',
+            f'--directory={self.staging_dir}',
+            f'--slot={WAL_SLOT_NAME}',
+            f'--endpos={end_lsn}',
+            '--no-loop'
+        ]
+        env = os.environ.copy()
+        env['PGPASSWORD'] = self.service.password
+
+        subprocess.run(cmd, env=env, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        archived = _archived_files(self.archive_dir)
+        received = sorted(name for name in os.listdir(self.staging_dir) if WAL_SEGMENT.match(name) or WAL_HISTORY.match(name))
+        paths = []
+        for name in received:
+            if name in archived:
+                continue
+            target = os.path.join(self.archive_dir, name)
+            shutil.copyfile(os.path.join(self.staging_dir, name), target)
+            paths.append(compress_file(target, self.compression, self.level))
+
+        # Keep the newest complete segment so the next run resumes after it
+        segments = [name for name in received if WAL_SEGMENT.match(name)]
+        for name in segments[:-1]:
+            os.remove(os.path.join(self.staging_dir, name))
+
+        return paths
+
+    def base_backup(self, backup_dir: str) -> Dict[str, Any]:
+        """
+        Take a physical base backup of the cluster with pg_basebackup.
+
+        Returns:
+            dict: The backup manifest
+        """
+        if not self.service.check_binary_exists('pg_basebackup'):
+            raise DatabaseError("pg_basebackup binary not found. Please install PostgreSQL client tools.")
+
+        partial_dir = f"{backup_dir}.partial"
+        cmd = [
+            'pg_basebackup',
+            f'--host={self.service.host}',
+            f'--port={str(self.service.port)}',
+            f'--username={self.service.user}',
+            '--no-password',
+            f'--pgdata={partial_dir}',
+            '--format=tar',
+            '--gzip',
+            '--wal-method=stream',
+            '--checkpoint=fast'
+        ]
+        env = os.environ.copy()
+        env['PGPASSWORD'] = self.service.password
+
+        # pg_basebackup caps its own transfer rate, in kB/s from 32 upwards
+        limits = current_limits()
+        bandwidth = limits.limits.get('bandwidth_mbps') if limits is not None else None
+        if bandwidth:
+            cmd.append(f'--max-rate={max(32, int(bandwidth * 1024))}')
+
+        try:
+            run_limited(cmd, limits, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+            # The backup is consistent from the moment pg_basebackup finishes
+            manifest = {
+                'version': MANIFEST_VERSION,
+                'engine': 'pg-basebackup',
+                'created': datetime.now().isoformat(),
+                'files': checksum_files(partial_dir)
+            }
+            write_manifest(partial_dir, manifest)
+            os.rename(partial_dir, backup_dir)
+            return manifest
+        except Exception:
+            shutil.rmtree(partial_dir, ignore_errors=True)
+            raise
+
+    def prepare_restore(self, base_dir: str, stop_time: datetime, target_dir: str) -> str:
+        """
+        Build a data directory that recovers to stop_time when started.
+
+        The base backup is extracted into target_dir and configured to fetch
+        WAL from the archive. Start a PostgreSQL server on target_dir to run
+        the recovery; it is promoted once the target time is reached.
+
+        Returns:
+            str: The prepared data directory
+        """
+        manifest = read_manifest(base_dir, 'pg-basebackup')
+        verify_files(base_dir, manifest['files'])
+
+        if os.path.exists(target_dir) and os.listdir(target_dir):
+            raise DatabaseError(f"Restore directory is not empty: {target_dir}")
+        os.makedirs(target_dir, exist_ok=True)
+        os.chmod(target_dir, 0o700)
+
+        subprocess.run(['tar', '-xzf', os.path.join(base_dir, 'base.tar.gz'), '-C', target_dir],
+                       check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        wal_tar = os.path.join(base_dir, 'pg_wal.tar.gz')
+        if os.path.exists(wal_tar):
+            wal_dir = os.path.join(target_dir, 'pg_wal')
+            os.makedirs(wal_dir, exist_ok=True)
+            subprocess.run(['tar', '-xzf', wal_tar, '-C', wal_dir],
+                           check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        target_time = stop_time.astimezone().isoformat(sep=' ')
+        with open(os.path.join(target_dir, 'postgresql.auto.conf'), 'a') as f:
+            f.write("\n# Point-in-time recovery configured by NEXDB\n")
+            f.write(f"restore_command = '{self._restore_command()}'\n")
+            f.write(f"recovery_target_time = '{target_time}'\n")
+            f.write("recovery_target_action = 'promote'\n")
+
+        open(os.path.join(target_dir, 'recovery.signal'), 'w').close()
+        return target_dir
+
+    def _restore_command(self) -> str:
+        """Shell command fetching a (possibly compressed) segment from the archive"""
+        source = shlex.quote(os.path.abspath(self.archive_dir)) + '/%f'
+        branches = [f'if [ -f {source} ]; then cp {source} %p']
+        for method, info in COMPRESSORS.items():
+            try:
+                command = ' '.join(decompress_command(method))
+            except CompressionError:
+                # Not installed here; segments compressed with it can't be read
+                continue
+            branches.append(f'elif [ -f {source}{info["extension"]} ]; then {command} < {source}{info["extension"]} > %p')
+        command = '; '.join(branches) + '; else exit 1; fi'
+        # Quote for postgresql.conf
+        return command.replace("'", "''")
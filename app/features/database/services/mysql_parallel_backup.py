@@ -0,0 +1,489 @@
+import logging
+import math
+import os
+import queue
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pymysql
+from werkzeug.utils import secure_filename
+
+from app.features.database.types import DatabaseError
+from app.features.database.services.backup_manifest import MANIFEST_VERSION, read_manifest, write_manifest
+from app.utils.compression import get_extension, open_compressed, open_backup, file_checksum
+
+# Primary key types that can be split into numeric ranges
+INTEGER_TYPES = ('tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint')
+
+# Column of the statement in SHOW CREATE output, by object kind
+CREATE_COLUMNS = {'TABLE': 1, 'VIEW': 1, 'PROCEDURE': 2, 'FUNCTION': 2, 'TRIGGER': 2, 'EVENT': 3}
+
+
+class MySQLParallelBackup:
+    """
+    Dumps and loads a MySQL database table by table across several connections.
+
+    All dump connections start their transaction under FLUSH TABLES WITH READ
+    LOCK, so every table is read from the same point in time. Large tables
+    with an integer primary key are split into primary key ranges. Each chunk
+    is written as compressed INSERT statements, one statement per line, and a
+    manifest describes the schema, views, stored routines, triggers, events
+    and the chunk files.
+    """
+
+    def __init__(self,
+                 service: Any,
+                 workers: int = 4,
+                 chunk_rows: int = 1000000,
+                 compression: Optional[str] = None,
+                 level: Optional[int] = None,
+                 insert_bytes: int = 1024 * 1024,
+                 limits: Optional[Any] = None,
+                 progress: Optional[Callable[[int, int], None]] = None):
+        self.service = service
+        self.workers = max(1, int(workers))
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.compression = compression
+        self.level = level
+        self.insert_bytes = insert_bytes
+        # ResourceLimits of the job; the worker threads don't inherit the context
+        self.limits = limits
+        # Progress callback of the job, given the chunk bytes restored so far
+        self.progress = progress
+
+    def backup(self, db_name: str, backup_dir: str) -> Dict[str, Any]:
+        """
+        Dump a database into backup_dir.
+
+        The directory is built under a temporary name and renamed once every
+        chunk has been written.
+
+        Returns:
+            dict: The backup manifest
+        """
+        partial_dir = f"{backup_dir}.partial"
+        os.makedirs(partial_dir)
+
+        coordinator = self.service.get_connection(db_name)
+        connections = []
+        try:
+            connections = [self.service.get_connection(db_name) for _ in range(self.workers)]
+            snapshot = self._open_snapshot(coordinator, connections)
+
+            tables, views = self._list_objects(connections[0], db_name)
+            manifest = {
+                'version': MANIFEST_VERSION,
+                'engine': 'mysql-parallel',
+                'database': db_name,
+                'created': datetime.now().isoformat(),
+                'compression': self.compression,
+                **snapshot,
+                'tables': [],
+                'views': [],
+                'routines': self._dump_programs(connections[0], db_name, 'ROUTINE'),
+                'triggers': self._dump_programs(connections[0], db_name, 'TRIGGER'),
+                'events': self._dump_programs(connections[0], db_name, 'EVENT')
+            }
+
+            tasks = []
+            for index, table in enumerate(tables):
+                entry = {
+                    'name': table,
+                    'create': self._show_create(connections[0], 'TABLE', table),
+                    'columns': self._dump_columns(connections[0], db_name, table),
+                    'chunks': []
+                }
+                prefix = f"{index:04d}-{secure_filename(table) or 'table'}"
+                for number, (where, params) in enumerate(self._plan_chunks(connections[0], db_name, table)):
+                    chunk = {'file': f"{prefix}.{number:05d}.sql{get_extension(self.compression)}"}
+                    entry['chunks'].append(chunk)
+                    tasks.append((table, entry['columns'], where, params, chunk))
+                manifest['tables'].append(entry)
+
+            for view in views:
+                manifest['views'].append({
+                    'name': view,
+                    'create': self._strip_definer(self._show_create(connections[0], 'VIEW', view))
+                })
+
+            # Hand out snapshot connections to the worker threads
+            available = queue.Queue()
+            for conn in connections:
+                available.put(conn)
+
+            def run(task):
+                conn = available.get()
+                try:
+                    self._dump_chunk(conn, partial_dir, *task)
+                finally:
+                    available.put(conn)
+
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='mysql-dump') as executor:
+                # list() re-raises the first failure
+                list(executor.map(run, tasks))
+
+            write_manifest(partial_dir, manifest)
+
+            os.rename(partial_dir, backup_dir)
+            return manifest
+        except Exception:
+            shutil.rmtree(partial_dir, ignore_errors=True)
+            raise
+        finally:
+            for conn in [coordinator] + connections:
+                self._close_quietly(conn)
+
+    def restore(self, backup_dir: str, db_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Load a parallel backup, running the data chunks concurrently.
+
+        Tables are recreated first, then chunks are loaded with foreign key
+        and unique checks disabled. Stored routines and views are created
+        after the data, then triggers so they don't fire on the loaded rows,
+        and events last so none runs against a half-restored database.
+
+        Returns:
+            dict: The backup manifest
+        """
+        manifest = read_manifest(backup_dir, 'mysql-parallel')
+        db_name = db_name or manifest['database']
+        self.service.create_database(db_name)
+
+        conn = self.service.get_connection(db_name)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SET foreign_key_checks = 0")
+            for table in manifest['tables']:
+                cursor.execute(f"DROP TABLE IF EXISTS {self._quote(table['name'])}")
+                cursor.execute(table['create'])
+            cursor.close()
+        finally:
+            self._close_quietly(conn)
+
+        chunks = [chunk for table in manifest['tables'] for chunk in table['chunks']]
+        total = sum(chunk.get('size', 0) for chunk in chunks)
+        loaded = [0]
+        progress_lock = threading.Lock()
+        connections = []
+        try:
+            connections = [self.service.get_connection(db_name) for _ in range(min(self.workers, max(1, len(chunks))))]
+            available = queue.Queue()
+            for conn in connections:
+                self._prepare_load_session(conn)
+                available.put(conn)
+
+            def run(chunk):
+                conn = available.get()
+                try:
+                    self._load_chunk(conn, backup_dir, chunk)
+                finally:
+                    available.put(conn)
+                if self.progress is not None:
+                    with progress_lock:
+                        loaded[0] += chunk.get('size', 0)
+                        self.progress(loaded[0], total)
+
+            with ThreadPoolExecutor(max_workers=len(connections), thread_name_prefix='mysql-load') as executor:
+                list(executor.map(run, chunks))
+
+            cursor = connections[0].cursor()
+            # Views may call stored functions
+            self._restore_programs(cursor, manifest.get('routines', []))
+            for view in manifest['views']:
+                cursor.execute(f"DROP VIEW IF EXISTS {self._quote(view['name'])}")
+                cursor.execute(view['create'])
+            self._restore_programs(cursor, manifest.get('triggers', []))
+            self._restore_programs(cursor, manifest.get('events', []))
+            cursor.close()
+        finally:
+            for conn in connections:
+                self._close_quietly(conn)
+
+        return manifest
+
+    def _open_snapshot(self, coordinator: Any, connections: List[Any]) -> Dict[str, Any]:
+        """Start a consistent snapshot transaction on every dump connection"""
+        cursor = coordinator.cursor()
+        try:
+            cursor.execute("FLUSH TABLES WITH READ LOCK")
+            locked = True
+        except pymysql.MySQLError as e:
+            # Managed servers often deny RELOAD; each connection still gets a
+            # snapshot, but they may be taken at slightly different times
+            logging.warning(f"Could not lock tables for a consistent snapshot: {str(e)}")
+            locked = False
+
+        try:
+            for conn in connections:
+                worker_cursor = conn.cursor()
+                worker_cursor.execute("SET SESSION time_zone = '+00:00'")
+                worker_cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                worker_cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+                worker_cursor.close()
+
+            binlog = self._binlog_position(cursor)
+        finally:
+            if locked:
+                cursor.execute("UNLOCK TABLES")
+            cursor.close()
+
+        return {'consistent': locked, 'binlog': binlog}
+
+    @staticmethod
+    def _binlog_position(cursor: Any) -> Optional[Dict[str, Any]]:
+        """Read the binary log coordinates of the snapshot, if binary logging is on"""
+        # MySQL 8.4 renamed SHOW MASTER STATUS
+        for statement in ("SHOW BINARY LOG STATUS", "SHOW MASTER STATUS"):
+            try:
+                cursor.execute(statement)
+                row = cursor.fetchone()
+            except pymysql.MySQLError:
+                continue
+            if not row:
+                return None
+            columns = [d[0] for d in cursor.description]
+            status = dict(zip(columns, row))
+            return {
+                'file': status.get('File'),
+                'position': status.get('Position'),
+                'gtid_executed': status.get('Executed_Gtid_Set') or None
+            }
+        return None
+
+    def _list_objects(self, conn: Any, db_name: str) -> Tuple[List[str], List[str]]:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT TABLE_NAME, TABLE_TYPE FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = %s
+            ORDER BY TABLE_NAME
+            """,
+            (db_name,)
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+
+        tables = [name for name, table_type in rows if table_type == 'BASE TABLE']
+        views = [name for name, table_type in rows if table_type == 'VIEW']
+        return tables, views
+
+    def _show_create(self, conn: Any, kind: str, name: str) -> str:
+        cursor = conn.cursor()
+        cursor.execute(f"SHOW CREATE {kind} {self._quote(name)}")
+        row = cursor.fetchone()
+        cursor.close()
+        statement = row[CREATE_COLUMNS[kind]]
+        # Without the privileges to read its body, a routine shows as NULL
+        if statement is None:
+            raise DatabaseError(f"Not allowed to read the definition of {kind.lower()} {name}")
+        return statement
+
+    def _dump_programs(self, conn: Any, db_name: str, family: str) -> List[Dict[str, Any]]:
+        """
+        Read the stored routines, triggers or events of a database.
+
+        Each is saved with the sql_mode (and, for events, the time zone) it
+        was created under, which govern how its body runs, and without its
+        DEFINER.
+        """
+        cursor = conn.cursor()
+        if family == 'ROUTINE':
+            cursor.execute(
+                """
+                SELECT ROUTINE_TYPE, ROUTINE_NAME, SQL_MODE, NULL FROM information_schema.ROUTINES
+                WHERE ROUTINE_SCHEMA = %s
+                ORDER BY ROUTINE_TYPE, ROUTINE_NAME
+                """,
+                (db_name,)
+            )
+        elif family == 'TRIGGER':
+            cursor.execute(
+                """
+                SELECT 'TRIGGER', TRIGGER_NAME, SQL_MODE, NULL FROM information_schema.TRIGGERS
+                WHERE TRIGGER_SCHEMA = %s
+                ORDER BY EVENT_OBJECT_TABLE, ACTION_TIMING, EVENT_MANIPULATION, ACTION_ORDER
+                """,
+                (db_name,)
+            )
+        else:
+            cursor.execute(
+                """
+                SELECT 'EVENT', EVENT_NAME, SQL_MODE, TIME_ZONE FROM information_schema.EVENTS
+                WHERE EVENT_SCHEMA = %s
+                ORDER BY EVENT_NAME
+                """,
+                (db_name,)
+            )
+        rows = cursor.fetchall()
+        cursor.close()
+
+        return [
+            {
+                'kind': kind,
+                'name': name,
+                'sql_mode': sql_mode,
+                'time_zone': time_zone,
+                'create': self._strip_definer(self._show_create(conn, kind, name))
+            }
+            for kind, name, sql_mode, time_zone in rows
+        ]
+
+    def _restore_programs(self, cursor: Any, programs: List[Dict[str, Any]]) -> None:
+        """Recreate stored routines, triggers or events under their own sql_mode"""
+        for program in programs:
+            cursor.execute(f"DROP {program['kind']} IF EXISTS {self._quote(program['name'])}")
+            cursor.execute("SET SESSION sql_mode = %s", (program['sql_mode'],))
+            cursor.execute("SET SESSION time_zone = %s", (program['time_zone'] or '+00:00',))
+            cursor.execute(program['create'])
+
+    def _dump_columns(self, conn: Any, db_name: str, table: str) -> List[str]:
+        """Columns that can be inserted into, i.e. all but generated ones"""
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT COLUMN_NAME FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND EXTRA NOT LIKE '%%GENERATED%%'
+            ORDER BY ORDINAL_POSITION
+            """,
+            (db_name, table)
+        )
+        columns = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        return columns
+
+    def _plan_chunks(self, conn: Any, db_name: str, table: str) -> List[Tuple[str, Optional[tuple]]]:
+        """Split a table into primary key ranges of about chunk_rows rows"""
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT k.COLUMN_NAME, c.DATA_TYPE
+            FROM information_schema.KEY_COLUMN_USAGE k
+            JOIN information_schema.COLUMNS c
+              ON c.TABLE_SCHEMA = k.TABLE_SCHEMA
+             AND c.TABLE_NAME = k.TABLE_NAME
+             AND c.COLUMN_NAME = k.COLUMN_NAME
+            WHERE k.TABLE_SCHEMA = %s AND k.TABLE_NAME = %s AND k.CONSTRAINT_NAME = 'PRIMARY'
+            """,
+            (db_name, table)
+        )
+        key = cursor.fetchall()
+        cursor.execute(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s",
+            (db_name, table)
+        )
+        row = cursor.fetchone()
+        estimate = int(row[0] or 0) if row else 0
+
+        # Only single-column integer keys can be split into ranges
+        if len(key) != 1 or key[0][1].lower() not in INTEGER_TYPES or estimate <= self.chunk_rows:
+            cursor.close()
+            return [('', None)]
+
+        column = self._quote(key[0][0])
+        cursor.execute(f"SELECT MIN({column}), MAX({column}) FROM {self._quote(table)}")
+        low, high = cursor.fetchone()
+        cursor.close()
+        if low is None:
+            return [('', None)]
+
+        chunks = math.ceil(estimate / self.chunk_rows)
+        step = max(1, math.ceil((high - low + 1) / chunks))
+        ranges = []
+        for start in range(low, high + 1, step):
+            ranges.append((f"WHERE {column} >= %s AND {column} < %s", (start, start + step)))
+        return ranges
+
+    def _dump_chunk(self, conn: Any, backup_dir: str, table: str, columns: List[str],
+                    where: str, params: Optional[tuple], chunk: Dict[str, Any]) -> None:
+        """Write the rows of one chunk as multi-row INSERT statements"""
+        path = os.path.join(backup_dir, chunk['file'])
+        rows = 0
+
+        cursor = conn.cursor(pymysql.cursors.SSCursor)
+        try:
+            columns = ', '.join(self._quote(column) for column in columns)
+            cursor.execute(f"SELECT {columns} FROM {self._quote(table)} {where}", params)
+            prefix = f"INSERT INTO {self._quote(table)} ({columns}) VALUES "
+
+            with open_compressed(path, self.compression, self.level, limits=self.limits) as out:
+                values = []
+                size = 0
+                while True:
+                    batch = cursor.fetchmany(1000)
+                    if not batch:
+                        break
+                    for row in batch:
+                        value = '(' + ','.join(conn.escape(item) for item in row) + ')'
+                        values.append(value)
+                        size += len(value)
+                        rows += 1
+                        if size >= self.insert_bytes:
+                            self._write(out, prefix + ','.join(values) + ';\n')
+                            values = []
+                            size = 0
+                if values:
+                    self._write(out, prefix + ','.join(values) + ';\n')
+        finally:
+            cursor.close()
+
+        chunk['rows'] = rows
+        chunk['size'] = os.path.getsize(path)
+        chunk['sha256'] = file_checksum(path)
+
+    def _load_chunk(self, conn: Any, backup_dir: str, chunk: Dict[str, Any]) -> None:
+        """Execute the INSERT statements of one chunk in a single transaction"""
+        path = os.path.join(backup_dir, chunk['file'])
+        if chunk.get('sha256') and file_checksum(path) != chunk['sha256']:
+            raise DatabaseError(f"Checksum mismatch for backup chunk {chunk['file']}")
+
+        cursor = conn.cursor()
+        try:
+            with open_backup(path, self.limits) as source:
+                for line in source:
+                    if self.limits is not None:
+                        self.limits.throttle(len(line))
+                    statement = line.decode('utf-8').strip()
+                    if statement:
+                        cursor.execute(statement)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def _write(self, out: Any, statement: str) -> None:
+        """Write a statement to a chunk file, held to the job's bandwidth cap"""
+        data = statement.encode('utf-8')
+        if self.limits is not None:
+            self.limits.throttle(len(data))
+        out.write(data)
+
+    @staticmethod
+    def _prepare_load_session(conn: Any) -> None:
+        cursor = conn.cursor()
+        cursor.execute("SET SESSION time_zone = '+00:00'")
+        cursor.execute("SET SESSION foreign_key_checks = 0")
+        cursor.execute("SET SESSION unique_checks = 0")
+        cursor.close()
+        conn.autocommit(False)
+
+    @staticmethod
+    def _strip_definer(statement: str) -> str:
+        """Drop DEFINER clauses so views and stored programs can be created by the restoring user"""
+        return re.sub(r"DEFINER=`(?:[^`]|``)*`@`(?:[^`]|``)*`\s*", '', statement)
+
+    @staticmethod
+    def _quote(identifier: str) -> str:
+        return '`' + identifier.replace('`', '``') + '`'
+
+    @staticmethod
+    def _close_quietly(conn: Any) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
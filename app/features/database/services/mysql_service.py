@@ -2,11 +2,20 @@ import subprocess
 import os
 import logging
 import pymysql
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, BinaryIO, Optional, Tuple
+from datetime import datetime
 from flask import current_app
 from werkzeug.utils import secure_filename
 
 from app.features.database.types import DatabaseError
+from app.utils.mysql_pool import get_pool
+from app.utils.compression import compression_options, get_extension, dump_to_file, open_backup
+from app.utils.progress import current_progress
+from app.utils.schema_cache import get_schema_cache
+from app.utils.throttle import current_limits, run_limited
+from app.features.database.services.mysql_parallel_backup import MySQLParallelBackup
+from app.features.database.services.backup_manifest import is_parallel_backup
+from app.features.database.utils import get_parallel_jobs
 
 
 class MySQLService:
@@ -18,6 +27,8 @@ class MySQLService:
         self.port = current_app.config.get('MYSQL_PORT', 3306)
         self.user = current_app.config.get('MYSQL_USER', 'root')
         self.password = current_app.config.get('MYSQL_PASSWORD', '')
+        # Identifies the server in the schema cache
+        self.server = f"mysql://{self.host}:{self.port}"
     
     def get_connection(self, database: str = '') -> pymysql.connections.Connection:
         """Get a MySQL connection"""
@@ -34,6 +45,19 @@ class MySQLService:
             logging.error(f"MySQL connection error: {str(e)}")
             raise DatabaseError(f"Failed to connect to MySQL: {str(e)}")
     
+    def connection(self, database: str = ''):
+        """Check out a pooled MySQL connection for use in a with block"""
+        pool = get_pool(
+            'pymysql',
+            self.host,
+            self.port,
+            self.user,
+            self.password,
+            database,
+            lambda: self.get_connection(database)
+        )
+        return pool.connection()
+    
     def check_binary_exists(self, binary: str) -> bool:
         """Check if a binary exists in PATH"""
         try:
@@ -48,22 +72,20 @@ class MySQLService:
     def get_status(self) -> bool:
         """Check if MySQL is running"""
         try:
-            conn = self.get_connection()
-            conn.close()
-            return True
+            with self.connection():
+                return True
         except:
             return False
     
     def list_databases(self) -> List[str]:
         """List all databases"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SHOW DATABASES")
-            databases = [row[0] for row in cursor.fetchall() 
-                        if row[0] not in ('information_schema', 'performance_schema', 'mysql', 'sys')]
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SHOW DATABASES")
+                databases = [row[0] for row in cursor.fetchall() 
+                            if row[0] not in ('information_schema', 'performance_schema', 'mysql', 'sys')]
+                cursor.close()
             return databases
         except Exception as e:
             logging.error(f"Error listing MySQL databases: {str(e)}")
@@ -72,12 +94,11 @@ class MySQLService:
     def list_users(self) -> List[Dict[str, Any]]:
         """List all MySQL users"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT User, Host FROM mysql.user")
-            users = [{'user': row[0], 'host': row[1]} for row in cursor.fetchall()]
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT User, Host FROM mysql.user")
+                users = [{'user': row[0], 'host': row[1]} for row in cursor.fetchall()]
+                cursor.close()
             return users
         except Exception as e:
             logging.error(f"Error listing MySQL users: {str(e)}")
@@ -89,11 +110,11 @@ class MySQLService:
             # Sanitize db_name to prevent SQL injection
             db_name = db_name.replace('`', '').replace('\\', '').replace('/', '')
             
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{db_name}`")
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{db_name}`")
+                cursor.close()
+            get_schema_cache().invalidate(self.server, db_name)
             return True
         except Exception as e:
             logging.error(f"Error creating MySQL database: {str(e)}")
@@ -105,11 +126,11 @@ class MySQLService:
             # Sanitize db_name to prevent SQL injection
             db_name = db_name.replace('`', '').replace('\\', '').replace('/', '')
             
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(f"DROP DATABASE IF EXISTS `{db_name}`")
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"DROP DATABASE IF EXISTS `{db_name}`")
+                cursor.close()
+            get_schema_cache().invalidate(self.server, db_name)
             return True
         except Exception as e:
             logging.error(f"Error deleting MySQL database: {str(e)}")
@@ -122,20 +143,19 @@ class MySQLService:
             username = username.replace('`', '').replace('\\', '').replace('/', '')
             host = host.replace('`', '').replace('\\', '').replace('/', '')
             
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Check if MySQL 8.0+ (different user creation syntax)
-            cursor.execute("SELECT VERSION()")
-            version = cursor.fetchone()[0]
-            
-            if int(version.split('.')[0]) >= 8:
-                cursor.execute(f"CREATE USER IF NOT EXISTS '{username}'@'{host}' IDENTIFIED BY %s", (password,))
-            else:
-                cursor.execute(f"CREATE USER IF NOT EXISTS '{username}'@'{host}' IDENTIFIED BY PASSWORD(%s)", (password,))
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                
+                # Check if MySQL 8.0+ (different user creation syntax)
+                cursor.execute("SELECT VERSION()")
+                version = cursor.fetchone()[0]
                 
-            cursor.close()
-            conn.close()
+                if int(version.split('.')[0]) >= 8:
+                    cursor.execute(f"CREATE USER IF NOT EXISTS '{username}'@'{host}' IDENTIFIED BY %s", (password,))
+                else:
+                    cursor.execute(f"CREATE USER IF NOT EXISTS '{username}'@'{host}' IDENTIFIED BY PASSWORD(%s)", (password,))
+                    
+                cursor.close()
             return True
         except Exception as e:
             logging.error(f"Error creating MySQL user: {str(e)}")
@@ -149,12 +169,11 @@ class MySQLService:
             db_name = db_name.replace('`', '').replace('\\', '').replace('/', '')
             host = host.replace('`', '').replace('\\', '').replace('/', '')
             
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(f"GRANT ALL PRIVILEGES ON `{db_name}`.* TO '{username}'@'{host}'")
-            cursor.execute("FLUSH PRIVILEGES")
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"GRANT ALL PRIVILEGES ON `{db_name}`.* TO '{username}'@'{host}'")
+                cursor.execute("FLUSH PRIVILEGES")
+                cursor.close()
             return True
         except Exception as e:
             logging.error(f"Error granting MySQL privileges: {str(e)}")
@@ -167,11 +186,10 @@ class MySQLService:
             username = username.replace('`', '').replace('\\', '').replace('/', '')
             host = host.replace('`', '').replace('\\', '').replace('/', '')
             
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(f"DROP USER IF EXISTS '{username}'@'{host}'")
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"DROP USER IF EXISTS '{username}'@'{host}'")
+                cursor.close()
             return True
         except Exception as e:
             logging.error(f"Error deleting MySQL user: {str(e)}")
@@ -184,64 +202,90 @@ class MySQLService:
             username = username.replace('`', '').replace('\\', '').replace('/', '')
             host = host.replace('`', '').replace('\\', '').replace('/', '')
             
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Check if MySQL 8.0+ (different password change syntax)
-            cursor.execute("SELECT VERSION()")
-            version = cursor.fetchone()[0]
-            
-            if int(version.split('.')[0]) >= 8:
-                cursor.execute(f"ALTER USER '{username}'@'{host}' IDENTIFIED BY %s", (new_password,))
-            else:
-                cursor.execute(f"SET PASSWORD FOR '{username}'@'{host}' = PASSWORD(%s)", (new_password,))
+            with self.connection() as conn:
+                cursor = conn.cursor()
                 
-            cursor.close()
-            conn.close()
+                # Check if MySQL 8.0+ (different password change syntax)
+                cursor.execute("SELECT VERSION()")
+                version = cursor.fetchone()[0]
+                
+                if int(version.split('.')[0]) >= 8:
+                    cursor.execute(f"ALTER USER '{username}'@'{host}' IDENTIFIED BY %s", (new_password,))
+                else:
+                    cursor.execute(f"SET PASSWORD FOR '{username}'@'{host}' = PASSWORD(%s)", (new_password,))
+                    
+                cursor.close()
             return True
         except Exception as e:
             logging.error(f"Error changing MySQL password: {str(e)}")
             raise DatabaseError(f"Failed to change password: {str(e)}")
     
-    def backup_database(self, db_name: str, backup_path: Optional[str] = None) -> str:
-        """Backup a database to a file"""
+    def dump_command(self, db_name: str, compressed: bool = False,
+                     extended_insert: bool = True) -> Tuple[List[str], Dict[str, str]]:
+        """
+        Build the mysqldump command writing a database to stdout.
+        
+        Without extended_insert every row gets its own INSERT statement, so a
+        changed row doesn't shift the rest of the dump's lines.
+        
+        Returns:
+            tuple: (command, environment) for subprocess
+        """
+        if not self.check_binary_exists('mysqldump'):
+            raise DatabaseError("mysqldump binary not found. Please install MySQL client tools.")
+        
+        # Build command with proper escaping
+        cmd = [
+            'mysqldump',
+            f'--host={self.host}',
+            f'--port={str(self.port)}',
+            f'--user={self.user}',
+            '--add-drop-database',
+            '--databases',
+            secure_filename(db_name)
+        ]
+        if not extended_insert:
+            cmd.insert(-2, '--skip-extended-insert')
+        
+        # Use environment for password to avoid it showing in process list
+        env = os.environ.copy()
+        env['MYSQL_PWD'] = self.password
+        return cmd, env
+    
+    def backup_database(self, db_name: str, backup_path: Optional[str] = None,
+                        compression: Optional[str] = None, mode: Optional[str] = None) -> str:
+        """
+        Backup a database, compressed on the fly unless compression is 'none'.
+        
+        mode 'single' (the default from BACKUP_MODE) writes one mysqldump file;
+        'parallel' dumps tables concurrently from a consistent snapshot into a
+        directory of chunk files with a manifest.
+        """
         try:
-            # Check if mysqldump is available
-            if not self.check_binary_exists('mysqldump'):
-                raise DatabaseError("mysqldump binary not found. Please install MySQL client tools.")
-            
             # Sanitize db_name
             db_name = secure_filename(db_name)
             
+            compression, level, threads = compression_options(current_app.config, compression)
+            mode = mode or current_app.config.get('BACKUP_MODE', 'single')
+            
             # Generate backup path if not provided
             if backup_path is None:
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"{db_name}_{timestamp}.sql"
+                if mode == 'parallel':
+                    filename = f"{db_name}_{timestamp}.parallel"
+                else:
+                    filename = f"{db_name}_{timestamp}.sql{get_extension(compression)}"
                 backup_path = os.path.join(current_app.config['BACKUP_DIR'], filename)
             
-            # Build command with proper escaping
-            cmd = [
-                'mysqldump',
-                f'--host={self.host}',
-                f'--port={str(self.port)}',
-                f'--user={self.user}',
-                '--add-drop-database',
-                '--databases',
-                db_name
-            ]
+            if mode == 'parallel':
+                self._parallel_backup(compression, level).backup(db_name, backup_path)
+                return backup_path
             
-            # Use environment for password to avoid it showing in process list
-            env = os.environ.copy()
-            env['MYSQL_PWD'] = self.password
+            cmd, env = self.dump_command(db_name)
             
-            # Run the backup command
-            with open(backup_path, 'wb') as f:
-                process = subprocess.run(
-                    cmd,
-                    stdout=f,
-                    env=env,
-                    check=True
-                )
+            # Stream the dump through the compressor straight into the backup file
+            dump_to_file(cmd, backup_path, env=env, compression=compression, level=level, threads=threads,
+                         limits=current_limits(), progress=current_progress())
             
             return backup_path
         except subprocess.SubprocessError as e:
@@ -252,16 +296,40 @@ class MySQLService:
             raise DatabaseError(f"Backup failed: {str(e)}")
     
     def restore_database(self, backup_path: str, db_name: Optional[str] = None) -> bool:
-        """Restore a database from a backup file"""
+        """Restore a database from a backup file or parallel backup directory"""
         try:
-            # Check if mysql client is available
-            if not self.check_binary_exists('mysql'):
-                raise DatabaseError("mysql binary not found. Please install MySQL client tools.")
+            # Parallel backups are loaded over several connections
+            if is_parallel_backup(backup_path):
+                manifest = self._parallel_backup().restore(backup_path, db_name)
+                get_schema_cache().invalidate(self.server, db_name or manifest['database'])
+                return True
             
             # Ensure the backup file exists
             if not os.path.exists(backup_path):
                 raise FileNotFoundError(f"Backup file not found: {backup_path}")
             
+            # Decompress on the fly if needed
+            with open_backup(backup_path, current_limits(), current_progress()) as source:
+                return self.restore_stream(source, db_name)
+        except DatabaseError:
+            raise
+        except Exception as e:
+            logging.error(f"Error restoring MySQL database: {str(e)}")
+            raise DatabaseError(f"Restore failed: {str(e)}")
+    
+    def restore_stream(self, source: BinaryIO, db_name: Optional[str] = None) -> bool:
+        """
+        Restore a database from a stream of SQL statements.
+        
+        The stream is passed as the mysql client's stdin, so it must have a
+        real file descriptor, like the streams yielded by open_backup. The
+        current job's resource limits apply to the client and the stream.
+        """
+        try:
+            # Check if mysql client is available
+            if not self.check_binary_exists('mysql'):
+                raise DatabaseError("mysql binary not found. Please install MySQL client tools.")
+            
             # Build command
             cmd = [
                 'mysql',
@@ -281,18 +349,31 @@ class MySQLService:
             env['MYSQL_PWD'] = self.password
             
             # Run the restore command
-            with open(backup_path, 'rb') as f:
-                process = subprocess.run(
-                    cmd,
-                    stdin=f,
-                    env=env,
-                    check=True
-                )
+            process = run_limited(
+                cmd,
+                current_limits(),
+                stdin=source,
+                env=env
+            )
             
+            # Without db_name the dump can create and replace any database
+            get_schema_cache().invalidate(self.server, db_name or None)
             return True
         except subprocess.SubprocessError as e:
             logging.error(f"Error executing mysql: {str(e)}")
             raise DatabaseError(f"Restore failed: {str(e)}")
         except Exception as e:
             logging.error(f"Error restoring MySQL database: {str(e)}")
-            raise DatabaseError(f"Restore failed: {str(e)}") 
\ No newline at end of file
+            raise DatabaseError(f"Restore failed: {str(e)}")
+    
+    def _parallel_backup(self, compression: Optional[str] = None, level: Optional[int] = None) -> MySQLParallelBackup:
+        """Create the parallel backup engine with the configured worker count"""
+        return MySQLParallelBackup(
+            self,
+            workers=get_parallel_jobs(),
+            chunk_rows=current_app.config.get('BACKUP_PARALLEL_CHUNK_ROWS', 1000000),
+            compression=compression,
+            level=level,
+            limits=current_limits(),
+            progress=current_progress()
+        )
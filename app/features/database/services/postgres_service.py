@@ -1,13 +1,24 @@
 import subprocess
 import os
+import re
+import shutil
 import logging
 import psycopg2
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, BinaryIO, Optional, Tuple
 from datetime import datetime
 from flask import current_app
 from werkzeug.utils import secure_filename
 
 from app.features.database.types import DatabaseError
+from app.utils.postgres_pool import get_pool
+from app.utils.compression import compression_options, get_extension, get_compression, dump_to_file, open_backup
+from app.utils.progress import current_progress
+from app.utils.schema_cache import get_schema_cache
+from app.utils.throttle import current_limits, run_limited
+from app.features.database.services.backup_manifest import (
+    MANIFEST_VERSION, is_parallel_backup, read_manifest, write_manifest, checksum_files, verify_files
+)
+from app.features.database.utils import get_parallel_jobs
 
 
 class PostgresService:
@@ -19,6 +30,8 @@ class PostgresService:
         self.port = current_app.config.get('POSTGRES_PORT', 5432)
         self.user = current_app.config.get('POSTGRES_USER', 'postgres')
         self.password = current_app.config.get('POSTGRES_PASSWORD', '')
+        # Identifies the server in the schema cache
+        self.server = f"postgres://{self.host}:{self.port}"
     
     def get_connection(self, database: str = "postgres") -> psycopg2.extensions.connection:
         """Get a PostgreSQL connection"""
@@ -35,6 +48,11 @@ class PostgresService:
             logging.error(f"PostgreSQL connection error: {str(e)}")
             raise DatabaseError(f"Failed to connect to PostgreSQL: {str(e)}")
     
+    def connection(self, database: str = "postgres"):
+        """Check out a pooled PostgreSQL connection for use in a with block"""
+        pool = get_pool(self.host, self.port, self.user, self.password)
+        return pool.connection(database)
+    
     def check_binary_exists(self, binary: str) -> bool:
         """Check if a binary exists in PATH"""
         try:
@@ -49,21 +67,19 @@ class PostgresService:
     def get_status(self) -> bool:
         """Check if PostgreSQL is running"""
         try:
-            conn = self.get_connection()
-            conn.close()
-            return True
+            with self.connection():
+                return True
         except:
             return False
     
     def list_databases(self) -> List[str]:
         """List all databases"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT datname FROM pg_database WHERE datistemplate = false AND datname != 'postgres'")
-            databases = [row[0] for row in cursor.fetchall()]
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT datname FROM pg_database WHERE datistemplate = false AND datname != 'postgres'")
+                databases = [row[0] for row in cursor.fetchall()]
+                cursor.close()
             return databases
         except Exception as e:
             logging.error(f"Error listing PostgreSQL databases: {str(e)}")
@@ -72,12 +88,11 @@ class PostgresService:
     def list_users(self) -> List[Dict[str, Any]]:
         """List all users"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT rolname FROM pg_roles WHERE rolcanlogin = true")
-            users = [{'user': row[0], 'host': None} for row in cursor.fetchall()]
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT rolname FROM pg_roles WHERE rolcanlogin = true")
+                users = [{'user': row[0], 'host': None} for row in cursor.fetchall()]
+                cursor.close()
             return users
         except Exception as e:
             logging.error(f"Error listing PostgreSQL users: {str(e)}")
@@ -89,12 +104,12 @@ class PostgresService:
             # Sanitize db_name to prevent SQL injection
             db_name = db_name.replace('"', '').replace('\\', '').replace('/', '')
             
-            conn = self.get_connection()
-            conn.autocommit = True
-            cursor = conn.cursor()
-            cursor.execute(f'CREATE DATABASE "{db_name}"')
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f'CREATE DATABASE "{db_name}"')
+                cursor.close()
+            get_schema_cache().invalidate(self.server, db_name)
             return True
         except Exception as e:
             logging.error(f"Error creating PostgreSQL database: {str(e)}")
@@ -106,12 +121,15 @@ class PostgresService:
             # Sanitize db_name to prevent SQL injection
             db_name = db_name.replace('"', '').replace('\\', '').replace('/', '')
             
-            conn = self.get_connection()
-            conn.autocommit = True
-            cursor = conn.cursor()
-            cursor.execute(f'DROP DATABASE IF EXISTS "{db_name}"')
-            cursor.close()
-            conn.close()
+            # Pooled sessions on the database would block the drop
+            get_pool(self.host, self.port, self.user, self.password).discard(db_name)
+            
+            with self.connection() as conn:
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f'DROP DATABASE IF EXISTS "{db_name}"')
+                cursor.close()
+            get_schema_cache().invalidate(self.server, db_name)
             return True
         except Exception as e:
             logging.error(f"Error deleting PostgreSQL database: {str(e)}")
@@ -123,12 +141,11 @@ class PostgresService:
             # Sanitize username to prevent SQL injection
             username = username.replace('"', '').replace('\\', '').replace('/', '')
             
-            conn = self.get_connection()
-            conn.autocommit = True
-            cursor = conn.cursor()
-            cursor.execute(f'CREATE USER "{username}" WITH PASSWORD %s', (password,))
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f'CREATE USER "{username}" WITH PASSWORD %s', (password,))
+                cursor.close()
             return True
         except Exception as e:
             logging.error(f"Error creating PostgreSQL user: {str(e)}")
@@ -141,12 +158,11 @@ class PostgresService:
             username = username.replace('"', '').replace('\\', '').replace('/', '')
             db_name = db_name.replace('"', '').replace('\\', '').replace('/', '')
             
-            conn = self.get_connection()
-            conn.autocommit = True
-            cursor = conn.cursor()
-            cursor.execute(f'GRANT ALL PRIVILEGES ON DATABASE "{db_name}" TO "{username}"')
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f'GRANT ALL PRIVILEGES ON DATABASE "{db_name}" TO "{username}"')
+                cursor.close()
             return True
         except Exception as e:
             logging.error(f"Error granting PostgreSQL privileges: {str(e)}")
@@ -158,12 +174,11 @@ class PostgresService:
             # Sanitize username to prevent SQL injection
             username = username.replace('"', '').replace('\\', '').replace('/', '')
             
-            conn = self.get_connection()
-            conn.autocommit = True
-            cursor = conn.cursor()
-            cursor.execute(f'DROP USER IF EXISTS "{username}"')
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f'DROP USER IF EXISTS "{username}"')
+                cursor.close()
             return True
         except Exception as e:
             logging.error(f"Error deleting PostgreSQL user: {str(e)}")
@@ -175,56 +190,83 @@ class PostgresService:
             # Sanitize username to prevent SQL injection
             username = username.replace('"', '').replace('\\', '').replace('/', '')
             
-            conn = self.get_connection()
-            conn.autocommit = True
-            cursor = conn.cursor()
-            cursor.execute(f'ALTER USER "{username}" WITH PASSWORD %s', (new_password,))
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f'ALTER USER "{username}" WITH PASSWORD %s', (new_password,))
+                cursor.close()
             return True
         except Exception as e:
             logging.error(f"Error changing PostgreSQL password: {str(e)}")
             raise DatabaseError(f"Failed to change password: {str(e)}")
     
-    def backup_database(self, db_name: str, backup_path: Optional[str] = None) -> str:
-        """Backup a database to a file"""
+    def dump_command(self, db_name: str, compressed: bool = False) -> Tuple[List[str], Dict[str, str]]:
+        """
+        Build the pg_dump command writing a custom-format archive to stdout.
+        
+        Args:
+            db_name: Database to dump
+            compressed: Whether the output is piped through an external compressor
+        
+        Returns:
+            tuple: (command, environment) for subprocess
+        """
+        if not self.check_binary_exists('pg_dump'):
+            raise DatabaseError("pg_dump binary not found. Please install PostgreSQL client tools.")
+        
+        # Set environment variables for pg_dump
+        env = os.environ.copy()
+        env['PGPASSWORD'] = self.password
+        
+        # Build command with proper escaping
+        cmd = [
+            'pg_dump',
+            f'--host={self.host}',
+            f'--port={str(self.port)}',
+            f'--username={self.user}',
+            '--format=custom'
+        ]
+        
+        # The external compressor replaces pg_dump's own zlib compression
+        if compressed:
+            cmd.append('--compress=0')
+        
+        cmd.append(secure_filename(db_name))
+        return cmd, env
+    
+    def backup_database(self, db_name: str, backup_path: Optional[str] = None,
+                        compression: Optional[str] = None, mode: Optional[str] = None) -> str:
+        """
+        Backup a database, compressed on the fly unless compression is 'none'.
+        
+        mode 'single' (the default from BACKUP_MODE) writes one custom-format
+        archive; 'parallel' runs pg_dump --jobs into a directory-format backup.
+        """
         try:
-            # Check if pg_dump is available
-            if not self.check_binary_exists('pg_dump'):
-                raise DatabaseError("pg_dump binary not found. Please install PostgreSQL client tools.")
-            
             # Sanitize db_name
             db_name = secure_filename(db_name)
             
+            compression, level, threads = compression_options(current_app.config, compression)
+            mode = mode or current_app.config.get('BACKUP_MODE', 'single')
+            
             # Generate backup path if not provided
             if backup_path is None:
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"{db_name}_{timestamp}.dump"
+                if mode == 'parallel':
+                    filename = f"{db_name}_{timestamp}.parallel"
+                else:
+                    filename = f"{db_name}_{timestamp}.dump{get_extension(compression)}"
                 backup_path = os.path.join(current_app.config['BACKUP_DIR'], filename)
             
-            # Set environment variables for pg_dump
-            env = os.environ.copy()
-            env['PGPASSWORD'] = self.password
+            if mode == 'parallel':
+                self._directory_backup(db_name, backup_path, compression, level)
+                return backup_path
             
-            # Build command with proper escaping
-            cmd = [
-                'pg_dump',
-                f'--host={self.host}',
-                f'--port={str(self.port)}',
-                f'--username={self.user}',
-                '--format=custom',
-                f'--file={backup_path}',
-                db_name
-            ]
+            cmd, env = self.dump_command(db_name, compressed=bool(compression))
             
-            # Run the backup command
-            process = subprocess.run(
-                cmd,
-                env=env,
-                check=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
+            # Stream the dump through the compressor straight into the backup file
+            dump_to_file(cmd, backup_path, env=env, compression=compression, level=level, threads=threads,
+                         limits=current_limits(), progress=current_progress())
             
             return backup_path
         except subprocess.SubprocessError as e:
@@ -235,50 +277,176 @@ class PostgresService:
             raise DatabaseError(f"Backup failed: {str(e)}")
     
     def restore_database(self, backup_path: str, db_name: str) -> bool:
-        """Restore a database from a backup file"""
+        """
+        Restore a database from a backup file or directory-format backup.
+        
+        Directory backups and uncompressed archives are restored with
+        pg_restore --jobs; compressed archives are piped through stdin,
+        which pg_restore can only read with a single job.
+        """
         try:
-            # Check if pg_restore is available
-            if not self.check_binary_exists('pg_restore'):
-                raise DatabaseError("pg_restore binary not found. Please install PostgreSQL client tools.")
-            
             # Ensure the backup file exists
             if not os.path.exists(backup_path):
                 raise FileNotFoundError(f"Backup file not found: {backup_path}")
             
-            # Sanitize db_name
-            db_name = secure_filename(db_name)
+            # Compressed archives are decompressed into pg_restore's stdin
+            if not is_parallel_backup(backup_path) and get_compression(backup_path) is not None:
+                with open_backup(backup_path, current_limits(), current_progress()) as source:
+                    return self.restore_stream(source, db_name)
             
-            # Make sure database exists
-            self.create_database(db_name)
+            jobs = get_parallel_jobs()
+            if is_parallel_backup(backup_path):
+                manifest = read_manifest(backup_path, 'pg-directory')
+                verify_files(backup_path, manifest['files'], jobs)
             
-            # Set environment variables for pg_restore
-            env = os.environ.copy()
-            env['PGPASSWORD'] = self.password
-            
-            # Build command
-            cmd = [
-                'pg_restore',
-                f'--host={self.host}',
-                f'--port={str(self.port)}',
-                f'--username={self.user}',
-                '--dbname=' + db_name,
-                '--clean',
-                backup_path
-            ]
+            cmd, env = self.restore_command(db_name)
+            cmd.extend([f'--jobs={jobs}', backup_path])
+            process = run_limited(
+                cmd,
+                current_limits(),
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
             
-            # Run the restore command
-            process = subprocess.run(
+            get_schema_cache().invalidate(self.server, db_name)
+            return True
+        except DatabaseError:
+            raise
+        except subprocess.SubprocessError as e:
+            logging.error(f"Error executing pg_restore: {str(e)}")
+            raise DatabaseError(f"Restore failed: {str(e)}")
+        except Exception as e:
+            logging.error(f"Error restoring PostgreSQL database: {str(e)}")
+            raise DatabaseError(f"Restore failed: {str(e)}")
+    
+    def restore_stream(self, source: BinaryIO, db_name: str) -> bool:
+        """
+        Restore a database from a stream of a custom-format archive.
+        
+        The stream is passed as pg_restore's stdin, so it must have a real
+        file descriptor, like the streams yielded by open_backup. The current
+        job's resource limits apply to pg_restore and the stream.
+        """
+        try:
+            cmd, env = self.restore_command(db_name)
+            process = run_limited(
                 cmd,
+                current_limits(),
+                stdin=source,
                 env=env,
-                check=True,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE
             )
             
+            get_schema_cache().invalidate(self.server, db_name)
             return True
+        except DatabaseError:
+            raise
         except subprocess.SubprocessError as e:
             logging.error(f"Error executing pg_restore: {str(e)}")
             raise DatabaseError(f"Restore failed: {str(e)}")
         except Exception as e:
             logging.error(f"Error restoring PostgreSQL database: {str(e)}")
-            raise DatabaseError(f"Restore failed: {str(e)}") 
\ No newline at end of file
+            raise DatabaseError(f"Restore failed: {str(e)}")
+    
+    def restore_command(self, db_name: str) -> Tuple[List[str], Dict[str, str]]:
+        """
+        Build the pg_restore command and environment for restoring into db_name.
+        
+        The database is created first if it doesn't exist.
+        """
+        # Check if pg_restore is available
+        if not self.check_binary_exists('pg_restore'):
+            raise DatabaseError("pg_restore binary not found. Please install PostgreSQL client tools.")
+        
+        # Sanitize db_name
+        db_name = secure_filename(db_name)
+        
+        # Make sure database exists
+        self.create_database(db_name)
+        
+        # Set environment variables for pg_restore
+        env = os.environ.copy()
+        env['PGPASSWORD'] = self.password
+        
+        cmd = [
+            'pg_restore',
+            f'--host={self.host}',
+            f'--port={str(self.port)}',
+            f'--username={self.user}',
+            '--dbname=' + db_name,
+            '--clean',
+            '--if-exists'
+        ]
+        return cmd, env
+    
+    def _directory_backup(self, db_name: str, backup_dir: str,
+                          compression: Optional[str], level: Optional[int]) -> None:
+        """Run pg_dump --format=directory --jobs and write a manifest of the result"""
+        if not self.check_binary_exists('pg_dump'):
+            raise DatabaseError("pg_dump binary not found. Please install PostgreSQL client tools.")
+        
+        jobs = get_parallel_jobs()
+        # pg_dump creates the directory itself and refuses an existing one
+        partial_dir = f"{backup_dir}.partial"
+        
+        env = os.environ.copy()
+        env['PGPASSWORD'] = self.password
+        
+        cmd = [
+            'pg_dump',
+            f'--host={self.host}',
+            f'--port={str(self.port)}',
+            f'--username={self.user}',
+            '--format=directory',
+            f'--jobs={jobs}',
+            f'--file={partial_dir}',
+            *self._directory_compression_args(compression, level),
+            db_name
+        ]
+        
+        try:
+            run_limited(
+                cmd,
+                current_limits(),
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+            
+            write_manifest(partial_dir, {
+                'version': MANIFEST_VERSION,
+                'engine': 'pg-directory',
+                'database': db_name,
+                'created': datetime.now().isoformat(),
+                'jobs': jobs,
+                'compression': compression,
+                'files': checksum_files(partial_dir, jobs)
+            })
+            os.rename(partial_dir, backup_dir)
+        except Exception:
+            shutil.rmtree(partial_dir, ignore_errors=True)
+            raise
+    
+    def _directory_compression_args(self, compression: Optional[str], level: Optional[int]) -> List[str]:
+        """
+        Map the backup compression settings onto pg_dump's own per-file compression.
+        
+        zstd and lz4 need pg_dump 16 or later; older versions fall back to gzip.
+        """
+        if not compression:
+            return ['--compress=0']
+        
+        if compression in ('zstd', 'lz4'):
+            if self._pg_dump_version() >= 16:
+                return [f'--compress={compression}:{level}' if level else f'--compress={compression}']
+            logging.warning(f"pg_dump does not support {compression} before version 16, using gzip")
+        
+        return [f'--compress={min(int(level), 9)}'] if level else []
+    
+    def _pg_dump_version(self) -> int:
+        """Major version of the installed pg_dump"""
+        output = subprocess.run(['pg_dump', '--version'], stdout=subprocess.PIPE, check=True).stdout.decode()
+        match = re.search(r'(\d+)(?:\.\d+)?', output)
+        return int(match.group(1)) if match else 0
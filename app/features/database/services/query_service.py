@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from app.features.database.types import QueryStatus
+
+# Seconds past its time limit after which a statement is cancelled from
+# here, for statements the server-side limit doesn't cover
+CANCEL_GRACE_SECONDS = 2
+
+
+class QueryService:
+    """
+    Runs SQL console statements in the background so they can be polled and cancelled.
+
+    Each statement runs under a server-side time limit (MAX_EXECUTION_TIME
+    on MySQL, statement_timeout on PostgreSQL). MySQL only applies it to
+    SELECTs, so every statement is also cancelled on the server once it
+    overruns its limit by CANCEL_GRACE_SECONDS. Cancelling stops the
+    statement on the server, not just the wait for it, so a closed browser
+    tab doesn't leave it running.
+    """
+
+    def __init__(self, max_workers: int = 4, ttl: int = 300):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='console-query')
+        self._queries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.ttl = ttl
+
+    def start(self,
+              db_manager: Any,
+              db_type: str,
+              db_name: str,
+              query: str,
+              timeout: int,
+              max_rows: int,
+              max_bytes: int) -> QueryStatus:
+        """Start running a statement; SELECT results are kept up to max_rows and max_bytes"""
+        job = {
+            'id': uuid.uuid4().hex[:12],
+            'status': 'running',
+            'db_type': db_type,
+            'db_name': db_name,
+            'query': query,
+            'is_select': query.strip().split(' ')[0].upper() == 'SELECT',
+            'timeout': timeout,
+            'results': None,
+            'truncated': False,
+            'affected_rows': 0,
+            'execution_time': None,
+            'error': None,
+            'started': time.time(),
+            'finished': None,
+            'session_id': None,
+            # Held while the session is killed, so its connection isn't
+            # handed to another request in the meantime
+            'session_lock': threading.Lock(),
+            'manager': db_manager,
+            'done': threading.Event()
+        }
+        with self._lock:
+            self._expire()
+            self._queries[job['id']] = job
+
+        self._executor.submit(self._run, job, max_rows, max_bytes)
+        return self._status(job)
+
+    def get(self, query_id: str) -> Optional[QueryStatus]:
+        """Get the state of a query, if it is known"""
+        with self._lock:
+            self._expire()
+            job = self._queries.get(query_id)
+            return self._status(job) if job else None
+
+    def wait(self, query_id: str, timeout: float) -> Optional[QueryStatus]:
+        """Wait up to timeout seconds for a query to finish, then return its state"""
+        with self._lock:
+            job = self._queries.get(query_id)
+        if job is None:
+            return None
+        job['done'].wait(timeout)
+        return self._status(job)
+
+    def cancel(self, query_id: str, reason: str = 'Query cancelled') -> bool:
+        """Cancel a running query by stopping its statement on the server"""
+        with self._lock:
+            job = self._queries.get(query_id)
+            if not job or job['status'] != 'running':
+                return False
+            job['status'] = 'cancelled'
+            job['error'] = reason
+            job['finished'] = time.time()
+        job['done'].set()
+
+        # The session id is cleared before the connection goes back to the pool
+        with job['session_lock']:
+            if job['session_id'] is not None:
+                job['manager'].cancel_session(job['session_id'])
+        return True
+
+    def _run(self, job: Dict[str, Any], max_rows: int, max_bytes: int) -> None:
+        def on_session(session_id):
+            with job['session_lock']:
+                if session_id is not None and job['status'] != 'running':
+                    raise RuntimeError("Query cancelled")
+                job['session_id'] = session_id
+
+        db_manager = job['manager']
+        timer = threading.Timer(
+            job['timeout'] + CANCEL_GRACE_SECONDS,
+            self.cancel,
+            (job['id'], f"Query exceeded the {job['timeout']}s time limit")
+        )
+        timer.daemon = True
+        start_time = time.time()
+        try:
+            if job['status'] != 'running':
+                return
+            timer.start()
+            if job['is_select']:
+                # Read through a server-side cursor and stop at the display caps
+                with db_manager.stream_query(job['db_name'], job['query'],
+                                             timeout=job['timeout'], on_session=on_session) as stream:
+                    results, truncated = stream.head(max_rows, max_bytes)
+                affected_rows = len(results)
+            else:
+                affected_rows = db_manager.execute_query(job['db_name'], job['query'],
+                                                         timeout=job['timeout'], on_session=on_session)
+                results, truncated = [], False
+
+            with self._lock:
+                if job['status'] == 'running':
+                    job['status'] = 'done'
+                    job['results'] = results
+                    job['truncated'] = truncated
+                    job['affected_rows'] = affected_rows
+                    job['execution_time'] = round((time.time() - start_time) * 1000, 2)  # ms
+                    job['finished'] = time.time()
+        except Exception as e:
+            with self._lock:
+                if job['status'] == 'running':
+                    logging.error(f"Error running query on {job['db_name']}: {str(e)}")
+                    job['status'] = 'failed'
+                    job['error'] = str(e)
+                    job['finished'] = time.time()
+        finally:
+            timer.cancel()
+            job['done'].set()
+
+    def _expire(self) -> None:
+        """Drop finished queries, and their results, older than the TTL"""
+        cutoff = time.time() - self.ttl
+        for query_id, job in list(self._queries.items()):
+            if job['finished'] is not None and job['finished'] < cutoff:
+                del self._queries[query_id]
+
+    @staticmethod
+    def _status(job: Dict[str, Any]) -> QueryStatus:
+        return {
+            'id': job['id'],
+            'status': job['status'],
+            'db_type': job['db_type'],
+            'db_name': job['db_name'],
+            'query': job['query'],
+            'is_select': job['is_select'],
+            'timeout': job['timeout'],
+            'results': job['results'],
+            'truncated': job['truncated'],
+            'affected_rows': job['affected_rows'],
+            'execution_time': job['execution_time'],
+            'error': job['error'],
+            'started': job['started'],
+            'finished': job['finished']
+        }
+
+
+# Create a singleton instance
+_query_service = None
+
+def get_query_service(max_workers: int = 4, ttl: int = 300) -> QueryService:
+    """Get the console query service singleton"""
+    global _query_service
+    if _query_service is None:
+        _query_service = QueryService(max_workers=max_workers, ttl=ttl)
+    return _query_service
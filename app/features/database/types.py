@@ -22,4 +22,30 @@ class DatabaseStats(TypedDict):
     name: str
     size: float  # Size in MB
     tables: int
-    status: str 
\ No newline at end of file
+    status: str 
+
+
+class RowCountStatus(TypedDict):
+    """Type definition for a background row count"""
+    status: str  # running, done, failed or cancelled
+    count: Optional[int]
+    error: Optional[str]
+    started: float
+    finished: Optional[float]
+
+class QueryStatus(TypedDict):
+    """Type definition for a SQL console query running in the background"""
+    id: str
+    status: str  # running, done, failed or cancelled
+    db_type: str
+    db_name: str
+    query: str
+    is_select: bool
+    timeout: int  # seconds
+    results: Optional[List[Dict[str, Any]]]  # SELECT rows, up to the display caps
+    truncated: bool
+    affected_rows: int
+    execution_time: Optional[float]  # ms
+    error: Optional[str]
+    started: float
+    finished: Optional[float]
@@ -2,10 +2,16 @@
 Database utilities for NEXDB.
 Contains helper functions for database operations.
 """
+import base64
+import json
+import psutil
 from flask import current_app
 from app.utils.mysql_manager import MySQLManager
 from app.utils.postgres_manager import PostgresManager
 
+# Key of the JSON object that holds a binary key value in a page token
+BINARY_TAG = '$bytes'
+
 def get_mysql_manager():
     """
     Get a configured MySQL manager instance.
@@ -48,4 +54,92 @@ def format_db_size(size_bytes):
         if size_bytes < 1024.0:
             return f"{size_bytes:.2f} {unit}"
         size_bytes /= 1024.0
-    return f"{size_bytes:.2f} PB" 
\ No newline at end of file
+    return f"{size_bytes:.2f} PB" 
+
+def get_parallel_jobs():
+    """
+    Get the number of parallel jobs for backups and restores.
+    
+    Returns:
+        int: BACKUP_PARALLEL_WORKERS, or the CPU count when it is 0
+    """
+    jobs = current_app.config.get('BACKUP_PARALLEL_WORKERS', 0)
+    if jobs and jobs > 0:
+        return jobs
+    return psutil.cpu_count(logical=True) or 1
+
+def get_keyset_columns(structure):
+    """
+    Pick the columns that uniquely identify a row, for keyset pagination.
+    
+    Args:
+        structure (list): Column definitions from get_table_structure
+        
+    Returns:
+        list: Primary key columns in index order, a NOT NULL unique column,
+            or an empty list if the table has neither
+    """
+    primary = [column for column in structure if column.get('primary_key')]
+    if primary:
+        primary.sort(key=lambda column: column.get('primary_key_position') or 0)
+        return [column['name'] for column in primary]
+    
+    for column in structure:
+        if column.get('unique_key') and not column.get('nullable'):
+            return [column['name']]
+    
+    return []
+
+def encode_page_token(row, key_columns):
+    """
+    Encode the key values of a row as an opaque, URL-safe page token.
+    
+    Args:
+        row (dict): Row the next page should start after (or before)
+        key_columns (list): Columns returned by get_keyset_columns
+        
+    Returns:
+        str: Page token
+    """
+    values = [_encode_key_value(row[column]) for column in key_columns]
+    payload = json.dumps(values, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_page_token(token, key_columns):
+    """
+    Decode a page token created by encode_page_token.
+    
+    Args:
+        token (str): Page token from the URL
+        key_columns (list): Columns returned by get_keyset_columns
+        
+    Returns:
+        list: Key values, one per key column
+        
+    Raises:
+        ValueError: If the token is malformed or doesn't match the key
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid page token")
+    
+    if not isinstance(values, list) or len(values) != len(key_columns):
+        raise ValueError("Invalid page token")
+    return [_decode_key_value(value) for value in values]
+
+def _encode_key_value(value):
+    """Tag binary key values, which JSON can't hold and str() would mangle"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {BINARY_TAG: base64.b64encode(bytes(value)).decode('ascii')}
+    return value
+
+def _decode_key_value(value):
+    """Turn a value tagged by _encode_key_value back into bytes"""
+    if isinstance(value, dict) and list(value) == [BINARY_TAG]:
+        try:
+            return base64.b64decode(value[BINARY_TAG].encode('ascii'), validate=True)
+        except Exception:
+            raise ValueError("Invalid page token")
+    return value
@@ -3,6 +3,7 @@ from app.routes.auth import login_required
 from app.utils.backup_manager import BackupManager
 from app.utils.mysql_manager import MySQLManager
 from app.utils.postgres_manager import PostgresManager
+from app.utils.compression import is_backup_file
 import os
 import json
 import threading
@@ -40,7 +41,7 @@ def index():
     local_backups = []
     if os.path.exists(backup_dir):
         for filename in os.listdir(backup_dir):
-            if filename.endswith('.sql') or filename.endswith('.dump'):
+            if is_backup_file(filename):
                 file_path = os.path.join(backup_dir, filename)
                 file_size = round(os.path.getsize(file_path) / (1024 * 1024), 2)  # Convert to MB
                 file_date = datetime.datetime.fromtimestamp(os.path.getmtime(file_path))
@@ -2,7 +2,7 @@ from flask import Blueprint, render_template, current_app
 from app.routes.auth import login_required
 from app.utils.mysql_manager import MySQLManager
 from app.utils.postgres_manager import PostgresManager
-import os
+from app.features.backup.services.backup_service import get_backup_service
 import psutil
 import shutil
 
@@ -54,17 +54,8 @@ def index():
         'cpu_percent': psutil.cpu_percent()
     }
     
-    # Get backup info
-    backup_dir = current_app.config['BACKUP_DIR']
-    backups = []
-    if os.path.exists(backup_dir):
-        for filename in os.listdir(backup_dir):
-            if os.path.isfile(os.path.join(backup_dir, filename)):
-                backups.append({
-                    'name': filename,
-                    'size': round(os.path.getsize(os.path.join(backup_dir, filename)) / (1024**2), 2),  # MB
-                    'date': os.path.getmtime(os.path.join(backup_dir, filename))
-                })
+    # Get the most recent backups from the backup catalog
+    backups = get_backup_service().list_local_backups(limit=5)
     
     return render_template('dashboard/index.html', 
                           mysql_status=mysql_status,
@@ -74,4 +65,4 @@ def index():
                           postgres_dbs=postgres_dbs,
                           postgres_users=postgres_users,
                           system_info=system_info,
-                          backups=sorted(backups, key=lambda x: x['date'], reverse=True)[:5])  # Show only 5 most recent backups 
\ No newline at end of file
+                          backups=backups) 
\ No newline at end of file
@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from app.routes.auth import login_required
 from app.utils.mysql_manager import MySQLManager
+from app.features.backup.services.backup_service import get_backup_service
+from werkzeug.utils import secure_filename
 import os
 from datetime import datetime
 
@@ -191,24 +193,30 @@ def backup_database(db_name):
 @mysql_bp.route('/restore', methods=['POST'])
 @login_required
 def restore_database():
-    backup_file = request.form.get('backup_file')
-    
-    mysql_manager = MySQLManager(
-        host=current_app.config['MYSQL_HOST'],
-        port=current_app.config['MYSQL_PORT'],
-        user=current_app.config['MYSQL_USER'],
-        password=current_app.config['MYSQL_PASSWORD']
-    )
+    backup_file = secure_filename(request.form.get('backup_file') or '')
     
     backup_path = os.path.join(current_app.config['BACKUP_DIR'], backup_file)
     
-    if not os.path.exists(backup_path):
+    if not backup_file or not os.path.exists(backup_path):
         flash(f"Backup file not found: {backup_file}", "danger")
         return redirect(url_for('mysql.index'))
     
-    if mysql_manager.restore_database(backup_path):
-        flash("Database restored successfully", "success")
-    else:
-        flash("Failed to restore database", "danger")
+    # Run the restore as a background job instead of in the request
+    try:
+        backup_service = get_backup_service()
+        job = backup_service.submit_job(
+            'restore',
+            'mysql',
+            None,
+            backup_service.restore_local_backup,
+            'mysql',
+            backup_file,
+            None,
+            name=f"restore {backup_file}"
+        )
+        flash(f"Restore started (job {job['id']})", "success")
+        return redirect(url_for('backup.backup_controller.job_status', job_id=job['id']))
+    except Exception as e:
+        flash(f"Failed to start restore: {str(e)}", "danger")
     
     return redirect(url_for('mysql.index')) 
\ No newline at end of file
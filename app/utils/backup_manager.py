@@ -3,6 +3,9 @@ import logging
 import os
 from datetime import datetime
 
+from app.utils.s3_download import S3ParallelDownloader
+from app.utils.s3_listing import list_objects
+
 class BackupManager:
     def __init__(self, aws_access_key, aws_secret_key, aws_bucket_name, aws_region):
         self.aws_access_key = aws_access_key
@@ -28,13 +31,10 @@ class BackupManager:
         """List all backups in the S3 bucket"""
         try:
             s3_client = self.get_s3_client()
-            response = s3_client.list_objects_v2(Bucket=self.aws_bucket_name)
-            
-            if 'Contents' not in response:
-                return []
+            objects, _ = list_objects(s3_client, self.aws_bucket_name)
             
             backups = []
-            for obj in response['Contents']:
+            for obj in objects:
                 backups.append({
                     'name': obj['Key'],
                     'size': round(obj['Size'] / (1024**2), 2),  # MB
@@ -60,11 +60,17 @@ class BackupManager:
             logging.error(f"Error uploading to S3: {str(e)}")
             raise
     
-    def download_from_s3(self, object_name, file_path):
-        """Download a file from S3 bucket"""
+    def download_from_s3(self, object_name, file_path, part_size=16 * 1024 * 1024, concurrency=4):
+        """Download a file from S3 bucket with parallel ranged GETs, resuming an interrupted download"""
         try:
             s3_client = self.get_s3_client()
-            s3_client.download_file(self.aws_bucket_name, object_name, file_path)
+            S3ParallelDownloader(
+                s3_client,
+                self.aws_bucket_name,
+                object_name,
+                part_size=part_size,
+                concurrency=concurrency
+            ).download(file_path)
             return True
         except Exception as e:
             logging.error(f"Error downloading from S3: {str(e)}")
@@ -0,0 +1,314 @@
+"""
+Bulk CSV/TSV import for NEXDB.
+Reads an uploaded file as it arrives, maps its columns onto a table and
+hands it to the server in batches through LOAD DATA LOCAL INFILE (MySQL) or
+COPY FROM STDIN (PostgreSQL). Each batch is spooled to a temporary file in
+the text format both commands read by default, so memory use does not
+depend on the size of the upload, and is committed on its own.
+"""
+import csv
+import gzip
+import io
+import logging
+import os
+import re
+import tempfile
+import time
+
+# Backslash escapes of the MySQL / PostgreSQL text format
+_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+_UNESCAPES = {'\\': '\\', 't': '\t', 'n': '\n', 'r': '\r'}
+
+# Longest value kept for a rejected row in the error report
+REPORT_VALUE_LENGTH = 200
+
+# The row number in a MySQL warning or PostgreSQL COPY error context
+ROW_PATTERN = re.compile(r'\b(?:row|line) (\d+)', re.IGNORECASE)
+
+# Raise the csv module's 128KB field limit for TEXT/BLOB columns
+csv.field_size_limit(64 * 1024 * 1024)
+
+
+class BulkLoadError(Exception):
+    """A batch was rejected because of one of its rows"""
+
+    def __init__(self, message, row):
+        """
+        Args:
+            message (str): Server error message
+            row (int): 1-based position of the offending row in the batch
+        """
+        super().__init__(message)
+        self.row = row
+
+
+def batch_row(message):
+    """Get the 1-based batch row a server message refers to, or None"""
+    match = ROW_PATTERN.search(message or '')
+    return int(match.group(1)) if match else None
+
+
+class CountingReader(io.RawIOBase):
+    """Raw reader over an upload counting the bytes read, for throughput stats"""
+
+    def __init__(self, source):
+        super().__init__()
+        self._source = source
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._source.read(len(buffer))
+        buffer[:len(data)] = data
+        self.bytes_read += len(data)
+        return len(data)
+
+
+def open_upload(stream, compressed=False, encoding='utf-8-sig'):
+    """
+    Open an uploaded file for reading as text without buffering it.
+
+    Args:
+        stream: Binary stream of the upload, e.g. the request body
+        compressed (bool): Whether the upload is gzip compressed
+        encoding (str): Text encoding; the default skips a UTF-8 BOM
+
+    Returns:
+        tuple: (text stream, CountingReader of the raw upload)
+    """
+    counter = CountingReader(stream)
+    source = gzip.GzipFile(fileobj=counter, mode='rb') if compressed else io.BufferedReader(counter)
+    return io.TextIOWrapper(source, encoding=encoding, newline=''), counter
+
+
+def resolve_mapping(header, mapping, columns):
+    """
+    Work out the table column each file column goes to.
+
+    Args:
+        header (list): Column names from the file's header row, or None
+        mapping (list): Target column, or None to skip, per file column;
+            None maps by header name, or by position without a header
+        columns (list): Column names of the table
+
+    Returns:
+        list: Target column name or None for every file column
+
+    Raises:
+        ValueError: If a file column maps to a column the table doesn't have
+    """
+    if mapping is None:
+        mapping = list(header) if header is not None else list(columns)
+    unknown = [target for target in mapping if target and target not in columns]
+    if unknown:
+        raise ValueError(f"Unknown table column(s): {', '.join(unknown)}")
+    targets = [target for target in mapping if target]
+    if not targets:
+        raise ValueError("No file columns are mapped to table columns")
+    if len(set(targets)) != len(targets):
+        raise ValueError("Each table column can only be mapped once")
+    return [target or None for target in mapping]
+
+
+def import_csv(text, columns, bulk_loader, mapping=None, header=True, delimiter=',',
+               null_value='', batch_size=50000, max_errors=100, counter=None):
+    """
+    Import delimited text into a table batch by batch.
+
+    Rows with the wrong number of fields are reported and skipped. A batch
+    the server rejects because of one row is retried without that row. The
+    import stops once more than max_errors rows were rejected; batches
+    committed before then stay in the table.
+
+    Args:
+        text: Text stream of the file
+        columns (list): Column names of the table
+        bulk_loader (callable): A manager's bulk_loader(columns) context,
+            already bound to the database and table
+        mapping (list): File column to table column mapping, see resolve_mapping()
+        header (bool): Whether the first row holds column names
+        delimiter (str): Field delimiter, ',' for CSV or '\\t' for TSV
+        null_value (str): Field value loaded as NULL
+        batch_size (int): Rows loaded and committed at a time
+        max_errors (int): Rejected rows after which the import is abandoned
+        counter (CountingReader): Raw upload reader, for byte throughput
+
+    Returns:
+        dict: Report with rows_read, rows_imported, rows_skipped (dropped
+            by the server, e.g. MySQL duplicate keys), rows_failed, batches,
+            errors (line, message and values of rejected rows) and
+            warnings (line and message) up to max_errors each, aborted,
+            error (why the import stopped early), elapsed, rows_per_second
+            and bytes_read
+    """
+    report = {
+        'rows_read': 0,
+        'rows_imported': 0,
+        'rows_skipped': 0,
+        'rows_failed': 0,
+        'batches': 0,
+        'errors': [],
+        'warnings': [],
+        'aborted': False,
+        'error': None,
+        'elapsed': 0,
+        'rows_per_second': 0,
+        'bytes_read': 0
+    }
+    start_time = time.monotonic()
+    reader = csv.reader(text, delimiter=delimiter)
+
+    def reject(line, message, values):
+        report['rows_failed'] += 1
+        if len(report['errors']) < max_errors:
+            report['errors'].append({
+                'line': line,
+                'message': message,
+                'values': [value[:REPORT_VALUE_LENGTH] for value in values]
+            })
+
+    def too_many_errors():
+        if report['rows_failed'] > max_errors:
+            report['aborted'] = True
+            report['error'] = f"Stopped after more than {max_errors} rejected rows"
+            return True
+        return False
+
+    batch = None
+    try:
+        first = next(reader, None) if header else None
+        targets = resolve_mapping(first, mapping, columns)
+        positions = [i for i, target in enumerate(targets) if target]
+        target_columns = [targets[i] for i in positions]
+
+        with bulk_loader(target_columns) as load:
+            batch = _Batch()
+            for values in reader:
+                if not values:
+                    continue
+                report['rows_read'] += 1
+                if len(values) != len(targets):
+                    reject(reader.line_num, f"Expected {len(targets)} fields, found {len(values)}", values)
+                    if too_many_errors():
+                        break
+                    continue
+
+                batch.add(reader.line_num, [None if values[i] == null_value else values[i] for i in positions])
+                if batch.size >= batch_size:
+                    _load_batch(load, batch, report, reject, max_errors)
+                    if too_many_errors():
+                        break
+                    batch = _Batch()
+
+            if batch.size and not report['aborted']:
+                _load_batch(load, batch, report, reject, max_errors)
+                too_many_errors()
+    except Exception as e:
+        logging.error(f"Bulk import failed: {str(e)}")
+        report['aborted'] = True
+        report['error'] = str(e)
+    finally:
+        if batch is not None:
+            batch.discard()
+
+    elapsed = time.monotonic() - start_time
+    report['elapsed'] = round(elapsed, 3)
+    report['rows_per_second'] = int(report['rows_imported'] / elapsed) if elapsed > 0 else 0
+    report['bytes_read'] = counter.bytes_read if counter else 0
+    logging.info(
+        f"Bulk import: {report['rows_imported']} rows in {report['batches']} batches, "
+        f"{report['rows_failed']} rejected, {report['rows_per_second']} rows/s"
+    )
+    return report
+
+
+def _load_batch(load, batch, report, reject, max_errors):
+    """Load and commit a batch, retrying without each row the server rejects"""
+    batch.flush()
+    try:
+        while batch.size:
+            try:
+                loaded, warnings = load(batch.path)
+            except BulkLoadError as e:
+                if e.row is None or not 1 <= e.row <= batch.size:
+                    raise
+                line, values = batch.remove(e.row - 1)
+                reject(line, str(e), ['' if value is None else value for value in values])
+                if report['rows_failed'] > max_errors:
+                    return
+                continue
+
+            report['batches'] += 1
+            report['rows_imported'] += loaded
+            report['rows_skipped'] += batch.size - loaded
+            for row, message in warnings:
+                if len(report['warnings']) >= max_errors:
+                    break
+                line = batch.lines[row - 1] if row and 1 <= row <= batch.size else None
+                report['warnings'].append({'line': line, 'message': message})
+            return
+    finally:
+        batch.discard()
+
+
+def _unescape(field):
+    """Decode a field of the text format"""
+    if field == '\\N':
+        return None
+    if '\\' not in field:
+        return field
+    decoded = []
+    chars = iter(field)
+    for char in chars:
+        if char == '\\':
+            escaped = next(chars, '')
+            decoded.append(_UNESCAPES.get(escaped, escaped))
+        else:
+            decoded.append(char)
+    return ''.join(decoded)
+
+
+class _Batch:
+    """Rows spooled to a temporary file in the MySQL / PostgreSQL text format"""
+
+    def __init__(self):
+        self._file = tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='', suffix='.tsv', delete=False)
+        self.path = self._file.name
+        self.lines = []
+
+    @property
+    def size(self):
+        return len(self.lines)
+
+    def add(self, line, values):
+        self._file.write('\t'.join('\\N' if value is None else value.translate(_ESCAPES) for value in values))
+        self._file.write('\n')
+        self.lines.append(line)
+
+    def flush(self):
+        self._file.flush()
+
+    def remove(self, index):
+        """Drop the row at index, returning its line number and values"""
+        self._file.close()
+        removed = None
+        with open(self.path, 'r', encoding='utf-8', newline='') as source, \
+                tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='', suffix='.tsv', delete=False) as target:
+            for i, row in enumerate(source):
+                if i == index:
+                    removed = [_unescape(field) for field in row[:-1].split('\t')]
+                else:
+                    target.write(row)
+        os.unlink(self.path)
+        self._file = open(target.name, 'a', encoding='utf-8', newline='')
+        self.path = target.name
+        return self.lines.pop(index), removed
+
+    def discard(self):
+        self._file.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
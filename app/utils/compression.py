@@ -0,0 +1,570 @@
+"""
+Streaming backup compression for NEXDB.
+Dump tools write to a pipe that feeds an external compressor. The compressed
+bytes are checksummed and written to disk in the same pass, so no
+uncompressed copy of a backup ever touches the disk.
+"""
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from app.utils.progress import ProgressReader
+
+# Supported compressors, in order of preferred binaries
+COMPRESSORS = {
+    'gzip': {
+        'extension': '.gz',
+        'binaries': ['pigz', 'gzip'],
+        'levels': (1, 9),
+    },
+    'zstd': {
+        'extension': '.zst',
+        'binaries': ['zstd'],
+        'levels': (1, 19),
+    },
+    'lz4': {
+        'extension': '.lz4',
+        'binaries': ['lz4'],
+        'levels': (1, 12),
+    },
+}
+
+# Backups stored as directories of individually compressed files
+DIRECTORY_EXTENSIONS = ('.parallel', '.basebackup')
+
+# Snapshots of the deduplicating repository, named <dump name>.dedup
+DEDUP_EXTENSION = '.dedup'
+
+# Uncompressed dump formats produced by the database services
+BACKUP_EXTENSIONS = ('.sql', '.dump', DEDUP_EXTENSION) + DIRECTORY_EXTENSIONS
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class CompressionError(Exception):
+    """Raised when a dump or compression pipeline fails"""
+    pass
+
+
+def is_backup_file(filename):
+    """Check if a file name looks like a (possibly compressed) backup"""
+    return strip_compression_extension(filename).endswith(BACKUP_EXTENSIONS)
+
+
+def get_compression(filename):
+    """Get the compressor used for a backup file from its extension, or None"""
+    for method, info in COMPRESSORS.items():
+        if filename.endswith(info['extension']):
+            return method
+    return None
+
+
+def strip_compression_extension(filename):
+    """Remove a compressor extension from a file name"""
+    method = get_compression(filename)
+    if method:
+        return filename[:-len(COMPRESSORS[method]['extension'])]
+    return filename
+
+
+def get_extension(method):
+    """Get the file extension for a compressor, '' for no compression"""
+    if not method or method == 'none':
+        return ''
+    if method not in COMPRESSORS:
+        raise CompressionError(f"Unsupported compression: {method}")
+    return COMPRESSORS[method]['extension']
+
+
+def compression_options(config, compression=None):
+    """
+    Resolve the compression settings for a backup.
+
+    Args:
+        config (dict): App config holding the BACKUP_COMPRESSION* settings
+        compression (str): Override of BACKUP_COMPRESSION for this backup
+
+    Returns:
+        tuple: (method or None, level, threads)
+    """
+    method = compression if compression is not None else config.get('BACKUP_COMPRESSION', 'gzip')
+    if not method or method == 'none':
+        method = None
+    elif method not in COMPRESSORS:
+        raise CompressionError(f"Unsupported compression: {method}")
+
+    level = config.get('BACKUP_COMPRESSION_LEVEL') or None
+    threads = config.get('BACKUP_COMPRESSION_THREADS') or None
+    return method, level, threads
+
+
+def _find_binary(method):
+    """Find an installed binary for a compressor"""
+    if method not in COMPRESSORS:
+        raise CompressionError(f"Unsupported compression: {method}")
+
+    for binary in COMPRESSORS[method]['binaries']:
+        if shutil.which(binary):
+            return binary
+
+    raise CompressionError(f"No {method} binary found. Please install {COMPRESSORS[method]['binaries'][0]}.")
+
+
+def compress_command(method, level=None, threads=None):
+    """
+    Build the command line of a compressor reading stdin and writing stdout.
+
+    Args:
+        method (str): gzip, zstd or lz4
+        level (int): Compression level, clamped to the range the tool accepts
+        threads (int): Worker threads for compressors that support them
+
+    Returns:
+        list: Command and arguments
+    """
+    binary = _find_binary(method)
+    cmd = [binary, '-c']
+
+    if level:
+        low, high = COMPRESSORS[method]['levels']
+        cmd.append(f"-{min(max(int(level), low), high)}")
+
+    if threads:
+        if binary == 'pigz':
+            cmd.extend(['-p', str(int(threads))])
+        elif binary == 'zstd':
+            cmd.append(f"-T{int(threads)}")
+
+    if binary == 'zstd':
+        # Keep zstd quiet on stderr when writing to a pipe
+        cmd.append('-q')
+    return cmd
+
+
+def decompress_command(method):
+    """Build the command line of a decompressor reading stdin and writing stdout"""
+    binary = _find_binary(method)
+    cmd = [binary, '-d', '-c']
+    if binary == 'zstd':
+        cmd.append('-q')
+    return cmd
+
+
+def write_checksum_file(path, checksum):
+    """Write a sha256sum-compatible sidecar next to a backup"""
+    with open(f"{path}.sha256", 'w') as f:
+        f.write(f"{checksum}  {os.path.basename(path)}\n")
+
+
+def read_checksum_file(path):
+    """Read the checksum written by write_checksum_file, or None"""
+    try:
+        with open(f"{path}.sha256") as f:
+            return f.read().split()[0]
+    except (OSError, IndexError):
+        return None
+
+
+def dump_to_file(dump_cmd, output_path, env=None, compression=None, level=None, threads=None, limits=None,
+                 progress=None):
+    """
+    Run a dump command and stream its output, optionally compressed, to a file.
+
+    The output is written to a temporary name and renamed once every process
+    in the pipeline has succeeded. A sha256 of the file is computed while
+    writing and stored in a .sha256 sidecar.
+
+    Args:
+        dump_cmd (list): Dump command writing to stdout
+        output_path (str): Final backup path
+        env (dict): Environment for the dump command
+        compression (str): gzip, zstd, lz4, or None/'none' to store as-is
+        level (int): Compression level
+        threads (int): Compressor threads
+        limits (ResourceLimits): Resource limits of the job, see dump_pipeline
+        progress (callable): Called with (bytes_written, None) as the file grows
+
+    Returns:
+        str: Hex sha256 of the written file
+    """
+    partial_path = f"{output_path}.partial"
+    try:
+        with dump_pipeline(dump_cmd, env=env, compression=compression, level=level, threads=threads,
+                           limits=limits) as source:
+            if progress is not None:
+                source = ProgressReader(source, None, progress)
+            with open(partial_path, 'wb') as f:
+                checksum = copy_stream(source, f)
+        os.replace(partial_path, output_path)
+    except BaseException:
+        _remove_quietly(partial_path)
+        raise
+
+    write_checksum_file(output_path, checksum)
+    return checksum
+
+
+@contextmanager
+def dump_pipeline(dump_cmd, env=None, compression=None, level=None, threads=None, limits=None):
+    """
+    Context manager yielding the (compressed) output stream of a dump command.
+
+    Every process in the pipeline is waited for on exit and a failure of any
+    of them raises CompressionError, even if the stream was read fully.
+
+    With limits (an app.utils.throttle.ResourceLimits) the processes are put
+    under the job's limits and the dump output passes through a rate-limited
+    pipe on its way to the compressor.
+    """
+    # Resolved before the dump starts, so a missing binary can't strand it
+    compress_cmd = None
+    if compression and compression != 'none':
+        compress_cmd = compress_command(compression, level, threads)
+
+    dump_errors = tempfile.TemporaryFile()
+    processes = []
+    pipe = None
+
+    try:
+        dump = subprocess.Popen(dump_cmd, stdout=subprocess.PIPE, stderr=dump_errors, env=env)
+        processes.append((dump_cmd[0], dump, dump_errors))
+        source = dump.stdout
+
+        try:
+            if limits is not None:
+                limits.attach(dump)
+                pipe = limits.pipe(dump.stdout)
+                source = pipe.reader
+
+            if compress_cmd is not None:
+                compress_errors = tempfile.TemporaryFile()
+                try:
+                    compressor = subprocess.Popen(compress_cmd, stdin=source, stdout=subprocess.PIPE,
+                                                  stderr=compress_errors)
+                except BaseException:
+                    compress_errors.close()
+                    raise
+                # Let the dump see a broken pipe if the compressor dies
+                source.close()
+                processes.append((compress_cmd[0], compressor, compress_errors))
+                source = compressor.stdout
+                if limits is not None:
+                    limits.attach(compressor, compressor=True)
+        except BaseException:
+            # Nothing will read the dump's output, so it would block on a full pipe
+            for _, process, _ in processes:
+                process.kill()
+            source.close()
+            raise
+
+        try:
+            yield source
+        except BaseException:
+            for _, process, _ in processes:
+                process.kill()
+            raise
+        finally:
+            source.close()
+
+        _check_processes(processes)
+        if pipe is not None:
+            pipe.check()
+    finally:
+        for _, process, errors in processes:
+            process.wait()
+            errors.close()
+            if limits is not None:
+                limits.detach(process)
+        if pipe is not None:
+            pipe.join()
+        dump_errors.close()
+
+
+@contextmanager
+def open_compressed(path, compression=None, level=None, threads=None, limits=None):
+    """
+    Context manager yielding a binary writer whose output is compressed into path.
+
+    The compressor runs as a child process, under limits if given; a failure
+    raises CompressionError when the block exits.
+    """
+    with open(path, 'wb') as f:
+        if not compression or compression == 'none':
+            yield f
+            return
+
+        cmd = compress_command(compression, level, threads)
+        errors = tempfile.TemporaryFile()
+        process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=f, stderr=errors)
+        if limits is not None:
+            limits.attach(process, compressor=True)
+        try:
+            yield process.stdin
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+            process.wait()
+            if limits is not None:
+                limits.detach(process)
+
+        try:
+            _check_processes([(cmd[0], process, errors)])
+        finally:
+            errors.close()
+
+
+def compress_file(path, compression=None, level=None, threads=None):
+    """
+    Compress a file next to itself and remove the original.
+
+    A .sha256 sidecar is written for the result.
+
+    Returns:
+        str: Path of the compressed file (path itself without compression)
+    """
+    target = f"{path}{get_extension(compression)}"
+    if target != path:
+        partial_path = f"{target}.partial"
+        try:
+            with open(path, 'rb') as source, open_compressed(partial_path, compression, level, threads) as out:
+                shutil.copyfileobj(source, out, CHUNK_SIZE)
+            os.replace(partial_path, target)
+        except BaseException:
+            _remove_quietly(partial_path)
+            raise
+        os.remove(path)
+
+    write_checksum_file(target, file_checksum(target))
+    return target
+
+
+def file_checksum(path):
+    """Compute the sha256 of a file"""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+@contextmanager
+def open_backup(path, limits=None, progress=None):
+    """
+    Context manager yielding a readable stream of a backup's uncompressed contents.
+
+    Compressed backups are decompressed by a child process, under limits if
+    given; the yielded object has a real file descriptor and can be passed
+    as stdin to a client tool. With progress, the file is fed to the stream
+    by a thread that reports (bytes_read, file_size) to it.
+    """
+    method = get_compression(path)
+    with open(path, 'rb') as f:
+        if progress is not None:
+            reader = ProgressReader(f, os.fstat(f.fileno()).st_size, progress)
+            with open_pipe(reader, method, limits) as source:
+                yield source
+            return
+
+        if method is None:
+            yield f
+            return
+
+        cmd = decompress_command(method)
+        errors = tempfile.TemporaryFile()
+        process = subprocess.Popen(cmd, stdin=f, stdout=subprocess.PIPE, stderr=errors)
+        if limits is not None:
+            limits.attach(process, compressor=True)
+        try:
+            yield process.stdout
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            process.stdout.close()
+            process.wait()
+            if limits is not None:
+                limits.detach(process)
+
+        try:
+            _check_processes([(cmd[0], process, errors)])
+        finally:
+            errors.close()
+
+
+@contextmanager
+def open_pipe(reader, compression=None, limits=None):
+    """
+    Context manager yielding a readable pipe fed from reader by a background thread.
+
+    reader is any object with a read(size) method, such as a stream coming
+    from the network. Its data is decompressed first if compression is
+    given, under limits if given. The yielded object has a real file
+    descriptor and can be passed as stdin to a client tool.
+    """
+    errors = None
+    process = None
+
+    if not compression or compression == 'none':
+        read_fd, write_fd = os.pipe()
+        sink = os.fdopen(write_fd, 'wb')
+        output = os.fdopen(read_fd, 'rb')
+    else:
+        cmd = decompress_command(compression)
+        errors = tempfile.TemporaryFile()
+        process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=errors)
+        sink = process.stdin
+        output = process.stdout
+        if limits is not None:
+            limits.attach(process, compressor=True)
+
+    failures = []
+
+    def feed():
+        try:
+            while True:
+                chunk = reader.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                sink.write(chunk)
+        except BaseException as e:
+            failures.append(e)
+        finally:
+            try:
+                sink.close()
+            except OSError:
+                pass
+
+    feeder = threading.Thread(target=feed, name='pipe-feeder', daemon=True)
+    feeder.start()
+
+    try:
+        try:
+            yield output
+        except BaseException:
+            if process is not None:
+                process.kill()
+            raise
+        finally:
+            # Closing the read side unblocks the feeder if the consumer stopped early
+            output.close()
+            feeder.join()
+            if process is not None:
+                process.wait()
+                if limits is not None:
+                    limits.detach(process)
+
+        if failures:
+            raise failures[0]
+        if process is not None:
+            _check_processes([(cmd[0], process, errors)])
+    finally:
+        if errors is not None:
+            errors.close()
+
+
+def compress_chunks(chunks, compression=None, level=None, threads=None):
+    """
+    Compress an iterator of str or bytes chunks through an external compressor.
+
+    A background thread feeds the chunks to the compressor while the
+    compressed output is yielded, so memory use stays at a few pipe buffers
+    however much data passes through. Closing the generator early kills the
+    compressor, which stops the feeder and closes chunks.
+    """
+    if not compression or compression == 'none':
+        for chunk in chunks:
+            yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+        return
+
+    cmd = compress_command(compression, level, threads)
+    errors = tempfile.TemporaryFile()
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=errors)
+    failures = []
+
+    def feed():
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        except BaseException as e:
+            failures.append(e)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    feeder = threading.Thread(target=feed, name='compress-feeder', daemon=True)
+    feeder.start()
+
+    try:
+        while True:
+            data = process.stdout.read1(CHUNK_SIZE)
+            if not data:
+                break
+            yield data
+        feeder.join()
+        if failures:
+            raise failures[0]
+        _check_processes([(cmd[0], process, errors)])
+    except BaseException:
+        # Also reached when the consumer closes the generator early
+        process.kill()
+        raise
+    finally:
+        process.stdout.close()
+        feeder.join()
+        process.wait()
+        errors.close()
+
+
+def copy_stream(source, *targets):
+    """
+    Copy a stream to one or more writable objects in a single pass.
+
+    Returns:
+        str: Hex sha256 of the copied bytes
+    """
+    sha256 = hashlib.sha256()
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        sha256.update(chunk)
+        for target in targets:
+            target.write(chunk)
+    return sha256.hexdigest()
+
+
+def _check_processes(processes):
+    """Wait for pipeline processes and raise if any of them failed"""
+    failures = []
+    for name, process, errors in processes:
+        returncode = process.wait()
+        if returncode != 0:
+            errors.seek(0)
+            message = errors.read().decode('utf-8', errors='replace').strip()
+            failures.append(f"{name} exited with status {returncode}: {message}")
+
+    if failures:
+        raise CompressionError('; '.join(failures))
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -1,7 +1,24 @@
 import mysql.connector
 import subprocess
 import os
+import re
 import logging
+from contextlib import contextmanager
+
+from app.utils.bulk_import import batch_row
+from app.utils.search_plan import SearchPlan, SearchTimeout, parse_search, like_pattern, leading_index
+from app.utils.mysql_pool import get_pool
+from app.utils.query_stream import QueryStream
+from app.utils.schema_cache import get_schema_cache
+
+# Error raised when MAX_EXECUTION_TIME stops a SELECT
+ER_QUERY_TIMEOUT = 3024
+
+# Column types LIKE 'prefix%' can use an index on
+TEXT_TYPE_PATTERN = re.compile(r'^((var)?char|(tiny|medium|long)?text|enum|set)\b', re.IGNORECASE)
+
+# Characters with a meaning in MATCH ... AGAINST (... IN BOOLEAN MODE)
+BOOLEAN_OPERATORS = re.compile(r'[-+<>()~*"@]+')
 
 class MySQLManager:
     def __init__(self, host, port, user, password):
@@ -9,8 +26,10 @@ class MySQLManager:
         self.port = port
         self.user = user
         self.password = password
+        # Identifies the server in the schema cache
+        self.server = f"mysql://{host}:{port}"
         
-    def get_connection(self, database=None):
+    def get_connection(self, database=None, allow_local_infile=False):
         """Get a MySQL connection"""
         try:
             conn = mysql.connector.connect(
@@ -18,46 +37,60 @@ class MySQLManager:
                 port=self.port,
                 user=self.user,
                 password=self.password,
-                database=database
+                database=database,
+                allow_local_infile=allow_local_infile
             )
             return conn
         except Exception as e:
             logging.error(f"MySQL connection error: {str(e)}")
             raise
     
+    def connection(self, database=None):
+        """Check out a pooled MySQL connection for use in a with block"""
+        pool = get_pool(
+            'mysql.connector',
+            self.host,
+            self.port,
+            self.user,
+            self.password,
+            database,
+            lambda: self.get_connection(database)
+        )
+        return pool.connection()
+    
     def get_status(self):
         """Check if MySQL is running"""
         try:
-            conn = self.get_connection()
-            conn.close()
-            return True
+            with self.connection():
+                return True
         except:
             return False
     
     def list_databases(self):
         """List all databases"""
         try:
-            conn = self.get_connection()
+            return get_schema_cache().get(self.server, ('databases',), self._load_databases)
+        except Exception as e:
+            logging.error(f"Error listing MySQL databases: {str(e)}")
+            return []
+    
+    def _load_databases(self):
+        with self.connection() as conn:
             cursor = conn.cursor(dictionary=True)
             cursor.execute("SHOW DATABASES")
             databases = [row['Database'] for row in cursor.fetchall() 
                         if row['Database'] not in ['information_schema', 'performance_schema', 'mysql', 'sys']]
             cursor.close()
-            conn.close()
-            return databases
-        except Exception as e:
-            logging.error(f"Error listing MySQL databases: {str(e)}")
-            return []
+        return databases
     
     def list_users(self):
         """List all users"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT User, Host FROM mysql.user")
-            users = [f"{row['User']}@{row['Host']}" for row in cursor.fetchall()]
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute("SELECT User, Host FROM mysql.user")
+                users = [f"{row['User']}@{row['Host']}" for row in cursor.fetchall()]
+                cursor.close()
             return users
         except Exception as e:
             logging.error(f"Error listing MySQL users: {str(e)}")
@@ -66,12 +99,12 @@ class MySQLManager:
     def create_database(self, db_name):
         """Create a new database"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(f"CREATE DATABASE `{db_name}`")
-            conn.commit()
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"CREATE DATABASE `{db_name}`")
+                conn.commit()
+                cursor.close()
+            get_schema_cache().invalidate(self.server, db_name)
             return True
         except Exception as e:
             logging.error(f"Error creating MySQL database: {str(e)}")
@@ -80,12 +113,12 @@ class MySQLManager:
     def delete_database(self, db_name):
         """Delete a database"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(f"DROP DATABASE `{db_name}`")
-            conn.commit()
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"DROP DATABASE `{db_name}`")
+                conn.commit()
+                cursor.close()
+            get_schema_cache().invalidate(self.server, db_name)
             return True
         except Exception as e:
             logging.error(f"Error deleting MySQL database: {str(e)}")
@@ -94,12 +127,11 @@ class MySQLManager:
     def create_user(self, username, password, host='%'):
         """Create a new user"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(f"CREATE USER '{username}'@'{host}' IDENTIFIED BY '{password}'")
-            conn.commit()
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"CREATE USER '{username}'@'{host}' IDENTIFIED BY '{password}'")
+                conn.commit()
+                cursor.close()
             return True
         except Exception as e:
             logging.error(f"Error creating MySQL user: {str(e)}")
@@ -108,13 +140,12 @@ class MySQLManager:
     def grant_privileges(self, username, db_name, host='%'):
         """Grant privileges to a user on a database"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(f"GRANT ALL PRIVILEGES ON `{db_name}`.* TO '{username}'@'{host}'")
-            cursor.execute("FLUSH PRIVILEGES")
-            conn.commit()
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"GRANT ALL PRIVILEGES ON `{db_name}`.* TO '{username}'@'{host}'")
+                cursor.execute("FLUSH PRIVILEGES")
+                conn.commit()
+                cursor.close()
             return True
         except Exception as e:
             logging.error(f"Error granting MySQL privileges: {str(e)}")
@@ -123,12 +154,11 @@ class MySQLManager:
     def delete_user(self, username, host='%'):
         """Delete a user"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(f"DROP USER '{username}'@'{host}'")
-            conn.commit()
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"DROP USER '{username}'@'{host}'")
+                conn.commit()
+                cursor.close()
             return True
         except Exception as e:
             logging.error(f"Error deleting MySQL user: {str(e)}")
@@ -137,18 +167,464 @@ class MySQLManager:
     def change_password(self, username, new_password, host='%'):
         """Change user password"""
         try:
-            conn = self.get_connection()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"ALTER USER '{username}'@'{host}' IDENTIFIED BY '{new_password}'")
+                cursor.execute("FLUSH PRIVILEGES")
+                conn.commit()
+                cursor.close()
+            return True
+        except Exception as e:
+            logging.error(f"Error changing MySQL password: {str(e)}")
+            return False
+    
+    @staticmethod
+    def _quote(identifier):
+        """Quote a table or column name"""
+        return '`' + str(identifier).replace('`', '``') + '`'
+    
+    def list_tables(self, db_name):
+        """List the tables of a database with their size statistics"""
+        return get_schema_cache().get(self.server, ('tables', db_name), lambda: self._load_tables(db_name))
+    
+    def _load_tables(self, db_name):
+        with self.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT TABLE_NAME AS name, TABLE_ROWS AS `rows`, DATA_LENGTH + INDEX_LENGTH AS size,
+                       ENGINE AS engine, CREATE_TIME AS created
+                FROM information_schema.TABLES
+                WHERE TABLE_SCHEMA = %s
+                ORDER BY TABLE_NAME
+            """, (db_name,))
+            tables = cursor.fetchall()
+            cursor.close()
+        return tables
+    
+    def table_version(self, db_name, table_name):
+        """
+        Get a cheap version of a table's definition, for schema cache checks.
+        
+        CREATE_TIME changes when a table is recreated or rebuilt by ALTER
+        TABLE. Both columns are only as fresh as information_schema_stats_expiry
+        allows, so the cache TTL bounds how long other changes go unseen.
+        """
+        with self.connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(f"ALTER USER '{username}'@'{host}' IDENTIFIED BY '{new_password}'")
-            cursor.execute("FLUSH PRIVILEGES")
-            conn.commit()
+            cursor.execute(
+                "SELECT CREATE_TIME, UPDATE_TIME FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s",
+                (db_name, table_name)
+            )
+            row = cursor.fetchone()
             cursor.close()
-            conn.close()
+        return tuple(row) if row else None
+    
+    def get_table_structure(self, db_name, table_name):
+        """Get the column definitions of a table, cached until the table changes"""
+        return get_schema_cache().get(
+            self.server,
+            ('structure', db_name, table_name),
+            lambda: self._load_table_structure(db_name, table_name),
+            lambda: self.table_version(db_name, table_name)
+        )
+    
+    def _load_table_structure(self, db_name, table_name):
+        with self.connection(db_name) as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT c.COLUMN_NAME AS name, c.COLUMN_TYPE AS type, c.IS_NULLABLE AS nullable,
+                       c.COLUMN_DEFAULT AS `default`, c.COLUMN_KEY AS `key`, c.EXTRA AS extra,
+                       s.SEQ_IN_INDEX AS primary_key_position
+                FROM information_schema.COLUMNS c
+                LEFT JOIN information_schema.STATISTICS s
+                    ON s.TABLE_SCHEMA = c.TABLE_SCHEMA AND s.TABLE_NAME = c.TABLE_NAME
+                    AND s.COLUMN_NAME = c.COLUMN_NAME AND s.INDEX_NAME = 'PRIMARY'
+                WHERE c.TABLE_SCHEMA = %s AND c.TABLE_NAME = %s
+                ORDER BY c.ORDINAL_POSITION
+            """, (db_name, table_name))
+            rows = cursor.fetchall()
+            cursor.close()
+        
+        return [{
+            'name': row['name'],
+            'type': row['type'],
+            'nullable': row['nullable'] == 'YES',
+            'default': row['default'],
+            'primary_key': row['key'] == 'PRI',
+            'primary_key_position': row['primary_key_position'],
+            'unique_key': row['key'] == 'UNI',
+            'index': row['key'] == 'MUL',
+            'extra': row['extra']
+        } for row in rows]
+    
+    def list_indexes(self, db_name, table_name):
+        """Get the indexes of a table, cached until the table changes"""
+        return get_schema_cache().get(
+            self.server,
+            ('indexes', db_name, table_name),
+            lambda: self._load_indexes(db_name, table_name),
+            lambda: self.table_version(db_name, table_name)
+        )
+    
+    def _load_indexes(self, db_name, table_name):
+        with self.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT INDEX_NAME AS name, COLUMN_NAME AS `column`, NON_UNIQUE AS non_unique, INDEX_TYPE AS method
+                FROM information_schema.STATISTICS
+                WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
+                ORDER BY INDEX_NAME, SEQ_IN_INDEX
+            """, (db_name, table_name))
+            rows = cursor.fetchall()
+            cursor.close()
+        
+        indexes = {}
+        for row in rows:
+            index = indexes.setdefault(row['name'], {
+                'name': row['name'],
+                'columns': [],
+                'unique': not int(row['non_unique']),
+                'method': row['method'],
+                'partial': False
+            })
+            index['columns'].append(row['column'])
+        return list(indexes.values())
+    
+    def plan_search(self, db_name, table_name, search):
+        """
+        Plan the WHERE conditions for a search, see app.utils.search_plan.
+        
+        Column filters use B-tree indexes that start with the column. Free
+        text uses the widest FULLTEXT index if the table has one, requiring
+        every word, and otherwise falls back to LIKE on every column, which
+        needs a scan.
+        """
+        plan = SearchPlan()
+        if not search:
+            return plan
+        
+        structure = self.get_table_structure(db_name, table_name)
+        indexes = self.list_indexes(db_name, table_name)
+        types = {column['name']: column['type'] for column in structure}
+        filters, text = parse_search(search, list(types))
+        
+        for search_filter in filters:
+            column = search_filter['column']
+            quoted = self._quote(column)
+            op = search_filter['op']
+            value = search_filter['value']
+            index = leading_index(indexes, column)
+            
+            if op in ('null', 'not null'):
+                plan.add(f"{quoted} IS {op.upper()}", [], index, search_filter['raw'])
+            elif op in ('prefix', 'like'):
+                pattern = like_pattern(value) + ('%' if op == 'prefix' else '')
+                # Only a fixed leading part of a string can be looked up in an index
+                usable = TEXT_TYPE_PATTERN.match(types[column]) and not pattern.startswith('%')
+                plan.add(f"{quoted} LIKE %s", [pattern], index if usable else None, search_filter['raw'])
+            elif op == '!=':
+                plan.add(f"{quoted} <> %s", [value], None, search_filter['raw'])
+            else:
+                plan.add(f"{quoted} {op} %s", [value], index, search_filter['raw'])
+        
+        if text:
+            fulltext = [index for index in indexes if index['method'] == 'FULLTEXT']
+            # Operators typed in the search box are not passed on as syntax
+            words = BOOLEAN_OPERATORS.sub(' ', text).split()
+            if fulltext and words:
+                index = max(fulltext, key=lambda index: len(index['columns']))
+                columns = ', '.join(self._quote(column) for column in index['columns'])
+                plan.add(f"MATCH ({columns}) AGAINST (%s IN BOOLEAN MODE)",
+                         [' '.join(f"+{word}" for word in words)], index['name'], f'"{text}"')
+            else:
+                condition = ' OR '.join(f"CAST({self._quote(column)} AS CHAR) LIKE %s" for column in types)
+                plan.add(f"({condition})", [f"%{like_pattern(text)}%"] * len(types), None, f'"{text}"')
+        return plan
+    
+    def _search_conditions(self, db_name, table_name, search):
+        """Build the WHERE conditions for a search"""
+        plan = self.plan_search(db_name, table_name, search)
+        return list(plan.conditions), list(plan.params)
+    
+    @staticmethod
+    def _select(timeout=None):
+        """SELECT with an optimizer hint stopping the statement after timeout seconds"""
+        if not timeout:
+            return "SELECT"
+        return f"SELECT /*+ MAX_EXECUTION_TIME({int(timeout * 1000)}) */"
+    
+    @staticmethod
+    @contextmanager
+    def _session(on_session, session_id):
+        """
+        Report the session a statement runs in to on_session, and report
+        None once it is done, before the connection can be reused
+        """
+        if on_session is None:
+            yield
+            return
+        on_session(session_id)
+        try:
+            yield
+        finally:
+            on_session(None)
+    
+    @contextmanager
+    def _search_timeout(self, timeout):
+        """Turn MAX_EXECUTION_TIME errors into SearchTimeout"""
+        try:
+            yield
+        except mysql.connector.Error as e:
+            if e.errno == ER_QUERY_TIMEOUT:
+                raise SearchTimeout(f"The search was stopped after {timeout}s") from e
+            raise
+    
+    def estimate_records(self, db_name, table_name):
+        """Get the row count estimate kept in table statistics, or None"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s",
+                (db_name, table_name)
+            )
+            row = cursor.fetchone()
+            cursor.close()
+        return int(row[0]) if row and row[0] is not None else None
+    
+    def count_records(self, db_name, table_name, search='', on_session=None, limit=None, timeout=None):
+        """
+        Count the rows of a table matching search.
+        
+        If on_session is given it is called with the server session id before
+        the count starts, so the count can be stopped with cancel_session(),
+        and with None once the connection is no longer running it.
+        With limit, counting stops after limit matching rows. With timeout,
+        the server stops the count after that many seconds and SearchTimeout
+        is raised.
+        """
+        conditions, params = self._search_conditions(db_name, table_name, search)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        if limit:
+            source = f"(SELECT 1 FROM {self._quote(table_name)}{where} LIMIT {int(limit)}) AS capped"
+        else:
+            source = f"{self._quote(table_name)}{where}"
+        
+        with self._search_timeout(timeout), self.connection(db_name) as conn, \
+                self._session(on_session, conn.connection_id):
+            cursor = conn.cursor()
+            cursor.execute(f"{self._select(timeout)} COUNT(*) FROM {source}", params)
+            count = cursor.fetchone()[0]
+            cursor.close()
+        return count
+    
+    def get_table_data(self, db_name, table_name, offset=0, limit=50, search='', sort_by='', sort_dir='asc',
+                       timeout=None):
+        """Get one page of rows using LIMIT/OFFSET, stopped after timeout seconds if given"""
+        conditions, params = self._search_conditions(db_name, table_name, search)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        order = ''
+        if sort_by:
+            order = f" ORDER BY {self._quote(sort_by)} {'DESC' if sort_dir == 'desc' else 'ASC'}"
+        
+        with self._search_timeout(timeout), self.connection(db_name) as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                f"{self._select(timeout)} * FROM {self._quote(table_name)}{where}{order} LIMIT %s OFFSET %s",
+                params + [int(limit), int(offset)]
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+        return rows
+    
+    def get_table_data_keyset(self, db_name, table_name, key_columns, limit=50,
+                              after=None, before=None, search='', sort_dir='asc', timeout=None):
+        """
+        Get one page of rows ordered by a unique key, seeking past the key
+        values in after (or before) instead of skipping rows with OFFSET.
+        The server stops the read after timeout seconds if given.
+        
+        Returns:
+            tuple: (rows, has_more) where has_more is True if more rows exist
+                in the direction the page was read
+        """
+        conditions, params = self._search_conditions(db_name, table_name, search)
+        
+        # Paging backwards scans in the opposite order, rows are flipped afterwards
+        backwards = before is not None
+        scan_desc = (sort_dir == 'desc') != backwards
+        
+        boundary = before if backwards else after
+        if boundary is not None:
+            key_list = ', '.join(self._quote(column) for column in key_columns)
+            placeholders = ', '.join(['%s'] * len(key_columns))
+            conditions.append(f"({key_list}) {'<' if scan_desc else '>'} ({placeholders})")
+            params.extend(boundary)
+        
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        order = ', '.join(f"{self._quote(column)} {'DESC' if scan_desc else 'ASC'}" for column in key_columns)
+        
+        with self._search_timeout(timeout), self.connection(db_name) as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                f"{self._select(timeout)} * FROM {self._quote(table_name)}{where} ORDER BY {order} LIMIT %s",
+                params + [int(limit) + 1]
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backwards:
+            rows.reverse()
+        return rows, has_more
+    
+    def cancel_session(self, session_id):
+        """Stop the statement running on another session without closing it"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"KILL QUERY {int(session_id)}")
+                cursor.close()
             return True
         except Exception as e:
-            logging.error(f"Error changing MySQL password: {str(e)}")
+            logging.error(f"Error cancelling MySQL query: {str(e)}")
             return False
     
+    def run_query(self, db_name, query):
+        """Run a query and return all rows as dictionaries"""
+        with self.connection(db_name) as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query)
+            rows = cursor.fetchall() if cursor.with_rows else []
+            cursor.close()
+        return rows
+    
+    def execute_query(self, db_name, query, timeout=None, on_session=None):
+        """
+        Execute a statement and return the number of affected rows.
+        
+        MAX_EXECUTION_TIME only applies to SELECTs, so timeout is not enforced
+        here; stop overrunning statements with cancel_session(), using the
+        session id passed to on_session before the statement starts. None
+        is passed once it is done, before the connection goes back to the pool.
+        """
+        try:
+            with self.connection(db_name) as conn, self._session(on_session, conn.connection_id):
+                cursor = conn.cursor()
+                cursor.execute(query)
+                affected_rows = cursor.rowcount
+                conn.commit()
+                cursor.close()
+        finally:
+            # A failed DDL statement may still have changed part of the schema
+            get_schema_cache().invalidate_for(self.server, db_name, query)
+        return affected_rows
+    
+    def drop_table(self, db_name, table_name):
+        """Drop a table"""
+        try:
+            with self.connection(db_name) as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"DROP TABLE {self._quote(table_name)}")
+                cursor.close()
+        finally:
+            get_schema_cache().invalidate(self.server, db_name, table_name)
+    
+    def truncate_table(self, db_name, table_name):
+        """Delete every row of a table"""
+        try:
+            with self.connection(db_name) as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"TRUNCATE TABLE {self._quote(table_name)}")
+                cursor.close()
+        finally:
+            get_schema_cache().invalidate(self.server, db_name, table_name)
+    
+    def stream_query(self, db_name, query, batch_size=1000, timeout=None, on_session=None):
+        """
+        Run a query with an unbuffered cursor on a dedicated connection.
+        
+        Rows are read from the server as the returned QueryStream is iterated,
+        so memory use does not depend on the size of the result. The server
+        aborts a SELECT running longer than timeout seconds. on_session gets
+        the session id before the query starts, for cancel_session(), and
+        None when the stream is closed.
+        """
+        conn = self.get_connection(db_name)
+        try:
+            if on_session:
+                on_session(conn.connection_id)
+            # An unbuffered cursor is mysql.connector's equivalent of SSCursor
+            cursor = conn.cursor(buffered=False)
+            if timeout:
+                cursor.execute("SET SESSION MAX_EXECUTION_TIME = %s", (int(timeout * 1000),))
+            cursor.execute(query)
+            columns = list(cursor.column_names)
+        except Exception:
+            conn.close()
+            raise
+        
+        def batches():
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield rows
+        
+        def close(exhausted):
+            if on_session:
+                on_session(None)
+            if exhausted:
+                cursor.close()
+                conn.close()
+            else:
+                # Closing normally would first read every remaining row
+                conn.shutdown()
+        
+        return QueryStream(columns, batches(), close)
+    
+    def stream_table(self, db_name, table_name, batch_size=1000):
+        """Stream every row of a table, see stream_query()"""
+        return self.stream_query(db_name, f"SELECT * FROM {self._quote(table_name)}", batch_size)
+    
+    @contextmanager
+    def bulk_loader(self, db_name, table_name, columns):
+        """
+        Open a dedicated connection for loading rows with LOAD DATA LOCAL INFILE.
+        
+        Yields a function that loads a file of tab-separated rows in the
+        LOAD DATA default format (backslash escapes, \\N for NULL) into the
+        given columns, commits, and returns (rows_loaded, warnings) where
+        warnings holds (batch_row, message) pairs. With LOCAL the server
+        turns bad values and duplicate keys into warnings and skips the
+        duplicates, so a batch is never rejected over a single row. The
+        server must have local_infile enabled.
+        """
+        statement = (
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {self._quote(table_name)} CHARACTER SET utf8mb4 "
+            f"({', '.join(self._quote(column) for column in columns)})"
+        )
+        conn = self.get_connection(db_name, allow_local_infile=True)
+        cursor = conn.cursor()
+        
+        def load(path):
+            cursor.execute(statement, (path,))
+            loaded = cursor.rowcount
+            warnings = []
+            if cursor.warning_count:
+                cursor.execute("SHOW WARNINGS")
+                warnings = [(batch_row(message), message) for _level, _code, message in cursor.fetchall()]
+            conn.commit()
+            return loaded, warnings
+        
+        try:
+            yield load
+        finally:
+            cursor.close()
+            conn.close()
+            # Table statistics in the cached table list are now stale
+            get_schema_cache().invalidate(self.server, db_name, table_name)
+    
     def backup_database(self, db_name, backup_path):
         """Backup a database to a file"""
         try:
@@ -185,6 +661,8 @@ class MySQLManager:
             with open(backup_path, 'rb') as f:
                 subprocess.run(cmd, stdin=f, check=True)
             
+            # The dump can create and replace any database
+            get_schema_cache().invalidate(self.server)
             return True
         except Exception as e:
             logging.error(f"Error restoring MySQL database: {str(e)}")
@@ -0,0 +1,271 @@
+"""
+Process-wide MySQL connection pooling for NEXDB.
+Connections are pooled per (driver, host, port, user, database) so that the
+managers and services reuse authenticated sessions instead of reconnecting
+on every call.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Defaults, overridden from the app config by init_app()
+_settings = {
+    'min_size': 1,
+    'max_size': 10,
+    'idle_timeout': 300,
+    'checkout_timeout': 30,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no connection could be checked out before the timeout"""
+    pass
+
+
+class MySQLConnectionPool:
+    """A bounded pool of connections created by a single connect factory"""
+
+    def __init__(self, connect, password=None, min_size=1, max_size=10, idle_timeout=300, checkout_timeout=30):
+        self._connect = connect
+        # Password connect uses, so the pool can be recycled when it changes
+        self.password = password
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+
+        self._idle = deque()  # (connection, returned_at)
+        self._size = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    @property
+    def size(self):
+        """Number of open connections owned by the pool"""
+        return self._size
+
+    @property
+    def idle(self):
+        """Number of connections waiting to be checked out"""
+        return len(self._idle)
+
+    def fill(self):
+        """Open connections until the pool holds min_size; failures surface on checkout"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+
+            try:
+                conn = self._connect()
+            except Exception as e:
+                logging.debug(f"MySQL pool warm-up failed: {str(e)}")
+                with self._cond:
+                    self._size -= 1
+                return
+
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def acquire(self):
+        """Check out a live connection, opening a new one if the pool allows it"""
+        deadline = time.monotonic() + self.checkout_timeout
+        expired = []
+
+        try:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolExhaustedError("Connection pool is closed")
+
+                    expired.extend(self._prune_idle())
+
+                    if self._idle:
+                        conn, _ = self._idle.pop()
+                        break
+
+                    if self._size < self.max_size:
+                        self._size += 1
+                        conn = None
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolExhaustedError(
+                            f"Timed out after {self.checkout_timeout}s waiting for a MySQL connection"
+                        )
+                    self._cond.wait(remaining)
+        finally:
+            # Closing says goodbye to the server, so it happens outside the lock
+            for stale in expired:
+                self._close_quietly(stale)
+
+        # Connect and ping outside the lock so slow servers don't block the pool
+        if conn is not None and self._is_alive(conn):
+            return conn
+
+        if conn is not None:
+            self._close_quietly(conn)
+
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, or close it if discard is set"""
+        if not discard:
+            try:
+                # Drop any transaction state left behind by the caller
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if discard or self._closed:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+        if discard or self._closed:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager yielding a pooled connection.
+
+        The connection is returned to the pool on normal exit and closed if
+        the block raises or is abandoned, since its state can no longer be
+        trusted.
+        """
+        conn = self.acquire()
+        discard = True
+        try:
+            yield conn
+            discard = False
+        finally:
+            self.release(conn, discard=discard)
+
+    def close(self):
+        """Close all idle connections and stop handing out new ones"""
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._size -= len(idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def _prune_idle(self):
+        """
+        Take connections idle for longer than idle_timeout out of the pool,
+        keeping min_size open. Called under the lock; the caller closes the
+        returned connections once it has released it.
+        """
+        expired = []
+        if not self.idle_timeout:
+            return expired
+
+        cutoff = time.monotonic() - self.idle_timeout
+        # Oldest connections sit at the left of the deque
+        while self._idle and self._size > self.min_size and self._idle[0][1] < cutoff:
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            expired.append(conn)
+        return expired
+
+    @staticmethod
+    def _is_alive(conn):
+        """Ping the server without reconnecting"""
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def init_app(app):
+    """Load pool sizing from the Flask app config"""
+    _settings['min_size'] = app.config.get('MYSQL_POOL_MIN_SIZE', _settings['min_size'])
+    _settings['max_size'] = app.config.get('MYSQL_POOL_MAX_SIZE', _settings['max_size'])
+    _settings['idle_timeout'] = app.config.get('MYSQL_POOL_IDLE_TIMEOUT', _settings['idle_timeout'])
+    _settings['checkout_timeout'] = app.config.get('MYSQL_POOL_TIMEOUT', _settings['checkout_timeout'])
+
+
+def get_pool(driver, host, port, user, password, database, connect):
+    """
+    Get the shared pool for a connection target, creating it on first use.
+
+    A pool created with a different password is closed and replaced, so
+    changed credentials take effect without a restart.
+
+    Args:
+        driver (str): Name of the client library, pools never mix drivers
+        host (str): MySQL host
+        port (int): MySQL port
+        user (str): MySQL user
+        password (str): MySQL password connect uses
+        database (str): Default database, or None
+        connect (callable): Zero-argument factory returning a new connection
+
+    Returns:
+        MySQLConnectionPool: The pool for this target
+    """
+    global _pools_pid
+    key = (driver, host, int(port), user, database or None)
+
+    with _pools_lock:
+        # Connections must not be shared across forked workers
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+
+        pool = _pools.get(key)
+        stale = None
+        if pool is not None and pool.password != password:
+            logging.info("MySQL credentials changed, recycling connection pool")
+            stale = pool
+            pool = None
+        created = pool is None
+        if created:
+            pool = MySQLConnectionPool(connect, password, **_settings)
+            _pools[key] = pool
+
+    if stale is not None:
+        stale.close()
+    if created:
+        pool.fill()
+    return pool
+
+
+def close_all_pools():
+    """Close every pool owned by this process"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+
+    for pool in pools:
+        pool.close()
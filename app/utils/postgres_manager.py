@@ -1,7 +1,33 @@
 import psycopg2
+import psycopg2.extras
 import subprocess
 import os
 import logging
+import queue
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+
+from app.utils.bulk_import import BulkLoadError, batch_row
+from app.utils.search_plan import SearchPlan, SearchTimeout, parse_search, like_pattern, leading_index
+from app.utils.postgres_pool import get_pool
+from app.utils.query_stream import QueryStream
+from app.utils.schema_cache import get_schema_cache
+
+# Bytes of COPY output collected before it is handed to the reader, and
+# collected chunks buffered ahead of a slow reader
+COPY_CHUNK_SIZE = 256 * 1024
+COPY_QUEUE_CHUNKS = 16
+
+# Column types LIKE can be run on without a cast
+TEXT_TYPE_PATTERN = re.compile(r'^(text|character|citext|name)\b')
+
+# Collations under which a B-tree index can serve LIKE 'prefix%'
+BYTE_ORDER_COLLATIONS = ('C', 'POSIX')
+
+# The text search configuration of an indexed to_tsvector() expression
+TSVECTOR_CONFIG_PATTERN = re.compile(r"^to_tsvector\(('(?:[^']|'')*'::regconfig)\s*,")
 
 class PostgresManager:
     def __init__(self, host, port, user, password):
@@ -9,6 +35,8 @@ class PostgresManager:
         self.port = port
         self.user = user
         self.password = password
+        # Identifies the server in the schema cache
+        self.server = f"postgres://{host}:{port}"
         
     def get_connection(self, database="postgres"):
         """Get a PostgreSQL connection"""
@@ -25,38 +53,43 @@ class PostgresManager:
             logging.error(f"PostgreSQL connection error: {str(e)}")
             raise
     
+    def connection(self, database="postgres"):
+        """Check out a pooled PostgreSQL connection for use in a with block"""
+        pool = get_pool(self.host, self.port, self.user, self.password)
+        return pool.connection(database)
+    
     def get_status(self):
         """Check if PostgreSQL is running"""
         try:
-            conn = self.get_connection()
-            conn.close()
-            return True
+            with self.connection():
+                return True
         except:
             return False
     
     def list_databases(self):
         """List all databases"""
         try:
-            conn = self.get_connection()
+            return get_schema_cache().get(self.server, ('databases',), self._load_databases)
+        except Exception as e:
+            logging.error(f"Error listing PostgreSQL databases: {str(e)}")
+            return []
+    
+    def _load_databases(self):
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT datname FROM pg_database WHERE datistemplate = false AND datname != 'postgres'")
             databases = [row[0] for row in cursor.fetchall()]
             cursor.close()
-            conn.close()
-            return databases
-        except Exception as e:
-            logging.error(f"Error listing PostgreSQL databases: {str(e)}")
-            return []
+        return databases
     
     def list_users(self):
         """List all users"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT rolname FROM pg_roles WHERE rolcanlogin = true")
-            users = [row[0] for row in cursor.fetchall()]
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT rolname FROM pg_roles WHERE rolcanlogin = true")
+                users = [row[0] for row in cursor.fetchall()]
+                cursor.close()
             return users
         except Exception as e:
             logging.error(f"Error listing PostgreSQL users: {str(e)}")
@@ -65,12 +98,12 @@ class PostgresManager:
     def create_database(self, db_name):
         """Create a new database"""
         try:
-            conn = self.get_connection()
-            conn.autocommit = True
-            cursor = conn.cursor()
-            cursor.execute(f"CREATE DATABASE {db_name}")
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f"CREATE DATABASE {db_name}")
+                cursor.close()
+            get_schema_cache().invalidate(self.server, db_name)
             return True
         except Exception as e:
             logging.error(f"Error creating PostgreSQL database: {str(e)}")
@@ -79,12 +112,15 @@ class PostgresManager:
     def delete_database(self, db_name):
         """Delete a database"""
         try:
-            conn = self.get_connection()
-            conn.autocommit = True
-            cursor = conn.cursor()
-            cursor.execute(f"DROP DATABASE {db_name}")
-            cursor.close()
-            conn.close()
+            # Pooled sessions on the database would block the drop
+            get_pool(self.host, self.port, self.user, self.password).discard(db_name)
+            
+            with self.connection() as conn:
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f"DROP DATABASE {db_name}")
+                cursor.close()
+            get_schema_cache().invalidate(self.server, db_name)
             return True
         except Exception as e:
             logging.error(f"Error deleting PostgreSQL database: {str(e)}")
@@ -93,12 +129,11 @@ class PostgresManager:
     def create_user(self, username, password):
         """Create a new user"""
         try:
-            conn = self.get_connection()
-            conn.autocommit = True
-            cursor = conn.cursor()
-            cursor.execute(f"CREATE USER {username} WITH PASSWORD '{password}'")
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f"CREATE USER {username} WITH PASSWORD '{password}'")
+                cursor.close()
             return True
         except Exception as e:
             logging.error(f"Error creating PostgreSQL user: {str(e)}")
@@ -107,12 +142,11 @@ class PostgresManager:
     def grant_privileges(self, username, db_name):
         """Grant privileges to a user on a database"""
         try:
-            conn = self.get_connection()
-            conn.autocommit = True
-            cursor = conn.cursor()
-            cursor.execute(f"GRANT ALL PRIVILEGES ON DATABASE {db_name} TO {username}")
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f"GRANT ALL PRIVILEGES ON DATABASE {db_name} TO {username}")
+                cursor.close()
             return True
         except Exception as e:
             logging.error(f"Error granting PostgreSQL privileges: {str(e)}")
@@ -121,12 +155,11 @@ class PostgresManager:
     def delete_user(self, username):
         """Delete a user"""
         try:
-            conn = self.get_connection()
-            conn.autocommit = True
-            cursor = conn.cursor()
-            cursor.execute(f"DROP USER {username}")
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f"DROP USER {username}")
+                cursor.close()
             return True
         except Exception as e:
             logging.error(f"Error deleting PostgreSQL user: {str(e)}")
@@ -135,17 +168,656 @@ class PostgresManager:
     def change_password(self, username, new_password):
         """Change user password"""
         try:
-            conn = self.get_connection()
-            conn.autocommit = True
-            cursor = conn.cursor()
-            cursor.execute(f"ALTER USER {username} WITH PASSWORD '{new_password}'")
-            cursor.close()
-            conn.close()
+            with self.connection() as conn:
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f"ALTER USER {username} WITH PASSWORD '{new_password}'")
+                cursor.close()
             return True
         except Exception as e:
             logging.error(f"Error changing PostgreSQL password: {str(e)}")
             return False
     
+    @staticmethod
+    def _quote(identifier):
+        """Quote a table or column name"""
+        return '"' + str(identifier).replace('"', '""') + '"'
+    
+    def list_tables(self, db_name):
+        """List the tables of a database with their size statistics"""
+        return get_schema_cache().get(self.server, ('tables', db_name), lambda: self._load_tables(db_name))
+    
+    def _load_tables(self, db_name):
+        with self.connection(db_name) as conn:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            cursor.execute("""
+                SELECT c.relname AS name, GREATEST(c.reltuples, 0)::bigint AS rows,
+                       pg_total_relation_size(c.oid) AS size, NULL AS engine, NULL AS created
+                FROM pg_class c
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE c.relkind IN ('r', 'p') AND pg_table_is_visible(c.oid)
+                    AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+                ORDER BY c.relname
+            """)
+            tables = cursor.fetchall()
+            cursor.close()
+        return tables
+    
+    def table_version(self, db_name, table_name):
+        """
+        Get a cheap version of a table's definition, for schema cache checks.
+        
+        ALTER TABLE rewrites the table's pg_class row, giving it a new xmin.
+        """
+        with self.connection(db_name) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT xmin::text FROM pg_class WHERE oid = to_regclass(%s)", (self._quote(table_name),))
+            row = cursor.fetchone()
+            cursor.close()
+        return row[0] if row else None
+    
+    def get_table_structure(self, db_name, table_name):
+        """Get the column definitions of a table, cached until the table changes"""
+        return get_schema_cache().get(
+            self.server,
+            ('structure', db_name, table_name),
+            lambda: self._load_table_structure(db_name, table_name),
+            lambda: self.table_version(db_name, table_name)
+        )
+    
+    def _load_table_structure(self, db_name, table_name):
+        with self.connection(db_name) as conn:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            cursor.execute("""
+                SELECT a.attnum, a.attname AS name,
+                       format_type(a.atttypid, a.atttypmod) AS type,
+                       NOT a.attnotnull AS nullable,
+                       pg_get_expr(d.adbin, d.adrelid) AS "default",
+                       CASE WHEN a.attidentity IN ('a', 'd') THEN 'identity' ELSE '' END AS extra
+                FROM pg_attribute a
+                LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+                WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+                ORDER BY a.attnum
+            """, (self._quote(table_name),))
+            columns = cursor.fetchall()
+            cursor.execute("""
+                SELECT i.indisprimary, i.indisunique, i.indkey::int2[] AS attnums
+                FROM pg_index i
+                WHERE i.indrelid = %s::regclass
+            """, (self._quote(table_name),))
+            indexes = cursor.fetchall()
+            cursor.close()
+        
+        primary = next((index['attnums'] for index in indexes if index['indisprimary']), [])
+        unique = {index['attnums'][0] for index in indexes
+                  if index['indisunique'] and len(index['attnums']) == 1}
+        indexed = {attnum for index in indexes for attnum in index['attnums']}
+        
+        return [{
+            'name': column['name'],
+            'type': column['type'],
+            'nullable': column['nullable'],
+            'default': column['default'],
+            'primary_key': column['attnum'] in primary,
+            'primary_key_position': primary.index(column['attnum']) + 1 if column['attnum'] in primary else None,
+            'unique_key': column['attnum'] in unique and column['attnum'] not in primary,
+            'index': column['attnum'] in indexed and column['attnum'] not in primary and column['attnum'] not in unique,
+            'extra': column['extra']
+        } for column in columns]
+    
+    def list_indexes(self, db_name, table_name):
+        """Get the indexes of a table, cached until the table changes"""
+        return get_schema_cache().get(
+            self.server,
+            ('indexes', db_name, table_name),
+            lambda: self._load_indexes(db_name, table_name),
+            lambda: self.table_version(db_name, table_name)
+        )
+    
+    def _load_indexes(self, db_name, table_name):
+        with self.connection(db_name) as conn:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            cursor.execute("""
+                SELECT c.relname AS name, ix.indisunique AS is_unique, am.amname AS method,
+                       ix.indpred IS NOT NULL AS partial,
+                       ARRAY(SELECT pg_get_indexdef(ix.indexrelid, k, true)
+                             FROM generate_series(1, ix.indnatts) AS k ORDER BY k) AS columns,
+                       ARRAY(SELECT COALESCE(o.opcname, '')
+                             FROM generate_series(0, ix.indnatts - 1) AS k
+                             LEFT JOIN pg_opclass o ON o.oid = ix.indclass[k] ORDER BY k) AS opclasses,
+                       ARRAY(SELECT COALESCE(co.collname, '')
+                             FROM generate_series(0, ix.indnatts - 1) AS k
+                             LEFT JOIN pg_collation co ON co.oid = ix.indcollation[k] ORDER BY k) AS collations
+                FROM pg_index ix
+                JOIN pg_class c ON c.oid = ix.indexrelid
+                JOIN pg_am am ON am.oid = c.relam
+                WHERE ix.indrelid = to_regclass(%s)
+                ORDER BY c.relname
+            """, (self._quote(table_name),))
+            rows = cursor.fetchall()
+            cursor.execute("SELECT datcollate FROM pg_database WHERE datname = current_database()")
+            database_collation = cursor.fetchone()['datcollate']
+            cursor.close()
+        
+        indexes = []
+        for row in rows:
+            collations = [database_collation if name == 'default' else name for name in row['collations']]
+            indexes.append({
+                'name': row['name'],
+                # Plain columns come back quoted like identifiers, expressions as written
+                'columns': [self._unquote(column) for column in row['columns']],
+                'unique': row['is_unique'],
+                'method': row['method'],
+                'partial': row['partial'],
+                # Whether LIKE 'prefix%' can use the B-tree on each column
+                'pattern': [opclass.endswith('_pattern_ops') or collation in BYTE_ORDER_COLLATIONS
+                            for opclass, collation in zip(row['opclasses'], collations)],
+                'trigram': [opclass in ('gin_trgm_ops', 'gist_trgm_ops') for opclass in row['opclasses']]
+            })
+        return indexes
+    
+    @staticmethod
+    def _unquote(identifier):
+        if len(identifier) > 1 and identifier[0] == identifier[-1] == '"':
+            return identifier[1:-1].replace('""', '"')
+        return identifier
+    
+    def plan_search(self, db_name, table_name, search):
+        """
+        Plan the WHERE conditions for a search, see app.utils.search_plan.
+        
+        Column filters use B-tree indexes that start with the column, and
+        pg_trgm indexes for patterns. LIKE 'prefix%' only uses a B-tree built
+        with text_pattern_ops or a C collation. Free text uses an indexed
+        tsvector column or to_tsvector() expression index if the table has
+        one and otherwise falls back to ILIKE on every column, which needs
+        a scan.
+        """
+        plan = SearchPlan()
+        if not search:
+            return plan
+        
+        structure = self.get_table_structure(db_name, table_name)
+        indexes = self.list_indexes(db_name, table_name)
+        types = {column['name']: column['type'] for column in structure}
+        filters, text = parse_search(search, list(types))
+        
+        for search_filter in filters:
+            column = search_filter['column']
+            quoted = self._quote(column)
+            op = search_filter['op']
+            value = search_filter['value']
+            
+            if op in ('null', 'not null'):
+                plan.add(f"{quoted} IS {op.upper()}", [], leading_index(indexes, column), search_filter['raw'])
+            elif op in ('prefix', 'like'):
+                pattern = like_pattern(value) + ('%' if op == 'prefix' else '')
+                index = None
+                if TEXT_TYPE_PATTERN.match(types[column]):
+                    target = quoted
+                    index = leading_index(indexes, column, ('gin', 'gist'), lambda index: index['trigram'][0])
+                    if index is None and not pattern.startswith('%'):
+                        index = leading_index(indexes, column, usable=lambda index: index['pattern'][0])
+                else:
+                    target = f"CAST({quoted} AS TEXT)"
+                plan.add(f"{target} LIKE %s", [pattern], index, search_filter['raw'])
+            elif op == '!=':
+                plan.add(f"{quoted} <> %s", [value], None, search_filter['raw'])
+            elif op == '=':
+                plan.add(f"{quoted} = %s", [value], leading_index(indexes, column, ('btree', 'hash')), search_filter['raw'])
+            else:
+                plan.add(f"{quoted} {op} %s", [value], leading_index(indexes, column), search_filter['raw'])
+        
+        if text:
+            document, index = self._text_search_index(indexes, types)
+            if document:
+                # The query must be parsed with the configuration the index was
+                # built with, or stemmed words stop matching
+                config = TSVECTOR_CONFIG_PATTERN.match(document)
+                query = f"plainto_tsquery({config.group(1)}, %s)" if config else "plainto_tsquery(%s)"
+                plan.add(f"{document} @@ {query}", [text], index, f'"{text}"')
+            else:
+                condition = ' OR '.join(f"CAST({self._quote(column)} AS TEXT) ILIKE %s" for column in types)
+                plan.add(f"({condition})", [f"%{like_pattern(text)}%"] * len(types), None, f'"{text}"')
+        return plan
+    
+    def _text_search_index(self, indexes, types):
+        """
+        Find a full-text index: a GIN/GiST index on a tsvector column or on
+        a to_tsvector() expression.
+        
+        Returns:
+            tuple: (indexed tsvector expression, index name) or (None, None)
+        """
+        for index in indexes:
+            if index['partial'] or index['method'] not in ('gin', 'gist') or not index['columns']:
+                continue
+            column = index['columns'][0]
+            if types.get(column) == 'tsvector':
+                return self._quote(column), index['name']
+            if column.startswith('to_tsvector('):
+                # Matches the index only if repeated exactly as indexed
+                return column, index['name']
+        return None, None
+    
+    def _search_conditions(self, db_name, table_name, search):
+        """Build the WHERE conditions for a search"""
+        plan = self.plan_search(db_name, table_name, search)
+        return list(plan.conditions), list(plan.params)
+    
+    @staticmethod
+    def _set_timeout(cursor, timeout):
+        """Stop the statements of the current transaction after timeout seconds"""
+        if timeout:
+            cursor.execute("SET LOCAL statement_timeout = %s", (int(timeout * 1000),))
+    
+    @staticmethod
+    @contextmanager
+    def _session(on_session, session_id):
+        """
+        Report the session a statement runs in to on_session, and report
+        None once it is done, before the connection can be reused
+        """
+        if on_session is None:
+            yield
+            return
+        on_session(session_id)
+        try:
+            yield
+        finally:
+            on_session(None)
+    
+    @contextmanager
+    def _search_timeout(self, timeout):
+        """Turn statement_timeout errors into SearchTimeout"""
+        try:
+            yield
+        except psycopg2.extensions.QueryCanceledError as e:
+            if timeout:
+                raise SearchTimeout(f"The search was stopped after {timeout}s") from e
+            raise
+    
+    def estimate_records(self, db_name, table_name):
+        """Get the row count estimate kept in table statistics, or None"""
+        with self.connection(db_name) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT c.reltuples::bigint, s.n_live_tup
+                FROM pg_class c
+                LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+                WHERE c.oid = %s::regclass
+            """, (self._quote(table_name),))
+            row = cursor.fetchone()
+            cursor.close()
+        
+        if not row:
+            return None
+        reltuples, live_tuples = row
+        # reltuples is -1 (0 before PostgreSQL 14) until the table is analyzed
+        if reltuples is not None and reltuples > 0:
+            return int(reltuples)
+        return int(live_tuples) if live_tuples is not None else None
+    
+    def count_records(self, db_name, table_name, search='', on_session=None, limit=None, timeout=None):
+        """
+        Count the rows of a table matching search.
+        
+        If on_session is given it is called with the server session id before
+        the count starts, so the count can be stopped with cancel_session(),
+        and with None once the connection is no longer running it.
+        With limit, counting stops after limit matching rows. With timeout,
+        the server stops the count after that many seconds and SearchTimeout
+        is raised.
+        """
+        conditions, params = self._search_conditions(db_name, table_name, search)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        if limit:
+            source = f"(SELECT 1 FROM {self._quote(table_name)}{where} LIMIT {int(limit)}) AS capped"
+        else:
+            source = f"{self._quote(table_name)}{where}"
+        
+        with self._search_timeout(timeout), self.connection(db_name) as conn, \
+                self._session(on_session, conn.get_backend_pid()):
+            cursor = conn.cursor()
+            self._set_timeout(cursor, timeout)
+            cursor.execute(f"SELECT COUNT(*) FROM {source}", params)
+            count = cursor.fetchone()[0]
+            cursor.close()
+            if timeout:
+                conn.rollback()
+        return count
+    
+    def get_table_data(self, db_name, table_name, offset=0, limit=50, search='', sort_by='', sort_dir='asc',
+                       timeout=None):
+        """Get one page of rows using LIMIT/OFFSET, stopped after timeout seconds if given"""
+        conditions, params = self._search_conditions(db_name, table_name, search)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        order = ''
+        if sort_by:
+            order = f" ORDER BY {self._quote(sort_by)} {'DESC' if sort_dir == 'desc' else 'ASC'}"
+        
+        with self._search_timeout(timeout), self.connection(db_name) as conn:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            self._set_timeout(cursor, timeout)
+            cursor.execute(
+                f"SELECT * FROM {self._quote(table_name)}{where}{order} LIMIT %s OFFSET %s",
+                params + [int(limit), int(offset)]
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+            if timeout:
+                conn.rollback()
+        return rows
+    
+    def get_table_data_keyset(self, db_name, table_name, key_columns, limit=50,
+                              after=None, before=None, search='', sort_dir='asc', timeout=None):
+        """
+        Get one page of rows ordered by a unique key, seeking past the key
+        values in after (or before) instead of skipping rows with OFFSET.
+        The server stops the read after timeout seconds if given.
+        
+        Returns:
+            tuple: (rows, has_more) where has_more is True if more rows exist
+                in the direction the page was read
+        """
+        conditions, params = self._search_conditions(db_name, table_name, search)
+        
+        # Paging backwards scans in the opposite order, rows are flipped afterwards
+        backwards = before is not None
+        scan_desc = (sort_dir == 'desc') != backwards
+        
+        boundary = before if backwards else after
+        if boundary is not None:
+            key_list = ', '.join(self._quote(column) for column in key_columns)
+            placeholders = ', '.join(['%s'] * len(key_columns))
+            conditions.append(f"({key_list}) {'<' if scan_desc else '>'} ({placeholders})")
+            params.extend(boundary)
+        
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        order = ', '.join(f"{self._quote(column)} {'DESC' if scan_desc else 'ASC'}" for column in key_columns)
+        
+        with self._search_timeout(timeout), self.connection(db_name) as conn:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            self._set_timeout(cursor, timeout)
+            cursor.execute(
+                f"SELECT * FROM {self._quote(table_name)}{where} ORDER BY {order} LIMIT %s",
+                params + [int(limit) + 1]
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+            if timeout:
+                conn.rollback()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backwards:
+            rows.reverse()
+        return rows, has_more
+    
+    def cancel_session(self, session_id):
+        """Stop the statement running on another session without closing it"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT pg_cancel_backend(%s)", (int(session_id),))
+                cancelled = cursor.fetchone()[0]
+                cursor.close()
+            return bool(cancelled)
+        except Exception as e:
+            logging.error(f"Error cancelling PostgreSQL query: {str(e)}")
+            return False
+    
+    def run_query(self, db_name, query):
+        """Run a query and return all rows as dictionaries"""
+        with self.connection(db_name) as conn:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            cursor.execute(query)
+            rows = cursor.fetchall() if cursor.description else []
+            cursor.close()
+        return rows
+    
+    def execute_query(self, db_name, query, timeout=None, on_session=None):
+        """
+        Execute a statement and return the number of affected rows.
+        
+        The server aborts the statement after timeout seconds. on_session
+        gets the session id before it starts, for cancel_session(), and None
+        once it is done, before the connection goes back to the pool.
+        """
+        with self.connection(db_name) as conn, self._session(on_session, conn.get_backend_pid()):
+            cursor = conn.cursor()
+            if timeout:
+                # Only lasts until the transaction ends
+                cursor.execute("SET LOCAL statement_timeout = %s", (int(timeout * 1000),))
+            cursor.execute(query)
+            affected_rows = cursor.rowcount
+            conn.commit()
+            cursor.close()
+        # DDL is transactional here, so a failed statement changed nothing
+        get_schema_cache().invalidate_for(self.server, db_name, query)
+        return affected_rows
+    
+    def drop_table(self, db_name, table_name):
+        """Drop a table"""
+        with self.connection(db_name) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"DROP TABLE {self._quote(table_name)}")
+            conn.commit()
+            cursor.close()
+        get_schema_cache().invalidate(self.server, db_name, table_name)
+    
+    def truncate_table(self, db_name, table_name):
+        """Delete every row of a table"""
+        with self.connection(db_name) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"TRUNCATE TABLE {self._quote(table_name)}")
+            conn.commit()
+            cursor.close()
+        get_schema_cache().invalidate(self.server, db_name, table_name)
+    
+    def stream_query(self, db_name, query, batch_size=1000, timeout=None, on_session=None):
+        """
+        Run a query through a named (server-side) cursor.
+        
+        Rows are fetched batch_size at a time as the returned QueryStream is
+        iterated, so memory use does not depend on the size of the result.
+        Each statement, including every fetch, is aborted by the server after
+        timeout seconds. on_session gets the session id before the query
+        starts, for cancel_session(), and None before the connection goes
+        back to the pool.
+        """
+        pool = get_pool(self.host, self.port, self.user, self.password)
+        conn = pool.acquire(db_name)
+        reported = False
+        try:
+            if on_session:
+                on_session(conn.get_backend_pid())
+                reported = True
+            if timeout:
+                # Lasts until the cursor's transaction ends, when the
+                # connection goes back to the pool
+                setup = conn.cursor()
+                setup.execute("SET LOCAL statement_timeout = %s", (int(timeout * 1000),))
+                setup.close()
+            cursor = conn.cursor(name=f"nexdb_{uuid.uuid4().hex}")
+            cursor.itersize = batch_size
+            cursor.execute(query)
+            # Named cursors only learn their columns on the first fetch
+            first = cursor.fetchmany(batch_size)
+            columns = [col[0] for col in cursor.description] if cursor.description else []
+        except Exception:
+            if reported:
+                on_session(None)
+            pool.release(conn, db_name, discard=True)
+            raise
+        
+        def batches():
+            rows = first
+            while rows:
+                yield rows
+                rows = cursor.fetchmany(batch_size)
+        
+        def close(exhausted):
+            discard = False
+            try:
+                cursor.close()
+            except Exception:
+                discard = True
+            if on_session:
+                on_session(None)
+            pool.release(conn, db_name, discard=discard)
+        
+        return QueryStream(columns, batches(), close)
+    
+    def stream_table(self, db_name, table_name, batch_size=1000):
+        """Stream every row of a table, see stream_query()"""
+        return self.stream_query(db_name, f"SELECT * FROM {self._quote(table_name)}", batch_size)
+    
+    def copy_out(self, db_name, table_name=None, query=None):
+        """
+        Export a table or the result of a SELECT as CSV with a header row,
+        using COPY ... TO STDOUT.
+        
+        Returns a generator of CSV byte chunks. COPY runs on a background
+        thread that blocks once COPY_QUEUE_CHUNKS chunks are waiting, so
+        memory use does not depend on the size of the export. Closing the
+        generator early cancels the COPY on the server.
+        """
+        # COPY takes a single statement without its terminator; the line
+        # breaks keep a trailing -- comment from swallowing the parenthesis
+        source = f"(\n{query.strip().rstrip(';').rstrip()}\n)" if query else self._quote(table_name)
+        statement = f"COPY {source} TO STDOUT WITH (FORMAT csv, HEADER)"
+        chunks = queue.Queue(maxsize=COPY_QUEUE_CHUNKS)
+        stopped = threading.Event()
+        # The COPY's backend pid while it runs; cleared under the lock before
+        # the connection goes back to the pool, so a late cancel can't hit
+        # whatever statement reuses it
+        session = {'pid': None}
+        session_lock = threading.Lock()
+        failures = []
+        done = object()
+        
+        class Sink:
+            """File object psycopg2 writes COPY data to, one row per write"""
+            
+            def __init__(self):
+                self.buffer = []
+                self.size = 0
+            
+            def write(self, data):
+                self.buffer.append(data)
+                self.size += len(data)
+                if self.size >= COPY_CHUNK_SIZE:
+                    self.flush()
+            
+            def flush(self):
+                if not self.buffer:
+                    return
+                chunk = b''.join(data.encode('utf-8') if isinstance(data, str) else data for data in self.buffer)
+                self.buffer = []
+                self.size = 0
+                while True:
+                    if stopped.is_set():
+                        raise IOError("Export stopped by the reader")
+                    try:
+                        chunks.put(chunk, timeout=1)
+                        return
+                    except queue.Full:
+                        pass
+        
+        def on_session(pid):
+            with session_lock:
+                session['pid'] = pid
+        
+        def copy():
+            try:
+                with self.connection(db_name) as conn:
+                    with self._session(on_session, conn.get_backend_pid()):
+                        cursor = conn.cursor()
+                        sink = Sink()
+                        cursor.copy_expert(statement, sink, size=COPY_CHUNK_SIZE)
+                        sink.flush()
+                        cursor.close()
+                        conn.rollback()
+            except BaseException as e:
+                failures.append(e)
+            finally:
+                while True:
+                    try:
+                        chunks.put(done, timeout=1)
+                        break
+                    except queue.Full:
+                        if stopped.is_set():
+                            break
+        
+        def read():
+            worker = threading.Thread(target=copy, name='pg-copy-out', daemon=True)
+            worker.start()
+            finished = False
+            try:
+                while True:
+                    chunk = chunks.get()
+                    if chunk is done:
+                        break
+                    yield chunk
+                finished = True
+            finally:
+                if not finished:
+                    stopped.set()
+                    with session_lock:
+                        if session['pid'] is not None:
+                            self.cancel_session(session['pid'])
+                    # Unblock the COPY thread if it is waiting on a full queue
+                    while worker.is_alive():
+                        try:
+                            chunks.get(timeout=0.1)
+                        except queue.Empty:
+                            pass
+                worker.join()
+            if failures:
+                logging.error(f"Error exporting from PostgreSQL: {str(failures[0])}")
+                raise failures[0]
+        
+        return read()
+    
+    @contextmanager
+    def bulk_loader(self, db_name, table_name, columns):
+        """
+        Check out a connection for loading rows with COPY FROM STDIN.
+        
+        Yields a function that loads a file of tab-separated rows in the COPY
+        text format (backslash escapes, \\N for NULL) into the given columns,
+        commits, and returns (rows_loaded, warnings). A batch with a bad row
+        is rolled back and raises BulkLoadError naming the row.
+        """
+        statement = (
+            f"COPY {self._quote(table_name)} ({', '.join(self._quote(column) for column in columns)}) FROM STDIN"
+        )
+        with self.connection(db_name) as conn:
+            cursor = conn.cursor()
+            
+            def load(path):
+                try:
+                    with open(path, 'r', encoding='utf-8', newline='') as f:
+                        cursor.copy_expert(statement, f, size=1024 * 1024)
+                    loaded = cursor.rowcount
+                    conn.commit()
+                except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                    conn.rollback()
+                    row = batch_row(e.diag.context)
+                    raise BulkLoadError(e.diag.message_primary or str(e).strip(), row) if row else e
+                except Exception:
+                    conn.rollback()
+                    raise
+                return loaded, []
+            
+            try:
+                yield load
+            finally:
+                cursor.close()
+        # Table statistics in the cached table list are now stale
+        get_schema_cache().invalidate(self.server, db_name, table_name)
+    
     def backup_database(self, db_name, backup_path):
         """Backup a database to a file"""
         try:
@@ -190,6 +862,7 @@ class PostgresManager:
             ]
             
             subprocess.run(cmd, env=env, check=True)
+            get_schema_cache().invalidate(self.server, db_name)
             return True
         except Exception as e:
             logging.error(f"Error restoring PostgreSQL database: {str(e)}")
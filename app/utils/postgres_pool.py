@@ -0,0 +1,346 @@
+"""
+Process-wide PostgreSQL connection pooling for NEXDB.
+Each server gets one pool holding per-database idle and checked-out
+connections that share a bound on the total number of open connections.
+Connections to databases nobody is using are closed, least recently used
+first.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+
+from app.utils.mysql_pool import PoolExhaustedError
+
+# Defaults, overridden from the app config by init_app()
+_settings = {
+    'min_idle': 1,
+    'max_per_database': 5,
+    'max_total': 20,
+    'idle_timeout': 300,
+    'checkout_timeout': 30,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+class _DatabaseConnections:
+    """Connections of a PostgresConnectionPool to one database"""
+
+    def __init__(self):
+        self.idle = []
+        self.used = set()
+        # Connections being opened outside the pool lock
+        self.connecting = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def busy(self):
+        """Connections checked out or being opened"""
+        return len(self.used) + self.connecting
+
+    @property
+    def size(self):
+        return len(self.idle) + self.busy
+
+
+class PostgresConnectionPool:
+    """Per-database connections to one server sharing a total connection limit"""
+
+    def __init__(self, host, port, user, password, min_idle=1, max_per_database=5,
+                 max_total=20, idle_timeout=300, checkout_timeout=30):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        # Idle connections kept per database once they are returned
+        self.min_idle = max(0, min_idle)
+        self.max_per_database = max(1, max_per_database)
+        self.max_total = max(1, max_total)
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+
+        # database name -> _DatabaseConnections, least recently used first
+        self._databases = OrderedDict()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    @property
+    def size(self):
+        """Number of open connections across all databases"""
+        with self._cond:
+            return self._open_count()
+
+    def acquire(self, database):
+        """Check out a healthy connection to the given database"""
+        deadline = time.monotonic() + self.checkout_timeout
+
+        while True:
+            conn = self._checkout(database, deadline)
+            if self._is_alive(conn):
+                return conn
+            # Stale idle connection; drop it and try again
+            self.release(conn, database, discard=True)
+
+    def release(self, conn, database, discard=False):
+        """Return a connection to its database, or close it if discard is set"""
+        if not discard and not conn.closed:
+            try:
+                status = conn.info.transaction_status
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    # Drop any transaction state left behind by the caller
+                    conn.rollback()
+                # The services switch to autocommit for DDL; don't leak that
+                if not discard and conn.autocommit:
+                    conn.autocommit = False
+            except Exception:
+                discard = True
+
+        with self._cond:
+            connections = self._databases.get(database)
+            keep = (
+                not discard
+                and not conn.closed
+                and connections is not None
+                and conn in connections.used
+                and len(connections.idle) < self.min_idle
+            )
+            if connections is not None and conn in connections.used:
+                connections.used.discard(conn)
+                connections.last_used = time.monotonic()
+            if keep:
+                connections.idle.append(conn)
+            self._cond.notify_all()
+
+        if not keep:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self, database):
+        """
+        Context manager yielding a pooled connection to database.
+
+        The connection is returned to the pool on normal exit and closed if
+        the block raises or is abandoned, since its state can no longer be
+        trusted.
+        """
+        conn = self.acquire(database)
+        discard = True
+        try:
+            yield conn
+            discard = False
+        finally:
+            self.release(conn, database, discard=discard)
+
+    def discard(self, database):
+        """Close idle connections to database, e.g. before it is dropped"""
+        with self._cond:
+            connections = self._databases.get(database)
+            if connections is None:
+                return
+            idle = connections.idle
+            connections.idle = []
+            # Checked-out connections are closed when they are released
+            if not connections.busy:
+                del self._databases[database]
+            self._cond.notify_all()
+
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def close(self):
+        """Close every idle connection and stop handing out new ones"""
+        with self._cond:
+            self._closed = True
+            idle = [conn for connections in self._databases.values() for conn in connections.idle]
+            self._databases.clear()
+            self._cond.notify_all()
+
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def _checkout(self, database, deadline):
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolExhaustedError("Connection pool is closed")
+
+                self._evict_expired()
+
+                connections = self._databases.get(database)
+                if connections is not None:
+                    self._databases.move_to_end(database)
+
+                # Per-database limit reached, wait for a release
+                at_limit = connections is not None and connections.busy >= self.max_per_database
+
+                if not at_limit and connections is not None and connections.idle:
+                    conn = connections.idle.pop()
+                    connections.used.add(conn)
+                    connections.last_used = time.monotonic()
+                    return conn
+
+                if not at_limit and (self._open_count() < self.max_total or self._make_room(database)):
+                    if connections is None:
+                        connections = self._databases[database] = _DatabaseConnections()
+                    # Hold the slot while connecting, which may take a while
+                    # and must not stall checkouts of other databases
+                    connections.connecting += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhaustedError(
+                        f"Timed out after {self.checkout_timeout}s waiting for a PostgreSQL connection"
+                    )
+                self._cond.wait(remaining)
+
+        conn = None
+        try:
+            conn = psycopg2.connect(
+                host=self.host,
+                port=self.port,
+                user=self.user,
+                password=self.password,
+                database=database
+            )
+        finally:
+            with self._cond:
+                connections.connecting -= 1
+                # The database is kept while connecting, unless the whole pool was closed
+                registered = (
+                    conn is not None
+                    and not self._closed
+                    and self._databases.get(database) is connections
+                )
+                if registered:
+                    connections.used.add(conn)
+                    connections.last_used = time.monotonic()
+                elif not connections.size and self._databases.get(database) is connections:
+                    # Don't keep an empty entry for a database we can't reach
+                    del self._databases[database]
+                self._cond.notify_all()
+
+        if conn is not None and not registered:
+            self._close_quietly(conn)
+            raise PoolExhaustedError("Connection pool is closed")
+        return conn
+
+    def _make_room(self, database):
+        """Free one connection slot held by another database, LRU first"""
+        # Prefer dropping databases that have nothing checked out
+        for name, connections in list(self._databases.items()):
+            if name != database and connections.idle and not connections.busy:
+                del self._databases[name]
+                self._close_all(connections.idle)
+                return True
+
+        # Otherwise close idle connections held by busy databases
+        for name, connections in self._databases.items():
+            if name != database and connections.idle:
+                self._close_quietly(connections.idle.pop(0))
+                return True
+
+        return False
+
+    def _evict_expired(self):
+        """Close the connections of databases idle for longer than idle_timeout"""
+        if not self.idle_timeout:
+            return
+
+        cutoff = time.monotonic() - self.idle_timeout
+        for name, connections in list(self._databases.items()):
+            if not connections.busy and connections.last_used < cutoff:
+                del self._databases[name]
+                self._close_all(connections.idle)
+
+    def _open_count(self):
+        # Connections being opened count too
+        return sum(connections.size for connections in self._databases.values())
+
+    @staticmethod
+    def _is_alive(conn):
+        """Run a trivial query outside any transaction"""
+        if conn.closed:
+            return False
+        try:
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.autocommit = False
+            return True
+        except Exception:
+            return False
+
+    @classmethod
+    def _close_all(cls, conns):
+        for conn in conns:
+            cls._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def init_app(app):
+    """Load pool sizing from the Flask app config"""
+    _settings['min_idle'] = app.config.get('POSTGRES_POOL_MIN_IDLE', _settings['min_idle'])
+    _settings['max_per_database'] = app.config.get('POSTGRES_POOL_MAX_PER_DATABASE', _settings['max_per_database'])
+    _settings['max_total'] = app.config.get('POSTGRES_POOL_MAX_TOTAL', _settings['max_total'])
+    _settings['idle_timeout'] = app.config.get('POSTGRES_POOL_IDLE_TIMEOUT', _settings['idle_timeout'])
+    _settings['checkout_timeout'] = app.config.get('POSTGRES_POOL_TIMEOUT', _settings['checkout_timeout'])
+
+
+def get_pool(host, port, user, password):
+    """
+    Get the shared pool for a PostgreSQL server, creating it on first use.
+
+    Args:
+        host (str): PostgreSQL host
+        port (int): PostgreSQL port
+        user (str): PostgreSQL user
+        password (str): PostgreSQL password
+
+    Returns:
+        PostgresConnectionPool: The pool for this server
+    """
+    global _pools_pid
+    key = (host, int(port), user)
+
+    with _pools_lock:
+        # Connections must not be shared across forked workers
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+
+        pool = _pools.get(key)
+        if pool is None or pool.password != password:
+            if pool is not None:
+                logging.info("PostgreSQL credentials changed, recycling connection pool")
+                pool.close()
+            pool = PostgresConnectionPool(host, port, user, password, **_settings)
+            _pools[key] = pool
+        return pool
+
+
+def close_all_pools():
+    """Close every pool owned by this process"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,44 @@
+"""
+Progress reporting for NEXDB backup and restore jobs.
+A job installs a callback taking (bytes_done, total_bytes) for the duration
+of the job; the code reading a backup or dump reports to it as data passes
+through.
+"""
+import contextvars
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar('progress', default=None)
+
+
+def current_progress():
+    """Progress callback of the job running in the current context, or None"""
+    return _current.get()
+
+
+@contextmanager
+def use_progress(callback):
+    """Make callback the current job's progress callback for the duration of the block"""
+    token = _current.set(callback)
+    try:
+        yield callback
+    finally:
+        _current.reset(token)
+
+
+class ProgressReader:
+    """Readable wrapper that reports the bytes read so far to a progress callback"""
+
+    def __init__(self, source, total, progress):
+        self._source = source
+        self.total = total
+        self.done = 0
+        self._progress = progress
+
+    def read(self, size=-1):
+        data = self._source.read(size)
+        self.done += len(data)
+        self._progress(self.done, self.total)
+        return data
+
+    def close(self):
+        self._source.close()
@@ -0,0 +1,234 @@
+"""
+Incremental query results for NEXDB.
+Wraps a server-side cursor so large result sets can be rendered with a cap
+or streamed to the client without being loaded into memory.
+"""
+import csv
+import io
+import json
+import logging
+
+
+class QueryStream:
+    """Rows of a query read batch by batch from a server-side cursor"""
+
+    def __init__(self, columns, batches, close):
+        """
+        Args:
+            columns (list): Column names of the result set
+            batches (iterator): Iterator over lists of row tuples
+            close (callable): Releases the cursor and connection; receives
+                True if every row was read
+        """
+        self.columns = columns
+        self._batches = batches
+        self._close = close
+        self._exhausted = False
+        self._closed = False
+
+    def __iter__(self):
+        for batch in self._batches:
+            for row in batch:
+                yield row
+        self._exhausted = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Release the cursor and its connection"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._close(self._exhausted)
+        except Exception as e:
+            logging.warning(f"Error closing query stream: {str(e)}")
+
+    def head(self, max_rows, max_bytes):
+        """
+        Read rows as dictionaries until a row or byte cap is hit.
+
+        Args:
+            max_rows (int): Maximum number of rows to return
+            max_bytes (int): Approximate maximum size of the returned values
+
+        Returns:
+            tuple: (rows, truncated) where truncated is True if rows were left unread
+        """
+        rows = []
+        size = 0
+        for row in self:
+            if len(rows) >= max_rows or size >= max_bytes:
+                return rows, True
+            size += sum(len(str(value)) for value in row if value is not None)
+            rows.append(dict(zip(self.columns, row)))
+        return rows, False
+
+
+def iter_ndjson(stream, rows_per_chunk=500):
+    """Encode a query stream as newline-delimited JSON, closing it when done"""
+    try:
+        buffer = io.StringIO()
+        count = 0
+        for row in stream:
+            buffer.write(json.dumps(dict(zip(stream.columns, row)), default=_json_default))
+            buffer.write('\n')
+            count += 1
+            if count % rows_per_chunk == 0:
+                yield buffer.getvalue()
+                buffer = io.StringIO()
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        stream.close()
+
+
+def iter_csv(stream, rows_per_chunk=500, delimiter=','):
+    """Encode a query stream as CSV with a header row, closing it when done"""
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=delimiter)
+        writer.writerow(stream.columns)
+        count = 0
+        for row in stream:
+            writer.writerow(['' if value is None else _text(value) for value in row])
+            count += 1
+            if count % rows_per_chunk == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        stream.close()
+
+
+def iter_parquet(stream, row_group_rows=65536, compression='snappy'):
+    """
+    Encode a query stream as Parquet, one row group at a time, closing it when done.
+
+    Each row group is converted to columns and written out before the next
+    one is read, so memory use is bounded by row_group_rows. Column types
+    are inferred from the first row group; decimal columns, columns that are
+    NULL throughout it and ones holding values pyarrow can't convert are
+    written as strings.
+    Requires the optional pyarrow package.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        stream.close()
+        raise RuntimeError("Parquet export requires pyarrow. Please install it with pip install pyarrow.")
+
+    sink = _ChunkSink()
+    writer = None
+    schema = None
+    try:
+        rows = []
+        for row in stream:
+            rows.append(row)
+            if len(rows) < row_group_rows:
+                continue
+            if writer is None:
+                schema = _parquet_schema(pa, stream.columns, rows)
+                writer = pq.ParquetWriter(sink, schema, compression=compression)
+            writer.write_table(_parquet_table(pa, schema, rows))
+            rows = []
+            yield sink.take()
+
+        if writer is None:
+            schema = _parquet_schema(pa, stream.columns, rows)
+            writer = pq.ParquetWriter(sink, schema, compression=compression)
+        if rows:
+            writer.write_table(_parquet_table(pa, schema, rows))
+        writer.close()
+        writer = None
+        yield sink.take()
+    finally:
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception:
+                pass
+        stream.close()
+
+
+class _ChunkSink:
+    """Writable file handing what was written so far to a generator"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_schema(pa, columns, rows):
+    """Infer a Parquet schema from a sample of rows, falling back to strings"""
+    fields = []
+    for index, name in enumerate(columns):
+        try:
+            column_type = pa.array([_parquet_value(row[index]) for row in rows]).type
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # e.g. MySQL SET values; written as text instead
+            column_type = pa.string()
+        if pa.types.is_null(column_type) or pa.types.is_decimal(column_type):
+            # A decimal type fixes the scale, which later values of an
+            # unconstrained NUMERIC may exceed; text keeps them exact
+            column_type = pa.string()
+        fields.append(pa.field(name, column_type))
+    return pa.schema(fields)
+
+
+def _parquet_table(pa, schema, rows):
+    columns = []
+    for index, field in enumerate(schema):
+        values = [_parquet_value(row[index]) for row in rows]
+        if pa.types.is_string(field.type):
+            values = [None if value is None else _text(value) for value in values]
+        columns.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _parquet_value(value):
+    """Convert the types database drivers return that pyarrow can't"""
+    if isinstance(value, (bytearray, memoryview)):
+        return bytes(value)
+    return value
+
+
+def _text(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return str(value)
+
+
+def _json_default(value):
+    """Serialize the types database drivers return that json can't"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return str(value)
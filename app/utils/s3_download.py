@@ -0,0 +1,263 @@
+"""
+Parallel, resumable S3 downloads for NEXDB.
+Large backups are fetched as ranged GETs written straight into their place
+in a preallocated file. Finished parts are recorded in a sidecar so an
+interrupted download resumes where it stopped instead of starting over.
+"""
+import errno
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app.utils.compression import CHUNK_SIZE
+
+PROGRESS_VERSION = 1
+
+
+class S3DownloadError(Exception):
+    """Raised when a download fails verification"""
+    pass
+
+
+class S3ParallelDownloader:
+    """
+    Downloads one S3 object with up to `concurrency` ranged GETs at a time.
+
+    Data is written to `<path>.partial` and progress to
+    `<path>.partial.json`. Parts are only recorded once they are flushed to
+    disk, so after a crash or dropped connection the next download of the
+    same object into the same path fetches the missing parts only. Every
+    GET is conditional on the ETag seen at the start, so a part of a newer
+    object version is never mixed in.
+
+    Once complete, the file is checked against the object's ETag (for
+    unencrypted single and multipart uploads) and against expected_checksum
+    if one is given, then renamed into place.
+    """
+
+    def __init__(self, s3_client, bucket, key, part_size=16 * 1024 * 1024, concurrency=4, progress=None):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(int(part_size), CHUNK_SIZE)
+        self.concurrency = max(1, int(concurrency))
+        self.progress = progress
+
+        self._lock = threading.Lock()
+        self._bytes_done = 0
+
+    def download(self, path, expected_checksum=None):
+        """
+        Download the object to path.
+
+        Args:
+            path (str): Destination file
+            expected_checksum (str): Hex sha256 the file must have
+
+        Returns:
+            str: Hex sha256 of the downloaded file
+        """
+        head = self.s3_client.head_object(Bucket=self.bucket, Key=self.key)
+        size = head['ContentLength']
+        etag = head['ETag']
+
+        partial_path = f"{path}.partial"
+        state = self._load_progress(partial_path, size, etag)
+        done = set(state['done'])
+        parts = [index for index in range(self._part_count(size)) if index not in done]
+        self._bytes_done = sum(self._part_length(index, size) for index in done)
+
+        if done:
+            logging.info(f"Resuming download of {self.key}: {len(done)} parts already downloaded")
+
+        flags = os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0)
+        fd = os.open(partial_path, flags, 0o644)
+        try:
+            if not done:
+                self._preallocate(fd, size)
+
+            if parts:
+                with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='s3-download') as executor:
+                    futures = {
+                        executor.submit(self._download_part, fd, index, size, etag): index
+                        for index in parts
+                    }
+                    try:
+                        for future in as_completed(futures):
+                            future.result()
+                            # Record a part only once its bytes are on disk
+                            os.fsync(fd)
+                            done.add(futures[future])
+                            state['done'] = sorted(done)
+                            self._save_progress(partial_path, state)
+                    except BaseException:
+                        for future in futures:
+                            future.cancel()
+                        raise
+        finally:
+            os.close(fd)
+
+        try:
+            checksum = self._verify(partial_path, head, expected_checksum)
+        except S3DownloadError:
+            # Corrupt data would only be resumed again
+            self._discard(partial_path)
+            raise
+
+        os.replace(partial_path, path)
+        self._remove_progress(partial_path)
+        return checksum
+
+    def _download_part(self, fd, index, size, etag):
+        start, end = self._part_range(index, size)
+        response = self.s3_client.get_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Range=f"bytes={start}-{end}",
+            IfMatch=etag
+        )
+        body = response['Body']
+        offset = start
+        try:
+            while True:
+                chunk = body.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                os.pwrite(fd, chunk, offset)
+                offset += len(chunk)
+                self._report(len(chunk), size)
+        finally:
+            body.close()
+
+        if offset != end + 1:
+            raise IOError(f"Short read of {self.key} at bytes {start}-{end}")
+
+    def _verify(self, path, head, expected_checksum):
+        """Check the downloaded file against the ETag and expected checksum"""
+        etag = head['ETag'].strip('"')
+        check_etag = head.get('ServerSideEncryption') != 'aws:kms' and 'SSECustomerAlgorithm' not in head
+
+        part_size = None
+        if check_etag and '-' in etag:
+            # Multipart ETags are the MD5 of the part MD5s; the part size
+            # is the size of the first part
+            part_size = self.s3_client.head_object(Bucket=self.bucket, Key=self.key, PartNumber=1)['ContentLength']
+
+        sha256 = hashlib.sha256()
+        md5 = hashlib.md5()
+        part_md5s = []
+        part_md5 = hashlib.md5()
+        part_left = part_size
+
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(min(CHUNK_SIZE, part_left) if part_size else CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+                if part_size:
+                    part_md5.update(chunk)
+                    part_left -= len(chunk)
+                    if part_left == 0:
+                        part_md5s.append(part_md5.digest())
+                        part_md5 = hashlib.md5()
+                        part_left = part_size
+                else:
+                    md5.update(chunk)
+
+        if part_size and part_left != part_size:
+            part_md5s.append(part_md5.digest())
+
+        if check_etag:
+            if part_size:
+                actual = f"{hashlib.md5(b''.join(part_md5s)).hexdigest()}-{len(part_md5s)}"
+            else:
+                actual = md5.hexdigest()
+            if actual != etag:
+                raise S3DownloadError(f"ETag mismatch for {self.key}: expected {etag}, got {actual}")
+
+        checksum = sha256.hexdigest()
+        if expected_checksum and checksum != expected_checksum:
+            raise S3DownloadError(f"Checksum mismatch for {self.key}")
+        return checksum
+
+    def _report(self, count, size):
+        with self._lock:
+            self._bytes_done += count
+            done = self._bytes_done
+        if self.progress is not None:
+            self.progress(done, size)
+
+    def _part_count(self, size):
+        return (size + self.part_size - 1) // self.part_size
+
+    def _part_range(self, index, size):
+        start = index * self.part_size
+        return start, min(start + self.part_size, size) - 1
+
+    def _part_length(self, index, size):
+        start, end = self._part_range(index, size)
+        return end - start + 1
+
+    def _load_progress(self, partial_path, size, etag):
+        """Load the progress of an earlier attempt, or start a new one"""
+        state = {
+            'version': PROGRESS_VERSION,
+            'key': self.key,
+            'etag': etag,
+            'size': size,
+            'part_size': self.part_size,
+            'done': []
+        }
+        try:
+            with open(f"{partial_path}.json") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            self._discard(partial_path)
+            return state
+
+        same = all(saved.get(field) == state[field] for field in ('version', 'key', 'etag', 'size', 'part_size'))
+        if not same or not os.path.exists(partial_path):
+            # The object or settings changed; the old parts are useless
+            self._discard(partial_path)
+            return state
+
+        state['done'] = saved.get('done', [])
+        return state
+
+    @staticmethod
+    def _save_progress(partial_path, state):
+        progress_path = f"{partial_path}.json"
+        with open(f"{progress_path}.tmp", 'w') as f:
+            json.dump(state, f)
+        os.replace(f"{progress_path}.tmp", progress_path)
+
+    @staticmethod
+    def _remove_progress(partial_path):
+        try:
+            os.remove(f"{partial_path}.json")
+        except OSError:
+            pass
+
+    @staticmethod
+    def _discard(partial_path):
+        for path in (partial_path, f"{partial_path}.json"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _preallocate(fd, size):
+        """Reserve the file's space up front so a full disk fails early"""
+        os.ftruncate(fd, size)
+        if size and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(fd, 0, size)
+            except OSError as e:
+                # Not supported by every filesystem; the sparse file still works
+                if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL):
+                    raise
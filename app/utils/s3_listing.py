@@ -0,0 +1,94 @@
+"""
+Partitioned S3 listings for NEXDB.
+Backups are stored under <db_type>/<db_name>/<YYYY>/<MM>/<DD>/ prefixes.
+A bucket is listed by discovering those database prefixes and paging
+through them concurrently. An incremental listing starts each database
+prefix at the day of a watermark, so older keys are never fetched.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+
+def backup_key(filename, db_type, db_name, when=None):
+    """
+    Build the S3 key of a backup in the per-database/date layout.
+
+    The date is the upload date in UTC, which keeps every key written after
+    a watermark at or after the watermark's day prefix.
+    """
+    when = when or datetime.now(timezone.utc)
+    return f"{db_type}/{db_name}/{when:%Y/%m/%d}/{filename}"
+
+
+def list_objects(s3_client, bucket, prefix='', start_after=None, delimiter=None):
+    """
+    List every object under a prefix, following continuation tokens.
+
+    Returns:
+        tuple: (objects, common prefixes); the latter only with a delimiter
+    """
+    params = {'Bucket': bucket, 'Prefix': prefix}
+    if start_after:
+        params['StartAfter'] = start_after
+    if delimiter:
+        params['Delimiter'] = delimiter
+
+    objects = []
+    prefixes = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(**params):
+        objects.extend(page.get('Contents', []))
+        prefixes.extend(entry['Prefix'] for entry in page.get('CommonPrefixes', []))
+    return objects, prefixes
+
+
+def discover_partitions(s3_client, bucket, depth=2, exclude=()):
+    """
+    Find the key prefixes depth levels below the bucket root.
+
+    Objects stored above that depth, such as backups uploaded before the
+    partitioned layout, are returned as well.
+
+    Returns:
+        tuple: (partition prefixes, objects found above them)
+    """
+    level = ['']
+    objects = []
+    for _ in range(depth):
+        below = []
+        for prefix in level:
+            found, prefixes = list_objects(s3_client, bucket, prefix, delimiter='/')
+            objects.extend(found)
+            below.extend(p for p in prefixes if not p.startswith(tuple(exclude)))
+        level = below
+    return level, objects
+
+
+def list_partitioned(s3_client, bucket, depth=2, since=None, concurrency=8, exclude=()):
+    """
+    List a bucket laid out by backup_key, one partition per worker.
+
+    Args:
+        depth: Prefix levels identifying a partition (db_type/db_name)
+        since: Watermark datetime; partitions are only listed from its UTC
+            day onwards. Objects above partition depth are always listed.
+        concurrency: Partitions listed at once
+        exclude: Prefixes that are skipped entirely
+
+    Returns:
+        list: Object summaries as returned by ListObjectsV2
+    """
+    partitions, objects = discover_partitions(s3_client, bucket, depth, exclude)
+
+    def list_partition(prefix):
+        start_after = None
+        if since is not None:
+            # Keys sort by date below the partition; everything from the
+            # watermark's day sorts after "<prefix>YYYY/MM/DD"
+            start_after = f"{prefix}{since.astimezone(timezone.utc):%Y/%m/%d}"
+        return list_objects(s3_client, bucket, prefix, start_after)[0]
+
+    with ThreadPoolExecutor(max_workers=max(1, int(concurrency)), thread_name_prefix='s3-list') as executor:
+        for found in executor.map(list_partition, partitions):
+            objects.extend(found)
+    return objects
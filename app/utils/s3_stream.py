@@ -0,0 +1,302 @@
+"""
+Streaming S3 transfers for NEXDB.
+Backups are written to S3 part by part as the dump produces them, and read
+back part by part into the restore client, so a backup never needs to be
+staged on local disk on its way to or from S3.
+"""
+import hashlib
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from app.utils.compression import CHUNK_SIZE, CompressionError, get_compression, open_pipe
+
+# S3 rejects parts smaller than 5 MiB (except the last) and uploads with
+# more than 10,000 parts
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+class S3MultipartUploader:
+    """
+    File-like object that uploads everything written to it as one S3 object.
+
+    Parts are uploaded by a small thread pool while the caller keeps
+    writing. At most `concurrency` parts are held in memory at once; write()
+    blocks when they are all in flight. Objects smaller than one part are
+    sent with a single PutObject instead.
+
+    Used as a context manager the upload is completed on normal exit and
+    aborted if the block raises, so no orphaned parts are left behind.
+    """
+
+    def __init__(self, s3_client, bucket, key, part_size=64 * 1024 * 1024, concurrency=4, extra_args=None):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(int(part_size), MIN_PART_SIZE)
+        self.concurrency = max(1, int(concurrency))
+        self.extra_args = extra_args or {}
+        self.bytes_written = 0
+
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._part_number = 0
+        self._futures = []
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._executor = None
+        self._finished = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.complete()
+        else:
+            self.abort()
+
+    def write(self, data):
+        """Buffer data and upload every full part"""
+        if self._finished:
+            raise ValueError("Upload already finished")
+
+        self._buffer.extend(data)
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            body = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._submit(body)
+        return len(data)
+
+    def complete(self):
+        """Upload what is left and assemble the object"""
+        if self._finished:
+            return
+        self._finished = True
+
+        try:
+            if self._upload_id is None:
+                # Everything fit in one part; a plain PUT is cheaper
+                self.s3_client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer), **self.extra_args)
+                self._buffer = bytearray()
+                return
+
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+                self._buffer = bytearray()
+
+            parts = [future.result() for future in self._futures]
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={'Parts': sorted(parts, key=lambda part: part['PartNumber'])}
+            )
+        except Exception:
+            self._abort_upload()
+            raise
+        finally:
+            self._shutdown()
+
+    def abort(self):
+        """Stop uploading and discard the parts already sent"""
+        if self._finished:
+            return
+        self._finished = True
+        self._buffer = bytearray()
+        try:
+            self._abort_upload()
+        finally:
+            self._shutdown()
+
+    def _submit(self, body):
+        if self._upload_id is None:
+            response = self.s3_client.create_multipart_upload(Bucket=self.bucket, Key=self.key, **self.extra_args)
+            self._upload_id = response['UploadId']
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='s3-upload')
+
+        if self._part_number >= MAX_PARTS:
+            raise ValueError(f"Upload exceeds {MAX_PARTS} parts; increase the part size")
+
+        # Wait for a free slot so memory stays bounded by concurrency * part_size
+        self._slots.acquire()
+        try:
+            self._raise_failed()
+            self._part_number += 1
+            self._futures.append(self._executor.submit(self._upload_part, self._part_number, body))
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _upload_part(self, part_number, body):
+        try:
+            response = self.s3_client.upload_part(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                PartNumber=part_number,
+                Body=body
+            )
+            return {'PartNumber': part_number, 'ETag': response['ETag']}
+        finally:
+            self._slots.release()
+
+    def _raise_failed(self):
+        """Surface the error of any part that has already failed"""
+        for future in self._futures:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+
+    def _abort_upload(self):
+        for future in self._futures:
+            future.cancel()
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+        if self._upload_id is not None:
+            try:
+                self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            except Exception as e:
+                logging.error(f"Error aborting multipart upload of {self.key}: {str(e)}")
+
+    def _shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class S3RangeReader:
+    """
+    Read-only file-like object streaming one S3 object.
+
+    With a concurrency above one the object is fetched as ranged GETs by a
+    thread pool that stays up to `concurrency` parts ahead of the reader, so
+    memory is bounded by concurrency * part_size. Otherwise the object is
+    read from a single GET.
+
+    A sha256 of everything read is kept in `checksum`, and `progress`, if
+    given, is called with (bytes_read, total_bytes) after every read.
+    """
+
+    def __init__(self, s3_client, bucket, key, part_size=16 * 1024 * 1024, concurrency=4, progress=None):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(int(part_size), CHUNK_SIZE)
+        self.concurrency = max(1, int(concurrency))
+        self.progress = progress
+        self.bytes_read = 0
+
+        self.size = s3_client.head_object(Bucket=bucket, Key=key)['ContentLength']
+        self._sha256 = hashlib.sha256()
+        self._buffer = memoryview(b'')
+        self._next_offset = 0
+        self._pending = deque()
+        self._body = None
+        self._executor = None
+        self._closed = False
+
+    @property
+    def checksum(self):
+        """Hex sha256 of the bytes read so far"""
+        return self._sha256.hexdigest()
+
+    def read(self, size=-1):
+        """Read up to size bytes; b'' at the end of the object"""
+        if self._closed:
+            raise ValueError("Reader is closed")
+
+        if self.concurrency == 1:
+            data = self._read_body(size)
+        else:
+            if not self._buffer:
+                self._buffer = memoryview(self._next_part())
+            if size is None or size < 0:
+                size = len(self._buffer)
+            data = bytes(self._buffer[:size])
+            self._buffer = self._buffer[len(data):]
+
+        self._sha256.update(data)
+        self.bytes_read += len(data)
+        if self.progress is not None and data:
+            self.progress(self.bytes_read, self.size)
+        return data
+
+    def close(self):
+        """Stop fetching and release the connection"""
+        if self._closed:
+            return
+        self._closed = True
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._body is not None:
+            self._body.close()
+            self._body = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _read_body(self, size):
+        if self._body is None:
+            self._body = self.s3_client.get_object(Bucket=self.bucket, Key=self.key)['Body']
+        return self._body.read(None if size is None or size < 0 else size)
+
+    def _next_part(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='s3-download')
+
+        # Keep the pool busy with the parts after the one being consumed
+        while len(self._pending) < self.concurrency and self._next_offset < self.size:
+            end = min(self._next_offset + self.part_size, self.size) - 1
+            self._pending.append(self._executor.submit(self._get_range, self._next_offset, end))
+            self._next_offset = end + 1
+
+        if not self._pending:
+            return b''
+        return self._pending.popleft().result()
+
+    def _get_range(self, start, end):
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{end}")
+        data = response['Body'].read()
+        if len(data) != end - start + 1:
+            raise IOError(f"Short read of {self.key} at bytes {start}-{end}")
+        return data
+
+
+@contextmanager
+def open_s3_backup(s3_client, bucket, key, part_size=16 * 1024 * 1024, concurrency=4, progress=None,
+                   expected_checksum=None):
+    """
+    Context manager yielding a readable stream of an S3 backup's uncompressed contents.
+
+    The object is fed by a background thread into a decompressor, or a plain
+    pipe for uncompressed backups, so the yielded object has a real file
+    descriptor and can be passed as stdin to a client tool. Nothing is
+    written to disk.
+
+    If expected_checksum is given it is compared with the sha256 of the
+    object once the stream has been consumed. A restore has already been
+    applied by then, so a mismatch means it must not be trusted.
+    """
+    reader = S3RangeReader(s3_client, bucket, key, part_size, concurrency, progress)
+    try:
+        with open_pipe(reader, get_compression(key)) as output:
+            yield output
+    finally:
+        reader.close()
+
+    if reader.bytes_read != reader.size:
+        raise IOError(f"Read {reader.bytes_read} of {reader.size} bytes of {key}")
+    if expected_checksum and reader.checksum != expected_checksum:
+        raise CompressionError(f"Checksum mismatch for {key}")
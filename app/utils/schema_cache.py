@@ -0,0 +1,166 @@
+"""
+Schema metadata cache for NEXDB.
+Keeps database lists, table lists, column definitions and indexes in process
+so the explorer doesn't query information_schema / pg_catalog on every click.
+Entries expire after a TTL, the least recently used ones are evicted past a
+size bound, and table definitions are revalidated against a cheap per-table
+version (MySQL CREATE_TIME/UPDATE_TIME, PostgreSQL pg_class xmin) once they
+are a few seconds old. DDL run through the managers drops the affected
+entries straight away.
+"""
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Defaults, overridden from the app config by init_app()
+_settings = {
+    'ttl': 300,
+    'max_entries': 2000,
+    'check_interval': 5,
+}
+
+# Statements that change the schema, for invalidation after execute_query()
+DDL_PATTERN = re.compile(r'^\s*(CREATE|DROP|ALTER|TRUNCATE|RENAME|COMMENT)\b', re.IGNORECASE)
+
+
+class SchemaCache:
+    """LRU cache of schema metadata with a TTL and version checks"""
+
+    def __init__(self, ttl=300, max_entries=2000, check_interval=5):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.check_interval = check_interval
+        self._entries = OrderedDict()  # (server, key) -> entry dict
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, server, key, load, version=None):
+        """
+        Get a cached value, loading it on a miss.
+
+        Args:
+            server (str): Server the metadata belongs to, e.g. mysql://db1:3306
+            key (tuple): ('databases',), ('tables', db), ('structure', db, table)
+                or ('indexes', db, table)
+            load (callable): Zero-argument function reading the value from
+                the server; exceptions propagate and nothing is cached
+            version (callable): Optional zero-argument function returning a
+                cheap version of the value; an entry older than
+                check_interval is reloaded if its version changed
+
+        Returns:
+            The cached or freshly loaded value; callers must not modify it
+        """
+        cache_key = (server, key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and now - entry['loaded'] > self.ttl:
+                del self._entries[cache_key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+
+        if entry is not None:
+            if version is None or now - entry['checked'] <= self.check_interval:
+                self.hits += 1
+                return entry['value']
+            current = self._version(version, key)
+            if current is not None and current == entry['version']:
+                entry['checked'] = now
+                self.hits += 1
+                return entry['value']
+
+        self.misses += 1
+        current = self._version(version, key) if version is not None else None
+        value = load()
+        with self._lock:
+            self._entries[cache_key] = {
+                'value': value,
+                'version': current,
+                'loaded': now,
+                'checked': now
+            }
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, server, db_name=None, table_name=None):
+        """
+        Drop the entries a schema change could have made stale.
+
+        Args:
+            server (str): Server the change ran on
+            db_name (str): Database the change ran in; None drops everything
+                cached for the server
+            table_name (str): Table that changed; None drops the database
+                list and everything cached for the database
+        """
+        with self._lock:
+            for cache_key in list(self._entries):
+                entry_server, key = cache_key
+                if entry_server != server:
+                    continue
+                if db_name is None:
+                    stale = True
+                elif table_name is None:
+                    stale = key[0] == 'databases' or key[1] == db_name
+                else:
+                    stale = key in (
+                        ('tables', db_name),
+                        ('structure', db_name, table_name),
+                        ('indexes', db_name, table_name)
+                    )
+                if stale:
+                    del self._entries[cache_key]
+
+    def invalidate_for(self, server, db_name, query):
+        """Invalidate db_name if query is a DDL statement"""
+        if DDL_PATTERN.match(query or ''):
+            self.invalidate(server, db_name)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Entry count and hit/miss counters"""
+        with self._lock:
+            size = len(self._entries)
+        return {'entries': size, 'hits': self.hits, 'misses': self.misses}
+
+    @staticmethod
+    def _version(version, key):
+        try:
+            return version()
+        except Exception as e:
+            # Without a version the entry is simply reloaded
+            logging.debug(f"Schema version check for {key} failed: {str(e)}")
+            return None
+
+
+_schema_cache = None
+_schema_cache_lock = threading.Lock()
+
+
+def init_app(app):
+    """Load cache settings from the Flask app config"""
+    global _schema_cache
+    _settings['ttl'] = app.config.get('EXPLORER_SCHEMA_CACHE_TTL', _settings['ttl'])
+    _settings['max_entries'] = app.config.get('EXPLORER_SCHEMA_CACHE_SIZE', _settings['max_entries'])
+    _settings['check_interval'] = app.config.get('EXPLORER_SCHEMA_CACHE_CHECK_SECONDS', _settings['check_interval'])
+    with _schema_cache_lock:
+        _schema_cache = None
+
+
+def get_schema_cache():
+    """Get the process-wide schema cache, creating it on first use"""
+    global _schema_cache
+    with _schema_cache_lock:
+        if _schema_cache is None:
+            _schema_cache = SchemaCache(**_settings)
+        return _schema_cache
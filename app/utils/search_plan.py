@@ -0,0 +1,141 @@
+"""
+Search planning for the NEXDB table view.
+Turns the search box into predicates a table's indexes can serve, noting the
+index each one uses and warning about the ones that need a scan. The search
+box accepts free text plus per-column filters:
+
+    free text          full-text index if the table has one, else every column
+    column:value       equal to value
+    column:abc*        starts with abc
+    column:*abc*       matches a pattern, * being any characters
+    column:>10         also <, >= and <=
+    column:!value      not equal to value
+    column:NULL        also !NULL
+"""
+import re
+import shlex
+
+# A column filter token, column:condition
+FILTER_PATTERN = re.compile(r'^([^:\s]+):(.*)$', re.DOTALL)
+
+RANGE_OPERATORS = ('>=', '<=', '>', '<')
+
+
+class SearchTimeout(Exception):
+    """A search ran past its time limit and was stopped by the server"""
+    pass
+
+
+class SearchPlan:
+    """WHERE conditions for a search, with the indexes they can use"""
+
+    def __init__(self):
+        self.conditions = []
+        self.params = []
+        self.notes = []
+        self.warnings = []
+        self.indexed = False
+
+    def add(self, condition, params, index, description):
+        """
+        Add a predicate.
+
+        Args:
+            condition (str): SQL condition with %s placeholders
+            params (list): Values for the placeholders
+            index (str): Index the predicate can use, or None if it needs a scan
+            description (str): The predicate as the user wrote it
+        """
+        self.conditions.append(condition)
+        self.params.extend(params)
+        if index:
+            self.indexed = True
+            self.notes.append(f"{description} uses index {index}")
+        else:
+            self.warnings.append(f"{description} can't use an index")
+
+    @property
+    def scan(self):
+        """True if the search has predicates but none of them can use an index"""
+        return bool(self.conditions) and not self.indexed
+
+
+def parse_search(search, columns):
+    """
+    Split a search into column filters and free text.
+
+    Tokens are split like a shell command line, so quoted values may
+    contain spaces. column:condition tokens naming a column of the table
+    become filters; everything else is free text.
+
+    Args:
+        search (str): Search box contents
+        columns (list): Column names of the table
+
+    Returns:
+        tuple: (filters, text) where filters is a list of dicts with the
+            column, op (=, !=, <, <=, >, >=, prefix, like, null or not null),
+            value and the raw token, and text is the remaining free text
+    """
+    try:
+        tokens = shlex.split(search)
+    except ValueError:
+        # Unbalanced quotes
+        tokens = search.split()
+
+    by_name = {column.lower(): column for column in columns}
+    filters = []
+    text = []
+    for token in tokens:
+        match = FILTER_PATTERN.match(token)
+        column = match and (match.group(1) if match.group(1) in columns else by_name.get(match.group(1).lower()))
+        if not column or match.group(2) == '':
+            text.append(token)
+            continue
+
+        value = match.group(2)
+        if value.upper() == 'NULL':
+            op, value = 'null', None
+        elif value.upper() == '!NULL':
+            op, value = 'not null', None
+        elif value.startswith(RANGE_OPERATORS):
+            op = next(operator for operator in RANGE_OPERATORS if value.startswith(operator))
+            value = value[len(op):]
+        elif value.startswith('!'):
+            op, value = '!=', value[1:]
+        elif value.endswith('*') and '*' not in value[:-1]:
+            op, value = 'prefix', value[:-1]
+        elif '*' in value:
+            op = 'like'
+        else:
+            op = '='
+        filters.append({'column': column, 'op': op, 'value': value, 'raw': token})
+
+    return filters, ' '.join(text)
+
+
+def like_pattern(value):
+    """Turn a filter value with * wildcards into a LIKE pattern"""
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped.replace('*', '%')
+
+
+def leading_index(indexes, column, methods=('btree',), usable=None):
+    """
+    Find an index that starts with column.
+
+    Args:
+        indexes (list): Indexes from a manager's list_indexes()
+        column (str): Column name
+        methods (tuple): Index methods that can serve the predicate
+        usable (callable): Optional check of the index for the predicate
+
+    Returns:
+        str: Name of the index, or None
+    """
+    for index in indexes:
+        if index['partial'] or not index['columns'] or index['columns'][0] != column:
+            continue
+        if index['method'].lower() in methods and (usable is None or usable(index)):
+            return index['name']
+    return None
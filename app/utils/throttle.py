@@ -0,0 +1,589 @@
+"""
+Resource limits for NEXDB backup and restore jobs.
+The dump, restore and compressor processes of a job are reniced and
+ioniced, the data passing between them is rate limited, and compressors
+are held to a CPU budget by pausing them. A job's limits are kept in a
+state file, so any worker process can change them while the job runs.
+"""
+import contextvars
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# ionice scheduling classes
+IO_CLASSES = {'realtime': 1, 'best-effort': 2, 'idle': 3}
+
+# Limits a job can have, with the config setting of their default
+LIMITS = {
+    'nice': 'BACKUP_NICE',
+    'io_class': 'BACKUP_IO_CLASS',
+    'io_priority': 'BACKUP_IO_PRIORITY',
+    'bandwidth_mbps': 'BACKUP_BANDWIDTH_MBPS',
+    'cpu_percent': 'BACKUP_COMPRESSION_CPU_PERCENT',
+}
+
+# Seconds between CPU usage checks of capped compressors
+CPU_PERIOD = 0.2
+
+# Seconds between checks of a job's state file for changes
+POLL_SECONDS = 1.0
+
+# Seconds a cancelled job's processes get to exit after SIGTERM before SIGKILL
+CANCEL_GRACE_SECONDS = 10
+
+RELAY_CHUNK_SIZE = 1024 * 1024
+
+_current = contextvars.ContextVar('resource_limits', default=None)
+
+
+class ThrottleError(Exception):
+    """Raised for invalid resource limits"""
+    pass
+
+
+class JobCancelled(Exception):
+    """Raised by throttle() once the job has been cancelled"""
+    pass
+
+
+def validate_limits(values):
+    """
+    Check and normalize resource limits.
+
+    Args:
+        values (dict): Any of nice (-20 to 19), io_class (idle, best-effort,
+            realtime or none), io_priority (0 to 7), bandwidth_mbps and
+            cpu_percent (percent of one core); 0 or None disables the last two
+
+    Returns:
+        dict: The given limits with normalized types
+    """
+    if not isinstance(values, dict):
+        raise ThrottleError("Resource limits must be an object")
+
+    unknown = set(values) - set(LIMITS)
+    if unknown:
+        raise ThrottleError(f"Unknown resource limits: {', '.join(sorted(unknown))}")
+
+    limits = {}
+    try:
+        for name, value in values.items():
+            if name == 'io_class':
+                value = value or 'none'
+                if value != 'none' and value not in IO_CLASSES:
+                    raise ThrottleError(f"Invalid I/O class: {value}")
+            elif name == 'nice':
+                value = int(value)
+                if not -20 <= value <= 19:
+                    raise ThrottleError("nice must be between -20 and 19")
+            elif name == 'io_priority':
+                value = int(value)
+                if not 0 <= value <= 7:
+                    raise ThrottleError("io_priority must be between 0 and 7")
+            else:
+                value = float(value or 0)
+                if value < 0:
+                    raise ThrottleError(f"{name} cannot be negative")
+            limits[name] = value
+    except (TypeError, ValueError):
+        raise ThrottleError(f"Invalid value for {name}: {values[name]}")
+    return limits
+
+
+def limits_from_config(config, overrides=None):
+    """Resolve a job's limits: the config defaults with overrides applied"""
+    limits = validate_limits({name: config.get(setting) for name, setting in LIMITS.items()
+                              if config.get(setting) is not None})
+    limits.update(validate_limits(overrides or {}))
+    return limits
+
+
+def current_limits():
+    """Limits of the job running in the current context, or None"""
+    return _current.get()
+
+
+@contextmanager
+def use_limits(limits):
+    """Make limits the current job's limits for the duration of the block"""
+    token = _current.set(limits)
+    try:
+        yield limits
+    finally:
+        _current.reset(token)
+
+
+def list_jobs(state_dir):
+    """Limits of the jobs running in any process, from their state files"""
+    jobs = []
+    if not os.path.isdir(state_dir):
+        return jobs
+
+    for filename in sorted(os.listdir(state_dir)):
+        if not filename.endswith('.json'):
+            continue
+        path = os.path.join(state_dir, filename)
+        state = _read_state(path)
+        if state is None:
+            continue
+        if not _process_alive(state.get('pid')):
+            # The process died without cleaning up
+            _remove_quietly(path)
+            continue
+        jobs.append(state)
+    return jobs
+
+
+def update_job(state_dir, job_id, changes):
+    """
+    Change the limits of a running job.
+
+    The job's process applies the change within POLL_SECONDS. Raises
+    ValueError if no such job is running.
+
+    Returns:
+        dict: The job's state with the new limits
+    """
+    changes = validate_limits(changes)
+    path = _state_path(state_dir, job_id)
+    state = _read_state(path)
+    if state is None or not _process_alive(state.get('pid')):
+        raise ValueError(f"No running job with ID {job_id}")
+
+    state['limits'].update(changes)
+    _write_state(path, state)
+    return state
+
+
+def run_limited(cmd, limits=None, stdin=None, **kwargs):
+    """
+    Like subprocess.run(cmd, check=True), with the process under limits.
+
+    A readable stdin is fed to the process through a rate-limited pipe.
+
+    Returns:
+        subprocess.CompletedProcess
+    """
+    if limits is None:
+        return subprocess.run(cmd, stdin=stdin, check=True, **kwargs)
+
+    pipe = None
+    if stdin is not None:
+        pipe = limits.pipe(stdin)
+        stdin = pipe.reader
+
+    try:
+        process = subprocess.Popen(cmd, stdin=stdin, **kwargs)
+    finally:
+        if pipe is not None:
+            pipe.reader.close()
+
+    limits.attach(process)
+    try:
+        stdout, stderr = process.communicate()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        limits.detach(process)
+        if pipe is not None:
+            pipe.join()
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd, stdout, stderr)
+    if pipe is not None:
+        pipe.check()
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+
+class ThrottledPipe:
+    """
+    Pipe fed from a readable object by a thread, at most at the job's bandwidth.
+
+    reader has a real file descriptor, so it can be a child process's stdin.
+    The source is closed once it is exhausted or the reading end goes away.
+    """
+
+    def __init__(self, source, limits):
+        read_fd, write_fd = os.pipe()
+        self.reader = os.fdopen(read_fd, 'rb')
+        self._sink = os.fdopen(write_fd, 'wb')
+        self._source = source
+        self._limits = limits
+        self._error = None
+        self._thread = threading.Thread(target=self._feed, name='throttled-pipe', daemon=True)
+        self._thread.start()
+
+    def join(self):
+        self._thread.join()
+
+    def check(self):
+        """Raise if the source could not be read completely"""
+        self.join()
+        if self._error is not None:
+            raise self._error
+
+    def _feed(self):
+        try:
+            while True:
+                chunk = self._source.read(RELAY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self._limits.throttle(len(chunk))
+                self._sink.write(chunk)
+        except BrokenPipeError:
+            # The reader stopped early; it reports its own failure
+            pass
+        except BaseException as e:
+            self._error = e
+        finally:
+            for f in (self._sink, self._source):
+                try:
+                    f.close()
+                except OSError:
+                    pass
+
+
+class ThrottledReader:
+    """Readable wrapper that holds reads to the job's bandwidth"""
+
+    def __init__(self, source, limits):
+        self._source = source
+        self._limits = limits
+
+    def read(self, size=-1):
+        data = self._source.read(size)
+        self._limits.throttle(len(data))
+        return data
+
+    def close(self):
+        self._source.close()
+
+
+class ResourceLimits:
+    """
+    Resource limits of one backup or restore job.
+
+    Processes attached to the job are reniced and ioniced; their threads
+    and children are included. Compressors additionally get a CPU cap of
+    cpu_percent of one core, enforced by stopping them with SIGSTOP when
+    they are over budget. The bandwidth cap applies to the data passed
+    through throttle(), pipe() and reader(), normally the uncompressed
+    dump or restore stream, which in turn slows down the database.
+
+    Used as a context manager the job is published in a state file in
+    state_dir, and changes written there by update_job() are applied
+    live. Lowering nice below its current value needs privileges; such
+    changes are logged and skipped.
+
+    cancel() ends the job: its processes get SIGTERM, and SIGKILL after
+    CANCEL_GRACE_SECONDS, and throttle() raises JobCancelled.
+    """
+
+    def __init__(self, limits, state_dir=None, name='', job_id=None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.name = name
+        self.state_dir = state_dir
+        self.started = time.time()
+
+        self._limits = validate_limits(limits)
+        self._lock = threading.Lock()
+        self._processes = []
+        self._allowance = 0.0
+        self._last_refill = time.monotonic()
+        self._stop = threading.Event()
+        self._cancelled_at = None
+        self._controller = None
+        self._state_mtime = None
+
+    def __enter__(self):
+        self._stop.clear()
+        if self.state_dir:
+            os.makedirs(self.state_dir, exist_ok=True)
+            self._save_state()
+        self._controller = threading.Thread(target=self._control, name=f"limits-{self.id}", daemon=True)
+        self._controller.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._controller.join()
+        self._resume_compressors()
+        if self.state_dir:
+            _remove_quietly(_state_path(self.state_dir, self.id))
+
+    @property
+    def limits(self):
+        with self._lock:
+            return dict(self._limits)
+
+    @property
+    def cancelled(self):
+        return self._cancelled_at is not None
+
+    def update(self, changes, save=True):
+        """Change the limits and apply them to the running processes"""
+        changes = validate_limits(changes)
+        with self._lock:
+            self._limits.update(changes)
+            processes = [process for process, _ in self._processes]
+        for process in processes:
+            self._apply(process, changes)
+        if save and self.state_dir:
+            self._save_state()
+
+    def cancel(self):
+        """Terminate the job's processes and stop its data flowing"""
+        with self._lock:
+            if self._cancelled_at is None:
+                self._cancelled_at = time.monotonic()
+            processes = [process for process, _ in self._processes]
+        for process in processes:
+            _signal(process, signal.SIGTERM)
+            # Stopped processes only act on SIGTERM once resumed
+            _signal(process, signal.SIGCONT)
+
+    def attach(self, process, compressor=False):
+        """Put a child process under the limits; compressors also get the CPU cap"""
+        with self._lock:
+            self._processes.append((process, compressor))
+            cancelled = self._cancelled_at is not None
+        if cancelled:
+            _signal(process, signal.SIGTERM)
+            return
+        self._apply(process, self.limits)
+
+    def detach(self, process):
+        """Stop tracking a process, resuming it if the CPU cap paused it"""
+        with self._lock:
+            self._processes = [entry for entry in self._processes if entry[0] is not process]
+        _signal(process, signal.SIGCONT)
+
+    def throttle(self, size):
+        """Account for size bytes of job data, sleeping while over the bandwidth cap"""
+        if self._cancelled_at is not None:
+            raise JobCancelled(f"Job {self.name or self.id} was cancelled")
+        rate = self.limits.get('bandwidth_mbps', 0) * 1024 * 1024
+        if not rate:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            # Allow bursts of up to one second's worth
+            self._allowance = min(rate, self._allowance + (now - self._last_refill) * rate)
+            self._last_refill = now
+            self._allowance -= size
+            delay = -self._allowance / rate if self._allowance < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+    def pipe(self, source):
+        """Relay a readable through a rate-limited pipe; see ThrottledPipe"""
+        return ThrottledPipe(source, self)
+
+    def reader(self, source):
+        """Wrap a readable so reading it is rate limited"""
+        return ThrottledReader(source, self)
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'pid': os.getpid(),
+            'started': self.started,
+            'limits': self.limits,
+        }
+
+    def _apply(self, process, changes):
+        """Apply nice and ionice changes to a process, its threads and children"""
+        tasks = _tasks(process.pid)
+        limits = self.limits
+
+        if 'nice' in changes:
+            for task in tasks:
+                try:
+                    os.setpriority(os.PRIO_PROCESS, task, limits['nice'])
+                except ProcessLookupError:
+                    pass
+                except PermissionError:
+                    logging.warning(f"Not permitted to set nice {limits['nice']} on process {task}")
+                    break
+
+        if ('io_class' in changes or 'io_priority' in changes) and limits.get('io_class', 'none') != 'none':
+            ionice = shutil.which('ionice')
+            if not ionice:
+                logging.warning("ionice not found, backup I/O priority is not limited")
+                return
+            cmd = [ionice, '-c', str(IO_CLASSES[limits['io_class']])]
+            if limits['io_class'] != 'idle':
+                cmd.extend(['-n', str(limits.get('io_priority', 4))])
+            cmd.extend(['-p', *[str(task) for task in tasks]])
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            if result.returncode != 0 and process.poll() is None:
+                logging.warning(f"ionice failed: {result.stderr.decode('utf-8', errors='replace').strip()}")
+
+    def _control(self):
+        """Enforce the CPU cap and pick up changes from the state file"""
+        last_poll = time.monotonic()
+        last_cpu = None
+        last_wall = time.monotonic()
+
+        while not self._stop.wait(CPU_PERIOD):
+            now = time.monotonic()
+            if self.state_dir and now - last_poll >= POLL_SECONDS:
+                last_poll = now
+                self._load_state()
+
+            with self._lock:
+                self._processes = [entry for entry in self._processes if entry[0].poll() is None]
+                processes = [process for process, _ in self._processes]
+                compressors = [process for process, compressor in self._processes if compressor]
+                cap = self._limits.get('cpu_percent', 0) / 100
+                cancelled_at = self._cancelled_at
+
+            if cancelled_at is not None:
+                if now - cancelled_at >= CANCEL_GRACE_SECONDS:
+                    for process in processes:
+                        _signal(process, signal.SIGKILL)
+                continue
+
+            if not compressors or not cap:
+                last_cpu = None
+                continue
+
+            cpu = sum(_cpu_seconds(process.pid) for process in compressors)
+            if last_cpu is None or cpu < last_cpu:
+                last_cpu, last_wall = cpu, now
+                continue
+
+            # Pause the compressors until their average usage since the
+            # window started is back under the cap; long pauses are split
+            # so cap changes and job exit are noticed
+            pause = (cpu - last_cpu) / cap - (now - last_wall)
+            if pause <= 0:
+                last_cpu, last_wall = cpu, now
+                continue
+            for process in compressors:
+                _signal(process, signal.SIGSTOP)
+            try:
+                self._stop.wait(min(pause, 1.0))
+            finally:
+                for process in compressors:
+                    _signal(process, signal.SIGCONT)
+
+    def _resume_compressors(self):
+        with self._lock:
+            processes = [process for process, _ in self._processes]
+        for process in processes:
+            _signal(process, signal.SIGCONT)
+
+    def _save_state(self):
+        path = _state_path(self.state_dir, self.id)
+        _write_state(path, self.as_dict())
+        self._state_mtime = os.stat(path).st_mtime_ns
+
+    def _load_state(self):
+        path = _state_path(self.state_dir, self.id)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._state_mtime:
+            return
+        self._state_mtime = mtime
+
+        state = _read_state(path)
+        if state is None:
+            return
+        changes = {name: value for name, value in state.get('limits', {}).items() if self.limits.get(name) != value}
+        if changes:
+            logging.info(f"Applying new limits to job {self.name or self.id}: {changes}")
+            try:
+                # The state file already holds the changes
+                self.update(changes, save=False)
+            except ThrottleError as e:
+                logging.error(f"Invalid limits for job {self.id}: {str(e)}")
+
+
+def _state_path(state_dir, job_id):
+    if not job_id or not all(c.isalnum() for c in job_id):
+        raise ValueError(f"No running job with ID {job_id}")
+    return os.path.join(state_dir, f"{job_id}.json")
+
+
+def _read_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_state(path, state):
+    partial_path = f"{path}.partial"
+    with open(partial_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(partial_path, path)
+
+
+def _tasks(pid):
+    """Thread IDs of a process and of its descendants (Linux), or just the pid"""
+    tasks = []
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            threads = [int(tid) for tid in os.listdir(f"/proc/{current}/task")]
+        except OSError:
+            threads = [current]
+        tasks.extend(threads)
+        for tid in threads:
+            try:
+                with open(f"/proc/{current}/task/{tid}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+            except OSError:
+                pass
+    return tasks
+
+
+def _cpu_seconds(pid):
+    """User plus system CPU time of a process, all threads included (Linux)"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except (OSError, IndexError):
+        return 0.0
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def _process_alive(pid):
+    try:
+        os.kill(int(pid), 0)
+    except (TypeError, ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _signal(process, signum):
+    # Popen.send_signal skips processes that have already been reaped
+    try:
+        process.send_signal(signum)
+    except ProcessLookupError:
+        pass
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
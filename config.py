@@ -29,7 +29,42 @@ class Config:
     
     # Backup settings
     BACKUP_DIR = os.environ.get('BACKUP_DIR') or os.path.join(basedir, 'instance', 'backups')
-    
+    BACKUP_COMPRESSION = os.environ.get('BACKUP_COMPRESSION', 'gzip')  # gzip, zstd, lz4 or none
+    BACKUP_COMPRESSION_LEVEL = int(os.environ.get('BACKUP_COMPRESSION_LEVEL', 0))  # 0 uses the compressor's default
+    BACKUP_COMPRESSION_THREADS = int(os.environ.get('BACKUP_COMPRESSION_THREADS', 1))  # used by pigz and zstd
+    BACKUP_MODE = os.environ.get('BACKUP_MODE', 'single')  # single (one dump file), parallel (per-table files), incremental or dedup
+    BACKUP_BASE_INTERVAL_HOURS = int(os.environ.get('BACKUP_BASE_INTERVAL_HOURS', 24))  # hours between full base backups in incremental mode
+    BACKUP_PARALLEL_WORKERS = int(os.environ.get('BACKUP_PARALLEL_WORKERS', 0))  # parallel backup/restore jobs, 0 uses the CPU count
+    BACKUP_PARALLEL_CHUNK_ROWS = int(os.environ.get('BACKUP_PARALLEL_CHUNK_ROWS', 1000000))  # rows per primary key range
+    BACKUP_CATALOG_SYNC_MINUTES = int(os.environ.get('BACKUP_CATALOG_SYNC_MINUTES', 15))  # how often the backup catalog is reconciled with disk and S3
+    BACKUP_RETENTION_ENABLED = os.environ.get('BACKUP_RETENTION_ENABLED') == 'True'  # delete expired backups after each catalog sync
+    BACKUP_KEEP_HOURLY = int(os.environ.get('BACKUP_KEEP_HOURLY', 24))  # default retention policy, overridable per database and schedule
+    BACKUP_KEEP_DAILY = int(os.environ.get('BACKUP_KEEP_DAILY', 7))
+    BACKUP_KEEP_WEEKLY = int(os.environ.get('BACKUP_KEEP_WEEKLY', 4))
+    BACKUP_KEEP_MONTHLY = int(os.environ.get('BACKUP_KEEP_MONTHLY', 12))
+    BACKUP_DEDUP_CHUNK_MIN_SIZE = int(os.environ.get('BACKUP_DEDUP_CHUNK_MIN_SIZE', 128 * 1024))  # bytes, content-defined chunks of dedup backups
+    BACKUP_DEDUP_CHUNK_AVG_SIZE = int(os.environ.get('BACKUP_DEDUP_CHUNK_AVG_SIZE', 512 * 1024))
+    BACKUP_DEDUP_CHUNK_MAX_SIZE = int(os.environ.get('BACKUP_DEDUP_CHUNK_MAX_SIZE', 2 * 1024 * 1024))
+    BACKUP_DEDUP_PACK_SIZE = int(os.environ.get('BACKUP_DEDUP_PACK_SIZE', 64 * 1024 * 1024))  # bytes of compressed chunks per pack file
+    BACKUP_DEDUP_COMPRESSION_LEVEL = int(os.environ.get('BACKUP_DEDUP_COMPRESSION_LEVEL', 6))  # zlib level of stored chunks
+    BACKUP_DEDUP_REPACK_PERCENT = int(os.environ.get('BACKUP_DEDUP_REPACK_PERCENT', 50))  # rewrite local packs with less live data than this
+    BACKUP_DEDUP_EXTENDED_INSERT = os.environ.get('BACKUP_DEDUP_EXTENDED_INSERT') == 'True'  # one INSERT per row deduplicates far better
+    BACKUP_QUEUE_WORKERS = int(os.environ.get('BACKUP_QUEUE_WORKERS', 2))  # backups run at once per process
+    BACKUP_QUEUE_PER_HOST = int(os.environ.get('BACKUP_QUEUE_PER_HOST', 1))  # backups run at once against one database server, across processes
+    BACKUP_JOB_RETENTION_DAYS = int(os.environ.get('BACKUP_JOB_RETENTION_DAYS', 7))  # days finished backup and restore jobs are kept
+    BACKUP_SCHEDULE_JITTER_SECONDS = int(os.environ.get('BACKUP_SCHEDULE_JITTER_SECONDS', 300))  # random delay of each scheduled run
+    BACKUP_SCHEDULE_STAGGER_MINUTES = int(os.environ.get('BACKUP_SCHEDULE_STAGGER_MINUTES', 5))  # gap between new schedules without a run time
+    BACKUP_NICE = int(os.environ.get('BACKUP_NICE', 10))  # nice value of dump, restore and compressor processes
+    BACKUP_IO_CLASS = os.environ.get('BACKUP_IO_CLASS', 'best-effort')  # ionice class: idle, best-effort, realtime or none
+    BACKUP_IO_PRIORITY = int(os.environ.get('BACKUP_IO_PRIORITY', 7))  # ionice priority within the class, 0 (highest) to 7
+    BACKUP_BANDWIDTH_MBPS = float(os.environ.get('BACKUP_BANDWIDTH_MBPS', 0))  # cap on dump/restore data in MB/s, 0 for none
+    BACKUP_COMPRESSION_CPU_PERCENT = int(os.environ.get('BACKUP_COMPRESSION_CPU_PERCENT', 0))  # compressor CPU cap in percent of one core, 0 for none
+    SCHEDULER_LOCK_FILE = os.environ.get('SCHEDULER_LOCK_FILE')  # file locked by the worker running the scheduler, instance/scheduler.lock by default
+    SCHEDULER_LEADER_RETRY_SECONDS = int(os.environ.get('SCHEDULER_LEADER_RETRY_SECONDS', 30))  # how often other workers try to take over the scheduler
+    SCHEDULER_SYNC_SECONDS = int(os.environ.get('SCHEDULER_SYNC_SECONDS', 60))  # how often the scheduler picks up schedule changes from other workers
+    SCHEDULER_MISFIRE_GRACE_SECONDS = int(os.environ.get('SCHEDULER_MISFIRE_GRACE_SECONDS', 24 * 3600))  # missed runs later than this are not caught up
+    BACKUP_CATALOG_FULL_SYNC_HOURS = int(os.environ.get('BACKUP_CATALOG_FULL_SYNC_HOURS', 24))  # hours between full S3 listings; other syncs start at the watermark
+
     # Security settings
     ALLOWED_IPS = os.environ.get('ALLOWED_IPS', '').split(',') if os.environ.get('ALLOWED_IPS') else []
     
@@ -39,17 +74,60 @@ class Config:
     MYSQL_USER = os.environ.get('MYSQL_USER', 'root')
     MYSQL_PASSWORD = os.environ.get('MYSQL_PASSWORD', '')
     
+    # MySQL connection pool settings
+    MYSQL_POOL_MIN_SIZE = int(os.environ.get('MYSQL_POOL_MIN_SIZE', 1))
+    MYSQL_POOL_MAX_SIZE = int(os.environ.get('MYSQL_POOL_MAX_SIZE', 10))
+    MYSQL_POOL_IDLE_TIMEOUT = int(os.environ.get('MYSQL_POOL_IDLE_TIMEOUT', 300))  # seconds
+    MYSQL_POOL_TIMEOUT = int(os.environ.get('MYSQL_POOL_TIMEOUT', 30))  # seconds to wait for a free connection
+    
     # PostgreSQL settings
     POSTGRES_HOST = os.environ.get('POSTGRES_HOST', 'localhost')
     POSTGRES_PORT = int(os.environ.get('POSTGRES_PORT', 5432))
     POSTGRES_USER = os.environ.get('POSTGRES_USER', 'postgres')
     POSTGRES_PASSWORD = os.environ.get('POSTGRES_PASSWORD', '')
     
+    # PostgreSQL connection pool settings
+    POSTGRES_POOL_MIN_IDLE = int(os.environ.get('POSTGRES_POOL_MIN_IDLE', 1))  # idle connections kept per database
+    POSTGRES_POOL_MAX_PER_DATABASE = int(os.environ.get('POSTGRES_POOL_MAX_PER_DATABASE', 5))
+    POSTGRES_POOL_MAX_TOTAL = int(os.environ.get('POSTGRES_POOL_MAX_TOTAL', 20))
+    POSTGRES_POOL_IDLE_TIMEOUT = int(os.environ.get('POSTGRES_POOL_IDLE_TIMEOUT', 300))  # seconds
+    POSTGRES_POOL_TIMEOUT = int(os.environ.get('POSTGRES_POOL_TIMEOUT', 30))  # seconds to wait for a free connection
+    
+    # Database explorer settings
+    EXPLORER_MAX_ROWS = int(os.environ.get('EXPLORER_MAX_ROWS', 1000))  # rows rendered for a query
+    EXPLORER_MAX_BYTES = int(os.environ.get('EXPLORER_MAX_BYTES', 5 * 1024 * 1024))  # approx. bytes rendered for a query
+    EXPLORER_EXACT_COUNT_THRESHOLD = int(os.environ.get('EXPLORER_EXACT_COUNT_THRESHOLD', 100000))  # estimated rows above which COUNT(*) is skipped
+    EXPLORER_COUNT_CACHE_TTL = int(os.environ.get('EXPLORER_COUNT_CACHE_TTL', 300))  # seconds
+    EXPLORER_QUERY_TIMEOUT = int(os.environ.get('EXPLORER_QUERY_TIMEOUT', 60))  # default time limit of a console query, seconds
+    EXPLORER_QUERY_MAX_TIMEOUT = int(os.environ.get('EXPLORER_QUERY_MAX_TIMEOUT', 3600))  # highest time limit a user can pick, seconds
+    EXPLORER_QUERY_WAIT_SECONDS = int(os.environ.get('EXPLORER_QUERY_WAIT_SECONDS', 10))  # request wait before a query is shown as running
+    EXPLORER_QUERY_WORKERS = int(os.environ.get('EXPLORER_QUERY_WORKERS', 4))  # console queries run at once per process
+    EXPLORER_QUERY_RESULT_TTL = int(os.environ.get('EXPLORER_QUERY_RESULT_TTL', 300))  # seconds finished query results are kept
+    EXPLORER_SCHEMA_CACHE_TTL = int(os.environ.get('EXPLORER_SCHEMA_CACHE_TTL', 300))  # max age of cached schema metadata, seconds
+    EXPLORER_SCHEMA_CACHE_SIZE = int(os.environ.get('EXPLORER_SCHEMA_CACHE_SIZE', 2000))  # cached database, table and column lists
+    EXPLORER_SCHEMA_CACHE_CHECK_SECONDS = int(os.environ.get('EXPLORER_SCHEMA_CACHE_CHECK_SECONDS', 5))  # age after which table versions are rechecked
+    EXPLORER_IMPORT_BATCH_ROWS = int(os.environ.get('EXPLORER_IMPORT_BATCH_ROWS', 50000))  # rows loaded and committed at a time by bulk imports
+    EXPLORER_IMPORT_MAX_ERRORS = int(os.environ.get('EXPLORER_IMPORT_MAX_ERRORS', 100))  # rejected rows after which a bulk import stops
+    EXPLORER_EXPORT_ROW_GROUP_ROWS = int(os.environ.get('EXPLORER_EXPORT_ROW_GROUP_ROWS', 65536))  # rows per Parquet row group in exports
+    EXPLORER_EXPORT_COMPRESSION_LEVEL = int(os.environ.get('EXPLORER_EXPORT_COMPRESSION_LEVEL', 3))  # gzip/zstd level of compressed exports
+    EXPLORER_SEARCH_TIMEOUT = int(os.environ.get('EXPLORER_SEARCH_TIMEOUT', 10))  # seconds a table search may run
+    EXPLORER_SEARCH_COUNT_LIMIT = int(os.environ.get('EXPLORER_SEARCH_COUNT_LIMIT', 10000))  # matches counted for searches of large tables
+    
     # AWS S3 settings
     AWS_ACCESS_KEY = os.environ.get('AWS_ACCESS_KEY', '')
     AWS_SECRET_KEY = os.environ.get('AWS_SECRET_KEY', '')
     AWS_BUCKET_NAME = os.environ.get('AWS_BUCKET_NAME', '')
     AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
+    AWS_S3_ENDPOINT_URL = os.environ.get('AWS_S3_ENDPOINT_URL') or None  # e.g. a MinIO server
+    S3_MULTIPART_PART_SIZE = int(os.environ.get('S3_MULTIPART_PART_SIZE', 64 * 1024 * 1024))  # bytes, at least 5 MiB
+    S3_MULTIPART_CONCURRENCY = int(os.environ.get('S3_MULTIPART_CONCURRENCY', 4))  # parts uploaded (and buffered) at once
+    S3_KEY_LAYOUT = os.environ.get('S3_KEY_LAYOUT', 'database')  # database (<type>/<db>/<YYYY>/<MM>/<DD>/<file>) or flat
+    S3_LIST_CONCURRENCY = int(os.environ.get('S3_LIST_CONCURRENCY', 8))  # database prefixes listed at once
+    S3_DELETE_BATCH_SIZE = int(os.environ.get('S3_DELETE_BATCH_SIZE', 1000))  # keys per DeleteObjects call, at most 1000
+    S3_DOWNLOAD_PART_SIZE = int(os.environ.get('S3_DOWNLOAD_PART_SIZE', 16 * 1024 * 1024))  # bytes per ranged GET
+    S3_DOWNLOAD_CONCURRENCY = int(os.environ.get('S3_DOWNLOAD_CONCURRENCY', 4))  # ranged GETs in flight (and buffered) at once
+    BACKUP_STREAM_TO_S3 = os.environ.get('BACKUP_STREAM_TO_S3') == 'True'  # upload dumps to S3 as they are produced
+    BACKUP_KEEP_LOCAL_COPY = os.environ.get('BACKUP_KEEP_LOCAL_COPY') == 'True'  # also write streamed backups to BACKUP_DIR
     
     # Authentication settings
     ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME', 'admin')